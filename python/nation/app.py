@@ -1,9 +1,11 @@
-from flask import Flask, render_template, request, jsonify, session
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
 import threading
 import time
 import json
+import datetime
+import os
 from typing import Optional, Dict, List
 import serial
 from serial.tools import list_ports
@@ -19,6 +21,17 @@ from config import get_config
 
 #Nation 
 from nation import NationReader
+from tag_emitter import TagBatchEmitter
+from tag_table import TagTable
+from tag_log import TagLog
+from tag_index import TagLogIndex
+from tag_rollup import TagRollup, RESOLUTIONS
+from reader_manager import ReaderManager
+from epc_encoder import BatchEncoder
+from epc_allocator import EpcAllocator, PoolExhausted
+from gs1 import EpcDecoder
+from catalog import ProductCatalog
+from port_discovery import PortDiscovery
 
 # Load configuration
 config = get_config()
@@ -31,13 +44,50 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', logge
 # Global variables
 reader: Optional[serial.Serial] = None
 inventory_thread: Optional[threading.Thread] = None
+epc_batches: Dict[str, Dict] = {}  # reader_id -> {"encoder", "thread", "summary"} of its last EPC batch
 stop_inventory_flag = False
-detected_tags = []
-# detected_tags = deque(maxlen=config.MAX_TAGS_DISPLAY)
-# tag_queue = Queue()
-inventory_stats = {"read_rate": 0, "total_count": 0}
+# Ring-buffered tag history + EPC index (replaces the detected_tags list)
+tag_table = TagTable(history_size=config.TAG_HISTORY_SIZE, max_tags=config.TAG_TABLE_MAX_TAGS)
 connected_clients = set()
 
+# Tag records go through the emitter thread instead of one emit per read
+tag_emitter = TagBatchEmitter(
+    socketio,
+    interval_ms=config.TAG_BATCH_INTERVAL_MS,
+    max_batch=config.TAG_BATCH_MAX,
+)
+tag_emitter.start()
+
+# Every read also goes to the on-disk log (written by its own thread)
+tag_log = None
+if config.TAG_LOG_DIR:
+    tag_log = TagLog(
+        config.TAG_LOG_DIR,
+        segment_bytes=config.TAG_LOG_SEGMENT_MB * 1024 * 1024,
+        retention_segments=config.TAG_LOG_RETENTION_SEGMENTS,
+        retention_seconds=config.TAG_LOG_RETENTION_HOURS * 3600 if config.TAG_LOG_RETENTION_HOURS else None,
+        flush_interval_ms=config.TAG_LOG_FLUSH_MS,
+        fsync=config.TAG_LOG_FSYNC,
+    )
+    tag_log.start()
+tag_index = TagLogIndex(config.TAG_LOG_DIR) if tag_log else None
+
+# Serial numbers / EPCs for the encoding stations, leased in blocks
+epc_allocator = EpcAllocator(config.EPC_ALLOCATOR_FILE)
+
+# EPC -> GS1 fields (memoized); attached to tag events and to history on request
+epc_decoder = EpcDecoder(config.EPC_DECODE_CACHE)
+
+# EPC -> product from the product master; loaded and hot-reloaded in the background
+product_catalog = ProductCatalog(
+    config.CATALOG_FILE or None,
+    max_bytes=config.CATALOG_MAX_MB * 1024 * 1024,
+    decoder=epc_decoder,
+)
+
+# Read-rate / population rollups per second, minute and hour (/api/stats, 'stats' event)
+tag_rollup = TagRollup()
+
 # Configure logging
 logging.basicConfig(
     level=getattr(logging, config.LOG_LEVEL),
@@ -45,23 +95,83 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def publish_tag(tag: dict, verbose: bool = False) -> dict:
+    """
+    Đường đi của một tag sau driver: chuẩn hoá (+ giải mã GS1, sản phẩm) -> tag_table (+ tag_log, tag_rollup) -> emitter SocketIO.
+    Shared by both inventory endpoints (and bench.py).
+    """
+    if verbose:
+        logger.info(f"🔍 Tag callback called: EPC={tag.get('epc')}, RSSI={tag.get('rssi')}, Antenna={tag.get('antenna_id')}")
+    tag_data = {
+        "epc": tag.get("epc"),
+        "rssi": tag.get("rssi"),
+        "antenna": tag.get("antenna_id"),
+        "timestamp": time.strftime("%H:%M:%S")
+    }
+    if "reader_id" in tag:
+        tag_data["reader_id"] = tag["reader_id"]
+    if "event" in tag:
+        # Aggregated dedup event (first_seen / refresh / last_seen)
+        tag_data.update({
+            "event": tag["event"],
+            "count": tag["read_count"],
+            "peak_rssi": tag["peak_rssi"],
+            "mean_rssi": tag["mean_rssi"],
+        })
+    if config.EPC_DECODE:
+        tag_data["gs1"] = epc_decoder.decode(tag_data["epc"])
+    product = product_catalog.lookup(tag_data["epc"], tag_data.get("gs1"))
+    if product:
+        tag_data["product"] = product
+    if verbose:
+        print(f"Detected tag: {tag_data}")
+    tag_table.record(tag_data)
+    # A dedup event stands for every read since the previous event of the tag
+    tag_rollup.record(tag_data["epc"], tag_data["rssi"], tag_data["antenna"], reads=tag.get("new_reads", 1))
+    if tag_log:
+        tag_log.append(tag_data["epc"], tag_data["rssi"], tag_data["antenna"], tag_data.get("reader_id"))
+    tag_emitter.submit(tag_data)
+    return tag_data
+
+# Finds a reader again by serial number after it is re-plugged on another port
+port_discovery = PortDiscovery(
+    baudrates=config.DISCOVERY_BAUDRATES,
+    cache_file=config.PORT_CACHE_FILE,
+) if config.PORT_DISCOVERY else None
+
+# Every reader of this process; their tag streams merge into publish_tag()
+reader_manager = ReaderManager(
+    on_tag=publish_tag,
+    process_mode=config.READER_PROCESS_MODE,
+    discovery=port_discovery,
+    tag_queue_size=config.TAG_QUEUE_SIZE,
+    tag_overflow=config.TAG_QUEUE_OVERFLOW,
+    tag_workers=config.TAG_WORKERS,
+)
+
 class RFIDWebController:
     def __init__(self):
         self.reader = None
-        self.is_connected = False
+        self.reader_id = None  # ID of the current reader in reader_manager
         self.current_profile = None
         self.antenna_power = {}
+
+    @property
+    def is_connected(self) -> bool:
+        """Trạng thái thật của liên kết serial (False khi mất kết nối / đang kết nối lại)"""
+        return self.reader is not None and self.reader.is_connected()
         
     def connect(self, port: str, baudrate: int = None) -> Dict:
         if baudrate is None:
             baudrate = config.DEFAULT_BAUDRATE
             print(port, baudrate)
         try:
-            self.reader = NationReader(port, baudrate)
-            self.reader.open()
-            self.is_connected = True
+            # The manager opens the reader and populates its cached state once;
+            # a second connect adds another reader and makes it the current one
+            self.reader_id = reader_manager.add(port, baudrate)
+            self.reader = reader_manager.get(self.reader_id)
             logger.info(f"Connected to RFID reader on {port}")
-            return {"success": True, "message": f"Đã kết nối thành công đến {port}"}
+            return {"success": True, "message": f"Đã kết nối thành công đến {port}", "reader_id": self.reader_id}
         except Exception as e:
             logger.error(f"Connection error: {e}")
             return {"success": False, "message": f"Lỗi kết nối: {str(e)}"}
@@ -70,10 +180,10 @@ class RFIDWebController:
     def disconnect(self) -> Dict:
         """Ngắt kết nối RFID reader"""
         try:
-            if self.reader:
-                self.reader.close()
-            self.is_connected = False
+            if self.reader_id:
+                reader_manager.remove(self.reader_id)
             self.reader = None
+            self.reader_id = None
             logger.info("Disconnected from RFID reader")
             return {"success": True, "message": "Đã ngắt kết nối"}
         except Exception as e:
@@ -113,7 +223,7 @@ class RFIDWebController:
         if not self.is_connected or not self.reader:
             return {"success": False, "message": "Chưa kết nối đến reader"}
         try:
-            info = self.reader.query_baseband_profile()
+            info = self.reader.query_baseband_profile(use_cache=True)
             if info:
                 return {"success": True, "data": info}
             else:
@@ -122,8 +232,8 @@ class RFIDWebController:
             logger.error(f"Query baseband profile error: {e}")
             return {"success": False, "message": f"Lỗi: {str(e)}"}
     
-    def start_inventory(self, antenna_mask: int ) -> Dict:
-        global inventory_thread, stop_inventory_flag, detected_tags, inventory_stats
+    def start_inventory(self, antenna_mask: int, dedup: Optional[Dict] = None) -> Dict:
+        global inventory_thread, stop_inventory_flag
 
         if not self.is_connected:
             return {"success": False, "message": "Chưa kết nối đến reader"}
@@ -135,36 +245,12 @@ class RFIDWebController:
 
         try:
             stop_inventory_flag = False
-            detected_tags.clear()
-            inventory_stats = {"read_rate": 0, "total_count": 0}
-
-            # Only flush input, avoid unnecessary sleeps
-            try:
-                self.reader.uart.flush_input()
-            except Exception as e:
-                logger.warning(f"Buffer clear warning: {e}")
-
-            def tag_callback(tag: dict):
-                logger.info(f"🔍 Tag callback called: EPC={tag.get('epc')}, RSSI={tag.get('rssi')}, Antenna={tag.get('antenna_id')}")
-                tag_data = {
-                    "epc": tag.get("epc"),
-                    "rssi": tag.get("rssi"),
-                    "antenna": tag.get("antenna_id"),
-                    "timestamp": time.strftime("%H:%M:%S")
-                }
-                print(f"Detected tag: {tag_data}")
-                detected_tags.append(tag_data)
-                if len(detected_tags) > config.MAX_TAGS_DISPLAY:
-                    detected_tags.pop(0)
-                try:
-                    socketio.emit('tag_detected', tag_data)
-                except Exception as e:
-                    logger.error(f"❌ WebSocket emit failed: {e}")
+            tag_table.clear()
 
             def inventory_worker():
                 try:         
-                    # Start inventory with callbacks
-                    self.reader.start_inventory_with_mode(antenna_mask=antenna_mask,callback=tag_callback)
+                    # Tags reach publish_tag() through the manager's merged stream
+                    reader_manager.start_inventory(self.reader_id, antenna_mask, dedup=dedup)
                 except Exception as e:
                     logger.error(f"Inventory worker error: {e}")
                 finally:
@@ -191,25 +277,8 @@ class RFIDWebController:
             # Set flag để dừng inventory
             stop_inventory_flag = True
             
-            # Gửi lệnh stop đến reader
-            if self.reader:
-                # Gửi lệnh stop nhiều lần để đảm bảo reader nhận được
-                for i in range(3):
-                    try:
-                        self.reader.stop_inventory()
-                        time.sleep(0.1)
-                    except Exception as e:
-                        logger.warning(f"Stop command attempt {i+1} failed: {e}")
-                
-                # Đợi reader xử lý lệnh stop
-                time.sleep(0.5)
-                
-                # Clear buffer sau khi stop
-                try:
-                    self.reader.uart.flush_input()
-                    time.sleep(0.1)
-                except Exception as e:
-                    logger.warning(f"Buffer clear warning: {e}")
+            # Gửi lệnh stop đến reader (chờ phản hồi STOP hoặc thông báo read end)
+            stopped = self.reader.stop_inventory() if self.reader else True
             
             # Đợi thread dừng (tối đa 3 giây)
             if inventory_thread and inventory_thread.is_alive():
@@ -220,6 +289,9 @@ class RFIDWebController:
                     stop_inventory_flag = True
                     time.sleep(0.5)
             
+            if not stopped:
+                logger.warning("Reader không xác nhận lệnh STOP")
+                return {"success": False, "message": "Reader không xác nhận lệnh dừng inventory"}
             logger.info("Stopped inventory")
             return {"success": True, "message": "Đã dừng inventory"}
         except Exception as e:
@@ -255,7 +327,7 @@ class RFIDWebController:
             return {"success": False, "message": "Chưa kết nối đến reader"}
         
         try:
-            power_levels = self.reader.query_reader_power()
+            power_levels = self.reader.query_reader_power(use_cache=True)
             print(power_levels)  # Raw dict output
             # Pretty print for each antenna
             if power_levels:
@@ -333,10 +405,9 @@ class RFIDWebController:
             return {"success": False, "message": "Antenna phải từ 1 đến 32"}
 
         try:
-            # Use NationReader method to enable antennas
-            # This assumes NationReader has a method enable_ant(ant_id: int, save: bool)
-            for ant in antennas:
-                self.reader.enable_ant(ant, save_on_power_down)
+            # One command for all antennas, starting from the cached mask
+            if not self.reader.update_ant_mask(enable=antennas, save=save_on_power_down):
+                return {"success": False, "message": "Không thể bật antennas"}
             logger.info(f"Enabled antennas: {antennas}")
             return {"success": True, "message": f"Đã bật antennas: {antennas}"}
         except Exception as e:
@@ -353,16 +424,31 @@ class RFIDWebController:
             return {"success": False, "message": "Antenna phải từ 1 đến 32"}
 
         try:
-            # Use NationReader method to disable antennas
-            # This assumes NationReader has a method disable_ant(ant_id: int, save: bool)
-            for ant in antennas:
-                self.reader.disable_ant(ant, save_on_power_down)
+            # One command for all antennas, starting from the cached mask
+            if not self.reader.update_ant_mask(disable=antennas, save=save_on_power_down):
+                return {"success": False, "message": "Không thể tắt antennas"}
             logger.info(f"Disabled antennas: {antennas}")
             return {"success": True, "message": f"Đã tắt antennas: {antennas}"}
         except Exception as e:
             logger.error(f"Disable antennas error: {e}")
             return {"success": False, "message": f"Lỗi: {str(e)}"}
         
+    def apply_config(self, desired: Dict, persistence: Optional[bool] = None, dry_run: bool = False) -> Dict:
+        """Áp dụng cấu hình mong muốn, chỉ gửi các tham số thay đổi"""
+        if not self.is_connected or not self.reader:
+            return {"success": False, "message": "Chưa kết nối đến reader"}
+        try:
+            result = self.reader.apply_config(desired, persistence=persistence, dry_run=dry_run)
+            if result["success"]:
+                logger.info(f"Applied config, changed: {result['changed']}")
+                result["message"] = "Không có thay đổi" if not result["changed"] else f"Đã áp dụng: {', '.join(result['changed'])}"
+            else:
+                result.setdefault("message", "Không thể áp dụng toàn bộ cấu hình")
+            return result
+        except Exception as e:
+            logger.error(f"Apply config error: {e}")
+            return {"success": False, "message": f"Lỗi: {str(e)}"}
+
     def set_power_for_antenna(self, antenna: int, power: int, preserve_config: bool = True) -> Dict:
         if not self.is_connected:
             return {"success": False, "message": "Chưa kết nối đến reader"}
@@ -467,7 +553,12 @@ def api_start_inventory():
     """API bắt đầu inventory"""
     data = request.get_json()
     antenna_mask = data.get('selectedAntennas')
-    result = rfid_controller.start_inventory(antenna_mask)
+    dedup = data.get('dedup') or {
+        "mode": config.TAG_DEDUP_MODE,
+        "window": config.TAG_DEDUP_WINDOW,
+        "refresh_interval": config.TAG_DEDUP_REFRESH_INTERVAL,
+    }
+    result = rfid_controller.start_inventory(antenna_mask, dedup)
     return jsonify(result)
 
 @app.route('/api/stop_inventory', methods=['POST'])
@@ -563,14 +654,225 @@ def api_get_antenna_power():
     result = rfid_controller.get_antenna_power()
     return jsonify(result)
 
-# @app.route('/api/get_tags', methods=['GET'])
-# def api_get_tags():
-#     """API lấy danh sách tags đã phát hiện"""
-#     return jsonify({
-#         "success": True,
-#         "data": detected_tags,
-#         "stats": inventory_stats
-#     })
+@app.route('/api/get_tags', methods=['GET'])
+def api_get_tags():
+    """
+    API lấy danh sách tags đã phát hiện.
+    Query params:
+        view        - "tags" (mỗi EPC một dòng, mặc định) hoặc "events" (lịch sử từng lần đọc)
+        since       - cursor từ lần gọi trước; chỉ trả về dữ liệu mới hơn
+        epc         - lọc theo tiền tố EPC
+        antenna     - lọc theo ăng-ten (1-based)
+        min_rssi    - RSSI tối thiểu
+        seen_within - chỉ tag thấy trong N giây gần nhất
+        offset, limit - phân trang
+    """
+    try:
+        args = request.args
+        since = args.get('since', type=int)
+        limit = max(1, min(args.get('limit', config.MAX_TAGS_DISPLAY, type=int), 1000))
+        if args.get('view', 'tags') == 'events':
+            result = tag_table.events(since=since or 0, limit=limit)
+            return jsonify({"success": True, "data": result["events"], "cursor": result["cursor"],
+                            "missed": result["missed"], "stats": tag_table.stats()})
+        result = tag_table.query(
+            epc=args.get('epc'),
+            antenna=args.get('antenna', type=int),
+            min_rssi=args.get('min_rssi', type=int),
+            seen_within=args.get('seen_within', type=float),
+            since=since,
+            offset=max(0, args.get('offset', 0, type=int)),
+            limit=limit,
+        )
+        return jsonify({"success": True, "data": result["tags"], "total": result["total"],
+                        "cursor": result["cursor"], "stats": tag_table.stats()})
+    except Exception as e:
+        logger.error(f"Get tags error: {e}")
+        return jsonify({"success": False, "message": f"Lỗi: {str(e)}"})
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    """Epoch giây, ISO 8601 ("2026-10-18T14:00") hoặc "HH:MM[:SS]" của hôm nay"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if len(value) <= 8 and ':' in value:
+        value = f"{datetime.date.today().isoformat()}T{value}"
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/tags/history', methods=['GET'])
+def api_tags_history():
+    """
+    API tra cứu lịch sử đọc tag từ nhật ký trên đĩa (trả về dạng chunked).
+    Query params:
+        epc     - EPC đầy đủ (hex)
+        from/to - epoch giây, ISO 8601 hoặc HH:MM[:SS] hôm nay
+        reader  - reader ID
+        antenna - ăng-ten (1-based)
+        limit   - số bản ghi tối đa (mặc định 10000)
+        order   - "asc" (mặc định) hoặc "desc" (mới nhất trước; limit=1 = lần thấy cuối)
+        decode  - 1 = thêm trường "gs1" (GTIN, serial...) vào mỗi bản ghi
+    """
+    if not tag_index:
+        return jsonify({"success": False, "message": "Nhật ký tag đang tắt (TAG_LOG_DIR)"})
+    args = request.args
+    try:
+        records = tag_index.query(
+            epc=args.get('epc'),
+            since=_parse_time(args.get('from')),
+            until=_parse_time(args.get('to')),
+            reader_id=args.get('reader'),
+            antenna=args.get('antenna', type=int),
+            limit=max(1, args.get('limit', 10000, type=int)),
+            newest_first=args.get('order') == 'desc',
+        )
+        first = next(records, None)  # surface bad parameters before the 200 goes out
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Tham số không hợp lệ: {str(e)}"})
+    decode = args.get('decode', '').lower() in ('1', 'true', 'yes')
+
+    def encode(batch):
+        if decode:
+            for record, fields in zip(batch, epc_decoder.decode_many(r["epc"] for r in batch)):
+                record["gs1"] = fields
+        return ','.join(json.dumps(record) for record in batch)
+
+    def generate():
+        count = 0
+        prefix = '{"success": true, "data": ['
+        batch = [first] if first is not None else []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= 256:  # one chunk per few hundred records, not per record
+                yield prefix + encode(batch)
+                count += len(batch)
+                batch = []
+                prefix = ','
+        if batch:
+            yield prefix + encode(batch)
+            count += len(batch)
+        elif not count:
+            yield prefix
+        yield f'], "count": {count}}}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/api/epc/decode', methods=['GET', 'POST'])
+def api_decode_epc():
+    """
+    API giải mã EPC theo GS1 (SGTIN-96, SSCC-96, GRAI-96; còn lại là "raw").
+    GET ?epc=3074257BF7194E4000001A85  hoặc  POST {"epcs": ["...", "..."]}
+    """
+    if request.method == 'GET':
+        epc = request.args.get('epc')
+        if not epc:
+            return jsonify({"success": False, "message": "Thiếu EPC"})
+        return jsonify({"success": True, "data": dict(epc_decoder.decode(epc), epc=epc.upper())})
+    epcs = (request.get_json() or {}).get('epcs') or []
+    decoded = epc_decoder.decode_many(epcs)
+    return jsonify({
+        "success": True,
+        "data": [dict(fields, epc=str(epc).upper()) for epc, fields in zip(epcs, decoded)],
+        "cache": epc_decoder.stats(),
+    })
+
+@app.route('/api/catalog', methods=['GET'])
+def api_catalog():
+    """API trạng thái danh mục sản phẩm (số SKU, bộ nhớ, số lần nạp lại)"""
+    return jsonify({"success": True, "data": product_catalog.stats()})
+
+@app.route('/api/catalog/reload', methods=['POST'])
+def api_catalog_reload():
+    """
+    API nạp lại danh mục từ CATALOG_FILE (dựng chỉ mục mới rồi mới thay thế; lỗi thì giữ danh mục cũ)
+    Không nhận đường dẫn khác: API không xác thực, không được đọc file tuỳ ý trên máy
+    """
+    data = request.get_json(silent=True) or {}
+    path = data.get('path')
+    if path and (not config.CATALOG_FILE or
+                 os.path.realpath(path) != os.path.realpath(config.CATALOG_FILE)):
+        return jsonify({"success": False, "message": "Chỉ nạp lại được file danh mục đã cấu hình (CATALOG_FILE)"})
+    try:
+        return jsonify({"success": True, "data": product_catalog.load(config.CATALOG_FILE or None)})
+    except (OSError, ValueError) as e:
+        return jsonify({"success": False, "message": f"Không nạp được danh mục: {str(e)}"})
+
+@app.route('/api/catalog/lookup', methods=['GET'])
+def api_catalog_lookup():
+    """API tra sản phẩm theo ?epc= hoặc ?gtin="""
+    epc, gtin = request.args.get('epc'), request.args.get('gtin')
+    if not epc and not gtin:
+        return jsonify({"success": False, "message": "Thiếu epc hoặc gtin"})
+    product = product_catalog.lookup(epc) if epc else product_catalog.lookup_gtin(gtin)
+    if product is None:
+        return jsonify({"success": False, "message": "Không tìm thấy sản phẩm"})
+    return jsonify({"success": True, "data": product})
+
+@app.route('/api/inventory_stats', methods=['GET'])
+def api_inventory_stats():
+    """API lấy bộ đếm pipeline tag (độ sâu hàng đợi, số tag bị bỏ, emitter)"""
+    if not rfid_controller.is_connected or not rfid_controller.reader:
+        return jsonify({"success": False, "message": "Chưa kết nối đến reader"})
+    stats = rfid_controller.reader.inventory_stats()
+    stats["emitter"] = tag_emitter.stats()
+    return jsonify({"success": True, "data": stats})
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    """
+    API số liệu đọc tag theo khung thời gian.
+    Query params:
+        resolution - "second", "minute" (mặc định) hoặc "hour"
+        limit      - số khung gần nhất
+    """
+    resolution = request.args.get('resolution', 'minute')
+    if resolution not in RESOLUTIONS:
+        return jsonify({"success": False, "message": f"resolution phải là một trong {list(RESOLUTIONS)}"})
+    return jsonify({"success": True, "data": {
+        "summary": tag_rollup.summary(),
+        "buckets": tag_rollup.snapshot(resolution, request.args.get('limit', type=int)),
+    }})
+
+@app.route('/api/apply_config', methods=['POST'])
+def api_apply_config():
+    """API áp dụng cấu hình reader theo kiểu khai báo (chỉ gửi phần khác biệt)"""
+    data = request.get_json() or {}
+    persistence = data.pop('persistence', None)
+    dry_run = bool(data.pop('dry_run', False))
+    result = rfid_controller.apply_config(data, persistence=persistence, dry_run=dry_run)
+    return jsonify(result)
+
+@app.route('/api/reader_state', methods=['GET'])
+def api_reader_state():
+    """API lấy cấu hình reader đã lưu đệm (?refresh=1 để đọc lại từ phần cứng)"""
+    if not rfid_controller.is_connected or not rfid_controller.reader:
+        return jsonify({"success": False, "message": "Chưa kết nối đến reader"})
+    try:
+        if request.args.get('refresh') in ('1', 'true'):
+            return jsonify({"success": True, "data": rfid_controller.reader.refresh_state()})
+        return jsonify({"success": True, "data": rfid_controller.reader.reader_state()})
+    except Exception as e:
+        logger.error(f"Reader state error: {e}")
+        return jsonify({"success": False, "message": f"Lỗi: {str(e)}"})
+
+@app.route('/api/command_stats', methods=['GET'])
+def api_command_stats():
+    """API lấy độ trễ lệnh đo được theo từng MID (so với thời gian truyền trên dây)"""
+    if not rfid_controller.is_connected or not rfid_controller.reader:
+        return jsonify({"success": False, "message": "Chưa kết nối đến reader"})
+    if request.args.get('reset') in ('1', 'true'):
+        rfid_controller.reader.reset_command_stats()
+        return jsonify({"success": True, "message": "Đã xóa thống kê độ trễ"})
+    return jsonify({"success": True, "data": rfid_controller.reader.command_stats()})
+
+@app.route('/api/tag_log', methods=['GET'])
+def api_tag_log():
+    """API thống kê nhật ký tag trên đĩa"""
+    if not tag_log:
+        return jsonify({"success": False, "message": "Nhật ký tag đang tắt (TAG_LOG_DIR)"})
+    return jsonify({"success": True, "data": tag_log.stats()})
 
 @app.route('/api/config', methods=['GET'])
 def api_get_config():
@@ -599,9 +901,8 @@ def api_get_config():
 #             "is_connected": rfid_controller.is_connected,
 #             "inventory_thread_alive": inventory_thread.is_alive() if inventory_thread else False,
 #             "stop_inventory_flag": stop_inventory_flag,
-#             "detected_tags_count": len(detected_tags),
-#             "inventory_stats": inventory_stats,
-#             "recent_tags": detected_tags[-10:] if detected_tags else []  # 10 tags gần nhất
+#             "tag_table": tag_table.stats(),
+#             "recent_tags": tag_table.events(since=tag_table.cursor - 10)["events"]  # 10 tags gần nhất
 #         }
 #         return {"success": True, "data": data}
 #     except Exception as e:
@@ -609,6 +910,151 @@ def api_get_config():
 #         return {"success": False, "message": f"Lỗi: {str(e)}"}
 
 
+################################################################################
+#                            MULTI-READER API                                  #
+################################################################################
+def _reader_id(reader_id: str) -> str:
+    """
+    Reader ID từ URL. IDs that are device paths lose their leading slash in
+    /api/readers/dev/ttyUSB0/..., so fall back to the absolute form.
+    """
+    if reader_id not in reader_manager and "/" + reader_id in reader_manager:
+        return "/" + reader_id
+    return reader_id
+
+def _managed_reader(reader_id: str):
+    """Trả về (reader, None) hoặc (None, response lỗi) theo reader ID"""
+    try:
+        return reader_manager.get(_reader_id(reader_id)), None
+    except KeyError:
+        return None, jsonify({"success": False, "message": f"Không tìm thấy reader '{reader_id}'"})
+
+@app.route('/api/readers', methods=['GET'])
+def api_list_readers():
+    """API liệt kê các reader đang quản lý"""
+    return jsonify({"success": True, "data": reader_manager.status()})
+
+@app.route('/api/readers', methods=['POST'])
+def api_add_reader():
+    """API thêm reader (port, baudrate, reader_id tuỳ chọn)"""
+    data = request.get_json() or {}
+    port = data.get('port')
+    if not port:
+        return jsonify({"success": False, "message": "Thiếu port"})
+    try:
+        reader_id = reader_manager.add(port, data.get('baudrate', config.DEFAULT_BAUDRATE), data.get('reader_id'))
+        return jsonify({"success": True, "message": f"Đã thêm reader {reader_id}", "reader_id": reader_id})
+    except Exception as e:
+        logger.error(f"Add reader error: {e}")
+        return jsonify({"success": False, "message": f"Lỗi kết nối: {str(e)}"})
+
+@app.route('/api/readers/start_all', methods=['POST'])
+def api_start_all_readers():
+    """API bắt đầu inventory trên tất cả reader"""
+    data = request.get_json() or {}
+    results = reader_manager.start_all(data.get('selectedAntennas', [1]), data.get('dedup'))
+    return jsonify({"success": all(results.values()), "data": results})
+
+@app.route('/api/readers/stop_all', methods=['POST'])
+def api_stop_all_readers():
+    """API dừng inventory trên tất cả reader"""
+    results = reader_manager.stop_all()
+    return jsonify({"success": all(results.values()), "data": results})
+
+@app.route('/api/readers/discover', methods=['POST'])
+def api_discover_readers():
+    """API dò các cổng còn trống và thêm mọi reader trả lời handshake"""
+    data = request.get_json() or {}
+    added = reader_manager.discover(data.get('baudrate'))
+    return jsonify({"success": True, "message": f"Đã thêm {len(added)} reader", "data": added})
+
+@app.route('/api/ports', methods=['GET'])
+def api_list_ports():
+    """API liệt kê cổng serial (?probe=1 để handshake các cổng chưa dùng)"""
+    in_use = reader_manager.ports_in_use()
+    ports = [
+        {"device": p.device, "description": p.description, "hwid": p.hwid, "in_use": p.device in in_use}
+        for p in list_ports.comports()
+    ]
+    data = {"ports": ports, "known": port_discovery.known() if port_discovery else {}}
+    if request.args.get('probe') == '1':
+        discovery = port_discovery or PortDiscovery(baudrates=config.DISCOVERY_BAUDRATES)
+        data["readers"] = discovery.scan(exclude=in_use)
+    return jsonify({"success": True, "data": data})
+
+@app.route('/api/readers/<path:reader_id>', methods=['GET'])
+def api_reader_status(reader_id):
+    """API trạng thái một reader"""
+    reader_id = _reader_id(reader_id)
+    try:
+        return jsonify({"success": True, "data": reader_manager.status(reader_id)})
+    except KeyError:
+        return jsonify({"success": False, "message": f"Không tìm thấy reader '{reader_id}'"})
+
+@app.route('/api/readers/<path:reader_id>', methods=['DELETE'])
+def api_remove_reader(reader_id):
+    """API ngắt kết nối và bỏ một reader"""
+    reader_id = _reader_id(reader_id)
+    if reader_id == rfid_controller.reader_id:
+        return jsonify(rfid_controller.disconnect())
+    if not reader_manager.remove(reader_id):
+        return jsonify({"success": False, "message": f"Không tìm thấy reader '{reader_id}'"})
+    return jsonify({"success": True, "message": f"Đã ngắt kết nối {reader_id}"})
+
+@app.route('/api/readers/<path:reader_id>/start_inventory', methods=['POST'])
+def api_reader_start_inventory(reader_id):
+    """API bắt đầu inventory trên một reader"""
+    reader_id = _reader_id(reader_id)
+    data = request.get_json() or {}
+    try:
+        ok = reader_manager.start_inventory(reader_id, data.get('selectedAntennas', [1]), data.get('dedup'))
+    except KeyError:
+        return jsonify({"success": False, "message": f"Không tìm thấy reader '{reader_id}'"})
+    return jsonify({"success": ok, "message": "Inventory đã bắt đầu" if ok else "Không thể bắt đầu inventory"})
+
+@app.route('/api/readers/<path:reader_id>/stop_inventory', methods=['POST'])
+def api_reader_stop_inventory(reader_id):
+    """API dừng inventory trên một reader"""
+    reader_id = _reader_id(reader_id)
+    try:
+        ok = reader_manager.stop_inventory(reader_id)
+    except KeyError:
+        return jsonify({"success": False, "message": f"Không tìm thấy reader '{reader_id}'"})
+    return jsonify({"success": ok, "message": "Đã dừng inventory" if ok else "Không thể dừng inventory"})
+
+@app.route('/api/readers/<path:reader_id>/apply_config', methods=['POST'])
+def api_reader_apply_config(reader_id):
+    """API áp dụng cấu hình cho một reader (chỉ gửi phần khác biệt)"""
+    reader, error = _managed_reader(reader_id)
+    if error:
+        return error
+    data = request.get_json() or {}
+    persistence = data.pop('persistence', None)
+    dry_run = bool(data.pop('dry_run', False))
+    try:
+        return jsonify(reader.apply_config(data, persistence=persistence, dry_run=dry_run))
+    except Exception as e:
+        logger.error(f"Apply config error on {reader_id}: {e}")
+        return jsonify({"success": False, "message": f"Lỗi: {str(e)}"})
+
+@app.route('/api/readers/<path:reader_id>/state', methods=['GET'])
+def api_reader_cached_state(reader_id):
+    """API cấu hình đã lưu đệm của một reader"""
+    reader, error = _managed_reader(reader_id)
+    if error:
+        return error
+    return jsonify({"success": True, "data": reader.reader_state()})
+
+@app.route('/api/readers/<path:reader_id>/stats', methods=['GET'])
+def api_reader_stats(reader_id):
+    """API bộ đếm pipeline tag và độ trễ lệnh của một reader"""
+    reader, error = _managed_reader(reader_id)
+    if error:
+        return error
+    return jsonify({"success": True, "data": {"inventory": reader.inventory_stats(),
+                                              "commands": reader.command_stats()}})
+
+
 @app.route('/api/configure_baseband', methods=['POST'])
 def api_configure_baseband():
     """API cấu hình baseband"""
@@ -627,18 +1073,67 @@ def api_query_baseband_profile():
     return jsonify(result)
 
 
+def _join_tag_stream(options: Optional[Dict]) -> Dict:
+    """Đăng ký client hiện tại vào luồng tag (batch hoặc từng tag)"""
+    settings, room, previous = tag_emitter.register(request.sid, options)
+    if previous:
+        leave_room(previous)
+    join_room(room)
+    emit('tag_stream', settings)
+    return settings
+
+def _stats_push_loop():
+    """Đẩy sự kiện 'stats' định kỳ khi có client đang kết nối"""
+    interval = config.STATS_PUSH_INTERVAL_MS / 1000.0
+    while True:
+        socketio.sleep(interval)
+        if connected_clients:
+            try:
+                socketio.emit('stats', tag_rollup.summary())
+            except Exception as e:
+                logger.error(f"Stats push error: {e}")
+
+if config.STATS_PUSH_INTERVAL_MS > 0:
+    socketio.start_background_task(_stats_push_loop)
+
+def _catalog_watch_loop():
+    """Nạp danh mục sản phẩm, sau đó nạp lại mỗi khi file thay đổi"""
+    while True:
+        product_catalog.reload_if_changed()
+        if config.CATALOG_WATCH_S <= 0:
+            return
+        socketio.sleep(config.CATALOG_WATCH_S)
+
+if config.CATALOG_FILE:
+    socketio.start_background_task(_catalog_watch_loop)
+
 @socketio.on('connect')
-def handle_connect():
-    """Xử lý khi client kết nối WebSocket"""
+def handle_connect(auth=None):
+    """
+    Xử lý khi client kết nối WebSocket.
+    Client có thể chọn luồng tag khi kết nối:
+        io(url, {auth: {tag_stream: {mode: "batch", interval_ms: 250, max_batch: 500}}})
+    Thêm readers: ["/dev/ttyUSB0", ...] để chỉ nhận tag của các reader đó.
+    Không chọn -> 'tag_detected' từng tag như trước.
+    """
     logger.info(f"🔌 WebSocket client connected: {request.sid}")
     socketio.emit('status', {'message': 'Connected to server'})
     connected_clients.add(request.sid)
+    options = auth.get('tag_stream') if isinstance(auth, dict) else None
+    settings = _join_tag_stream(options)
+    logger.info(f"📡 Tag stream for {request.sid}: {settings}")
+
+@socketio.on('tag_stream')
+def handle_tag_stream(options):
+    """Đổi chế độ luồng tag sau khi đã kết nối"""
+    return _join_tag_stream(options if isinstance(options, dict) else None)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Xử lý khi client ngắt kết nối WebSocket"""
     logger.info(f"🔌 WebSocket client disconnected: {request.sid}")
-    connected_clients.remove(request.sid)
+    connected_clients.discard(request.sid)
+    tag_emitter.unregister(request.sid)
 
 @socketio.on('message')
 def handle_message(message):
@@ -648,7 +1143,7 @@ def handle_message(message):
 @app.route('/api/tags_inventory', methods=['POST'])
 def api_tags_inventory():
     """API bắt đầu tags inventory với cấu hình tuỳ chọn (liên tục)"""
-    global inventory_thread, stop_inventory_flag, detected_tags, inventory_stats
+    global inventory_thread, stop_inventory_flag
 
     if not rfid_controller.is_connected:
         return {"success": False, "message": "Chưa kết nối đến reader"}
@@ -662,8 +1157,7 @@ def api_tags_inventory():
     try:
         # Reset trạng thái
         stop_inventory_flag = False
-        detected_tags.clear()
-        inventory_stats = {"read_rate": 0, "total_count": 0}
+        tag_table.clear()
 
         # Lấy tham số từ request
         data      = request.get_json()
@@ -671,6 +1165,7 @@ def api_tags_inventory():
         session   = int(data.get("session", 0))
         inventory_flag = int(data.get("inventory_flag", 0))  # 0: Single, 1: Continuous, 2: Fast
         scan_time = int(data.get("scan_time", 10))  # Not used directly in NationReader, but can be used for sleep
+        antenna_mask = data.get("selectedAntennas") or [config.DEFAULT_ANTENNA]
 
         # Cấu hình baseband trước khi inventory
         if not rfid_controller.reader.configure_baseband(
@@ -682,26 +1177,14 @@ def api_tags_inventory():
             return {"success": False, "message": "Không thể cấu hình baseband"}
 
         # Callback khi có tag mới
-        def tag_callback(tag: dict):
-            tag_data = {
-                "epc":       tag.get("epc"),
-                "rssi":      tag.get("rssi"),
-                "antenna":   tag.get("antenna_id"),
-                "timestamp": time.strftime("%H:%M:%S")
-            }
-            detected_tags.append(tag_data)
-            if len(detected_tags) > config.MAX_TAGS_DISPLAY:
-                detected_tags.pop(0)
-            try:
-                socketio.emit("tag_detected", tag_data)
-            except Exception as e:
-                logger.error(f"❌ WebSocket emit failed: {e}")
+        tag_callback = publish_tag
 
         # Thread worker: run inventory for scan_time*100ms, then stop
         def inventory_worker():
             try:
-                rfid_controller.reader.uart.flush_input()
-                rfid_controller.reader.start_inventory(on_tag=tag_callback)
+                if not rfid_controller.reader.start_inventory_with_mode(antenna_mask, callback=tag_callback):
+                    logger.error("Không thể bắt đầu tags inventory")
+                    return
                 logger.info("▶️ Inventory started (custom tags inventory mode)")
                 
                 time.sleep(scan_time * 0.1)
@@ -763,6 +1246,202 @@ def api_write_epc_tag_auto():
         logger.error(f"Write EPC auto error: {e}")
         return jsonify({"success": False, "message": f"Lỗi: {str(e)}"})
     
+@app.route('/api/write_epc_verified', methods=['POST'])
+def api_write_epc_verified():
+    """
+    API ghi EPC có thử lại (backoff, tăng công suất) và đọc lại để xác nhận
+    Body: {
+        "epc": "ABCD1111",
+        "match_epc": "E2801160...",
+        "antenna_id": 1,
+        "access_pwd": null,
+        "retries": 3,
+        "power_step": 2,
+        "max_power": 30,
+        "verify": true
+    }
+    """
+    data = request.get_json() or {}
+    epc = data.get('epc')
+    if not epc:
+        return jsonify({"success": False, "message": "EPC không được để trống"})
+    if not rfid_controller.is_connected or not rfid_controller.reader:
+        return jsonify({"success": False, "message": "Chưa kết nối đến reader"})
+    try:
+        result = rfid_controller.reader.write_epc_verified(
+            epc,
+            match_epc_hex=data.get('match_epc'),
+            antenna_id=data.get('antenna_id', 1),
+            access_password=data.get('access_pwd'),
+            retries=data.get('retries', 3),
+            power_step=data.get('power_step', 2),
+            max_power=data.get('max_power', config.MAX_POWER),
+            verify=data.get('verify', True),
+        )
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Write EPC verified error: {e}")
+        return jsonify({"success": False, "message": f"Lỗi: {str(e)}"})
+
+@app.route('/api/write_epc_batch', methods=['POST'])
+def api_write_epc_batch():
+    """
+    API ghi EPC hàng loạt: mỗi tag đưa vào ăng-ten nhận EPC tiếp theo.
+    EPC lấy từ danh sách "epcs" hoặc cấp phát từ pool "pool" (theo lô thuê, "count" tag).
+    Mỗi reader chạy một lô riêng nên nhiều trạm có thể ghi song song.
+    Kết quả từng tag được đẩy qua SocketIO 'epc_write_result', tổng kết qua 'epc_write_batch_done'.
+    Body: {
+        "epcs": ["E280...01", "E280...02"],   // hoặc "pool": "shirts", "count": 500
+        "reader_id": null,                    // mặc định reader hiện tại
+        "antenna_id": 1,
+        "access_pwd": null,
+        "verify": true,
+        "retries": 2,
+        "idle_timeout": 10,
+        "unencoded_prefix": "E280"            // tuỳ chọn: chỉ ghi tag trắng có EPC bắt đầu bằng tiền tố này
+    }
+    Tag đã mang EPC của pool / danh sách (kể cả do trạm khác ghi) không bao giờ bị ghi lại;
+    mặc định chỉ ghi tag có EPC không phải GS1.
+    """
+    data = request.get_json() or {}
+    epcs = data.get('epcs') or []
+    pool = data.get('pool')
+    if not epcs and not pool:
+        return jsonify({"success": False, "message": "Danh sách EPC không được để trống"})
+    unencoded_prefix = data.get('unencoded_prefix')
+    if unencoded_prefix:
+        try:
+            int(unencoded_prefix, 16)
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "unencoded_prefix phải là chuỗi hex"})
+    reader_id = data.get('reader_id') or rfid_controller.reader_id
+    try:
+        reader = reader_manager.get(reader_id) if reader_id else None
+    except KeyError:
+        reader = None
+    if not reader or not reader.is_connected():
+        return jsonify({"success": False, "message": "Chưa kết nối đến reader"})
+    running = epc_batches.get(reader_id)
+    if running and running["thread"].is_alive():
+        return jsonify({"success": False, "message": "Đang ghi EPC hàng loạt"})
+    if reader_id == rfid_controller.reader_id and inventory_thread and inventory_thread.is_alive():
+        return jsonify({"success": False, "message": "Inventory đang chạy"})
+    is_encoded = None
+    if pool:
+        try:
+            is_encoded = epc_allocator.pool_format(pool).matches
+        except KeyError as e:
+            return jsonify({"success": False, "message": e.args[0]})
+        source = epc_allocator.stream(pool, holder=reader_id, block=config.EPC_LEASE_BLOCK,
+                                      limit=data.get('count'))
+    else:
+        try:
+            for epc in epcs:
+                NationReader.validate_epc_hex(epc)
+        except ValueError as e:
+            return jsonify({"success": False, "message": f"EPC không hợp lệ: {str(e)}"})
+        source = epcs
+
+    # The batch owns the reader: no inventory session to restore on reconnect
+    reader_manager.stop_inventory(reader_id)
+    encoder = BatchEncoder(
+        reader,
+        antenna_id=data.get('antenna_id', 1),
+        access_password=data.get('access_pwd'),
+        verify=data.get('verify', True),
+        retries=data.get('retries', 2),
+        idle_timeout=data.get('idle_timeout', 10.0),
+        unencoded_prefix=unencoded_prefix,
+        is_encoded=is_encoded,
+        on_result=lambda result: socketio.emit('epc_write_result', dict(result, reader_id=reader_id)),
+    )
+    batch = {"encoder": encoder, "summary": None}
+
+    def batch_worker():
+        try:
+            batch["summary"] = encoder.run(source)
+        except Exception as e:
+            logger.error(f"EPC batch error: {e}")
+            batch["summary"] = {"success": False, "reason": f"error: {e}"}
+        finally:
+            if pool:
+                source.close()  # releases the lease: unused serials go back to the pool
+        socketio.emit('epc_write_batch_done', dict(batch["summary"], reader_id=reader_id))
+        logger.info(f"EPC batch on {reader_id} finished: {batch['summary']}")
+
+    batch["thread"] = threading.Thread(target=batch_worker, daemon=True)
+    epc_batches[reader_id] = batch
+    batch["thread"].start()
+    target = f"{data.get('count') or 'tới khi hết tag'} EPC từ pool {pool}" if pool else f"{len(epcs)} EPC"
+    return jsonify({"success": True, "message": f"Bắt đầu ghi {target}", "reader_id": reader_id})
+
+@app.route('/api/write_epc_batch', methods=['GET'])
+def api_write_epc_batch_status():
+    """API trạng thái các lần ghi EPC hàng loạt (mỗi reader một lô; ?reader_id= để lọc)"""
+    wanted = request.args.get('reader_id')
+    data = {
+        reader_id: {
+            "running": batch["thread"].is_alive(),
+            "results": batch["encoder"].results,
+            "summary": batch["summary"],
+        }
+        for reader_id, batch in list(epc_batches.items())
+        if wanted is None or reader_id == wanted
+    }
+    return jsonify({"success": True, "data": data})
+
+@app.route('/api/write_epc_batch/stop', methods=['POST'])
+def api_write_epc_batch_stop():
+    """API dừng ghi hàng loạt sau tag hiện tại (body "reader_id" tuỳ chọn: mặc định tất cả)"""
+    wanted = (request.get_json(silent=True) or {}).get('reader_id')
+    stopped = []
+    for reader_id, batch in list(epc_batches.items()):
+        if batch["thread"].is_alive() and wanted in (None, reader_id):
+            batch["encoder"].stop()
+            stopped.append(reader_id)
+    if not stopped:
+        return jsonify({"success": False, "message": "Không có lần ghi hàng loạt nào đang chạy"})
+    return jsonify({"success": True, "message": "Đang dừng ghi hàng loạt", "data": stopped})
+
+@app.route('/api/epc_pools', methods=['GET'])
+def api_epc_pools():
+    """API trạng thái các pool EPC (serial kế tiếp, đã cấp, lease đang mở)"""
+    return jsonify({"success": True, "data": epc_allocator.pool_status()})
+
+@app.route('/api/epc_pools', methods=['POST'])
+def api_define_epc_pool():
+    """
+    API tạo pool EPC
+    Body: {"name": "shirts", "scheme": "sgtin96", "gtin": "80614141123458",
+           "company_prefix_length": 7, "filter": 1, "serial_start": 1, "serial_end": 1000000}
+       hoặc {"name": "raw", "scheme": "hex", "prefix": "E2AB", "length": 24}
+    """
+    data = request.get_json() or {}
+    name = data.pop('name', None)
+    if not name:
+        return jsonify({"success": False, "message": "Thiếu tên pool"})
+    try:
+        return jsonify({"success": True, "data": epc_allocator.define_pool(name, data)})
+    except (ValueError, KeyError) as e:
+        return jsonify({"success": False, "message": f"Pool không hợp lệ: {str(e)}"})
+
+@app.route('/api/epc_pools/<name>/lease', methods=['POST'])
+def api_lease_epcs(name):
+    """API thuê một lô EPC cho trạm tự ghi (body: count, holder, ttl)"""
+    data = request.get_json() or {}
+    try:
+        lease = epc_allocator.lease(name, int(data.get('count', config.EPC_LEASE_BLOCK)),
+                                    holder=data.get('holder'), ttl=data.get('ttl'))
+    except (KeyError, ValueError, PoolExhausted) as e:
+        return jsonify({"success": False, "message": e.args[0]})
+    return jsonify({"success": True, "data": dict(lease, epcs=epc_allocator.epcs(lease))})
+
+@app.route('/api/epc_leases/<lease_id>/release', methods=['POST'])
+def api_release_epc_lease(lease_id):
+    """API trả lease: "used" = số EPC đầu lô đã dùng, phần còn lại trả về pool nếu được"""
+    data = request.get_json() or {}
+    return jsonify({"success": True, "data": epc_allocator.release(lease_id, int(data.get('used', 0)))})
+
 @app.route('/api/check_write_epc', methods=['POST'])
 def check_write_epc():
     """
@@ -789,11 +1468,14 @@ def check_write_epc():
     try:
         result = rfid_controller.reader.check_write_epc(
             epcHex=epc,
+            antenna_id=antenna_id,
+            timeout=data.get('timeout') or 1.0,
         )
         if result is None:
             return jsonify({"success": False, "message": "Không thể kiểm tra khả năng ghi EPC"})
         if result is True:
             return jsonify({"success": True, "message": "Matching"})
+        return jsonify({"success": False, "message": f"Không thấy tag có EPC {epc}"})
     except Exception as e:
         logger.error(f"Check write EPC error: {e}")
         return jsonify({"success": False, "message": f"Lỗi: {str(e)}"})
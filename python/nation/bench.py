@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks cho NationReader (chạy không cần đầu đọc thật)
+
+    python bench.py crc --frames 200000 --tag-rate 1500
+    python bench.py pipeline --frames 50000 --output results/pipeline.json
+    python bench.py pipeline --capture uart_dump.bin --baseline results/pipeline.json
+    python bench.py e2e --duration 5 --baud 921600 --stream batch --output results/e2e.json
+
+pipeline: bytes -> extract_valid_frames/FrameDecoder -> parse_frame -> parse_epc -> app.publish_tag
+e2e:      simulator pty -> NationReader -> app.py callback -> SocketIO emit (latency per tag)
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from nation import FrameDecoder, NationReader, crc16_update, CRC16_CCITT_INIT
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _crc16_bitwise(data: bytes) -> int:
+    """Bit-by-bit CRC16-CCITT, kept only as the baseline to compare against."""
+    crc = 0x0000
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def _build_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+_TABLE = _build_table()
+
+
+def _crc16_table(data: bytes) -> int:
+    """Pure-Python 256-entry table variant, for reference."""
+    crc = 0x0000
+    table = _TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def build_tag_frame(epc: bytes, antenna_id: int = 1, rssi: int = 200) -> bytes:
+    """Build an EPC upload notification like the reader sends during inventory."""
+    pc = (len(epc) // 2 << 11).to_bytes(2, 'big')
+    payload = len(epc).to_bytes(2, 'big') + epc + pc + bytes([antenna_id, 0x01, rssi])
+    return NationReader.build_frame(0x1200, payload=payload, notify=True)
+
+
+def _time_per_call(fn, items, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items)
+
+
+def bench_crc(args):
+    frames = [build_tag_frame(i.to_bytes(12, 'big'), antenna_id=(i % 4) + 1)
+              for i in range(args.frames)]
+    contents = [f[1:-2] for f in frames]
+
+    variants = [
+        ("bitwise (legacy)", _crc16_bitwise),
+        ("table (python)", _crc16_table),
+        ("crc16_update", lambda d: crc16_update(CRC16_CCITT_INIT, d)),
+    ]
+    # The bitwise loop is slow enough that a slice of the frames is plenty
+    sample = contents[:min(len(contents), 20000)]
+
+    print(f"📦 Frame size: {len(frames[0])} bytes, frames: {len(frames)}")
+    print(f"🏷️  Tag rate: {args.tag_rate} tags/s (2 CRCs per tag: extract + parse)")
+    print("-" * 64)
+    for name, fn in variants:
+        items = sample if fn is _crc16_bitwise else contents
+        per_frame = _time_per_call(fn, items)
+        cpu_share = per_frame * 2 * args.tag_rate * 100
+        print(f"{name:<20} {per_frame * 1e9:>9.0f} ns/frame   {cpu_share:>6.2f}% of one core")
+
+    start = time.perf_counter()
+    ok = NationReader.validate_frames(frames)
+    batch = (time.perf_counter() - start) / len(frames)
+    assert all(ok), "validate_frames rejected a well-formed frame"
+    print(f"{'validate_frames':<20} {batch * 1e9:>9.0f} ns/frame   (batch of {len(frames)})")
+
+
+def synthetic_stream(frames: int, population: int = 300, seed: int = 1) -> bytes:
+    """
+    Tag notifications for `population` distinct EPCs, as a reader would send them back-to-back.
+    """
+    rng = random.Random(seed)
+    epcs = [rng.getrandbits(96).to_bytes(12, 'big') for _ in range(population)]
+    return b''.join(
+        build_tag_frame(epcs[rng.randrange(population)], antenna_id=rng.randint(1, 4), rssi=rng.randint(120, 220))
+        for _ in range(frames)
+    )
+
+
+def load_stream(path: str) -> bytes:
+    """
+    Captured UART bytes: raw binary, or hex text if the file ends in .hex/.txt.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith(('.hex', '.txt')):
+        data = bytes.fromhex(data.decode('ascii'))
+    return data
+
+
+def _uart_chunks(stream: bytes, seed: int = 1) -> list:
+    """Split a stream the way receive_available() hands it over: uneven 1-512 byte reads."""
+    rng = random.Random(seed)
+    view = memoryview(stream)
+    chunks, pos = [], 0
+    while pos < len(stream):
+        size = rng.randint(1, 512)
+        chunks.append(view[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def _percentile(values: list, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _measure_allocations(fn, items) -> dict:
+    """
+    tracemalloc per call: bytes allocated while handling one tag (peak above the
+    starting point) and bytes still held afterwards. CPython has no cheap total
+    allocation counter, so transient peak is the closest per-tag figure.
+    """
+    tracemalloc.start()
+    transient = 0
+    start, _ = tracemalloc.get_traced_memory()
+    for item in items:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn(item)
+        _, peak = tracemalloc.get_traced_memory()
+        transient += peak - before
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = max(1, len(items))
+    return {"transient_bytes_per_tag": round(transient / count, 1),
+            "retained_bytes_per_tag": round((end - start) / count, 1)}
+
+
+def _decode_tags(chunks, handler=None) -> tuple[int, int]:
+    decoder = FrameDecoder()
+    parse_frame = NationReader.parse_frame
+    parse_epc = NationReader.parse_epc
+    frames = tags = 0
+    for chunk in chunks:
+        decoder.feed(chunk)
+        for frame in decoder.frames():
+            frames += 1
+            parsed = parse_frame(frame, check_crc=False)
+            if parsed["notify"] and parsed["mid"] == 0x00:
+                tag = parse_epc(None, parsed["data"])
+                tags += 1
+                if handler:
+                    handler(tag)
+    return frames, tags
+
+
+def _quiet_app():
+    """Import app.py with its per-tag logging silenced (and no tag log: synthetic tags stay out of it)."""
+    import logging
+    os.environ['TAG_LOG_DIR'] = ''
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ('engineio', 'socketio', 'engineio.server', 'socketio.server'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    return app
+
+
+def bench_pipeline(args) -> dict:
+    stream = load_stream(args.capture) if args.capture else synthetic_stream(args.frames, args.population)
+    chunks = _uart_chunks(stream)
+    mb = len(stream) / 1e6
+    print(f"📦 Stream: {len(stream)} bytes in {len(chunks)} UART reads ({'capture' if args.capture else 'synthetic'})")
+    print("-" * 64)
+    results = {"stream_bytes": len(stream), "uart_reads": len(chunks)}
+
+    start = time.perf_counter()
+    frames = NationReader.extract_valid_frames(None, stream)
+    elapsed = time.perf_counter() - start
+    results["extract_valid_frames"] = {"frames": len(frames), "frames_per_sec": round(len(frames) / elapsed),
+                                       "mb_per_sec": round(mb / elapsed, 2)}
+
+    decoder = FrameDecoder()
+    count = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        decoder.feed(chunk)
+        for _ in decoder.frames():
+            count += 1
+    elapsed = time.perf_counter() - start
+    results["decoder"] = {"frames": count, "frames_per_sec": round(count / elapsed)}
+
+    start = time.perf_counter()
+    _, tags = _decode_tags(chunks)
+    elapsed = time.perf_counter() - start
+    results["decode_parse"] = {"tags": tags, "tags_per_sec": round(tags / elapsed)}
+
+    app = _quiet_app()
+    app.tag_emitter.register("bench", {"mode": "batch"})
+    try:
+        start = time.perf_counter()
+        _, tags = _decode_tags(chunks, app.publish_tag)
+        elapsed = time.perf_counter() - start
+        results["full_path"] = {"tags": tags, "tags_per_sec": round(tags / elapsed)}
+
+        sample = [NationReader.parse_epc(None, NationReader.parse_frame(f)["data"]) for f in frames[:5000]]
+        results["allocations"] = {
+            "parse": _measure_allocations(
+                lambda f: NationReader.parse_epc(None, NationReader.parse_frame(f, check_crc=False)["data"]),
+                frames[:5000]),
+            "publish_tag": _measure_allocations(app.publish_tag, sample),
+        }
+    finally:
+        app.tag_emitter.unregister("bench")
+
+    for stage in ("extract_valid_frames", "decoder", "decode_parse", "full_path"):
+        r = results[stage]
+        rate = r.get("tags_per_sec") or r.get("frames_per_sec")
+        unit = "tags/s" if "tags_per_sec" in r else "frames/s"
+        print(f"{stage:<22} {rate:>12,} {unit}")
+    for stage, r in results["allocations"].items():
+        print(f"{'alloc ' + stage:<22} {r['transient_bytes_per_tag']:>8} B/tag transient  {r['retained_bytes_per_tag']:>8} B/tag retained")
+    return results
+
+
+class _EmitProbe:
+    """
+    Stands in for the SocketIO object inside TagBatchEmitter: forwards every emit
+    and records serial-to-websocket latency from the simulator's EPC timestamps.
+    """
+
+    def __init__(self, socketio):
+        self._socketio = socketio
+        self.latencies_ns = []
+        self.events = 0
+
+    def emit(self, event, data, to=None):
+        from simulator import epc_timestamp_ns
+        self._socketio.emit(event, data, to=to)
+        now = time.perf_counter_ns()
+        self.events += 1
+        records = data["tags"] if event == "tag_batch" else [data]
+        self.latencies_ns.extend(now - epc_timestamp_ns(r["epc"]) for r in records if r.get("epc"))
+
+
+def bench_e2e(args) -> dict:
+    from simulator import NationSimulator
+
+    app = _quiet_app()
+    probe = _EmitProbe(app.socketio)
+    app.tag_emitter.socketio = probe
+    auth = {"tag_stream": {"mode": args.stream, "interval_ms": args.batch_ms}}
+    client = app.socketio.test_client(app.app, auth=auth)
+
+    with NationSimulator(tag_count=args.population, read_rate=args.rate, baudrate=args.baud,
+                         timestamp_epcs=True, seed=1) as sim:
+        print(f"🛰️  Simulator {sim.port}: {args.population} tags, "
+              f"{min(args.rate or sim.line_rate, sim.line_rate):.0f} reads/s @ {args.baud}bps, stream={args.stream}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            app.rfid_controller.connect(sim.port, args.baud)
+            app.rfid_controller.start_inventory([1, 2, 3, 4])
+            time.sleep(args.duration)
+            app.rfid_controller.stop_inventory()
+            time.sleep(0.2)  # let the emitter flush its last window
+            pipeline = app.rfid_controller.reader.inventory_stats()
+            app.rfid_controller.disconnect()
+        sent = sim.tags_sent
+
+    received = client.get_received()
+    client.disconnect()
+    app.tag_emitter.socketio = app.socketio
+    delivered = sum(len(m["args"][0]["tags"]) if m["name"] == "tag_batch" else 1
+                    for m in received if m["name"] in ("tag_batch", "tag_detected"))
+
+    lat_ms = [ns / 1e6 for ns in probe.latencies_ns]
+    results = {
+        "stream": args.stream,
+        "baud": args.baud,
+        "duration_s": args.duration,
+        "tags_sent": sent,
+        "tags_delivered": delivered,
+        "tags_per_sec": round(delivered / args.duration),
+        "emit_events": probe.events,
+        "latency_ms": {
+            "p50": round(_percentile(lat_ms, 50), 3) if lat_ms else None,
+            "p99": round(_percentile(lat_ms, 99), 3) if lat_ms else None,
+            "max": round(max(lat_ms), 3) if lat_ms else None,
+        },
+        "tag_queue": pipeline["tag_queue"],
+    }
+    print(f"📤 sent {sent}, delivered {delivered} ({results['tags_per_sec']} tags/s) in {probe.events} emits")
+    print(f"⏱️  serial→websocket latency p50={results['latency_ms']['p50']} ms  "
+          f"p99={results['latency_ms']['p99']} ms  max={results['latency_ms']['max']} ms")
+    return results
+
+
+def _file_digest(name: str) -> str:
+    with open(os.path.join(HERE, name), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "nation_py": _file_digest("nation.py"),
+        "app_py": _file_digest("app.py"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu": platform.processor() or platform.machine(),
+    }
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+def _compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f).get("results", {})
+    old, new = {}, {}
+    _flatten("", baseline, old)
+    _flatten("", results, new)
+    print("-" * 64)
+    print(f"Δ vs {baseline_path}")
+    for key in sorted(new.keys() & old.keys()):
+        if old[key]:
+            change = (new[key] - old[key]) / abs(old[key]) * 100
+            print(f"  {key:<44} {old[key]:>12} → {new[key]:<12} {change:+6.1f}%")
+
+
+def run_suite(args):
+    results = args.func(args)
+    if results is None:
+        return
+    if args.baseline:
+        _compare(results, args.baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({"benchmark": args.bench, "meta": _metadata(), "params": _params(args), "results": results},
+                      f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+def _params(args) -> dict:
+    return {k: v for k, v in vars(args).items() if k not in ("func", "output", "baseline", "bench")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NationReader micro-benchmarks')
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    crc = sub.add_parser('crc', help='Per-frame CRC16 cost')
+    crc.add_argument('--frames', type=int, default=100000, help='Number of frames (default: %(default)s)')
+    crc.add_argument('--tag-rate', type=int, default=1000, help='Tags/s to project CPU share for (default: %(default)s)')
+    crc.set_defaults(func=bench_crc)
+
+    pipeline = sub.add_parser('pipeline', help='Offline bytes -> tag callback throughput and allocations')
+    pipeline.add_argument('--frames', type=int, default=50000, help='Synthetic frames (default: %(default)s)')
+    pipeline.add_argument('--population', type=int, default=300, help='Distinct EPCs (default: %(default)s)')
+    pipeline.add_argument('--capture', default=None, help='Captured UART bytes (.bin, or .hex text) instead of synthetic')
+    pipeline.set_defaults(func=bench_pipeline)
+
+    e2e = sub.add_parser('e2e', help='Simulator -> NationReader -> app.py -> SocketIO, with latency')
+    e2e.add_argument('--duration', type=float, default=5.0, help='Inventory seconds (default: %(default)s)')
+    e2e.add_argument('--population', type=int, default=300, help='Tags in the field (default: %(default)s)')
+    e2e.add_argument('--rate', type=float, default=0, help='Reads/s, 0 = line rate (default: %(default)s)')
+    e2e.add_argument('--baud', type=int, default=115200, help='Emulated baud rate (default: %(default)s)')
+    e2e.add_argument('--stream', choices=['batch', 'single'], default='batch', help='SocketIO mode (default: %(default)s)')
+    e2e.add_argument('--batch-ms', type=int, default=100, help='tag_batch interval (default: %(default)s)')
+    e2e.set_defaults(func=bench_e2e)
+
+    for p in (pipeline, e2e):
+        p.add_argument('--output', default=None, help='Write results JSON here')
+        p.add_argument('--baseline', default=None, help='Results JSON to compare against')
+
+    args = parser.parse_args()
+    if args.bench == 'crc':
+        args.func(args)
+    else:
+        run_suite(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""
+Danh mục sản phẩm trong bộ nhớ: EPC -> GTIN -> SKU / tên / giá.
+
+Loaded from a product master file (CSV with a header row, or JSON: a list of
+objects or {"products": [...]}). Each product needs a "gtin"; "price" is kept
+as a number, every other column as text. An optional "epc_prefix" column maps
+EPCs that are not GS1-encoded (raw hex prefix -> product). Both formats are
+read as a stream of rows, so a large file is never held in memory as dicts.
+
+The index is compact so a million SKUs fit in a fixed budget:
+
+    gtins   - array('Q') of GTIN-14 values, sorted (lookup = bisect)
+    rows    - array('I'): sorted position -> row in file order
+    prices  - array('d') in file order, NaN when missing
+    text    - all text columns of all products in one UTF-8 blob, in file
+              order, sliced by an array('I') of offsets
+
+Only the GTINs and the row numbers are put in sorted order, so the text blob
+is never copied. The budget covers the index and the EPC prefix map.
+Reload builds a complete new index and swaps one reference, so lookups never
+see a half-loaded catalog and a broken file leaves the old one in place
+(during a reload both indexes are in memory).
+"""
+
+import csv
+import json
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import chain, islice
+from typing import Iterable, Iterator, Optional, Sequence
+
+from gs1 import EpcDecoder, normalize_gtin
+
+_SEPARATOR = "\x1f"
+_RESERVED = ("gtin", "price", "epc_prefix")
+_ROW_BYTES = 8 + 4 + 8 + 4  # gtins + rows + prices + offsets per product
+_JSON_CHUNK = 1 << 20
+
+
+def _prefix_nbytes(prefix: str) -> int:
+    return sys.getsizeof(prefix) + 64  # key object + its dict slot
+
+
+class _JsonStream:
+    """
+    Incremental reader over a JSON file: one token or value at a time, a chunk in memory.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(_JSON_CHUNK)
+        self.eof = not chunk
+        self.buf, self.pos = self.buf[self.pos:] + chunk, 0
+        return bool(chunk)
+
+    def peek(self) -> str:
+        """Next non-whitespace character, not consumed ('' at the end of the file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def take(self, char: str) -> bool:
+        if self.peek() != char:
+            return False
+        self.pos += 1
+        return True
+
+    def expect(self, char: str):
+        if not self.take(char):
+            raise ValueError(f"Malformed JSON catalog: expected '{char}'")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                item, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():  # cut by the chunk boundary
+                    continue
+                raise ValueError(f"Malformed JSON catalog: {e}") from None
+            if end == len(self.buf) and not isinstance(item, (dict, list, str)) and self._fill():
+                continue  # a number may go on in the next chunk
+            self.pos = end
+            return item
+
+    def items(self) -> Iterator:
+        """Elements of the array that starts here."""
+        self.expect("[")
+        if self.take("]"):
+            return
+        while True:
+            yield self.value()
+            if not self.take(","):
+                self.expect("]")
+                return
+
+
+def _iter_json_products(path: str) -> Iterator[dict]:
+    """
+    Stream the product objects of a JSON catalog (a list, or the "products"
+    member of an object) without loading the whole document.
+    :raises ValueError: On a malformed file
+    """
+    with open(path, encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        if stream.take("{"):
+            while not stream.take("}"):
+                key = stream.value()
+                stream.expect(":")
+                if key == "products" and stream.peek() == "[":
+                    break
+                stream.value()  # some other member: skip it
+                stream.take(",")
+            else:
+                raise ValueError("JSON catalog must be a list of products or {\"products\": [...]}")
+        elif stream.peek() != "[":
+            raise ValueError("JSON catalog must be a list of products or {\"products\": [...]}")
+        for row in stream.items():
+            if isinstance(row, dict):
+                yield row
+
+
+class CatalogIndex:
+    """
+    Immutable product index, built in one pass over the rows (they are not kept).
+    """
+
+    def __init__(self, rows: Iterable[dict] = (), fields: Sequence[str] = (), source: Optional[str] = None,
+                 max_bytes: Optional[int] = None):
+        """
+        :param rows: Product dicts with lower-case keys
+        :param fields: Text columns to keep, in order
+        :param max_bytes: Stop with ValueError as soon as the index outgrows this
+        """
+        self.fields = tuple(fields)
+        self.source = source
+        self.loaded_at = time.time()
+        self.errors = 0
+
+        gtins, prices, offsets, text = array("Q"), array("d"), array("I", [0]), bytearray()
+        prefixes = {}
+        prefix_bytes = 0
+        for row in rows:
+            try:
+                gtin = int(normalize_gtin(str(row.get("gtin") or "")))
+            except ValueError:
+                self.errors += 1
+                continue
+            gtins.append(gtin)
+            price = row.get("price")
+            try:
+                prices.append(float(price) if price not in (None, "") else math.nan)
+            except (TypeError, ValueError):
+                prices.append(math.nan)
+            text += _SEPARATOR.join(str(row.get(field) or "").replace(_SEPARATOR, " ")
+                                    for field in self.fields).encode("utf-8")
+            offsets.append(len(text))
+            prefix = str(row.get("epc_prefix") or "").strip().upper()
+            if prefix:
+                if prefix not in prefixes:
+                    prefix_bytes += _prefix_nbytes(prefix)
+                prefixes[prefix] = gtin
+            if max_bytes and len(text) + _ROW_BYTES * len(gtins) + prefix_bytes > max_bytes:
+                raise ValueError(f"Catalog is over the {max_bytes // (1024 * 1024)} MB budget "
+                                 f"after {len(gtins)} products")
+
+        # Sort packed (gtin, row) keys in place: rows of equal GTINs stay in file order
+        shift = max(len(gtins).bit_length(), 1)
+        keys = [(gtin << shift) | row for row, gtin in enumerate(gtins)]
+        del gtins
+        keys.sort()
+        mask = (1 << shift) - 1
+        self.gtins, self.rows = array("Q"), array("I")
+        for key in keys:
+            gtin = key >> shift
+            if self.gtins and self.gtins[-1] == gtin:
+                self.errors += 1  # duplicate GTIN: first row of the file wins
+                continue
+            self.gtins.append(gtin)
+            self.rows.append(key & mask)
+        del keys
+        self.prices, self.offsets, self.text = prices, offsets, text
+        self.prefixes = prefixes
+        self.prefix_lengths = sorted({len(p) for p in prefixes}, reverse=True)
+
+    def __len__(self):
+        return len(self.gtins)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the index."""
+        return (self.gtins.itemsize * len(self.gtins) + self.rows.itemsize * len(self.rows)
+                + self.prices.itemsize * len(self.prices) + self.offsets.itemsize * len(self.offsets)
+                + len(self.text) + sum(_prefix_nbytes(p) for p in self.prefixes))
+
+    def product(self, gtin: int) -> Optional[dict]:
+        i = bisect_left(self.gtins, gtin)
+        if i == len(self.gtins) or self.gtins[i] != gtin:
+            return None
+        row = self.rows[i]
+        product = {"gtin": f"{gtin:014d}"}
+        if self.fields:
+            values = self.text[self.offsets[row]:self.offsets[row + 1]].decode("utf-8").split(_SEPARATOR)
+            product.update(zip(self.fields, values))
+        price = self.prices[row]
+        product["price"] = None if math.isnan(price) else price
+        return product
+
+    def gtin_for_prefix(self, epc: str) -> Optional[int]:
+        for length in self.prefix_lengths:  # longest prefix wins
+            gtin = self.prefixes.get(epc[:length])
+            if gtin is not None:
+                return gtin
+        return None
+
+
+class ProductCatalog:
+    """
+    Thread-safe: lookups read the current index reference without locking, reload swaps it.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 256 * 1024 * 1024,
+                 decoder: Optional[EpcDecoder] = None):
+        """
+        :param path: Product master (.csv or .json); may be loaded later with load()
+        :param max_bytes: Memory budget of the index; a larger catalog is refused
+        :param decoder: Shared GS1 decoder (its LRU is reused for EPCs without decoded fields)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.decoder = decoder or EpcDecoder()
+        self._index = CatalogIndex()
+        self._reload_lock = threading.Lock()
+        self._mtime = None
+        self.reloads = 0
+        self.lookups = 0
+        self.hits = 0
+
+    ################################################################################
+    #                            LOADING                                           #
+    ################################################################################
+    @staticmethod
+    def read_rows(path: str) -> tuple[list[str], Iterable[dict]]:
+        """
+        :return: (text columns, rows); CSV rows are streamed from the file
+        :raises ValueError: On an unsupported or malformed file
+        """
+        if path.lower().endswith(".json"):
+            rows = ({str(k).lower(): v for k, v in row.items()} for row in _iter_json_products(path))
+            sample = list(islice(rows, 1000))
+            fields = []
+            for row in sample:  # columns may differ between objects: collect them from a sample
+                fields.extend(key for key in row if key not in _RESERVED and key not in fields)
+            return fields, chain(sample, rows)
+        if path.lower().endswith(".csv"):
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                header = next(csv.reader(f), None)
+            if not header:
+                raise ValueError(f"CSV catalog has no header row: {path}")
+            columns = [column.strip().lower() for column in header]
+            if "gtin" not in columns:
+                raise ValueError("CSV catalog needs a 'gtin' column")
+
+            def rows():
+                with open(path, newline="", encoding="utf-8-sig") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)
+                    for values in reader:
+                        yield dict(zip(columns, values))
+
+            return [c for c in columns if c and c not in _RESERVED], rows()
+        raise ValueError(f"Catalog must be a .csv or .json file: {path}")
+
+    def load(self, path: Optional[str] = None) -> dict:
+        """
+        Build a new index from `path` (default: the current one) and swap it in.
+        :return: stats() of the new catalog
+        :raises ValueError, OSError: The current catalog stays in place
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No catalog file configured")
+        with self._reload_lock:
+            mtime = os.path.getmtime(path)
+            fields, rows = self.read_rows(path)
+            index = CatalogIndex(rows, fields, source=path, max_bytes=self.max_bytes)
+            self._index = index
+            self.path = path
+            self._mtime = mtime
+            self.reloads += 1
+        print(f"📦 Catalog loaded from {path}: {len(index)} products ({index.errors} rows skipped)")
+        return self.stats()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload when the file's mtime changed since the last load (polled by the app).
+        :return: True if a new catalog was swapped in
+        """
+        if not self.path:
+            return False
+        try:
+            if os.path.getmtime(self.path) == self._mtime:
+                return False
+            self.load()
+            return True
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Catalog reload failed, keeping the previous one: {e}")
+            return False
+
+    ################################################################################
+    #                            LOOKUP                                            #
+    ################################################################################
+    def lookup_gtin(self, gtin: str) -> Optional[dict]:
+        try:
+            return self._index.product(int(normalize_gtin(gtin)))
+        except ValueError:
+            return None
+
+    def lookup(self, epc: Optional[str], gs1: Optional[dict] = None) -> Optional[dict]:
+        """
+        :param epc: EPC hex
+        :param gs1: Already decoded GS1 fields of the EPC (publish_tag has them), else decoded here
+        :return: Product dict ({"gtin", <text columns>, "price"}) or None
+        """
+        if not epc:
+            return None
+        index = self._index
+        if not len(index):
+            return None
+        self.lookups += 1
+        if gs1 is None:
+            gs1 = self.decoder.decode(epc)
+        gtin = gs1.get("gtin")
+        product = index.product(int(gtin)) if gtin else None
+        if product is None and index.prefixes:
+            prefix_gtin = index.gtin_for_prefix(epc.upper())
+            if prefix_gtin is not None:
+                product = index.product(prefix_gtin)
+        if product is not None:
+            self.hits += 1
+        return product
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            "path": self.path,
+            "products": len(index),
+            "fields": list(index.fields),
+            "epc_prefixes": len(index.prefixes),
+            "skipped_rows": index.errors,
+            "bytes": index.nbytes(),
+            "max_bytes": self.max_bytes,
+            "loaded_at": index.loaded_at if index.source else None,
+            "reloads": self.reloads,
+            "lookups": self.lookups,
+            "hits": self.hits,
+        }
@@ -4,6 +4,17 @@ Cấu hình cho ứng dụng RFID Reader Web Control Panel
 
 import os
 
+# Thư mục dữ liệu: đường dẫn tương đối của nhật ký / trạng thái đều tính từ đây,
+# không phụ thuộc thư mục đang chạy tiến trình
+DATA_DIR = os.path.abspath(os.environ.get('DATA_DIR') or
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+
+def data_path(path: str) -> str:
+    """Đường dẫn trong DATA_DIR (giữ nguyên nếu là đường dẫn tuyệt đối; rỗng = tắt)"""
+    return os.path.join(DATA_DIR, path) if path else ''
+
+
 class Config:
     """Cấu hình cơ bản"""
     
@@ -18,6 +29,10 @@ class Config:
     # Serial Configuration
     DEFAULT_PORT = os.environ.get('DEFAULT_SERIAL_PORT', '/dev/ttyUSB0')
     DEFAULT_BAUDRATE = int(os.environ.get('DEFAULT_BAUDRATE', 115200))
+    # Tự dò cổng theo serial number và kết nối lại khi cắm lại USB
+    PORT_DISCOVERY = os.environ.get('PORT_DISCOVERY', '1').lower() in ('1', 'true', 'yes')
+    PORT_CACHE_FILE = data_path(os.environ.get('PORT_CACHE_FILE', 'reader_ports.json'))
+    DISCOVERY_BAUDRATES = [int(b) for b in os.environ.get('DISCOVERY_BAUDRATES', '115200').split(',')]
     
     # RFID Reader Configuration
     DEFAULT_ADDRESS = 0x00
@@ -25,17 +40,53 @@ class Config:
     DEFAULT_SESSION = 0
     DEFAULT_ANTENNA = 1
     DEFAULT_SCAN_TIME = 10
+
+    # Tag dedup: off (every read), host (first_seen/refresh/last_seen events), hardware (reader filter)
+    TAG_DEDUP_MODE = os.environ.get('TAG_DEDUP_MODE', 'off')
+    TAG_DEDUP_WINDOW = float(os.environ.get('TAG_DEDUP_WINDOW', 1.0))  # giây
+    TAG_DEDUP_REFRESH_INTERVAL = float(os.environ.get('TAG_DEDUP_REFRESH_INTERVAL', 5.0))  # giây
     
+    # Tag handoff queue between the UART thread and the callback workers
+    TAG_QUEUE_SIZE = int(os.environ.get('TAG_QUEUE_SIZE', 4096))
+    TAG_QUEUE_OVERFLOW = os.environ.get('TAG_QUEUE_OVERFLOW', 'drop_oldest')  # drop_oldest | drop_newest | block
+    TAG_WORKERS = int(os.environ.get('TAG_WORKERS', 1))
+    # Nhật ký tag nhị phân trên đĩa, trong DATA_DIR (TAG_LOG_DIR rỗng = tắt)
+    DATA_DIR = DATA_DIR
+    TAG_LOG_DIR = data_path(os.environ.get('TAG_LOG_DIR', 'tag_log'))
+    TAG_LOG_SEGMENT_MB = int(os.environ.get('TAG_LOG_SEGMENT_MB', 64))
+    TAG_LOG_RETENTION_SEGMENTS = int(os.environ.get('TAG_LOG_RETENTION_SEGMENTS', 32))
+    TAG_LOG_RETENTION_HOURS = float(os.environ.get('TAG_LOG_RETENTION_HOURS', 0)) or None  # 0 = không giới hạn
+    TAG_LOG_FLUSH_MS = int(os.environ.get('TAG_LOG_FLUSH_MS', 50))  # group commit window
+    TAG_LOG_FSYNC = os.environ.get('TAG_LOG_FSYNC', '1').lower() in ('1', 'true', 'yes')
+    # Cấp phát EPC cho trạm mã hoá: pool + lease lưu trong file JSON trong DATA_DIR
+    # (không được tắt: mất file này là cấp lại serial đã dùng)
+    EPC_ALLOCATOR_FILE = data_path(os.environ.get('EPC_ALLOCATOR_FILE') or 'epc_allocator.json')
+    EPC_LEASE_BLOCK = int(os.environ.get('EPC_LEASE_BLOCK', 100))  # serial mỗi lần thuê
+    # Giải mã GS1 (SGTIN/SSCC/GRAI-96): gắn trường "gs1" vào mỗi sự kiện tag
+    EPC_DECODE = os.environ.get('EPC_DECODE', '1').lower() in ('1', 'true', 'yes')
+    EPC_DECODE_CACHE = int(os.environ.get('EPC_DECODE_CACHE', 65536))  # số EPC trong LRU
+    # Danh mục sản phẩm (CSV/JSON, khoá GTIN): gắn "product" vào sự kiện tag; '' = tắt
+    CATALOG_FILE = os.environ.get('CATALOG_FILE', '')
+    CATALOG_MAX_MB = int(os.environ.get('CATALOG_MAX_MB', 256))  # giới hạn bộ nhớ của chỉ mục
+    CATALOG_WATCH_S = float(os.environ.get('CATALOG_WATCH_S', 5))  # kiểm tra file để nạp lại (0 = không)
+    # Mỗi reader chạy trong một tiến trình riêng, tag chuyển qua shared memory
+    READER_PROCESS_MODE = os.environ.get('READER_PROCESS_MODE', '0').lower() in ('1', 'true', 'yes')
+
     # WebSocket Configuration
     SOCKETIO_ASYNC_MODE = 'eventlet'
     SOCKETIO_CORS_ALLOWED_ORIGINS = "*"
+    TAG_BATCH_INTERVAL_MS = int(os.environ.get('TAG_BATCH_INTERVAL_MS', 100))  # 'tag_batch' flush interval
+    TAG_BATCH_MAX = int(os.environ.get('TAG_BATCH_MAX', 200))  # flush early after this many tags
+    STATS_PUSH_INTERVAL_MS = int(os.environ.get('STATS_PUSH_INTERVAL_MS', 1000))  # sự kiện 'stats' (0 = tắt)
     
     # Logging Configuration
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     
     # UI Configuration
-    MAX_TAGS_DISPLAY = 100  # Số lượng tags tối đa hiển thị
+    MAX_TAGS_DISPLAY = 100  # Số lượng tags tối đa hiển thị (limit mặc định của /api/get_tags)
+    TAG_HISTORY_SIZE = int(os.environ.get('TAG_HISTORY_SIZE', 10000))  # ring buffer lịch sử đọc tag
+    TAG_TABLE_MAX_TAGS = int(os.environ.get('TAG_TABLE_MAX_TAGS', 100000))  # số EPC tối đa trong chỉ mục
     AUTO_REFRESH_INTERVAL = 5000  # Tự động làm mới (ms)
     
     # Antenna Configuration
@@ -0,0 +1,191 @@
+"""
+Lọc trùng tag phía host cho inventory liên tục.
+
+A reader in continuous mode reports the same EPC many times per second. The
+TagDeduplicator sits between parse_epc() and the user callback and turns that
+stream into three events per tag:
+
+    first_seen  - first read after the tag was absent for `window` seconds
+    refresh     - at most every `refresh_interval` seconds while it keeps being read
+    last_seen   - once no read arrived for `window` seconds (tag left the field)
+
+Each event carries the aggregated read_count, peak_rssi and mean_rssi, and
+new_reads: the reads since the previous event of the tag, so consumers that
+count reads (rate, per-antenna totals) can add it up without double counting.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+DEDUP_OFF = "off"            # every read goes to the callback (legacy behaviour)
+DEDUP_HOST = "host"          # TagDeduplicator in this process
+DEDUP_HARDWARE = "hardware"  # reader's own repeat filter (set_filter_settings, MID 0x0209)
+DEDUP_MODES = (DEDUP_OFF, DEDUP_HOST, DEDUP_HARDWARE)
+
+
+class _TagEntry:
+    __slots__ = ("tag", "first_seen", "last_seen", "last_emit", "read_count", "reported",
+                 "rssi_sum", "rssi_count", "peak_rssi")
+
+    def __init__(self, tag: dict, now: float):
+        self.tag = tag
+        self.first_seen = now
+        self.last_seen = now
+        self.last_emit = now
+        self.read_count = 0
+        self.reported = 0  # read_count at the previous event
+        self.rssi_sum = 0
+        self.rssi_count = 0
+        self.peak_rssi = None
+
+    def add(self, tag: dict, now: float):
+        self.tag = tag
+        self.last_seen = now
+        self.read_count += 1
+        rssi = tag.get("rssi")
+        if rssi is not None:
+            self.rssi_sum += rssi
+            self.rssi_count += 1
+            if self.peak_rssi is None or rssi > self.peak_rssi:
+                self.peak_rssi = rssi
+
+
+class TagDeduplicator:
+    """
+    Callable tag filter: pass an instance wherever a tag callback is expected.
+    Events are delivered from the caller's thread (first_seen/refresh) and from
+    an internal sweeper thread (last_seen), so the callback must be thread-safe.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[dict], None],
+        window: float = 1.0,
+        refresh_interval: float = 5.0,
+        key_by_antenna: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param callback: Receives one event dict per first_seen/refresh/last_seen
+        :param window: Hold-off in seconds; a tag unseen for this long is reported gone
+        :param refresh_interval: Minimum seconds between refresh events for one tag (0 = never)
+        :param key_by_antenna: Track EPC+antenna pairs instead of EPC only
+        :param clock: Monotonic time source (overridable for replaying captures)
+        """
+        if window <= 0:
+            raise ValueError("Dedup window must be positive")
+        if refresh_interval < 0:
+            raise ValueError("Refresh interval must be >= 0")
+        self.callback = callback
+        self.window = window
+        self.refresh_interval = refresh_interval
+        self.key_by_antenna = key_by_antenna
+        self._clock = clock
+        self._entries: dict = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+
+        self.reads_in = 0
+        self.events_out = 0
+
+    def __call__(self, tag: dict):
+        now = self._clock()
+        key = (tag["epc"], tag.get("antenna_id")) if self.key_by_antenna else tag["epc"]
+        event = None
+        with self._lock:
+            self.reads_in += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _TagEntry(tag, now)
+                entry.add(tag, now)
+                event = self._event("first_seen", entry)
+            else:
+                entry.add(tag, now)
+                if self.refresh_interval and now - entry.last_emit >= self.refresh_interval:
+                    entry.last_emit = now
+                    event = self._event("refresh", entry)
+        if event:
+            self._emit(event)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Emit last_seen for every tag idle longer than the window.
+        :return: Number of tags expired
+        """
+        now = self._clock() if now is None else now
+        cutoff = now - self.window
+        with self._lock:
+            gone = [k for k, e in self._entries.items() if e.last_seen <= cutoff]
+            events = [self._event("last_seen", self._entries.pop(k)) for k in gone]
+        for event in events:
+            self._emit(event)
+        return len(events)
+
+    def flush(self) -> int:
+        """
+        Emit last_seen for every tracked tag (end of inventory).
+        """
+        with self._lock:
+            entries, self._entries = self._entries, {}
+            events = [self._event("last_seen", e) for e in entries.values()]
+        for event in events:
+            self._emit(event)
+        return len(events)
+
+    def start(self):
+        """
+        Start the background sweeper that reports tags leaving the field.
+        """
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="tag-dedup-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def close(self):
+        """
+        Stop the sweeper and flush the remaining tags as last_seen.
+        """
+        self._stop.set()
+        if self._sweeper and self._sweeper is not threading.current_thread():
+            self._sweeper.join(timeout=1)
+        self._sweeper = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._entries),
+            "reads_in": self.reads_in,
+            "events_out": self.events_out,
+        }
+
+    def _sweep_loop(self):
+        interval = min(self.window / 2, 0.25)
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️ Dedup sweep error: {e}")
+
+    def _event(self, kind: str, entry: _TagEntry) -> dict:
+        # Called under self._lock
+        event = dict(entry.tag)
+        event.update({
+            "event": kind,
+            "read_count": entry.read_count,
+            "new_reads": entry.read_count - entry.reported,
+            "peak_rssi": entry.peak_rssi,
+            "mean_rssi": round(entry.rssi_sum / entry.rssi_count, 1) if entry.rssi_count else None,
+            "duration": round(entry.last_seen - entry.first_seen, 3),
+        })
+        entry.reported = entry.read_count
+        return event
+
+    def _emit(self, event: dict):
+        self.events_out += 1
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f"⚠️ Dedup callback error: {e}")
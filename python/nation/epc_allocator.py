@@ -0,0 +1,294 @@
+"""
+Cấp phát số serial / EPC duy nhất cho các trạm mã hoá.
+
+A pool describes how serial numbers become EPCs:
+
+    sgtin96 - GS1 SGTIN-96 of one GTIN ({"gtin", "company_prefix_length", "filter"})
+    hex     - fixed hex prefix + zero-padded hex serial ({"prefix", "length"} in hex digits)
+
+Stations do not ask for every EPC: they lease a block of serials [start, end)
+and encode from it locally, so several readers (or processes sharing the state
+file) work in parallel without collisions or a round-trip per tag.
+
+Crash safety: a lease is written to the state file (fsync + atomic rename)
+before any EPC of it is handed out, and the pool cursor only moves forward
+past leased blocks. After a crash the serials of an open lease are treated as
+used - some serials may be skipped, none is ever issued twice. Releasing the
+newest lease of a pool gives its unused tail back.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from gs1 import SGTIN96_MAX_SERIAL, SGTIN96_SERIAL_BITS, sgtin96_prefix
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+SCHEME_SGTIN96 = "sgtin96"
+SCHEME_HEX = "hex"
+SCHEMES = (SCHEME_SGTIN96, SCHEME_HEX)
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class EpcFormat:
+    """
+    Serial number -> EPC hex for one pool definition.
+    """
+
+    def __init__(self, pool: dict):
+        scheme = pool.get("scheme")
+        if scheme == SCHEME_SGTIN96:
+            self._prefix = sgtin96_prefix(pool["gtin"], int(pool["company_prefix_length"]), int(pool.get("filter", 1)))
+            self.max_serial = SGTIN96_MAX_SERIAL
+        elif scheme == SCHEME_HEX:
+            prefix = pool["prefix"].strip().upper()
+            length = int(pool.get("length", 24))
+            int(prefix or "0", 16)  # validate
+            if length % 4 or length <= len(prefix):
+                raise ValueError("hex pool 'length' must be a multiple of 4 hex digits longer than the prefix")
+            self._prefix = prefix
+            self._digits = length - len(prefix)
+            self.max_serial = 16 ** self._digits - 1
+        else:
+            raise ValueError(f"Unknown EPC scheme '{scheme}', expected one of {SCHEMES}")
+        self.scheme = scheme
+
+    def epc(self, serial: int) -> str:
+        if self.scheme == SCHEME_SGTIN96:
+            return f"{(self._prefix << SGTIN96_SERIAL_BITS) | serial:024X}"
+        return f"{self._prefix}{serial:0{self._digits}X}"
+
+    def matches(self, epc: str) -> bool:
+        """
+        True if `epc` (hex) has this pool's format, whatever its serial: a tag already encoded from it.
+        """
+        epc = epc.strip().upper()
+        if self.scheme == SCHEME_SGTIN96:
+            try:
+                return len(epc) == 24 and int(epc, 16) >> SGTIN96_SERIAL_BITS == self._prefix
+            except ValueError:
+                return False
+        return len(epc) == len(self._prefix) + self._digits and epc.startswith(self._prefix)
+
+
+class EpcAllocator:
+    """
+    Thread-safe, and process-safe on POSIX (flock on the state file).
+    """
+
+    def __init__(self, state_file: str, default_ttl: float = 3600.0):
+        """
+        :param state_file: JSON file holding pools and open leases
+        :param default_ttl: Seconds after which an unreleased lease counts as used up
+        """
+        self.state_file = state_file
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._formats: dict[str, tuple[str, EpcFormat]] = {}
+
+    ################################################################################
+    #                            STATE FILE                                        #
+    ################################################################################
+    @contextmanager
+    def _state(self, write: bool = True):
+        """
+        Load the state under the thread lock (+ file lock), yield it, save it if `write`.
+        """
+        with self._lock:
+            lock_file = None
+            if fcntl:
+                directory = os.path.dirname(os.path.abspath(self.state_file))
+                os.makedirs(directory, exist_ok=True)
+                lock_file = open(self.state_file + ".lock", "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self._load()
+                yield state
+                if write:
+                    self._save(state)
+            finally:
+                if lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.state_file):
+            return {"pools": {}, "leases": {}}
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def _save(self, state: dict):
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_file)
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(os.path.dirname(os.path.abspath(self.state_file)), os.O_DIRECTORY)
+            try:
+                os.fsync(fd)  # make the rename itself durable
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _expire(state: dict, now: float):
+        for lease_id in [k for k, lease in state["leases"].items() if lease["expires"] < now]:
+            del state["leases"][lease_id]
+
+    def _format(self, name: str, pool: dict) -> EpcFormat:
+        key = json.dumps({k: pool[k] for k in sorted(pool) if k not in ("next", "issued", "skipped")})
+        cached = self._formats.get(name)
+        if cached is None or cached[0] != key:
+            cached = self._formats[name] = (key, EpcFormat(pool))
+        return cached[1]
+
+    ################################################################################
+    #                            POOLS                                             #
+    ################################################################################
+    def define_pool(self, name: str, definition: dict) -> dict:
+        """
+        Create a pool, or change the definition of one that has not issued anything yet.
+        :param definition: {"scheme": "sgtin96", "gtin", "company_prefix_length", "filter", "serial_start", "serial_end"}
+                           or {"scheme": "hex", "prefix", "length", "serial_start", "serial_end"}
+        :raises ValueError: On an invalid definition or when redefining a pool in use
+        """
+        pool = dict(definition)
+        fmt = EpcFormat(pool)
+        start = int(pool.pop("serial_start", 0))
+        end = int(pool.pop("serial_end", fmt.max_serial + 1))  # exclusive
+        if not 0 <= start < end <= fmt.max_serial + 1:
+            raise ValueError(f"Serial range must be within 0..{fmt.max_serial + 1}")
+        pool.update({"start": start, "end": end, "next": start, "issued": 0, "skipped": 0})
+        with self._state() as state:
+            existing = state["pools"].get(name)
+            if existing and existing["next"] != existing["start"]:
+                raise ValueError(f"Pool '{name}' has already issued serials and cannot be redefined")
+            state["pools"][name] = pool
+        return self.pool_status(name)
+
+    def pool_format(self, name: str) -> EpcFormat:
+        """
+        :raises KeyError: Unknown pool
+        """
+        with self._state(write=False) as state:
+            if name not in state["pools"]:
+                raise KeyError(f"Unknown EPC pool '{name}'")
+            return self._format(name, state["pools"][name])
+
+    def pool_status(self, name: Optional[str] = None):
+        """
+        :return: Status of one pool, or {name: status} for all of them
+        """
+        now = time.time()
+        with self._state(write=False) as state:
+            def status(pool_name, pool):
+                leases = [dict(lease, id=lease_id) for lease_id, lease in state["leases"].items()
+                          if lease["pool"] == pool_name and lease["expires"] >= now]
+                return dict(pool, name=pool_name, remaining=pool["end"] - pool["next"], leases=leases)
+
+            if name is not None:
+                if name not in state["pools"]:
+                    raise KeyError(f"Unknown EPC pool '{name}'")
+                return status(name, state["pools"][name])
+            return {pool_name: status(pool_name, pool) for pool_name, pool in state["pools"].items()}
+
+    ################################################################################
+    #                            LEASES                                            #
+    ################################################################################
+    def lease(self, pool_name: str, count: int, holder: Optional[str] = None, ttl: Optional[float] = None) -> dict:
+        """
+        Reserve the next `count` serials of a pool (fewer if the pool is nearly used up).
+        The lease is on disk before this returns.
+        :return: {"id", "pool", "start", "end", "holder", "expires"}
+        :raises KeyError: Unknown pool
+        :raises PoolExhausted: No serial left
+        """
+        if count <= 0:
+            raise ValueError("count must be positive")
+        now = time.time()
+        with self._state() as state:
+            self._expire(state, now)
+            pool = state["pools"].get(pool_name)
+            if pool is None:
+                raise KeyError(f"Unknown EPC pool '{pool_name}'")
+            start = pool["next"]
+            end = min(start + count, pool["end"])
+            if start >= end:
+                raise PoolExhausted(f"EPC pool '{pool_name}' is exhausted")
+            pool["next"] = end
+            lease_id = uuid.uuid4().hex[:12]
+            lease = {"pool": pool_name, "start": start, "end": end, "holder": holder,
+                     "expires": now + (ttl or self.default_ttl)}
+            state["leases"][lease_id] = lease
+        return dict(lease, id=lease_id)
+
+    def release(self, lease_id: str, used: int) -> dict:
+        """
+        Close a lease after its first `used` serials were consumed. The unused tail
+        goes back to the pool when no later block has been leased; otherwise it is skipped.
+        :return: {"returned": n, "skipped": n}
+        """
+        with self._state() as state:
+            lease = state["leases"].pop(lease_id, None)
+            if lease is None:
+                return {"returned": 0, "skipped": 0}  # expired or already released
+            pool = state["pools"][lease["pool"]]
+            used = max(0, min(used, lease["end"] - lease["start"]))
+            unused = lease["end"] - lease["start"] - used
+            pool["issued"] += used
+            if unused and pool["next"] == lease["end"]:
+                pool["next"] = lease["start"] + used
+                return {"returned": unused, "skipped": 0}
+            pool["skipped"] += unused
+            return {"returned": 0, "skipped": unused}
+
+    def epcs(self, lease: dict) -> list[str]:
+        """
+        EPC hex strings of a lease, in serial order.
+        """
+        with self._state(write=False) as state:
+            fmt = self._format(lease["pool"], state["pools"][lease["pool"]])
+        return [fmt.epc(serial) for serial in range(lease["start"], lease["end"])]
+
+    def stream(self, pool_name: str, holder: Optional[str] = None, block: int = 100,
+               limit: Optional[int] = None) -> Iterator[str]:
+        """
+        EPCs for one encoding station: leases blocks of `block` serials as needed.
+        Closing the generator (or exhausting `limit`) releases the current lease,
+        so its unused serials are not lost.
+        """
+        produced = 0
+        lease, used = None, 0
+        try:
+            while limit is None or produced < limit:
+                if lease is None or used >= lease["end"] - lease["start"]:
+                    if lease is not None:
+                        self.release(lease["id"], used)
+                    size = block if limit is None else min(block, limit - produced)
+                    lease, used = None, 0
+                    try:
+                        lease = self.lease(pool_name, size, holder)
+                    except PoolExhausted as e:
+                        print(f"⚠️ {e}")
+                        return
+                    with self._state(write=False) as state:
+                        fmt = self._format(pool_name, state["pools"][pool_name])
+                epc = fmt.epc(lease["start"] + used)
+                used += 1  # counted before the yield: a serial handed out is never reissued
+                produced += 1
+                yield epc
+        finally:
+            if lease is not None:
+                self.release(lease["id"], used)
@@ -0,0 +1,222 @@
+"""
+Ghi EPC hàng loạt cho trạm mã hoá nhãn.
+
+write_epc_list() used to call write_epc_tag_auto() per EPC with a STOP, a fixed
+sleep and a 2 s pause between tags. BatchEncoder keeps the reader idle for
+the whole batch and needs two commands per tag:
+
+    inventory_once()  - single-shot round: the reader ends it by itself, so no
+                        STOP is needed before the next command
+    write             - write_epc_verified(match=<tag found>, verify=False,
+                        ensure_idle=False): transient failures are retried there
+
+The round that looks for the next tag also verifies the previous write (its
+new EPC must be in the field), so write -> verify is pipelined with the search
+for the next unencoded tag instead of costing a round of its own.
+
+A tag that already carries a serial is never written again: by default only
+tags whose EPC is not GS1-encoded count as blank, and EPCs of the batch's own
+list or pool (is_encoded) are skipped whoever wrote them.
+"""
+
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from gs1 import EpcDecoder
+
+
+class BatchEncoder:
+    def __init__(
+        self,
+        reader,
+        antenna_id: int = 1,
+        access_password: Optional[int] = None,
+        verify: bool = True,
+        retries: int = 2,
+        is_unencoded: Optional[Callable[[dict], bool]] = None,
+        unencoded_prefix: Optional[str] = None,
+        is_encoded: Optional[Callable[[str], bool]] = None,
+        round_timeout: float = 0.3,
+        write_timeout: float = 0.5,
+        idle_timeout: float = 10.0,
+        max_tag_failures: int = 3,
+        on_result: Optional[Callable[[dict], None]] = None,
+    ):
+        """
+        :param reader: Connected NationReader (or ProcessReader); inventory must be stopped
+        :param antenna_id: Antenna of the encoding station (1-based)
+        :param access_password: Optional access password for the writes
+        :param verify: Check that every written EPC shows up in the following round
+        :param retries: Retries of a transient write failure on the same tag (backoff + power stepping)
+        :param is_unencoded: Picks which tags in the field still need an EPC (replaces the two rules below)
+        :param unencoded_prefix: Hex prefix of blank tags (e.g. the factory EPC "E280"); default: any
+                                 EPC that is not GS1-encoded
+        :param is_encoded: EPC hex -> True if it is one of the pool's EPCs (EpcFormat.matches);
+                           such tags are skipped, as are the EPCs of a list batch
+        :param round_timeout: Deadline of one single-shot inventory
+        :param write_timeout: Deadline of one write command
+        :param idle_timeout: Give up after this long without an unencoded tag in the field
+        :param max_tag_failures: Failed writes before a tag is left alone (locked, damaged...)
+        :param on_result: Called with each per-tag result as soon as it is known
+        """
+        self.reader = reader
+        self.antenna_id = antenna_id
+        self.access_password = access_password
+        self.verify = verify
+        self.retries = retries
+        self.is_unencoded = is_unencoded
+        self.unencoded_prefix = unencoded_prefix.strip().upper() if unencoded_prefix else None
+        self.is_encoded = is_encoded
+        self._decoder = EpcDecoder(max_cached=1024)
+        self._batch_epcs: set[str] = set()
+        self.round_timeout = round_timeout
+        self.write_timeout = write_timeout
+        self.idle_timeout = idle_timeout
+        self.max_tag_failures = max_tag_failures
+        self.on_result = on_result
+        self._stop = threading.Event()
+        self.written: set[str] = set()
+        self.failures: dict[str, int] = {}  # EPC of the tag as found -> failed writes
+        self.results: list[dict] = []
+        self.rounds = 0
+
+    def stop(self):
+        """Finish the current tag and end the batch."""
+        self._stop.set()
+
+    def run(self, epcs: Iterable[str]) -> dict:
+        """
+        Encode one new EPC per tag presented to the antenna, in order.
+        :param epcs: EPC hex strings to write, a list or a lazy source such as
+                     EpcAllocator.stream(); an EPC whose write fails is retried on the next tag
+        :return: {"success", "written", "verified", "failed", "remaining", "elapsed_s", "tags_per_s", "reason"}
+        """
+        if isinstance(epcs, (list, tuple)):
+            self._batch_epcs = {self._pad(e) for e in epcs}
+        source = iter(epcs)
+        started = time.monotonic()
+        pending = None  # successful write waiting for the next round to verify it
+        epc = self._next(source)
+        reason = "done"
+        antennas = [self.antenna_id]
+
+        self.reader.stop_inventory()
+        last_candidate = time.monotonic()
+        while True:
+            tags = self.reader.inventory_once(antennas, timeout=self.round_timeout)
+            self.rounds += 1
+            present = {tag["epc"] for tag in tags}
+            if pending is not None:
+                self._verified(pending, present)
+                pending = None
+            if epc is None:
+                break
+            if self._stop.is_set():
+                reason = "stopped"
+                break
+
+            candidate = self._pick(tags)
+            if candidate is None:
+                if time.monotonic() - last_candidate > self.idle_timeout:
+                    reason = "idle_timeout"
+                    break
+                continue
+            last_candidate = time.monotonic()
+
+            t0 = time.monotonic()
+            write = self.reader.write_epc_verified(
+                epc,
+                match_epc_hex=candidate["epc"],
+                antenna_id=self.antenna_id,
+                access_password=self.access_password,
+                retries=self.retries,
+                verify=False,  # the next round verifies
+                write_timeout=self.write_timeout,
+                ensure_idle=False,
+            )
+            result = {
+                "index": len(self.written),
+                "epc": epc,
+                "previous_epc": candidate["epc"],
+                "rssi": candidate.get("rssi"),
+                "success": write.get("success", False),
+                "verified": None,
+                "result_code": write.get("result_code"),
+                "result_msg": write.get("result_msg"),
+                "attempts": len(write.get("attempts", ())),
+                "write_ms": round((time.monotonic() - t0) * 1000, 1),
+            }
+            if not result["success"]:
+                # The EPC was not written: keep it for the next tag
+                self.failures[candidate["epc"]] = self.failures.get(candidate["epc"], 0) + 1
+                self._emit(result)
+                continue
+            self.written.add(epc)
+            epc = self._next(source)
+            if self.verify:
+                pending = result
+            else:
+                self._emit(result)
+
+        # A list input reports what is left; a lazy source is not drained (its owner releases it)
+        remaining = [epc] if epc is not None else []
+        if isinstance(epcs, (list, tuple)):
+            remaining += [e for e in (self._pad(e) for e in source)]
+        elapsed = time.monotonic() - started
+        succeeded = [r for r in self.results if r["success"] and r["verified"] is not False]
+        return {
+            "success": not remaining and all(r["verified"] is not False for r in self.results if r["success"]),
+            "written": sum(1 for r in self.results if r["success"]),
+            "verified": sum(1 for r in self.results if r["verified"]),
+            "failed": sum(1 for r in self.results if not r["success"] or r["verified"] is False),
+            "remaining": remaining,
+            "skipped_tags": [tag for tag, n in self.failures.items() if n >= self.max_tag_failures],
+            "rounds": self.rounds,
+            "elapsed_s": round(elapsed, 3),
+            "tags_per_s": round(len(succeeded) / elapsed, 2) if elapsed else 0.0,
+            "reason": reason,
+        }
+
+    @staticmethod
+    def _pad(epc: str) -> str:
+        # Padded to whole words the way write_epc_tag_auto writes them, so verify compares like with like
+        epc = epc.strip().upper()
+        return epc.ljust((len(epc) + 3) // 4 * 4, "0")
+
+    def _next(self, source) -> Optional[str]:
+        epc = next(source, None)
+        return self._pad(epc) if epc is not None else None
+
+    def _pick(self, tags: list[dict]) -> Optional[dict]:
+        """Strongest tag that still needs an EPC (tags come sorted by RSSI)."""
+        for tag in tags:
+            if tag["epc"] in self.written or self.failures.get(tag["epc"], 0) >= self.max_tag_failures:
+                continue
+            if self._needs_epc(tag):
+                return tag
+        return None
+
+    def _needs_epc(self, tag: dict) -> bool:
+        if self.is_unencoded is not None:
+            return self.is_unencoded(tag)
+        epc = tag["epc"]
+        if epc in self._batch_epcs or (self.is_encoded is not None and self.is_encoded(epc)):
+            return False  # serialized from this batch's source, maybe by another station
+        if self.unencoded_prefix is not None:
+            return epc.startswith(self.unencoded_prefix)
+        return self._decoder.decode(epc)["scheme"] == "raw"
+
+    def _verified(self, result: dict, present: set):
+        result["verified"] = result["epc"] in present
+        if not result["verified"]:
+            result["result_msg"] = "Written EPC not seen in the verify round"
+        self._emit(result)
+
+    def _emit(self, result: dict):
+        self.results.append(result)
+        if self.on_result:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                print(f"⚠️ Encoder result callback error: {e}")
@@ -0,0 +1,242 @@
+"""
+Mã hoá / giải mã EPC theo chuẩn GS1 (TDS): SGTIN-96, SSCC-96, GRAI-96.
+
+96-bit layouts (most significant first):
+
+    SGTIN-96  header 8 (0x30) | filter 3 | partition 3 | company prefix M | item reference N | serial 38
+    SSCC-96   header 8 (0x31) | filter 3 | partition 3 | company prefix M | serial reference N | reserved 24
+    GRAI-96   header 8 (0x33) | filter 3 | partition 3 | company prefix M | asset type N | serial 38
+
+The partition value fixes how the bits after it are split between the GS1
+company prefix and the next field, which depends on how many digits the
+company prefix has (6-12).
+
+Decoding is memoized: EpcDecoder keeps an LRU of EPC bytes -> fields, so the
+same tag read thousands of times is decoded once. Anything that is not one of
+these schemes decodes to {"scheme": "raw"}.
+"""
+
+from functools import lru_cache
+from typing import Iterable, Optional
+
+SGTIN96_HEADER = 0x30
+SSCC96_HEADER = 0x31
+GRAI96_HEADER = 0x33
+SGTIN96_SERIAL_BITS = 38
+SGTIN96_MAX_SERIAL = (1 << SGTIN96_SERIAL_BITS) - 1
+
+# partition -> (company prefix digits, company prefix bits, item reference digits, item reference bits)
+SGTIN_PARTITIONS = {
+    0: (12, 40, 1, 4),
+    1: (11, 37, 2, 7),
+    2: (10, 34, 3, 10),
+    3: (9, 30, 4, 14),
+    4: (8, 27, 5, 17),
+    5: (7, 24, 6, 20),
+    6: (6, 20, 7, 24),
+}
+_PARTITION_BY_DIGITS = {digits: p for p, (digits, _, _, _) in SGTIN_PARTITIONS.items()}
+
+# partition -> (company prefix digits, company prefix bits, serial reference digits, serial reference bits)
+SSCC_PARTITIONS = {
+    0: (12, 40, 5, 18),
+    1: (11, 37, 6, 21),
+    2: (10, 34, 7, 24),
+    3: (9, 30, 8, 28),
+    4: (8, 27, 9, 31),
+    5: (7, 24, 10, 34),
+    6: (6, 20, 11, 38),
+}
+
+# partition -> (company prefix digits, company prefix bits, asset type digits, asset type bits)
+GRAI_PARTITIONS = {
+    0: (12, 40, 0, 4),
+    1: (11, 37, 1, 7),
+    2: (10, 34, 2, 10),
+    3: (9, 30, 3, 14),
+    4: (8, 27, 4, 17),
+    5: (7, 24, 5, 20),
+    6: (6, 20, 6, 24),
+}
+
+RAW = {"scheme": "raw"}
+
+
+def gtin_check_digit(digits: str) -> int:
+    """
+    GS1 mod-10 check digit of `digits` (the GTIN without its last digit).
+    """
+    digits = digits[::-1]  # weights 3, 1, 3... from the right
+    total = 3 * sum(map(int, digits[0::2])) + sum(map(int, digits[1::2]))
+    return (10 - total % 10) % 10
+
+
+def normalize_gtin(gtin: str) -> str:
+    """
+    GTIN-8/12/13/14 -> 14 digits, check digit verified.
+    :raises ValueError: On a malformed GTIN or a wrong check digit
+    """
+    gtin = gtin.strip()
+    if not gtin.isdigit() or len(gtin) not in (8, 12, 13, 14):
+        raise ValueError(f"GTIN must have 8, 12, 13 or 14 digits: '{gtin}'")
+    gtin = gtin.zfill(14)
+    if gtin_check_digit(gtin[:13]) != int(gtin[13]):
+        raise ValueError(f"Wrong GTIN check digit: '{gtin}'")
+    return gtin
+
+
+def encode_sgtin96(gtin: str, company_prefix_length: int, serial: int, filter_value: int = 1) -> str:
+    """
+    :param gtin: GTIN-8/12/13/14 of the product
+    :param company_prefix_length: Digits of the GS1 company prefix inside the GTIN (6-12)
+    :param serial: Serial number, 0 .. 2**38-1
+    :param filter_value: 0-7 (1 = point of sale trade item)
+    :return: 24 hex digits, upper case
+    :raises ValueError: On out-of-range arguments
+    """
+    partition = _PARTITION_BY_DIGITS.get(company_prefix_length)
+    if partition is None:
+        raise ValueError(f"Company prefix length must be 6-12 digits, got {company_prefix_length}")
+    if not 0 <= serial <= SGTIN96_MAX_SERIAL:
+        raise ValueError(f"SGTIN-96 serial must be 0..{SGTIN96_MAX_SERIAL}, got {serial}")
+    if not 0 <= filter_value <= 7:
+        raise ValueError(f"Filter value must be 0-7, got {filter_value}")
+    gtin = normalize_gtin(gtin)
+    _, company_bits, _, item_bits = SGTIN_PARTITIONS[partition]
+    company = int(gtin[1:1 + company_prefix_length])
+    item_reference = int(gtin[0] + gtin[1 + company_prefix_length:13])  # indicator digit first
+
+    value = SGTIN96_HEADER
+    value = (value << 3) | filter_value
+    value = (value << 3) | partition
+    value = (value << company_bits) | company
+    value = (value << item_bits) | item_reference
+    value = (value << SGTIN96_SERIAL_BITS) | serial
+    return f"{value:024X}"
+
+
+def sgtin96_prefix(gtin: str, company_prefix_length: int, filter_value: int = 1) -> int:
+    """
+    The 58 bits before the serial as an integer, so a run of serials of one GTIN
+    encodes as (prefix << 38) | serial without redoing the GTIN arithmetic.
+    """
+    return int(encode_sgtin96(gtin, company_prefix_length, 0, filter_value), 16) >> SGTIN96_SERIAL_BITS
+
+
+################################################################################
+#                            DECODING                                          #
+################################################################################
+def _fields(value: int, partitions: dict, tail_bits: int) -> Optional[tuple]:
+    """
+    Fields shared by the 96-bit schemes, from the whole EPC value:
+    (filter, company prefix digits, reference digits, last field) or None if they are out of range.
+    """
+    tail = value & ((1 << tail_bits) - 1)
+    value >>= tail_bits
+    partition = (value >> (82 - tail_bits)) & 0x7
+    entry = partitions.get(partition)
+    if entry is None:
+        return None
+    company_digits, _, reference_digits, reference_bits = entry
+    reference = value & ((1 << reference_bits) - 1)
+    company = (value >> reference_bits) & ((1 << (82 - tail_bits - reference_bits)) - 1)
+    if company >= 10 ** company_digits or reference >= 10 ** reference_digits:
+        return None
+    filter_value = (value >> (85 - tail_bits)) & 0x7
+    reference = f"{reference:0{reference_digits}d}" if reference_digits else ""
+    return filter_value, f"{company:0{company_digits}d}", reference, tail
+
+
+def decode_epc_bytes(epc: bytes) -> dict:
+    """
+    :return: {"scheme": "sgtin-96", "filter", "company_prefix", "item_reference", "serial", "gtin", "uri"}
+             {"scheme": "sscc-96", "filter", "company_prefix", "serial_reference", "sscc", "uri"}
+             {"scheme": "grai-96", "filter", "company_prefix", "asset_type", "serial", "grai", "uri"}
+             or {"scheme": "raw"}
+    """
+    if len(epc) != 12:
+        return RAW
+    value = int.from_bytes(epc, "big")
+    header = value >> 88
+    if header == SGTIN96_HEADER:
+        fields = _fields(value, SGTIN_PARTITIONS, SGTIN96_SERIAL_BITS)
+        if fields:
+            filter_value, company, item, serial = fields
+            gtin = item[0] + company + item[1:]  # indicator digit goes first
+            return {
+                "scheme": "sgtin-96",
+                "filter": filter_value,
+                "company_prefix": company,
+                "item_reference": item,
+                "serial": serial,
+                "gtin": gtin + str(gtin_check_digit(gtin)),
+                "uri": f"urn:epc:id:sgtin:{company}.{item}.{serial}",
+            }
+    elif header == SSCC96_HEADER:
+        fields = _fields(value, SSCC_PARTITIONS, 24)  # 24 reserved bits
+        if fields:
+            filter_value, company, reference, _ = fields
+            sscc = reference[0] + company + reference[1:]  # extension digit goes first
+            return {
+                "scheme": "sscc-96",
+                "filter": filter_value,
+                "company_prefix": company,
+                "serial_reference": reference,
+                "sscc": sscc + str(gtin_check_digit(sscc)),
+                "uri": f"urn:epc:id:sscc:{company}.{reference}",
+            }
+    elif header == GRAI96_HEADER:
+        fields = _fields(value, GRAI_PARTITIONS, 38)
+        if fields:
+            filter_value, company, asset_type, serial = fields
+            grai = "0" + company + asset_type
+            return {
+                "scheme": "grai-96",
+                "filter": filter_value,
+                "company_prefix": company,
+                "asset_type": asset_type,
+                "serial": serial,
+                "grai": grai + str(gtin_check_digit(grai)) + str(serial),
+                "uri": f"urn:epc:id:grai:{company}.{asset_type}.{serial}",
+            }
+    return RAW
+
+
+class EpcDecoder:
+    """
+    Memoized decode_epc_bytes(). Decoded dicts are shared between callers: treat them as read-only.
+    """
+
+    def __init__(self, max_cached: int = 65536):
+        """
+        :param max_cached: Distinct EPCs kept in the LRU
+        """
+        self.max_cached = max_cached
+        self._decode = lru_cache(maxsize=max_cached)(decode_epc_bytes)
+
+    def decode(self, epc_hex: Optional[str]) -> dict:
+        try:
+            return self._decode(bytes.fromhex(epc_hex))
+        except (TypeError, ValueError):
+            return RAW
+
+    def decode_many(self, epcs: Iterable[str]) -> list[dict]:
+        """
+        Bulk path (history queries): every distinct EPC of the batch goes through
+        the LRU once, repeats are served from a local dict.
+        """
+        seen = {}
+        decoded = []
+        for epc in epcs:
+            fields = seen.get(epc)
+            if fields is None:
+                fields = seen[epc] = self.decode(epc)
+            decoded.append(fields)
+        return decoded
+
+    def stats(self) -> dict:
+        info = self._decode.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "cached": info.currsize, "max_cached": self.max_cached}
+
+    def clear(self):
+        self._decode.cache_clear()
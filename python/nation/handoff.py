@@ -0,0 +1,232 @@
+"""
+Hàng đợi trung chuyển tag giữa luồng đọc UART và các luồng xử lý.
+
+The UART reader thread must never run user code: a slow tag callback (logging,
+list maintenance, websocket emit) would stall the next serial read and let the
+OS buffer overflow. The reader only put()s parsed tags here; consumer workers
+take them off in batches and run the callback.
+
+The queue is a collections.deque, whose append/popleft are atomic under the
+GIL, so the producer never takes a lock on the hot path (only BLOCK mode waits).
+Counters are each written by a single side, so reading them needs no lock either.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # keep the freshest reads (default)
+OVERFLOW_DROP_NEWEST = "drop_newest"  # keep what is queued, discard new reads
+OVERFLOW_BLOCK = "block"              # stall the producer until there is room
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+
+class TagHandoffQueue:
+    """
+    Bounded single-producer / multi-consumer ring queue.
+    """
+
+    def __init__(self, capacity: int = 4096, overflow: str = OVERFLOW_DROP_OLDEST):
+        """
+        :param capacity: Maximum queued items
+        :param overflow: One of OVERFLOW_POLICIES
+        """
+        if capacity < 1:
+            raise ValueError("Queue capacity must be >= 1")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected one of {OVERFLOW_POLICIES}")
+        self.capacity = capacity
+        self.overflow = overflow
+        # put() checks the length first; with drop_oldest maxlen is only a backstop
+        # (the single producer evicts before appending, so it never triggers)
+        self._items = deque(maxlen=capacity if overflow == OVERFLOW_DROP_OLDEST else None)
+        self._ready = threading.Event()
+        self._not_full = threading.Event()
+        self._consumer_lock = threading.Lock()
+
+        # Producer-owned counters
+        self.enqueued = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.blocked_seconds = 0.0
+        self.high_watermark = 0
+        # Consumer-owned counter (updated under _consumer_lock)
+        self.completed = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item, timeout: Optional[float] = None) -> bool:
+        """
+        Enqueue one item according to the overflow policy.
+        :param timeout: BLOCK mode only: give up (and count a drop) after this many seconds
+        :return: False if the item was discarded
+        """
+        items = self._items
+        depth = len(items)
+        if depth >= self.capacity:
+            if self.overflow == OVERFLOW_DROP_OLDEST:
+                # Evict here rather than through maxlen, so only a real eviction is
+                # counted: a consumer may have emptied the queue since the depth check
+                try:
+                    items.popleft()
+                    self.dropped_oldest += 1
+                except IndexError:
+                    pass
+            elif self.overflow == OVERFLOW_DROP_NEWEST:
+                self.dropped_newest += 1
+                return False
+            elif not self._wait_not_full(timeout):
+                self.dropped_newest += 1
+                return False
+        items.append(item)
+        self.enqueued += 1
+        if depth >= self.high_watermark:
+            self.high_watermark = min(depth + 1, self.capacity)
+        if not self._ready.is_set():
+            self._ready.set()
+        return True
+
+    def _wait_not_full(self, timeout: Optional[float]) -> bool:
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        try:
+            while len(self._items) >= self.capacity:
+                self._not_full.clear()
+                if len(self._items) < self.capacity:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._not_full.wait(0.1 if remaining is None else min(0.1, remaining))
+            return True
+        finally:
+            self.blocked_seconds += time.monotonic() - start
+
+    def get_batch(self, max_items: int = 64, timeout: Optional[float] = None) -> list:
+        """
+        Take up to max_items, waiting up to timeout for the first one.
+        :return: Possibly empty list
+        """
+        items = self._items
+        if not items:
+            self._ready.clear()
+            # Re-check after clearing so a put() racing with clear() is not missed
+            if not items and not self._ready.wait(timeout):
+                return []
+        batch = []
+        try:
+            while len(batch) < max_items:
+                batch.append(items.popleft())
+        except IndexError:
+            pass
+        if batch and self.overflow == OVERFLOW_BLOCK:
+            self._not_full.set()
+        return batch
+
+    def task_done(self, count: int = 1):
+        with self._consumer_lock:
+            self.completed += count
+
+    def unfinished(self) -> int:
+        """
+        Items accepted but not yet processed by a consumer (queued + in flight).
+        """
+        return self.enqueued - self.dropped_oldest - self.completed
+
+    def wait_empty(self, timeout: float = 1.0) -> bool:
+        """
+        Wait until every accepted item has been processed.
+        """
+        deadline = time.monotonic() + timeout
+        while self.unfinished() > 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def clear(self) -> int:
+        """
+        Discard everything still queued (counted as dropped_oldest).
+        """
+        discarded = 0
+        try:
+            while True:
+                self._items.popleft()
+                discarded += 1
+        except IndexError:
+            pass
+        self.dropped_oldest += discarded
+        self._not_full.set()
+        return discarded
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._items),
+            "capacity": self.capacity,
+            "overflow": self.overflow,
+            "high_watermark": self.high_watermark,
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "dropped_oldest": self.dropped_oldest,
+            "dropped_newest": self.dropped_newest,
+            "blocked_seconds": round(self.blocked_seconds, 3),
+        }
+
+
+class HandoffWorkers:
+    """
+    Consumer threads that drain a TagHandoffQueue into a handler.
+    """
+
+    def __init__(self, queue: TagHandoffQueue, handler: Callable[[object], None], workers: int = 1,
+                 batch_size: int = 64, name: str = "tag-worker"):
+        """
+        :param queue: Queue to drain
+        :param handler: Called once per item from a worker thread
+        :param workers: Number of threads (>1 gives up per-tag ordering)
+        :param batch_size: Items taken per wake-up
+        """
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.name = name
+        self.handler_errors = 0
+        self._threads: list[threading.Thread] = []
+        self._running = False
+
+    def start(self):
+        if self._threads:
+            return
+        self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 1.0):
+        self._running = False
+        self.queue._ready.set()  # wake idle workers
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout=timeout)
+        self._threads = []
+
+    def owns_current_thread(self) -> bool:
+        return threading.current_thread() in self._threads
+
+    def _run(self):
+        queue = self.queue
+        handler = self.handler
+        while self._running:
+            batch = queue.get_batch(self.batch_size, timeout=0.2)
+            for item in batch:
+                try:
+                    handler(item)
+                except Exception as e:
+                    self.handler_errors += 1
+                    print(f"⚠️ Tag handler error: {e}")
+            if batch:
+                queue.task_done(len(batch))
@@ -241,68 +241,59 @@
 # -*- coding: 2 reader -*-
 
 
-from nation import NationReader
+from reader_manager import ReaderManager
 import time, json, threading
 
-# ---------- Worker function for each UART port ----------
-def run_reader(port: str, baud: int = 115200):
-    tag_count = 0
-    unique_epcs = set()
-
-    reader = NationReader(port, baud)
-    reader.open()
-    print(f"🔧[{port}] Connecting & initializing...")
-    if not reader.Connect_Reader_And_Initialize():
-        print(f"❌[{port}] Init failed")
-        return
-
-    # --- Tag callback scoped to this reader ---
-    def on_tag_callback(tag: dict):
-        nonlocal tag_count, unique_epcs
-        epc = tag.get("epc")
-        tag_count += 1
+# ---------- Merged tag stream from every reader ----------
+_stats_lock = threading.Lock()
+tag_counts: dict = {}
+unique_epcs: dict = {}
+
+def on_tag_callback(tag: dict):
+    reader_id = tag["reader_id"]
+    epc = tag.get("epc")
+    with _stats_lock:
+        tag_counts[reader_id] = tag_counts.get(reader_id, 0) + 1
+        seen = unique_epcs.setdefault(reader_id, set())
         if epc:
-            unique_epcs.add(epc.upper())
-        payload = {
-            "epc": epc,
-            "rssi": tag.get("rssi"),
-            "antenna_id": tag.get("antenna_id"),
-            "port": port,
-            "total_detected": tag_count,
-            "unique_tags": len(unique_epcs),
-            "status": "tag_detected",
-        }
-        print(json.dumps(payload))
-        return json.dumps(payload)
-
-    # Example configuration (tuỳ chỉnh lại nếu cần)
-    reader.configure_baseband(speed=0, q_value=1, session=0, inventory_flag=0)
-    reader.configure_reader_power({1: 10, 2: 0, 3: 0, 4: 0}, persistence=True)
-
-    try:
-        reader.start_inventory_with_mode(antenna_mask=[1,2,3,4], callback=on_tag_callback)
-        while True:                
-            time.sleep(1)
-    except Exception as e:
-        print(f"⚠️[{port}] Error: {e}")
-    finally:
-        reader.stop_inventory()
-        reader.close()
-        print(f"🔌[{port}] UART closed")
+            seen.add(epc.upper())
+        total, unique = tag_counts[reader_id], len(seen)
+    payload = {
+        "epc": epc,
+        "rssi": tag.get("rssi"),
+        "antenna_id": tag.get("antenna_id"),
+        "reader_id": reader_id,
+        "total_detected": total,
+        "unique_tags": unique,
+        "status": "tag_detected",
+    }
+    print(json.dumps(payload))
+    return json.dumps(payload)
 
 # ---------- Entry point ----------
 if __name__ == "__main__":
-    ports = ["/dev/ttyUSB0"] 
-    threads = []
+    ports = ["/dev/ttyUSB0"]
+    manager = ReaderManager(on_tag=on_tag_callback)
 
     for p in ports:
-        t = threading.Thread(target=run_reader, args=(p,), daemon=True)
-        t.start()
-        threads.append(t)
-
+        try:
+            reader_id = manager.add(p, 115200)
+        except Exception as e:
+            print(f"❌[{p}] Init failed: {e}")
+            continue
+        # Example configuration (tuỳ chỉnh lại nếu cần); only differences are sent
+        manager.get(reader_id).apply_config({
+            "baseband": {"speed": 0, "q_value": 1, "session": 0, "inventory_flag": 0},
+            "antenna_powers": {1: 10, 2: 0, 3: 0, 4: 0},
+        }, persistence=True)
+
+    print(f"🚀 Starting inventory on {manager.ids()}")
+    manager.start_all([1, 2, 3, 4])
     try:
-        while True:  # Giữ chương trình chính sống để threads chạy
+        while True:  # Giữ chương trình chính sống, tag đến từ luồng của từng reader
             time.sleep(1)
     except KeyboardInterrupt:
         print("\n⛔️  Stopping all readers ...")
-        # Threads are daemons → sẽ tự kết thúc khi chương trình chính thoát
+    finally:
+        manager.stop_all()
+        manager.close_all()
@@ -3,27 +3,51 @@ import serial.tools.list_ports
 import time
 
 import threading
+import os
+import binascii
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from enum import IntEnum, unique
-from typing import Callable, Optional,Tuple
+from typing import Callable, Iterable, Optional,Tuple
 import struct
+
+from dedup import DEDUP_HARDWARE, DEDUP_HOST, DEDUP_MODES, DEDUP_OFF, TagDeduplicator
+from handoff import OVERFLOW_DROP_OLDEST, HandoffWorkers, TagHandoffQueue
+from reader_state import ReaderState
 # === Constants ===
 CRC16_CCITT_INIT = 0x0000
-CRC16_CCITT_POLY = 0x8005
+CRC16_CCITT_POLY = 0x1021
 
 
 FRAME_HEADER = 0x5A
 PROTO_TYPE = 0x00
 PROTO_VER = 0x01
+MAX_DATA_LEN = 1024  # largest DATA field the reader sends or accepts
 
 RS485_FLAG = 0x00 
 
 READER_NOTIFY_FLAG = 0x00  # Set to 0 for upper computer commands
+NOTIFY_CATEGORY = 0x02  # only tag upload / read-end frames are reader notifications
 
 
 PROTO_TYPE = 0x00
 PROTO_VER = 0x01
 
 
+def crc16_update(crc: int, data) -> int:
+    """
+    Feed more bytes into a running CRC16-CCITT (poly 0x1021, no reflection).
+    Lets callers checksum a frame in pieces without concatenating it first:
+        crc = crc16_update(CRC16_CCITT_INIT, head)
+        crc = crc16_update(crc, body)
+    :param crc: CRC value returned by the previous call (or CRC16_CCITT_INIT)
+    :param data: Any bytes-like object (bytes, bytearray, memoryview)
+    :return: Updated 16-bit CRC
+    """
+    # binascii.crc_hqx is the stdlib's 256-entry table implementation of this
+    # exact polynomial, so a frame costs one C call instead of 8 shifts per byte.
+    return binascii.crc_hqx(data, crc)
+
 
 class UARTConnection:
     def __init__(self, port: str, baudrate: int = 115200, timeout: float = 0.5):
@@ -37,7 +61,8 @@ class UARTConnection:
         self.baudrate = baudrate
         self.timeout = timeout
         self.ser = None
-        self.lock = threading.Lock()
+        self.lock = threading.Lock()        # serialises writes
+        self.read_lock = threading.Lock()   # serialises reads, independent of writes
         self._inventory_running = False
         self._inventory_thread = None
         
@@ -95,9 +120,33 @@ class UARTConnection:
         """
         if not self.ser or not self.ser.is_open:
             raise RuntimeError("❌ UART port is not open")
-        with self.lock:
+        with self.read_lock:
             data = self.ser.read(size)
         return data
+
+    def receive_available(self, max_size: int = 4096) -> bytes:
+        """
+        Block until at least one byte arrives (or the read timeout expires),
+        then return everything already waiting, up to max_size bytes.
+        Unlike receive(), a short frame is returned as soon as it lands instead
+        of waiting for the timeout to fill a fixed-size read.
+        """
+        if not self.ser or not self.ser.is_open:
+            raise RuntimeError("❌ UART port is not open")
+        with self.read_lock:
+            data = self.ser.read(1)
+            if data:
+                waiting = self.ser.in_waiting
+                if waiting:
+                    data += self.ser.read(min(waiting, max_size - 1))
+        return data
+
+    def cancel_read(self):
+        """
+        Wake up a thread blocked in receive()/receive_available().
+        """
+        if self.ser and hasattr(self.ser, 'cancel_read'):
+            self.ser.cancel_read()
     
     
     def send_raw_bytes(self, frame: bytes):
@@ -118,6 +167,202 @@ class UARTConnection:
         return self.ser.is_open if self.ser else False
 
 
+class FrameDecoder:
+    """
+    Stateful decoder for the reader's byte stream (0x5A | PCW | [ADDR] | LEN | DATA | CRC).
+    Bytes are copied once into a preallocated bytearray; complete frames are
+    handed out as memoryview slices of that buffer, so no per-frame copy is made.
+    A yielded view is only valid until the next feed()/reset() call.
+    """
+
+    HEADER_LEN = 7  # 0x5A + PCW(4) + LEN(2), without the optional RS485 address
+
+    def __init__(self, capacity: int = 4096):
+        """
+        :param capacity: Buffer size in bytes; frames declaring a larger length are treated as garbage
+        """
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0  # resync position: first byte not yet consumed
+        self._end = 0    # write position
+        self.frames_decoded = 0
+        self.crc_errors = 0
+        self.garbage_bytes = 0  # bytes skipped while hunting for a valid frame
+        self.dropped_bytes = 0  # bytes discarded because the buffer overflowed
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def reset(self):
+        """Discard any buffered bytes (counters are kept)."""
+        self._start = self._end = 0
+
+    def feed(self, data) -> int:
+        """
+        Append received bytes to the buffer.
+        :param data: bytes-like chunk read from the UART
+        :return: Number of buffered bytes after the append
+        """
+        n = len(data)
+        if not n:
+            return self._end - self._start
+        buf = self._buf
+        if self._end + n > self.capacity:
+            live = self._end - self._start
+            if live + n > self.capacity:
+                # Overflow: keep the newest bytes, the oldest ones are lost
+                excess = live + n - self.capacity
+                if excess >= live:
+                    self.dropped_bytes += excess
+                    data = memoryview(data)[excess - live:]
+                    n = len(data)
+                    live = 0
+                    self._start = self._end
+                else:
+                    self.dropped_bytes += excess
+                    self._start += excess
+                    live -= excess
+            # Same-length slice assignment never resizes, so outstanding views stay legal
+            buf[0:live] = buf[self._start:self._end]
+            self._start, self._end = 0, live
+        buf[self._end:self._end + n] = data
+        self._end += n
+        return self._end - self._start
+
+    def frames(self):
+        """
+        Yield every complete, CRC-valid frame currently buffered as a memoryview.
+        Bytes that cannot start a valid frame are skipped one at a time, so a
+        corrupted length field costs a single byte of resync, not a whole frame.
+        A 0x5A whose PCW type/version or length is impossible is rejected before
+        waiting for its body, so a stray header byte cannot hold back the frames behind it.
+        """
+        buf = self._buf
+        view = self._view
+        crc_hqx = binascii.crc_hqx
+        while True:
+            start, end = self._start, self._end
+            idx = buf.find(FRAME_HEADER, start, end)
+            if idx < 0:
+                self.garbage_bytes += end - start
+                self._start = self._end = 0
+                return
+            if idx > start:
+                self.garbage_bytes += idx - start
+                self._start = idx
+            if end - idx < self.HEADER_LEN:
+                return
+            if buf[idx + 1] != PROTO_TYPE or buf[idx + 2] != PROTO_VER:
+                self.garbage_bytes += 1
+                self._start = idx + 1
+                continue
+            # PCW bit 13 (RS485 flag) lives in bit 5 of the third PCW byte
+            addr_len = (buf[idx + 3] >> 5) & 0x01
+            len_pos = idx + 5 + addr_len
+            if end - idx < self.HEADER_LEN + addr_len:
+                return
+            data_len = (buf[len_pos] << 8) | buf[len_pos + 1]
+            full_len = self.HEADER_LEN + addr_len + data_len + 2
+            if data_len > MAX_DATA_LEN or full_len > self.capacity:
+                self.garbage_bytes += 1
+                self._start = idx + 1
+                continue
+            if end - idx < full_len:
+                return
+            crc_pos = idx + full_len - 2
+            if crc_hqx(view[idx + 1:crc_pos], CRC16_CCITT_INIT) != ((buf[crc_pos] << 8) | buf[crc_pos + 1]):
+                self.crc_errors += 1
+                self.garbage_bytes += 1
+                self._start = idx + 1
+                continue
+            self._start = idx + full_len
+            self.frames_decoded += 1
+            yield view[idx:idx + full_len]
+
+    def stats(self) -> dict:
+        return {
+            "buffered_bytes": self._end - self._start,
+            "frames_decoded": self.frames_decoded,
+            "crc_errors": self.crc_errors,
+            "garbage_bytes": self.garbage_bytes,
+            "dropped_bytes": self.dropped_bytes,
+        }
+
+
+class CommandStats:
+    """
+    Per-MID command latency, measured from send to the routed response.
+    wire_ms is what the request + response bytes alone take at the baud rate,
+    so latency - wire_ms is what the reader and this driver add on top.
+    """
+
+    def __init__(self, baudrate: int, samples: int = 256):
+        self.byte_time = 10 / baudrate if baudrate else 0.0  # 8N1 = 10 bits per byte
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._by_mid: dict[int, dict] = {}
+
+    def _entry(self, mid: int) -> dict:
+        entry = self._by_mid.get(mid)
+        if entry is None:
+            entry = self._by_mid[mid] = {"count": 0, "timeouts": 0, "errors": 0, "total": 0.0,
+                                         "min": None, "max": 0.0, "last": None, "wire": 0.0,
+                                         "recent": deque(maxlen=self.samples)}
+        return entry
+
+    def record(self, mid: int, latency: float, tx_bytes: int, rx_bytes: int, error: bool = False):
+        with self._lock:
+            e = self._entry(mid)
+            e["count"] += 1
+            e["errors"] += error
+            e["total"] += latency
+            e["last"] = latency
+            e["max"] = max(e["max"], latency)
+            e["min"] = latency if e["min"] is None else min(e["min"], latency)
+            e["wire"] = (tx_bytes + rx_bytes) * self.byte_time
+            e["recent"].append(latency)
+
+    def record_timeout(self, mid: int):
+        with self._lock:
+            self._entry(mid)["timeouts"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._by_mid.clear()
+
+    def snapshot(self) -> dict:
+        """
+        :return: {"0x0202": {name, count, timeouts, errors, mean_ms, p50_ms, p99_ms, min_ms, max_ms, last_ms, wire_ms}}
+        """
+        def ms(value):
+            return round(value * 1000, 3) if value is not None else None
+
+        with self._lock:
+            items = [(mid, dict(e, recent=sorted(e["recent"]))) for mid, e in self._by_mid.items()]
+        result = {}
+        for mid, e in sorted(items):
+            recent = e["recent"]
+            try:
+                name = MID(mid).name
+            except ValueError:
+                name = None
+            result[f"0x{mid:04X}"] = {
+                "name": name,
+                "count": e["count"],
+                "timeouts": e["timeouts"],
+                "errors": e["errors"],
+                "mean_ms": ms(e["total"] / e["count"]) if e["count"] else None,
+                "p50_ms": ms(recent[len(recent) // 2]) if recent else None,
+                "p99_ms": ms(recent[min(len(recent) - 1, int(len(recent) * 0.99))]) if recent else None,
+                "min_ms": ms(e["min"]),
+                "max_ms": ms(e["max"]) if e["count"] else None,
+                "last_ms": ms(e["last"]),
+                "wire_ms": ms(e["wire"]) if e["count"] else None,
+            }
+        return result
+
+
 class MID(IntEnum):
     # Reader Configuration
     QUERY_INFO = 0x0100
@@ -137,14 +382,19 @@ class MID(IntEnum):
     # RFID Baseband
     CONFIG_BASEBAND = 0x020B
     QUERY_BASEBAND = 0x020C
+    # RF band
+    CONFIG_RF_BAND = 0x0203
+    QUERY_RF_BAND = 0x0204
     
     
     #Session Management
     SESSION = 0x03
+    # Antenna enable mask (reader configuration category)
+    QUERY_ANT_MASK = 0x0102
+    CONFIG_ANT_MASK = 0x0103
     # Power Control
     CONFIGURE_READER_POWER = 0x0201
     QUERY_READER_POWER = 0x0202
-    SET_READER_POWER_CALIBRATION = 0x0103
     # RFID Capability
     # QUERY_RFID_ABILITY = (0x05 << 8) | 0x00
     
@@ -158,13 +408,31 @@ class NationReader:
     # DEFAULT_BAUDRATE = 115200
     DEFAULT_TIMEOUT = 0.5
 
+    RF_BAND_CODES = {
+        0: "CN 920–925 MHz",
+        1: "CN 840–845 MHz",
+        2: "CN Dual-band 840–845 + 920–925 MHz",
+        3: "FCC 902–928 MHz",
+        4: "ETSI 866–868 MHz",
+        5: "JP 916.8–920.4 MHz",
+        6: "TW 922.25–927.75 MHz",
+        7: "ID 923.125–925.125 MHz",
+        8: "RUS 866.6–867.4 MHz"
+    }
+
     @classmethod
     def set_uart_defaults(cls, port: str, baudrate: int, timeout: float = 0.5):
         cls.DEFAULT_PORT = port
         cls.DEFAULT_BAUDRATE = baudrate
         cls.DEFAULT_TIMEOUT = timeout
 
-    def __init__(self, port, baudrate,timeout=None):
+    def __init__(self, port, baudrate,timeout=None, tag_queue_size: int = 4096,
+                 tag_overflow: str = OVERFLOW_DROP_OLDEST, tag_workers: int = 1):
+        """
+        :param tag_queue_size: Tags buffered between the UART thread and the callback workers
+        :param tag_overflow: "drop_oldest" | "drop_newest" | "block" when that buffer is full
+        :param tag_workers: Threads running the tag callback (>1 gives up per-tag ordering)
+        """
         self.port = port or NationReader.DEFAULT_PORT
         self.baudrate = baudrate or NationReader.DEFAULT_BAUDRATE
         self.timeout = timeout or NationReader.DEFAULT_TIMEOUT
@@ -173,36 +441,366 @@ class NationReader:
         # Init in constructor
         self._ext_ant_masks: dict[int, int] = {i: 0 for i in range(1, 33)}  # Main Ant 1–32
         self.antenna_mask = 0x00000001  # Default to Main Antenna 1 
+        self.decoder = FrameDecoder()
+
+        # Inventory state (tags are delivered by the UART reader thread)
+        self._inventory_running = False
+        self._inventory_thread = None
+        self._on_tag = None
+        self._on_inventory_end = None
+        self._inventory_ended = threading.Event()
+        self._dedup: Optional[TagDeduplicator] = None
+
+        # The UART thread only enqueues tags; callbacks run on these workers
+        self.tag_queue = TagHandoffQueue(tag_queue_size, tag_overflow)
+        self._tag_workers = HandoffWorkers(self.tag_queue, self._deliver_tag, workers=tag_workers,
+                                           name=f"nation-tag-{self.port}")
+
+        # Response demultiplexer: (category, mid) -> FIFO of waiting futures
+        self._pending: dict[tuple[int, int], deque] = {}
+        self._pending_lock = threading.Lock()
+        self.latency = CommandStats(self.baudrate)
+        # Last known configuration, so reads do not have to stop a running inventory
+        self.state = ReaderState()
+        self._rx_thread = None
+        self._rx_running = False
+        # Set when the UART disappears (USB unplug); on_link_lost(reader) is called once
+        self.link_lost = False
+        self.on_link_lost: Optional[Callable[["NationReader"], None]] = None
 
 
     def open(self):
+        self.state.invalidate()  # whatever was cached may have changed while disconnected
         self.uart.open()
+        self.link_lost = False
+        self._tag_workers.start()
+        self._start_rx_thread()
 
     def close(self):
-        self.uart.flush_input()
+        self._stop_rx_thread()
+        self._tag_workers.stop()
         self.uart.close()
+        self.state.invalidate()
+
+    def reopen(self, port: Optional[str] = None, baudrate: Optional[int] = None):
+        """
+        Close and open again, optionally on another port (a USB reader that
+        came back under a different device name).
+        """
+        self.close()
+        if port:
+            self.port = self.uart.port_name = port
+        if baudrate:
+            self.baudrate = self.uart.baudrate = baudrate
+            self.latency = CommandStats(self.baudrate)
+        self.open()
+
+    def is_connected(self) -> bool:
+        return self.uart.is_open() and not self.link_lost
 
     def send(self, data: bytes):
         self.uart.send(data)
 
     def receive(self, size: int) -> bytes:
         return self.uart.receive(size)
-    
 
-    
-  
+    ################################################################################
+    #                            UART READER THREAD                                #
+    ################################################################################
+    def _start_rx_thread(self):
+        if self._rx_thread and self._rx_thread.is_alive():
+            return
+        self.decoder.reset()
+        self._rx_running = True
+        self._rx_thread = threading.Thread(target=self._rx_loop, name=f"nation-rx-{self.port}", daemon=True)
+        self._rx_thread.start()
+
+    def _stop_rx_thread(self):
+        self._rx_running = False
+        self.uart.cancel_read()
+        if self._rx_thread and self._rx_thread.is_alive() and self._rx_thread is not threading.current_thread():
+            self._rx_thread.join(timeout=1)
+        self._rx_thread = None
+        self._fail_pending(ConnectionError("UART reader stopped"))
+
+    def _rx_loop(self):
+        """
+        Single owner of the UART input: decodes every frame and routes it to
+        the future waiting for that (category, MID) or to the tag stream.
+        """
+        decoder = self.decoder
+        errors = 0
+        while self._rx_running:
+            try:
+                raw = self.uart.receive_available(4096)
+            except Exception as e:
+                if self._rx_running:
+                    errors += 1
+                    print(f"⚠️ UART read error: {e}")
+                    # A vanished device node or repeated errors means the reader is gone
+                    if errors >= 3 or (self.port.startswith("/dev/") and not os.path.exists(self.port)):
+                        self._link_lost(e)
+                        return
+                    time.sleep(0.1)
+                continue
+            errors = 0
+            if not raw:
+                continue
+
+            decoder.feed(raw)
+            for frame in decoder.frames():
+                try:
+                    self._dispatch_frame(self.parse_frame(frame, check_crc=False))
+                except Exception as e:
+                    print(f"⚠️ Frame dispatch error: {e}")
+
+    def _link_lost(self, error: Exception):
+        """
+        Runs on the UART thread: give up the port and notify the owner.
+        """
+        print(f"❌ UART link lost on {self.port}: {error}")
+        self.link_lost = True
+        self._rx_running = False
+        self._inventory_running = False
+        self._fail_pending(ConnectionError(f"UART link lost: {error}"))
+        try:
+            self.uart.close()
+        except Exception:
+            pass
+        callback = self.on_link_lost
+        if callback:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"⚠️ Link-lost callback error: {e}")
+
+    def _dispatch_frame(self, parsed: dict):
+        cat = parsed["category"]
+        mid = parsed["mid"]
+
+        if parsed["notify"]:
+            if mid == 0x00:
+                self._handle_tag_frame(parsed)
+            elif mid in self.all_read_end_mids():
+                self._handle_read_end(parsed)
+            return
+
+        # Frames handed to another thread must not alias the decoder buffer
+        parsed["data"] = bytes(parsed["data"])
+        parsed["raw"] = bytes(parsed["raw"])
+
+        future = self._pop_pending((cat, mid))
+        if future is None and mid == 0x00:
+            if cat == 0x02:
+                # Tag upload from a reader that does not set the notify flag
+                self._handle_tag_frame(parsed)
+                return
+            # Illegal-instruction/error reply: belongs to the oldest outstanding command
+            future = self._pop_pending(None)
+        if future is None:
+            print(f"🔍 Unsolicited frame CAT=0x{cat:02X} MID=0x{mid:02X}, Data={parsed['data'].hex()}")
+            return
+        future.resolved = time.monotonic()
+        future.set_result(parsed)
+
+    def _handle_tag_frame(self, parsed: dict):
+        if not self._inventory_running or not self._on_tag:
+            return
+        tag = self.parse_epc(parsed["data"])
+        if "error" in tag:
+            return
+        self.tag_queue.put(tag, timeout=1.0)
+
+    def _deliver_tag(self, tag: dict):
+        # Runs on a tag worker thread, never on the UART thread
+        callback = self._on_tag
+        if callback:
+            callback(tag)
+
+    def _drain_tags(self, timeout: float = 0.5):
+        """
+        Let the workers finish tags read before the stop, then close the dedup stage.
+        """
+        # A callback that stops inventory cannot wait for its own batch to finish
+        if self._tag_workers.owns_current_thread():
+            timeout = 0
+        if not self.tag_queue.wait_empty(timeout):
+            print(f"⚠️ Discarding {self.tag_queue.clear()} undelivered tags")
+        self._close_dedup()
+
+    def inventory_stats(self) -> dict:
+        """
+        Tag pipeline counters: handoff queue depth/drops, decoder and dedup stats.
+        """
+        return {
+            "running": self._inventory_running,
+            "tag_queue": self.tag_queue.stats(),
+            "handler_errors": self._tag_workers.handler_errors,
+            "decoder": self.decoder.stats(),
+            "dedup": self._dedup.stats() if self._dedup else None,
+        }
+
+    def _handle_read_end(self, parsed: dict):
+        data = parsed["data"]
+        reason = data[0] if data else None
+        print(f"✅ Inventory ended. Reason: {reason}")
+        self._inventory_running = False
+        self._inventory_ended.set()
+        if self._on_inventory_end:
+            try:
+                self._on_inventory_end(reason)
+            except Exception as e:
+                print(f"⚠️ Inventory end callback error: {e}")
+
+    def _expect(self, mid: int, timeout: float = 1.0) -> Future:
+        """
+        Register interest in the next response for a 16-bit MID (category << 8 | mid).
+        Must be called before the command is sent so a fast reply is never missed.
+        """
+        mid_value = getattr(mid, 'value', mid)
+        key = ((mid_value >> 8) & 0xFF, mid_value & 0xFF)
+        future = Future()
+        future.key = key
+        future.created = time.monotonic()
+        future.deadline = future.created + timeout
+        with self._pending_lock:
+            self._pending.setdefault(key, deque()).append(future)
+        return future
+
+    def _pop_pending(self, key) -> Optional[Future]:
+        """
+        Take the oldest future waiting on key, or the oldest future overall when key is None.
+        """
+        with self._pending_lock:
+            if key is None:
+                candidates = [q[0] for q in self._pending.values() if q]
+                if not candidates:
+                    return None
+                key = min(candidates, key=lambda f: f.created).key
+            queue = self._pending.get(key)
+            if not queue:
+                return None
+            future = queue.popleft()
+            if not queue:
+                del self._pending[key]
+            return future
+
+    def _discard_pending(self, future: Future):
+        with self._pending_lock:
+            queue = self._pending.get(future.key)
+            if queue and future in queue:
+                queue.remove(future)
+                if not queue:
+                    del self._pending[future.key]
+
+    def _fail_pending(self, exc: Exception):
+        with self._pending_lock:
+            futures = [f for q in self._pending.values() for f in q]
+            self._pending.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(exc)
+
+    def submit(self, mid, payload: bytes = b'', timeout: float = 1.0, expect=None) -> Future:
+        """
+        Send a command without waiting for its response.
+        Several commands can be submitted back-to-back; each response is
+        correlated by category+MID (FIFO for repeated MIDs) and resolves its
+        own future, so a batch costs one round-trip instead of one per command.
+        :param mid: 16-bit MID (category << 8 | mid) of the command
+        :param payload: Command payload
+        :param timeout: Per-command deadline in seconds, enforced by wait()/wait_all()
+        :param expect: Response MID if it differs from the command MID
+        :return: Future resolving to the parsed response frame (an error reply has mid == 0x00)
+        """
+        future = self._expect(expect if expect is not None else mid, timeout)
+        future.mid = getattr(mid, 'value', mid)
+        frame = self.build_frame(mid, payload=payload, rs485=self.rs485)
+        future.tx_bytes = len(frame)
+        try:
+            future.created = time.monotonic()  # latency counts from the write, not the registration
+            self.send(frame)
+        except Exception as e:
+            self._discard_pending(future)
+            future.set_exception(e)
+        return future
+
+    def wait(self, future: Future) -> dict:
+        """
+        Block until a submitted command completes or its deadline passes.
+        :raises TimeoutError: If the response did not arrive before the deadline
+        """
+        try:
+            parsed = future.result(timeout=max(0.0, future.deadline - time.monotonic()))
+        except FutureTimeoutError:
+            self._discard_pending(future)
+            if not future.done():
+                self.latency.record_timeout(future.mid)
+                raise TimeoutError(f"No response for MID=0x{future.mid:04X} within deadline")
+            parsed = future.result()  # resolved while we were giving up
+        self._record_latency(future, parsed)
+        return parsed
+
+    def _record_latency(self, future: Future, parsed: dict):
+        resolved = getattr(future, 'resolved', None)
+        if resolved is None or getattr(future, 'recorded', False):
+            return
+        future.recorded = True
+        self.latency.record(future.mid, resolved - future.created, future.tx_bytes, len(parsed["raw"]),
+                            error=parsed["mid"] == 0x00 and (future.mid & 0xFF) != 0x00)
+
+    def command_stats(self) -> dict:
+        """
+        Measured latency per command MID (see CommandStats.snapshot).
+        """
+        return self.latency.snapshot()
+
+    def reset_command_stats(self):
+        self.latency.reset()
+
+    def wait_all(self, futures: list) -> list:
+        """
+        Wait for every submitted future, each against its own deadline.
+        :return: One entry per future: the parsed response, or the exception it failed with
+        """
+        results = []
+        for future in futures:
+            try:
+                results.append(self.wait(future))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _command(self, mid, payload: bytes = b'', timeout: float = 1.0, expect=None) -> dict:
+        """
+        Send a command frame and block until its response is routed back.
+        :param mid: 16-bit MID (category << 8 | mid) of the command
+        :param payload: Command payload
+        :param timeout: Seconds to wait for the response
+        :param expect: Response MID if it differs from the command MID
+        :return: Parsed response frame (an error reply has mid == 0x00)
+        :raises TimeoutError: If no response arrives in time
+        """
+        return self.wait(self.submit(mid, payload, timeout=timeout, expect=expect))
+
     @staticmethod
-    def crc16_ccitt(data: bytes) -> int:
-        crc = 0x0000
-        
-        for byte in data:
-            crc ^= byte << 8
-            for _ in range(8):
-                if crc & 0x8000:
-                    crc = ((crc << 1) ^ 0x1021) & 0xFFFF
-                else:
-                    crc = (crc << 1) & 0xFFFF
-        return crc
+    def crc16_ccitt(data: bytes, crc: int = CRC16_CCITT_INIT) -> int:
+        return crc16_update(crc, data)
+
+    @staticmethod
+    def validate_frames(frames: Iterable[bytes]) -> list[bool]:
+        """
+        Check the CRC of many complete frames in one call.
+        Each frame is header + content + CRC (2 bytes, big-endian); the CRC
+        covers everything between the header and the CRC itself.
+        :param frames: Iterable of raw frames (bytes or memoryview)
+        :return: One boolean per frame, True when the CRC matches
+        """
+        crc_hqx = binascii.crc_hqx
+        return [
+            len(frame) >= 9 and crc_hqx(frame[1:-2], CRC16_CCITT_INIT) == (frame[-2] << 8 | frame[-1])
+            for frame in frames
+        ]
 
 
     @classmethod
@@ -236,11 +834,12 @@ class NationReader:
         return pcw
 
     @classmethod
-    def parse_frame(cls, raw: bytes) -> dict:
+    def parse_frame(cls, raw: bytes, check_crc: bool = True) -> dict:
         """
         Parses a received frame from the RFID reader.
         Validates CRC and extracts PCW fields and data.
-        :param raw: Full raw frame bytes including header
+        :param raw: Full raw frame bytes including header (bytes or memoryview)
+        :param check_crc: Set False for frames already validated by FrameDecoder
         :return: Parsed dictionary or raises ValueError
         """
         if len(raw) < 9:
@@ -259,9 +858,11 @@ class NationReader:
         proto_type = (pcw >> 24) & 0xFF
         proto_ver = (pcw >> 16) & 0xFF
         rs485_flag = (pcw >> 13) & 0x01
-        notify_flag = (pcw >> 12) & 0x01
         category = (pcw >> 8) & 0xFF
         mid = pcw & 0xFF
+        # Bit 12 is the notify flag but also part of category 0x10 (e.g. MID 0x1000, RFID ability):
+        # it only means "notification" on category 0x02 frames
+        notify_flag = (pcw >> 12) & 0x01 if (category & ~0x10) == NOTIFY_CATEGORY else 0
 
         response_type = "notification" if notify_flag else "response"
 
@@ -285,10 +886,11 @@ class NationReader:
 
         # === CRC ===
         received_crc = int.from_bytes(raw[offset:offset+2], 'big')
-        calculated_crc = cls.crc16_ccitt(raw[1:offset])  # exclude frame header
+        if check_crc:
+            calculated_crc = cls.crc16_ccitt(raw[1:offset])  # exclude frame header
 
-        if received_crc != calculated_crc:
-            raise ValueError(f"CRC mismatch! Got 0x{received_crc:04X}, expected 0x{calculated_crc:04X}")
+            if received_crc != calculated_crc:
+                raise ValueError(f"CRC mismatch! Got 0x{received_crc:04X}, expected 0x{calculated_crc:04X}")
 
         return {
             "valid": True,
@@ -315,55 +917,20 @@ class NationReader:
         - Length field (2 bytes)
         - CRC16-CCITT check
         """
-        frames = []
-        i = 0
-        while i < len(data):
-            if data[i] != 0x5A:
-                i += 1
-                continue
-
-            # Minimum valid length
-            if i + 9 > len(data):
-                break
-
-            length = int.from_bytes(data[i+5:i+7], 'big')
-            addr_len = 1 if self.rs485 else 0
-            full_len = 1 + 4 + addr_len + 2 + length + 2
-
-            if i + full_len > len(data):
-                break
-
-            frame = data[i:i + full_len]
-            crc_calc = self.crc16_ccitt(frame[1:-2])
-            crc_recv = int.from_bytes(frame[-2:], 'big')
-
-            if crc_calc == crc_recv:
-                frames.append(frame)
-            else:
-                print(f"⚠️ CRC mismatch at index {i}: expected={hex(crc_calc)}, got={hex(crc_recv)}")
-
-            i += full_len
-
-        return frames
+        decoder = FrameDecoder(capacity=max(len(data), FrameDecoder.HEADER_LEN))
+        decoder.feed(data)
+        return [bytes(frame) for frame in decoder.frames()]
 
 
     def Connect_Reader_And_Initialize(self) -> bool:
         try:
-            self.uart.flush_input()
-
             print("🚀 Sending STOP command to ensure Idle state...")
-            stop_frame = self.build_frame(MID.STOP_INVENTORY, payload=b'')
-            self.uart.send(stop_frame)
-
-            time.sleep(0.1)
-            raw = self.uart.receive(64)
-
-      
-            if not raw:
+            try:
+                frame = self._command(MID.STOP_INVENTORY)
+            except TimeoutError:
                 print("❌ No response received.")
                 return False
 
-            frame = self.parse_frame(raw)
             print(f"🔍 MID: {frame['mid']}, Data: {frame['data'].hex()}")
 
             if frame["mid"] in [0x01, MID.STOP_INVENTORY & 0xFF] and frame["data"][0] == 0x00:
@@ -384,64 +951,51 @@ class NationReader:
         Corrects for real-world byte order (MAX first, MIN second).
         """
         try:
-            self.uart.flush_input()
-            frame = self.build_frame(mid=0x1000, payload=b'', rs485=self.rs485)
-            self.uart.send(frame)
-
-            time.sleep(0.1)
-            raw = self.uart.receive(128)
-            if not raw:
+            try:
+                resp = self._command(0x1000)
+            except TimeoutError:
                 raise Exception("❌ No response from reader.")
 
-            frames = self.extract_valid_frames(raw)
-            print(f"📦 Raw frames count: {len(frames)}")
+            mid = resp["mid"]
+            cat = resp["category"]
+            print(f"🔎 MID: {mid:02X}, CAT: {cat:02X}")
+            if cat != 0x10 or mid != 0x00:
+                raise Exception("❌ No matching response frame for RFID ability.")
 
-            for idx, frame in enumerate(frames):
-                print(f"📦 Frame[{idx}]: {frame.hex()}")
-                pcw = int.from_bytes(frame[1:5], 'big')
-                mid = pcw & 0xFF
-                cat = (pcw >> 8) & 0xFF
-                print(f"🔎 MID: {mid:02X}, CAT: {cat:02X}")
-                if cat != 0x10 or mid != 0x00:
-                    continue
+            payload = resp["data"]
+            print(f"🔍 Payload Bytes: {payload.hex()}")
 
-                offset = 8 if self.rs485 else 7
-                payload = frame[offset:-2]
-                print(f"🔍 Payload Bytes: {payload.hex()}")
+            if len(payload) < 3:
+                raise Exception("❌ Payload too short.")
 
-                if len(payload) < 3:
-                    raise Exception("❌ Payload too short.")
-
-                
-                max_power = payload[0]
-                min_power = payload[1]
-                antenna_count = payload[2]
+            
+            max_power = payload[0]
+            min_power = payload[1]
+            antenna_count = payload[2]
 
 
-                freq_list = []
-                protocols = []
+            freq_list = []
+            protocols = []
 
-                try:
-                    freq_list_len = payload[3]
-                    freq_list = list(payload[4:4 + freq_list_len])
-                    print(f"📡 Frequency List Length: {freq_list_len}, Data: {freq_list}")
+            try:
+                freq_list_len = payload[3]
+                freq_list = list(payload[4:4 + freq_list_len])
+                print(f"📡 Frequency List Length: {freq_list_len}, Data: {freq_list}")
 
-                    protocol_offset = 4 + freq_list_len
-                    protocol_list_len = payload[protocol_offset]
-                    protocols = list(payload[protocol_offset + 1 : protocol_offset + 1 + protocol_list_len])
-                    print(f"📚 Protocol List Length: {protocol_list_len}, Data: {protocols}")
-                except IndexError:
-                    print("ℹ️ Reader reports no frequencies or protocols.")
+                protocol_offset = 4 + freq_list_len
+                protocol_list_len = payload[protocol_offset]
+                protocols = list(payload[protocol_offset + 1 : protocol_offset + 1 + protocol_list_len])
+                print(f"📚 Protocol List Length: {protocol_list_len}, Data: {protocols}")
+            except IndexError:
+                print("ℹ️ Reader reports no frequencies or protocols.")
 
-                return {
-                    "min_power_dbm": min_power,
-                    "max_power_dbm": max_power,
-                    "antenna_count": antenna_count,
-                    "frequencies": freq_list,
-                    "rfid_protocols": protocols
-                }
-
-            raise Exception("❌ No matching response frame for RFID ability.")
+            return {
+                "min_power_dbm": min_power,
+                "max_power_dbm": max_power,
+                "antenna_count": antenna_count,
+                "frequencies": freq_list,
+                "rfid_protocols": protocols
+            }
 
         except Exception as e:
             print(f"❌ Error in query_rfid_ability: {e}")
@@ -453,19 +1007,12 @@ class NationReader:
         Sends MID=0x00 Category=0x01 'Query Reader Information' and parses the response.
         """
         try:
-            self.uart.flush_input()
-
-            frame = self.build_frame(MID.QUERY_INFO, payload=b'')
-            self.uart.send(frame)
-
-            time.sleep(0.1)
-            raw = self.uart.receive(128)
-            if not raw:
+            try:
+                frame_data = self._command(MID.QUERY_INFO)
+            except TimeoutError:
                 print("❌ No response received.")
                 return {}
 
-            frame_data = self.parse_frame(raw)
-
             if frame_data['mid'] != 0x00 or frame_data['category'] != 0x01:
                 print("❌ Unexpected MID or Category.")
                 return {}
@@ -595,29 +1142,28 @@ class NationReader:
             return {"error": f"Parse error: {e}"}
 
     #✅
-    def query_reader_power(self) -> dict[int, int]:
+    def query_reader_power(self, use_cache: bool = False) -> dict[int, int]:
         """
         Queries the current transmit power settings for all antenna ports.
 
+        :param use_cache: Answer from the cached reader state when known (no STOP, no round-trip)
         :return: A dictionary where keys are antenna IDs (1-64)
                  and values are power levels in dBm, or an empty dict on failure.
         """
+        if use_cache:
+            cached = self.state.get("antenna_powers")
+            if cached is not None:
+                return cached
         try:
             self.stop_inventory()
             print("🚀 Sending Query Reader Power command...")
             # Use the consistent MID value for querying RFID powers
-            command_frame = self.build_frame(MID.QUERY_READER_POWER, payload=b'', rs485=self.rs485)
-            self.uart.flush_input()
-            self.uart.send(command_frame)
-
-            time.sleep(0.1) # Give reader time to respond
-            raw = self.uart.receive(128) # Receive enough bytes for multiple antenna responses
-
-            if not raw:
+            try:
+                frame = self._command(MID.QUERY_READER_POWER)
+            except TimeoutError:
                 print("❌ No response received from reader.")
                 return {}
 
-            frame = self.parse_frame(raw)
             if not frame:
                 print("❌ Failed to parse response frame.")
                 return {}
@@ -629,13 +1175,8 @@ class NationReader:
 
             # Expected response MID is 0x02 (from QUERY_READER_POWER) [19]
             if mid == (MID.QUERY_READER_POWER & 0xFF):
-                power_settings = {}
-                offset = 0
-                while offset + 2 <= len(data): # Each power entry is 2 bytes (PID + Value)
-                    ant_id = data[offset] # PID is antenna ID [19]
-                    power_dbm = data[offset + 1] # Value is power in dBm [19]
-                    power_settings[ant_id] = power_dbm
-                    offset += 2
+                power_settings = self.parse_power_data(data)
+                self.state.set("antenna_powers", power_settings)
                 return power_settings
             else:
                 print("❌ Unexpected response MID for power query.")
@@ -645,59 +1186,167 @@ class NationReader:
             print(f"❌ Exception during power query: {e}")
             return {}
 
-    def configure_reader_power(self, antenna_powers: dict[int, int], persistence: Optional[bool] = None) -> bool:
+    @staticmethod
+    def parse_power_data(data: bytes) -> dict[int, int]:
         """
-        Configures the transmit power for specified antenna ports.
-        :param antenna_powers: A dictionary where keys are antenna IDs (1-64)
-                               and values are power levels in dBm (0-36).
-        :param persistence: If True, settings are saved after power-down.
-                            If False, settings are temporary. If None, uses reader default (typically save).
-        :return: True if configuration was successful, False otherwise.
+        Parse a QUERY_READER_POWER response: (antenna PID, dBm) pairs.
+        """
+        power_settings = {}
+        offset = 0
+        while offset + 2 <= len(data): # Each power entry is 2 bytes (PID + Value)
+            ant_id = data[offset] # PID is antenna ID [19]
+            power_dbm = data[offset + 1] # Value is power in dBm [19]
+            power_settings[ant_id] = power_dbm
+            offset += 2
+        return power_settings
+
+    @staticmethod
+    def parse_baseband_data(data: bytes) -> Optional[dict]:
+        """
+        Parse a QUERY_BASEBAND response: [speed, q_value, session, inventory_flag].
+        """
+        if len(data) < 4:
+            return None
+        return {
+            "speed": data[0],
+            "q_value": data[1],
+            "session": data[2],
+            "inventory_flag": data[3]
+        }
+
+    @staticmethod
+    def parse_filter_data(data: bytes) -> Optional[dict]:
+        """
+        Parse a filter query response, PID-encoded like the 0x0209 payload:
+            PID 0x01 (U16): repeat time (10 ms units)
+            PID 0x02 (U8) : RSSI threshold
+        :return: None unless both fields are present and nothing else is (the value is not trusted)
+        """
+        fields = {}
+        i = 0
+        while i < len(data):
+            pid = data[i]
+            if pid == 0x01 and i + 3 <= len(data):
+                fields["repeat_time"] = int.from_bytes(data[i + 1:i + 3], 'big')
+                i += 3
+            elif pid == 0x02 and i + 2 <= len(data):
+                fields["rssi_threshold"] = data[i + 1]
+                i += 2
+            else:
+                return None
+        if len(fields) != 2:
+            return None
+        return {"repeat_time": fields["repeat_time"], "rssi_threshold": fields["rssi_threshold"]}
+
+    @staticmethod
+    def parse_ant_mask_data(data: bytes) -> Optional[int]:
+        """
+        Parse an antenna mask query response: 32-bit mask, same layout as the config payload.
+        """
+        if len(data) != 4:
+            return None
+        return int.from_bytes(data, 'big')
+
+    @staticmethod
+    def build_power_payload(antenna_powers: dict[int, int], persistence: Optional[bool] = None) -> bytes:
+        """
+        Build the CONFIGURE_READER_POWER payload: (antenna PID, dBm) pairs + optional persistence PID 0xFF.
+        :raises ValueError: On invalid antenna IDs or power levels
         """
         if not antenna_powers:
-            print("❌ No antenna powers provided for configuration.")
-            return False
+            raise ValueError("No antenna powers provided for configuration.")
         if not isinstance(antenna_powers, dict):
-            print("❌ antenna_powers must be a dictionary of {int: int}.")
-            return False
-        
+            raise ValueError("antenna_powers must be a dictionary of {int: int}.")
 
-        for ant_id, power_dbm in antenna_powers.items():
-            if not isinstance(ant_id, int) or not isinstance(power_dbm, int):
-                print(f"❌ Invalid types: antenna ID and power must both be integers. Got ({type(ant_id)}, {type(power_dbm)}).")
-                return False
- 
         payload_parts = []
         for ant_id, power_dbm in antenna_powers.items():
+            if not isinstance(ant_id, int) or not isinstance(power_dbm, int):
+                raise ValueError(f"Invalid types: antenna ID and power must both be integers. Got ({type(ant_id)}, {type(power_dbm)}).")
             if not (1 <= ant_id <= 64):
-                print(f"❌ Invalid antenna ID: {ant_id}. Must be between 1 and 64.")
-                return False
+                raise ValueError(f"Invalid antenna ID: {ant_id}. Must be between 1 and 64.")
             if not (0 <= power_dbm <= 33): # Max power is 36dBm [18]
-                print(f"❌ Invalid power level for antenna {ant_id}: {power_dbm}dBm. Must be between 0 and 36dBm.")
-                return False
+                raise ValueError(f"Invalid power level for antenna {ant_id}: {power_dbm}dBm. Must be between 0 and 33dBm.")
             payload_parts.append(ant_id.to_bytes(1, 'big')) # PID for antenna [17]
             payload_parts.append(power_dbm.to_bytes(1, 'big')) # Value for power [17]
- 
+
         if persistence is not None:
             payload_parts.append(b'\xFF') # PID for Parameter persistence [17]
             payload_parts.append((0x01 if persistence else 0x00).to_bytes(1, 'big')) # Value for persistence [17]
- 
-        full_payload = b''.join(payload_parts)
+
+        return b''.join(payload_parts)
+
+    @staticmethod
+    def build_ant_mask_payload(mask: int, save: Optional[bool] = True) -> bytes:
+        """
+        Build the antenna enable payload: [mask (4 bytes)] + optional [PID=0xFF, persist flag].
+        """
+        if not (0 <= mask <= 0xFFFFFFFF):
+            raise ValueError("Antenna mask must be a 32-bit unsigned integer")
+        payload = mask.to_bytes(4, 'big')
+        if save is not None:
+            payload += b'\xFF' + (b'\x01' if save else b'\x00')
+        return payload
+
+    @staticmethod
+    def build_baseband_payload(speed: int, q_value: int, session: int, inventory_flag: int) -> bytes:
+        """
+        Build the CONFIG_BASEBAND TLV payload.
+        :raises ValueError: On out-of-range parameters
+        """
+        if speed not in (0, 1, 2, 3, 4, 255):
+            raise ValueError(f"Invalid speed: {speed}")
+        if not (0 <= q_value <= 15):
+            raise ValueError(f"Invalid Q: {q_value}")
+        if session not in (0, 1, 2, 3):
+            raise ValueError(f"Invalid session: {session}")
+        if inventory_flag not in (0, 1, 2):
+            raise ValueError(f"Invalid flag: {inventory_flag}")
+        return bytes([
+            0x01, speed,
+            0x02, q_value,
+            0x03, session,
+            0x04, inventory_flag
+        ])
+
+    @staticmethod
+    def build_filter_payload(repeated_time_ms: int = 0, rssi_threshold: int = 0) -> bytes:
+        """
+        Build the tag upload filter payload (MID 0x0209):
+            PID 0x01 (U16): repeated time (in 10ms units)
+            PID 0x02 (U8) : RSSI threshold
+        """
+        if not (0 <= repeated_time_ms <= 655350):
+            raise ValueError("Repeated time must be 0–655350 ms (0-65535 * 10ms)")
+        if not (0 <= rssi_threshold <= 255):
+            raise ValueError("RSSI threshold must be 0–255")
+        return (
+            b'\x01' + (repeated_time_ms // 10).to_bytes(2, byteorder='big') +
+            b'\x02' + bytes([rssi_threshold])
+        )
+
+    def configure_reader_power(self, antenna_powers: dict[int, int], persistence: Optional[bool] = None) -> bool:
+        """
+        Configures the transmit power for specified antenna ports.
+        :param antenna_powers: A dictionary where keys are antenna IDs (1-64)
+                               and values are power levels in dBm (0-36).
+        :param persistence: If True, settings are saved after power-down.
+                            If False, settings are temporary. If None, uses reader default (typically save).
+        :return: True if configuration was successful, False otherwise.
+        """
+        try:
+            full_payload = self.build_power_payload(antenna_powers, persistence)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
  
         try:
-            self.uart.flush_input()
             # print(f"🚀 Sending Configure Reader Power command with payload: {full_payload.hex()}")
-            command_frame = self.build_frame(MID.CONFIGURE_READER_POWER, payload=full_payload, rs485=self.rs485)
-            self.uart.send(command_frame)
- 
-            time.sleep(0.1) # Give reader time to respond
-            raw = self.uart.receive(64)
- 
-            if not raw:
+            try:
+                frame = self._command(MID.CONFIGURE_READER_POWER, full_payload)
+            except TimeoutError:
                 print("❌ No response received from reader.")
                 return False
  
-            frame = self.parse_frame(raw)
             if not frame:
                 print("❌ Failed to parse response frame.")
                 return False
@@ -713,9 +1362,9 @@ class NationReader:
                 result_code = data[0]
                 if result_code == 0x00:
                     print("✅ Reader power configured successfully.")
+                    self.state.merge("antenna_powers", antenna_powers)
                     return True
                 else:
-                    result_code = data if len(data) >= 1 else -1
                     error_map = {
                         0x01: "the reader hardware does not support the port parameter", 
                         0x02: "The reader does not support the power parameter",      
@@ -737,110 +1386,82 @@ class NationReader:
         return self._inventory_running
 
     #still work.
-    def start_inventory_with_mode(self, antenna_mask, callback=None) -> bool:
-
-
+    def start_inventory_with_mode(self, antenna_mask, callback=None, dedup: Optional[dict] = None) -> bool:
+        """
+        Start continuous inventory; tags are delivered to callback from the UART reader thread.
+        :param antenna_mask: List of 1-based antenna IDs
+        :param callback: Called with each tag dict (or each dedup event when dedup is on)
+        :param dedup: Optional duplicate suppression, e.g. {"mode": "host", "window": 1.0}
+            mode "off"      - every read is delivered (default)
+            mode "host"     - TagDeduplicator: first_seen/refresh/last_seen events;
+                              also takes "refresh_interval" and "key_by_antenna"
+            mode "hardware" - reader-side repeat filter via set_filter_settings();
+                              "window" becomes the repeat time, plus optional "rssi_threshold"
+            The other modes clear a repeat filter still set on the reader (kept RSSI threshold).
+        """
         try:
 
             self.stop_inventory()
-            
-            self._inventory_running = True
+
+            dedup = dict(dedup or {})
+            mode = dedup.pop("mode", DEDUP_OFF)
+            if mode not in DEDUP_MODES:
+                raise ValueError(f"Unknown dedup mode '{mode}', expected one of {DEDUP_MODES}")
+            window = float(dedup.get("window", 1.0))
+            if mode == DEDUP_HARDWARE:
+                if not self.set_filter_settings(int(window * 1000), int(dedup.get("rssi_threshold", 0))):
+                    return False
+            else:
+                # A repeat filter left by an earlier hardware-mode session would still drop reads
+                current = self.state.get("filter")
+                if current is None or current["repeat_time"]:
+                    if not self.set_filter_settings(0, current["rssi_threshold"] if current else 0):
+                        return False
+            if mode == DEDUP_HOST and callback:
+                self._dedup = TagDeduplicator(
+                    callback,
+                    window=window,
+                    refresh_interval=float(dedup.get("refresh_interval", 5.0)),
+                    key_by_antenna=bool(dedup.get("key_by_antenna", False)),
+                )
+                callback = self._dedup
+                self._dedup.start()
+
             self._on_tag = callback
             self._on_inventory_end = None
+            self._inventory_ended.clear()
             antenna_mask = self.build_antenna_mask(antenna_mask)
             print("🚀 Starting inventory with antenna mask:", antenna_mask)
             payload = self.build_epc_read_payload(antenna_mask, continuous=True)    
-            frame = self.build_frame(mid=MID.READ_EPC_TAG, payload=payload, rs485=self.rs485)
-            
-            self.send(frame)
- 
-         
-            self._inventory_thread = threading.Thread(target=self._receive_inventory_loop_optimized)
-            self._inventory_thread.start()
+            self._inventory_running = True
+            try:
+                resp = self._command(MID.READ_EPC_TAG, payload, timeout=0.5)
+            except TimeoutError:
+                # Some firmware only answers with tag notifications
+                print("⚠️ No ack for inventory start, waiting for tags anyway.")
+                return True
+
+            code = resp["data"][0] if resp["data"] else -1
+            if resp["mid"] != (MID.READ_EPC_TAG & 0xFF) or code != 0x00:
+                self._inventory_running = False
+                self._close_dedup()
+                print(f"❌ Inventory start rejected: MID=0x{resp['mid']:02X}, code={code}")
+                return False
             return True
         except Exception as e:
+            self._inventory_running = False
+            self._close_dedup()
             print(f"❌ Exception in start_inventory_with_mode: {e}")
             return False
 
-    def _receive_inventory_loop_optimized(self):
-        """
-        Nhận dữ liệu inventory tối ưu: buffer, tách frame, không bỏ sót tag.
-        """
-        buffer = b""
-        while self._inventory_running:
-            try:
-                raw = self.receive(128)  # Đọc nhiều bytes hơn/lần
-                
-                if not raw:
-                    time.sleep(0.01)
-                    continue
-                buffer += raw
-                frames = self.extract_valid_frames(buffer)
-                # Xóa khỏi buffer các bytes đã xử lý thành frame
-                if frames:
-                    last_frame = frames[-1]
-                    idx = buffer.find(last_frame) + len(last_frame)
-                    buffer = buffer[idx:]
-
-                for frame in frames:
-                    try:
-                        parsed = self.parse_frame(frame)
-                        cat = parsed["category"]
-                        mid = parsed["mid"]
-                        if cat == 0x10 or mid == 0x00:  # EPC tag
-                            tag = self.parse_epc(parsed['data'])
-                            if "error" in tag:
-                                # print(f"⚠️ Parse error: {tag['error']}")
-                                continue
-                            else:
-                                if self._on_tag:
-                                    self._on_tag(tag)
-                        elif mid in MID.all_read_end_mids():
-                            reason = parsed['data'][0] if parsed['data'] else None
-                            print(f"✅ Inventory ended. Reason: {reason}")
-                            if self._on_inventory_end:
-                                self._on_inventory_end(reason)
-                            self._inventory_running = False
-                            return
-                    except Exception as e:
-                        # print(f"⚠️ Frame parse error: {e}")
-                        continue
-            except Exception as e:
-                print(f"⚠️ Error in inventory loop: {e}")
-                continue
-
 
-    def query_filter_settings(self):
+    def _close_dedup(self):
         """
-        Query Repeated Tag Filtering Time (ms) and RSSI Threshold (0-255).
-        MID = 0x03
-        Response Data:
-        Byte 0-1: Repeated_Tag_Filter_Time (uint16, big-endian)
-        Byte 2  : RSSI_Threshold (uint8)
+        Detach the host-side dedup stage and report the remaining tags as last_seen.
         """
-        MID_QUERY_FILTER=0x020A 
-        try:
-            frame = self.build_frame(mid=MID_QUERY_FILTER, data=b"")
-            self.send(frame)
-
-            response = self.receive_response(mid=MID_QUERY_FILTER)
-            data = response.get('data', b'')
-
-            if len(data) < 3:
-                raise ValueError(f"⚠️ Invalid response data length: {len(data)}")
-
-            repeated_time = int.from_bytes(data[0:2], byteorder='big')
-            rssi_threshold = data[2]
-
-            print(f"📊 Repeated Tag Filter Time: {repeated_time} ms, RSSI Threshold: {rssi_threshold}")
-            return {
-                "repeated_time": repeated_time,
-                "rssi_threshold": rssi_threshold
-            }
-        except Exception as e:
-            print(f"❌ Error querying filter settings: {e}")
-            return None
-
+        dedup, self._dedup = self._dedup, None
+        if dedup:
+            dedup.close()
 
     def set_filter_settings(self, repeated_time_ms: int = 0, rssi_threshold: int = 0):
         """
@@ -855,35 +1476,21 @@ class NationReader:
         MID_SET_FILTER = 0x0209
 
         try:
-            # ✅ Validate inputs
-            if not (0 <= repeated_time_ms <= 655350):
-                raise ValueError("Repeated time must be 0–655350 ms (0-65535 * 10ms)")
-            if not (0 <= rssi_threshold <= 255):
-                raise ValueError("RSSI threshold must be 0–255")
-
-            # ✅ Convert ms to 10ms units as required by protocol
-            repeated_time_10ms_units = repeated_time_ms // 10
-
-            # ✅ Build payload with proper PIDs
-            payload = (
-                b'\x01' + repeated_time_10ms_units.to_bytes(2, byteorder='big') +
-                b'\x02' + bytes([rssi_threshold])
-            )
+            # ✅ Validate inputs and build payload (time is sent in 10ms units)
+            payload = self.build_filter_payload(repeated_time_ms, rssi_threshold)
 
             # ✅ Debug
             print(f"📤 Sending payload: {payload.hex().upper()}")
 
-            # ✅ Build and send frame
-            frame = self.build_frame(mid=MID_SET_FILTER, payload=payload)
-            self.send(frame)
-
-            # ✅ Wait for response
-            response = self.receive_response(mid=MID_SET_FILTER)
+            # ✅ Send frame and wait for response
+            response = self._command(MID_SET_FILTER, payload)
 
             # ✅ Handle response
-            status = response.get('status')
+            status = response['data'][0] if response['data'] else -1
             if status == 0x00:
                 print(f"✅ Filter settings applied successfully: Time={repeated_time_ms} ms, RSSI={rssi_threshold}")
+                self.state.set("filter", {"repeat_time": repeated_time_ms // 10, "rssi_threshold": rssi_threshold})
+                return True
             else:
                 error_map = {
                     0x01: "❌ Parameter error",
@@ -894,147 +1501,108 @@ class NationReader:
 
         except Exception as e:
             print(f"❌ Error setting filter settings: {e}")
+            return False
 
 
 
     def receive_response(self, mid: int, timeout: float = 1.0) -> dict:
         """
         Nhận frame phản hồi từ đầu đọc Nation tương ứng với MID yêu cầu.
+        Frames are routed by the UART reader thread; prefer _command(), which
+        registers the wait before sending so a fast reply cannot be missed.
+        :param mid: Full 16-bit MID (category << 8 | mid)
         Trả về dict: {mid, status, data}
         """
-        import time
-        start_time = time.time()
-        buffer = b""
-
-        while time.time() - start_time < timeout:
-            raw = self.receive(128)
-            if not raw:
-                time.sleep(0.01)
-                continue
-
-            buffer += raw
-            frames = self.extract_valid_frames(buffer)
-
-            for frame in frames:
-                try:
-                    parsed = self.parse_frame(frame)
-                    if parsed['mid'] == mid:
-                        status = parsed['data'][0] if len(parsed['data']) >= 1 else None
-                        data = parsed['data'][1:] if len(parsed['data']) > 1 else b""
-                        return {
-                            "mid": mid,
-                            "status": status,
-                            "data": data
-                        }
-                except Exception as e:
-                    print(f"⚠️ Lỗi parse frame phản hồi: {e}")
-                    continue
-
-            # Nếu không có frame hợp lệ, tiếp tục chờ
-            time.sleep(0.01)
-
-        raise TimeoutError(f"❌ Không nhận được phản hồi MID=0x{mid:02X} sau {timeout} giây")
-
-
-    def _receive_inventory_loop(self):
-        while self._inventory_running:
-            try:    
-                raw = self.receive(128)
-                if not raw:
-                    continue
-
-                frame = self.parse_frame(raw)
-                mid = frame["mid"]
-
-                if mid == 0x00:  # EPC tag
-                    tag = self.parse_epc(frame['data'])
-                    if "error" in tag:
-                        print(f"⚠️ Parse error: {tag['error']}")
-                    else:
-                        # print(f"📦 Tag EPC: {tag['epc']}, RSSI: {tag['rssi']}, Ant: {tag['antenna_id']}")
-                        if self._on_tag:
-                            self._on_tag(tag)
-
-                elif mid in MID.all_read_end_mids():  # MID=0x01/0x21/0x31
-                    reason = frame['data'][0] if frame['data'] else None
-                    print(f"✅ Inventory ended. Reason: {reason}")
-                    if self._on_inventory_end:
-                        self._on_inventory_end(reason)
-                    self._inventory_running = False
-                    break
+        future = self._expect(mid)
+        try:
+            parsed = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._discard_pending(future)
+            raise TimeoutError(f"❌ Không nhận được phản hồi MID=0x{mid:02X} sau {timeout} giây")
 
-            except Exception as e:
-                # print(f"⚠️ Error in inventory loop: {e}")
-                continue
+        payload = parsed['data']
+        return {
+            "mid": mid,
+            "status": payload[0] if len(payload) >= 1 else None,
+            "data": payload[1:] if len(payload) > 1 else b""
+        }
 
 
-    def stop_inventory(self) -> bool:
+    def stop_inventory(self, timeout: float = 1.0) -> bool:
         """
         Sends the Stop command (MID=0xFF) to halt RFID operations and confirm idle state.
         Returns True if the reader acknowledges stop or issues a valid 'read end' notification.
         """
         
-        # Step 1: Stop any running inventory thread if needed
+        # Step 1: Stop delivering tags to the callback
         self._inventory_running = False
-        if hasattr(self, '_inventory_thread') and self._inventory_thread and self._inventory_thread.is_alive():
-            self._inventory_thread.join(timeout=1)
-            print("🧵 Inventory thread stopped.")
+        self._inventory_ended.clear()
+        self._drain_tags()
 
-        # Step 2: Clear any unread UART data
+        # Step 2: Send STOP and wait for the response routed by the reader thread
         try:
-            self.uart.flush_input()
-        except Exception as e:
-            print(f"⚠️ UART flush failed: {e}")
+            resp = self._command(MID.STOP_INVENTORY, timeout=timeout)
+        except TimeoutError:
+            if self._inventory_ended.is_set():
+                print("✅ Read end notification: stopped by STOP command.")
+                return True
+            print("❌ STOP failed: no valid response or reading end notification.")
+            return False
 
-        # Step 3: Send STOP command frame
-        stop_frame = self.build_frame(mid=MID.STOP_INVENTORY, payload=b'')
-        print(stop_frame.hex())
-        self.send(stop_frame)
+        mid = resp["mid"]
+        data = resp["data"]
+        result = data[0] if data else -1
+        if mid == MID.STOP_OPERATION and result == 0x00:
+            print("✅ Reader responded: STOP successful, now IDLE.")
+            return True
+        print(f"⚠️ Reader responded: STOP error MID={mid:#04x} code={result:#02x}")
+        return False
 
-        # Step 4: Wait for confirmation via response or notification
-        for attempt in range(10):
-            # time.sleep(0.2)
-            try:
-                raw = self.receive(256)
-                frames = self.extract_valid_frames(raw)
-                
+    @staticmethod
+    def all_read_end_mids():
+        return [0x01, 0x21, 0x31]
 
-                for idx, f in enumerate(frames):
-                    try:
-                        resp = self.parse_frame(f)
-                        mid = resp["mid"]
-                        data = resp["data"]
-
-                        if mid == MID.STOP_OPERATION:  # MID=0xFF, response
-                            result = data[0] if data else -1
-                            if result == 0x00:
-                                print("✅ Reader responded: STOP successful, now IDLE.")
-                                return True
-                            else:
-                                print(f"⚠️ Reader responded: STOP error code {result:#02x}")
-                                return False
-
-                        elif mid in NationReader.all_read_end_mids():
-                            reason = data[0] if data else -1
-                            if reason == 1:
-                                print("✅ Read end notification: stopped by STOP command.")
-                                return True
-                            else:
-                                print(f"↪️ Read ended with reason code {reason}, not STOP command.")
-
-                        else:
-                            print(f"🔍 Unrelated frame, MID={mid:#04x}")
-                    except Exception as e:
-                        print(f"❌ Frame parse error [{idx}]: {e}")
-            except Exception as e:
-                print(f"⚠️ UART receive error on attempt {attempt+1}: {e}")
+    def inventory_once(self, antenna_mask=None, timeout: float = 0.5) -> list[dict]:
+        """
+        Single-shot inventory (READ_EPC_TAG with the continuous flag cleared): the
+        reader singulates the tags in the field once and ends with a read-end
+        notification, so it is idle again without a STOP.
+        :param antenna_mask: List of 1-based antenna IDs (default antenna 1)
+        :param timeout: Deadline for the ack and for the read-end notification
+        :return: One dict per EPC (epc, pc, antenna_id, rssi, count), strongest RSSI first
+        """
+        seen: dict[str, dict] = {}
 
-        print("❌ STOP failed: no valid response or reading end notification after 10 attempts.")
-        return False
+        def collect(tag: dict):
+            previous = seen.get(tag["epc"])
+            if previous is None:
+                seen[tag["epc"]] = dict(tag, count=1)
+                return
+            previous["count"] += 1
+            if (tag.get("rssi") or 0) > (previous.get("rssi") or 0):
+                previous.update(rssi=tag.get("rssi"), antenna_id=tag.get("antenna_id"))
 
-    @staticmethod
-    def all_read_end_mids():
-        return [0x01, 0x21, 0x31]
+        if self._inventory_running:
+            self.stop_inventory()
+        self._on_tag = collect
+        self._on_inventory_end = None
+        self._inventory_ended.clear()
+        payload = self.build_epc_read_payload(self.build_antenna_mask(antenna_mask or [1]), continuous=False)
+        self._inventory_running = True
+        try:
+            resp = self._command(MID.READ_EPC_TAG, payload, timeout=timeout)
+            code = resp["data"][0] if resp["data"] else -1
+            if resp["mid"] != (MID.READ_EPC_TAG & 0xFF) or code != 0x00:
+                print(f"❌ Single inventory rejected: MID=0x{resp['mid']:02X}, code={code}")
+                return []
+            if not self._inventory_ended.wait(timeout):
+                print("⚠️ No read-end after single inventory, stopping.")
+                self.stop_inventory()
+        finally:
+            self._inventory_running = False
+            self._drain_tags()
+            self._on_tag = None
+        return sorted(seen.values(), key=lambda t: -(t.get("rssi") or 0))
 
     ################################################################################
     #                           WRITE EPC TAG                                      #
@@ -1060,10 +1628,8 @@ class NationReader:
         :return: dict with success, result_code, result_msg, failed_addr
         """
         try:
-            # 1. Ensure reader is idle
+            # 1. Ensure reader is idle (STOP is acknowledged once the reader is idle)
             self.stop_inventory()
-            self.uart.flush_input()
-            time.sleep(0.2)
 
             # 2. Build payload
             payload = bytearray()
@@ -1099,80 +1665,60 @@ class NationReader:
             if access_password is not None:
                 payload += b"\x02\x00\x04" + access_password.to_bytes(4, "big")
 
-            # 3. Build frame
-            frame = self.build_frame(mid=0x0211, payload=payload, rs485=self.rs485)
-            print(f"📤 Sending write frame: {frame.hex().upper()}")
-
-            # 4. Send frame
-            self.send(frame)
+            # 3. Send frame and wait for the response
+            print(f"📤 Sending write payload: {payload.hex().upper()}")
+            try:
+                resp = self._command(0x0211, bytes(payload), timeout=timeout)
+            except TimeoutError:
+                return {
+                    "success": False,
+                    "result_code": -2,
+                    "result_msg": "Timeout waiting for write response",
+                    "failed_addr": None,
+                }
 
-            # 5. Wait for response
-            deadline = time.time() + timeout
-            while time.time() < deadline:
-                raw = self.receive(256)
-                if not raw:
-                    continue
-                try:
-                    frames = self.extract_valid_frames(raw)
-                except Exception as e:
-                    print(f"⚠️ Frame extraction error: {e}")
-                    continue
-                for f in frames:
-                    try:
-                        resp = self.parse_frame(f)
-                    except Exception as e:
-                        print(f"⚠️ Frame parse error: {e}")
-                        continue
-                    print(f"📥 [WRITE-EPC-TAG] Received frame: MID={resp['mid']:02X}, Data={resp['data'].hex()}")
-                    # Success response
-                    if resp["mid"] == 0x11:
-                        data = resp["data"]
-                        result = data[0]
-                        result_map = {
-                            0x00: "Write successful",
-                            0x01: "Antenna parameter error",
-                            0x02: "Match parameter error",
-                            0x03: "Write parameter error",
-                            0x04: "CRC check error",
-                            0x05: "Insufficient power",
-                            0x06: "Data area overflow",
-                            0x07: "Data area locked",
-                            0x08: "Password error",
-                            0x09: "Other tag error",
-                            0x0A: "Tag lost",
-                            0x0B: "Reader send error",
-                        }
-                        failed_addr = None
-                        # Optional: failed word address (PID 0x01, U16)
-                        if len(data) >= 4 and data[1] == 0x01 and data[2] == 0x02:
-                            failed_addr = int.from_bytes(data[3:5], "big")
-                        return {
-                            "success": result == 0x00,
-                            "result_code": result,
-                            "result_msg": result_map.get(result, "Unknown error"),
-                            "failed_addr": failed_addr,
-                        }
-                    # Error/illegal instruction
-                    elif resp["mid"] == 0x00:
-                        error_code = resp["data"][0] if resp["data"] else -1
-                        error_map = {
-                            0x01: "Unsupported instruction",
-                            0x02: "CRC or mode error",
-                            0x03: "Parameter error",
-                            0x04: "Busy",
-                            0x05: "Invalid state",
-                        }
-                        return {
-                            "success": False,
-                            "result_code": error_code,
-                            "result_msg": f"Reader error: {error_map.get(error_code, f'Unknown error code 0x{error_code:02X}')}",
-                            "failed_addr": None,
-                        }
-            # Timeout
+            print(f"📥 [WRITE-EPC-TAG] Received frame: MID={resp['mid']:02X}, Data={resp['data'].hex()}")
+            # Success response
+            if resp["mid"] == 0x11:
+                data = resp["data"]
+                result = data[0]
+                result_map = {
+                    0x00: "Write successful",
+                    0x01: "Antenna parameter error",
+                    0x02: "Match parameter error",
+                    0x03: "Write parameter error",
+                    0x04: "CRC check error",
+                    0x05: "Insufficient power",
+                    0x06: "Data area overflow",
+                    0x07: "Data area locked",
+                    0x08: "Password error",
+                    0x09: "Other tag error",
+                    0x0A: "Tag lost",
+                    0x0B: "Reader send error",
+                }
+                failed_addr = None
+                # Optional: failed word address (PID 0x01, U16)
+                if len(data) >= 4 and data[1] == 0x01 and data[2] == 0x02:
+                    failed_addr = int.from_bytes(data[3:5], "big")
+                return {
+                    "success": result == 0x00,
+                    "result_code": result,
+                    "result_msg": result_map.get(result, "Unknown error"),
+                    "failed_addr": failed_addr,
+                }
+            # Error/illegal instruction
+            error_code = resp["data"][0] if resp["data"] else -1
+            error_map = {
+                0x01: "Unsupported instruction",
+                0x02: "CRC or mode error",
+                0x03: "Parameter error",
+                0x04: "Busy",
+                0x05: "Invalid state",
+            }
             return {
                 "success": False,
-                "result_code": -2,
-                "result_msg": "Timeout waiting for write response",
+                "result_code": error_code,
+                "result_msg": f"Reader error: {error_map.get(error_code, f'Unknown error code 0x{error_code:02X}')}",
                 "failed_addr": None,
             }
         except Exception as e:
@@ -1191,6 +1737,7 @@ class NationReader:
         antenna_id: int = 1,
         access_password: Optional[int] = None,
         timeout: float = 0,
+        ensure_idle: bool = True,
     ) -> dict:
         """
         Write new EPC to tag. Automatically calculates start_word and PC bits.
@@ -1199,110 +1746,29 @@ class NationReader:
         :param antenna_id: Antenna number (1-based)
         :param access_password: Optional password
         :param timeout: Timeout in seconds
+        :param ensure_idle: Send STOP first; callers that know the reader is idle
+                            (e.g. after inventory_once) skip the round-trip
         """
         try:
-            self.stop_inventory()
-            self.uart.flush_input()
-            time.sleep(0.2)
-
-            # Step 1: Format EPC content
-            epc_hex = new_epc_hex.strip().upper()
-            word_len = (len(epc_hex) + 3) // 4  # Word count (4 hex chars = 2 bytes)
-            pc_bits = word_len << 11  # PC word: upper 5 bits = word_len
-            pc_hex = f"{pc_bits:04X}"
-            full_epc_hex = pc_hex + epc_hex.ljust(word_len * 4, '0')
-            epc_bytes = bytes.fromhex(full_epc_hex)
-
-            # Step 2: Build payload
-            payload = bytearray()
-            antenna_mask = 1 << (antenna_id - 1)
-            payload += antenna_mask.to_bytes(4, "big")  # Antenna mask
-            payload += b"\x01"  # EPC area
-            payload += (1).to_bytes(2, "big")  # start_word = 1
-            payload += len(epc_bytes).to_bytes(2, "big")
-            payload += epc_bytes
-
-            # Step 3: Optional match EPC filter
-            if match_epc_hex:
-                match_hex = match_epc_hex.strip().upper()
-                match_bytes = bytes.fromhex(match_hex)
-                bit_len = len(match_bytes) * 8
-                match_content = (
-                    b"\x01" +  # area = EPC
-                    (1).to_bytes(2, "big") +  # start_word = 1
-                    bytes([bit_len]) +
-                    match_bytes
-                )
-                payload += b"\x01" + len(match_content).to_bytes(2, "big") + match_content
+            if ensure_idle or self._inventory_running:
+                self.stop_inventory()
 
-            # Step 4: Optional password
-            if access_password is not None:
-                payload += b"\x02\x00\x04" + access_password.to_bytes(4, "big")
+            payload = self.build_write_epc_auto_payload(new_epc_hex, match_epc_hex, antenna_id, access_password)
 
-            # Step 5: Build & send frame
-            frame = self.build_frame(mid=0x0211, payload=payload, rs485=self.rs485)
-            print(f"📤 Write EPC frame: {frame.hex().upper()}")
-            self.send(frame)
+            # Send frame & await response
+            print(f"📤 Write EPC payload: {payload.hex().upper()}")
+            try:
+                resp = self._command(0x0211, payload, timeout=timeout or 2.0)
+            except TimeoutError:
+                return {
+                    "success": False,
+                    "result_code": -2,
+                    "result_msg": "Timeout waiting for write response",
+                    "failed_addr": None,
+                }
 
-            # Step 6: Await response
-            deadline = time.time() + timeout
-            while time.time() < deadline:
-                raw = self.receive(256)
-                if not raw:
-                    continue
-                try:
-                    frames = self.extract_valid_frames(raw)
-                except Exception as e:
-                    print(f"⚠️ Frame extract error: {e}")
-                    continue
-                for f in frames:
-                    try:
-                        resp = self.parse_frame(f)
-                    except Exception as e:
-                        print(f"⚠️ Frame parse error: {e}")
-                        continue
-                    print(f"📥 Write-EPC response: MID={resp['mid']:02X}, Data={resp['data'].hex()}")
-                    if resp["mid"] == 0x11:
-                        result = resp["data"][0]
-                        failed_addr = (
-                            int.from_bytes(resp["data"][3:5], "big")
-                            if len(resp["data"]) >= 5 and resp["data"][1] == 0x01
-                            else None
-                        )
-                        result_map = {
-                            0x00: "Write successful",
-                            0x01: "Antenna error",
-                            0x02: "Match error",
-                            0x03: "Write parameter error",
-                            0x04: "CRC error",
-                            0x05: "Low power",
-                            0x06: "Overflow",
-                            0x07: "Locked",
-                            0x08: "Password error",
-                            0x09: "Tag error",
-                            0x0A: "Tag lost",
-                            0x0B: "Send error",
-                        }
-                        return {
-                            "success": result == 0x00,
-                            "result_code": result,
-                            "result_msg": result_map.get(result, "Unknown error"),
-                            "failed_addr": failed_addr,
-                        }
-                    elif resp["mid"] == 0x00:
-                        error_code = resp["data"][0]
-                        return {
-                            "success": False,
-                            "result_code": error_code,
-                            "result_msg": f"Reader error: {error_code:02X}",
-                            "failed_addr": None,
-                        }
-            return {
-                "success": False,
-                "result_code": -2,
-                "result_msg": "Timeout waiting for write response",
-                "failed_addr": None,
-            }
+            print(f"📥 Write-EPC response: MID={resp['mid']:02X}, Data={resp['data'].hex()}")
+            return self.parse_write_epc_response(resp)
         except Exception as e:
             return {
                 "success": False,
@@ -1311,26 +1777,235 @@ class NationReader:
                 "failed_addr": None,
             }
 
+    @staticmethod
+    def build_write_epc_auto_payload(
+        new_epc_hex: str,
+        match_epc_hex: Optional[str] = None,
+        antenna_id: int = 1,
+        access_password: Optional[int] = None,
+    ) -> bytes:
+        """
+        Build the MID=0x0211 payload used by write_epc_tag_auto: PC word + EPC
+        written from word 1, with optional EPC match (PID 0x01) and password (PID 0x02).
+        """
+        # Step 1: Format EPC content
+        epc_hex = new_epc_hex.strip().upper()
+        word_len = (len(epc_hex) + 3) // 4  # Word count (4 hex chars = 2 bytes)
+        pc_bits = word_len << 11  # PC word: upper 5 bits = word_len
+        pc_hex = f"{pc_bits:04X}"
+        full_epc_hex = pc_hex + epc_hex.ljust(word_len * 4, '0')
+        epc_bytes = bytes.fromhex(full_epc_hex)
+
+        # Step 2: Build payload
+        payload = bytearray()
+        antenna_mask = 1 << (antenna_id - 1)
+        payload += antenna_mask.to_bytes(4, "big")  # Antenna mask
+        payload += b"\x01"  # EPC area
+        payload += (1).to_bytes(2, "big")  # start_word = 1
+        payload += len(epc_bytes).to_bytes(2, "big")
+        payload += epc_bytes
+
+        # Step 3: Optional match EPC filter
+        if match_epc_hex:
+            match_hex = match_epc_hex.strip().upper()
+            match_bytes = bytes.fromhex(match_hex)
+            bit_len = len(match_bytes) * 8
+            match_content = (
+                b"\x01" +  # area = EPC
+                (1).to_bytes(2, "big") +  # start_word = 1
+                bytes([bit_len]) +
+                match_bytes
+            )
+            payload += b"\x01" + len(match_content).to_bytes(2, "big") + match_content
+
+        # Step 4: Optional password
+        if access_password is not None:
+            payload += b"\x02\x00\x04" + access_password.to_bytes(4, "big")
+        return bytes(payload)
 
-    def check_write_epc(self,epcHex) -> bool:
+    @staticmethod
+    def parse_write_epc_response(resp: dict) -> dict:
         """
-        Check if the reader supports writing EPC tags.
-        Returns True if supported, False otherwise.
+        Turn a MID=0x11 write reply (or a generic MID=0x00 error) into
+        {success, result_code, result_msg, failed_addr}.
         """
-        self.stop_inventory()
-        self.uart.flush_input()
-        # Ensure reader is idle
-        def on_tag_callback(tag: dict):
-            epc = tag.get("epc", "").upper()
-            if epc == epcHex.upper():
-                print(f"✅ Tag with EPC {epc} found during write check.")
-                return True
-            else:
-                print(f"👀 Tag with EPC {epc} found, but not the one we are checking for.")
-                return False
-        self.start_inventory_with_mode(antenna_mask=[1],callback=on_tag_callback)
-        return True
+        if resp["mid"] == 0x11:
+            result = resp["data"][0]
+            failed_addr = (
+                int.from_bytes(resp["data"][3:5], "big")
+                if len(resp["data"]) >= 5 and resp["data"][1] == 0x01
+                else None
+            )
+            result_map = {
+                0x00: "Write successful",
+                0x01: "Antenna error",
+                0x02: "Match error",
+                0x03: "Write parameter error",
+                0x04: "CRC error",
+                0x05: "Low power",
+                0x06: "Overflow",
+                0x07: "Locked",
+                0x08: "Password error",
+                0x09: "Tag error",
+                0x0A: "Tag lost",
+                0x0B: "Send error",
+            }
+            return {
+                "success": result == 0x00,
+                "result_code": result,
+                "result_msg": result_map.get(result, "Unknown error"),
+                "failed_addr": failed_addr,
+            }
+        error_code = resp["data"][0] if resp["data"] else -1
+        return {
+            "success": False,
+            "result_code": error_code,
+            "result_msg": f"Reader error: {error_code:02X}",
+            "failed_addr": None,
+        }
+
 
+    # MID 0x11 result codes worth another attempt: the tag was not (fully) powered,
+    # singulated or heard, as opposed to a parameter, lock or password problem
+    WRITE_RETRY_CODES = {0x02, 0x04, 0x05, 0x09, 0x0A, 0x0B, -2}
+    # ...and those where more antenna power may help
+    WRITE_POWER_CODES = {0x05, 0x0A}
+
+    def write_epc_verified(
+        self,
+        new_epc_hex: str,
+        match_epc_hex: Optional[str] = None,
+        antenna_id: int = 1,
+        access_password: Optional[int] = None,
+        retries: int = 3,
+        backoff: float = 0.05,
+        power_step: int = 2,
+        max_power: int = 30,
+        verify: bool = True,
+        write_timeout: float = 0.5,
+        verify_timeout: float = 1.0,
+        ensure_idle: bool = True,
+    ) -> dict:
+        """
+        Write transaction: write_epc_tag_auto() selecting the tag by `match_epc_hex`,
+        retrying transient result codes with exponential backoff, raising the antenna
+        power by `power_step` after "low power"/"tag lost" (restored afterwards), then
+        confirming with a targeted read that returns as soon as the new EPC is seen.
+        :param retries: Extra attempts after the first one
+        :param backoff: Delay before the first retry, doubled for each further one
+        :param power_step: dBm added per power-related failure (0 = keep the power)
+        :param max_power: Upper bound for power stepping
+        :param verify: Confirm the new EPC with wait_for_epc()
+        :param ensure_idle: STOP before the first attempt (see write_epc_tag_auto)
+        :return: {success, verified, epc, match_epc, result_code, result_msg, attempts, power,
+                  verify_ms, total_ms}; each attempt has attempt, power, result_code,
+                  result_msg, write_ms (and backoff_ms if another attempt followed)
+        """
+        epc = new_epc_hex.strip().upper()
+        epc = epc.ljust((len(epc) + 3) // 4 * 4, "0")  # as written: whole words
+        started = time.monotonic()
+        attempts = []
+        original_power = power = None
+        result = {}
+        verified = None
+        verify_ms = None
+        try:
+            for attempt in range(1, retries + 2):
+                t0 = time.monotonic()
+                result = self.write_epc_tag_auto(
+                    new_epc_hex=epc,
+                    match_epc_hex=match_epc_hex,
+                    antenna_id=antenna_id,
+                    access_password=access_password,
+                    timeout=write_timeout,
+                    ensure_idle=ensure_idle and attempt == 1,
+                )
+                code = result.get("result_code")
+                attempts.append({
+                    "attempt": attempt,
+                    "power": power,
+                    "result_code": code,
+                    "result_msg": result.get("result_msg"),
+                    "write_ms": round((time.monotonic() - t0) * 1000, 2),
+                })
+                if result.get("success"):
+                    break
+                if code == 0x02 and match_epc_hex and any(a["result_code"] == -2 for a in attempts[:-1]):
+                    # An earlier write whose reply was lost may have gone through already
+                    if self.wait_for_epc(epc, [antenna_id], timeout=verify_timeout):
+                        result = {"success": True, "result_code": 0x00,
+                                  "result_msg": "Write successful (reply of an earlier attempt was lost)"}
+                        verified = True
+                        break
+                if code not in self.WRITE_RETRY_CODES or attempt > retries:
+                    break
+                if code in self.WRITE_POWER_CODES and power_step:
+                    if original_power is None:
+                        original_power = self.query_reader_power(use_cache=True).get(antenna_id)
+                    current = power if power is not None else original_power
+                    if current is not None and current < max_power:
+                        stepped = min(current + power_step, max_power)
+                        if self.configure_reader_power({antenna_id: stepped}, persistence=False):
+                            power = stepped
+                delay = backoff * 2 ** (attempt - 1)
+                attempts[-1]["backoff_ms"] = round(delay * 1000, 1)
+                time.sleep(delay)
+
+            if verify and result.get("success") and verified is None:
+                t0 = time.monotonic()
+                verified = self.wait_for_epc(epc, [antenna_id], timeout=verify_timeout) is not None
+                verify_ms = round((time.monotonic() - t0) * 1000, 2)
+        finally:
+            if power is not None and original_power is not None:
+                self.configure_reader_power({antenna_id: original_power}, persistence=False)
+
+        return {
+            "success": bool(result.get("success")) and verified is not False,
+            "verified": verified,
+            "epc": epc,
+            "match_epc": match_epc_hex,
+            "result_code": result.get("result_code"),
+            "result_msg": result.get("result_msg") if verified is not False else "Written EPC not seen after write",
+            "attempts": attempts,
+            "power": power,
+            "verify_ms": verify_ms,
+            "total_ms": round((time.monotonic() - started) * 1000, 2),
+        }
+
+    def wait_for_epc(self, epc_hex: str, antenna_mask=None, timeout: float = 1.0) -> Optional[dict]:
+        """
+        Targeted read: run inventory only until `epc_hex` is reported, then stop.
+        :param antenna_mask: List of 1-based antenna IDs (default antenna 1)
+        :return: The tag dict, or None if it was not seen within `timeout`
+        """
+        target = epc_hex.strip().upper()
+        found = {}
+        seen = threading.Event()
+
+        def on_tag(tag: dict):
+            if not seen.is_set() and (tag.get("epc") or "").upper() == target:
+                found.update(tag)
+                seen.set()
+
+        if not self.start_inventory_with_mode(antenna_mask or [1], callback=on_tag):
+            return None
+        try:
+            seen.wait(timeout)
+        finally:
+            self.stop_inventory()
+        return found or None
+
+    def check_write_epc(self, epcHex: str, antenna_id: int = 1, timeout: float = 1.0) -> bool:
+        """
+        Check that a tag carrying `epcHex` is in the field (e.g. after a write).
+        Returns True as soon as it is read, False if not seen within `timeout`.
+        """
+        tag = self.wait_for_epc(epcHex, [antenna_id], timeout=timeout)
+        if tag:
+            print(f"✅ Tag with EPC {tag['epc']} found during write check.")
+            return True
+        print(f"👀 Tag with EPC {epcHex.upper()} not seen within {timeout}s.")
+        return False
         
         
         
@@ -1429,91 +2104,37 @@ class NationReader:
         timeout: float = 2.0,
         scan_timeout: float = 2.0,
         verify: bool = True,
-        overwrite_pc: bool = True,
-        prefix_words: int = 0,
-    ):
+        antenna_id: int = 1,
+    ) -> dict:
         """
-        Scan for a tag with EPC `target_tag_epc`, then write `new_epc_hex` to it,
-        automatically handling PC bits, word length, and start_word.
+        Scan for a tag with EPC `target_tag_epc`, then write `new_epc_hex` to it
+        (PC bits and word length handled by write_epc_verified / write_epc_tag_auto).
         """
         print(f"🔍 Scanning for tag with EPC '{target_tag_epc}' (up to {scan_timeout}s) …")
-        found_event = threading.Event()
-
-        def tag_callback(tag: dict):
-            epc = tag.get("epc", "").upper()
-            print(f"👀 Tag seen: {epc}")
-            if epc == target_tag_epc.upper():
-                print(
-                    f"  ✅ Found target tag: EPC={epc}  "
-                    f"(RSSI={tag.get('rssi')}, Antenna={tag.get('antenna_id')})"
-                )
-                found_event.set()
-
-        self.start_inventory_with_mode(mode=0, callback=tag_callback)
-
-        try:
-            if not found_event.wait(timeout=scan_timeout):
-                print(
-                    f"❌ Tag '{target_tag_epc}' not found within {scan_timeout}s. "
-                    "Place the tag closer to the antenna and try again."
-                )
-                return
-
-            # Validate EPCs
-            try:
-                self.validate_epc_hex(new_epc_hex)
-                self.validate_epc_hex(target_tag_epc)
-            except Exception as e:
-                print(f"❌ EPC validation error: {e}")
-                return
-
-            # --- Auto-calculate PC bits and word length ---
-            epc_hex = new_epc_hex.strip().upper()
-            word_len = (len(epc_hex) + 3) // 4  # Word count (4 hex chars = 2 bytes)
-            pc_bits = word_len << 11            # PC word: upper 5 bits = word_len
-            pc_hex = f"{pc_bits:04X}"
-            full_epc_hex = pc_hex + epc_hex.ljust(word_len * 4, '0')
-
-            # --- Calculate start_word ---
-            start_word = self.calculate_start_word(
-                new_epc_hex,
-                overwrite_pc=overwrite_pc,
-                prefix_words=prefix_words
-            )
-
-            print(f"📝 Writing new EPC '{new_epc_hex}' (full hex: {full_epc_hex}, start_word={start_word}) …")
-            result = self.write_epc_tag(
-                epc_hex=full_epc_hex,
-                antenna_id=1,
-                match_epc_hex=target_tag_epc,
-                access_password=access_pwd,
-                start_word=start_word,
-                timeout=timeout,
+        tag = self.wait_for_epc(target_tag_epc, [antenna_id], timeout=scan_timeout)
+        if not tag:
+            print(
+                f"❌ Tag '{target_tag_epc}' not found within {scan_timeout}s. "
+                "Place the tag closer to the antenna and try again."
             )
-            print("Write EPC result:", result)
-
-            # Optional verification
-            if verify and result.get("success"):
-                print("🔄 Verifying new EPC …")
-                verified_event = threading.Event()
-
-                def verify_cb(tag):
-                    if tag.get("epc", "").upper() == new_epc_hex.upper():
-                        verified_event.set()
+            return {"success": False, "verified": None, "result_code": 0x0A, "result_msg": "Target tag not found",
+                    "attempts": []}
+        print(f"  ✅ Found target tag: EPC={tag['epc']}  (RSSI={tag.get('rssi')}, Antenna={tag.get('antenna_id')})")
+
+        self.validate_epc_hex(new_epc_hex)
+        result = self.write_epc_verified(
+            new_epc_hex,
+            match_epc_hex=target_tag_epc,
+            antenna_id=antenna_id,
+            access_password=access_pwd,
+            write_timeout=timeout,
+            verify=verify,
+            ensure_idle=False,
+        )
+        print("Write EPC result:", result)
+        return result
 
-                self.start_inventory_with_mode(mode=0, callback=verify_cb)
-                if verified_event.wait(timeout=1.5):
-                    print("✅ Verification OK — tag now reports new EPC.")
-                else:
-                    print("⚠️  Write may have succeeded, but tag not seen with new EPC yet.")
-                self.stop_inventory()
-            elif not result.get("success"):
-                print("⚠️  Write failed; no verification performed.")
 
-        finally:
-            self.stop_inventory()
-            
-            
     @staticmethod   
     def validate_epc_hex(epc_hex: str) -> bytes:
         """
@@ -1564,45 +2185,36 @@ class NationReader:
     ################################################################################
     #                            ANT HEADER                                        #
     ################################################################################
-    def query_enabled_ant_mask(self) -> int:
+    def query_enabled_ant_mask(self, use_cache: bool = False) -> int:
         """
         Query the enabled antenna mask.
         MID = 0x02, CAT = 0x01
         Returns an integer mask where each bit represents an enabled antenna.
+        :param use_cache: Answer from the cached reader state when known
         """
+        if use_cache:
+            cached = self.state.get("antenna_mask")
+            if cached is not None:
+                return cached
         try:
-            self.uart.flush_input()
-            frame = self.build_frame(mid=0x0202, payload=b'', rs485=False)
-            print(f"📤 Sent frame: {frame.hex().upper()}")
-            self.uart.send(frame)
-            time.sleep(0.1)
-            raw = self.uart.receive(64)
-            if not raw:
+            try:
+                parsed = self._command(MID.QUERY_ANT_MASK)
+            except TimeoutError:
                 print("❌ No response for enabled antenna mask query.")
                 return 0
 
-            frames = self.extract_valid_frames(raw)
-            if not frames:
-                print("❌ No valid frames extracted.")
+            if parsed["category"] != 0x01 or parsed["mid"] != 0x02:
+                print(f"❌ Unexpected response: CAT=0x{parsed['category']:02X}, MID=0x{parsed['mid']:02X}")
                 return 0
 
-            for f in frames:
-                parsed = self.parse_frame(f)
-                if parsed["mid"] != 0x02:
-                    print(f"❌ Unexpected MID in response: 0x{parsed['mid']:02X}")
-                    continue
-
-                data = parsed["data"]
-                if len(data) < 2:
-                    print("❌ Invalid data length in response.")
-                    continue
-
-                mask = int.from_bytes(data[:2], byteorder="big")
-                print(f"📥 Queried enabled antenna mask: {mask:#06X}")
-                return mask
-
-            print("❌ No MID=0x02 frame found.")
-            return 0
+            mask = self.parse_ant_mask_data(parsed["data"])
+            if mask is None:
+                print(f"❌ Invalid antenna mask response: {parsed['data'].hex()}")
+                self.state.invalidate("antenna_mask")
+                return 0
+            print(f"📥 Queried enabled antenna mask: {mask:#06X}")
+            self.state.set("antenna_mask", mask)
+            return mask
         except Exception as e:
             print(f"❌ Exception in query_enabled_ant_mask: {e}")
             return 0
@@ -1628,63 +2240,57 @@ class NationReader:
         """
         Enable a single antenna and optionally save the state.
         """
-        if not (1 <= ant_id <= 32):
-            print(f"❌ Invalid antenna ID: {ant_id}")
-            return False
-        try:
-            # Query current mask
-            mask = self.query_enabled_ant_mask()
-            new_mask = mask | (1 << (ant_id - 1))
-            # Build payload: [mask (4 bytes)] + [PID=0xFF, persist flag]
-            payload = new_mask.to_bytes(4, 'big')
-            if save is not None:
-                payload += b'\xFF' + (b'\x01' if save else b'\x00')
-            frame = self.build_frame(mid=0x0203, payload=payload)
-            self.uart.flush_input()
-            self.uart.send(frame)
-            raw = self.uart.receive(64)
-            parsed = self.parse_frame(raw)
-            if parsed["mid"] == 0x03 and parsed["data"] and parsed["data"][0] == 0x00:
-                print(f"✅ Enabled antenna {ant_id} (mask={new_mask:08X}, save={save})")
-                return True
-            else:
-                print(f"❌ Failed to enable antenna {ant_id}")
-                return False
-        except Exception as e:
-            print(f"❌ Exception in enable_ant: {e}")
-            return False
+        return self.update_ant_mask(enable=[ant_id], save=save)
 
 
     def disable_ant(self, ant_id: int, save: bool = True) -> bool:
         """
         Disable a single antenna and optionally save the state.
         """
-        if not (1 <= ant_id <= 32):
-            print(f"❌ Invalid antenna ID: {ant_id}")
+        return self.update_ant_mask(disable=[ant_id], save=save)
+
+    def update_ant_mask(self, enable: Iterable[int] = (), disable: Iterable[int] = (), save: bool = True) -> bool:
+        """
+        Enable and/or disable several antennas with a single command.
+        The current mask comes from the cached reader state (queried only when unknown).
+        :param enable: 1-based antenna IDs to switch on
+        :param disable: 1-based antenna IDs to switch off
+        """
+        enable, disable = list(enable), list(disable)
+        invalid = [a for a in enable + disable if not (1 <= a <= 32)]
+        if invalid:
+            print(f"❌ Invalid antenna ID: {invalid[0]}")
             return False
         try:
-            # Query current mask
-            mask = self.query_enabled_ant_mask()
-            new_mask = mask & ~(1 << (ant_id - 1))
-            # Build payload: [mask (4 bytes)] + [PID=0xFF, persist flag]
-            payload = new_mask.to_bytes(4, 'big')
-            if save is not None:
-                payload += b'\xFF' + (b'\x01' if save else b'\x00')
-            frame = self.build_frame(mid=0x0203, payload=payload)
-            self.uart.flush_input()
-            self.uart.send(frame)
-            raw = self.uart.receive(64)
-            parsed = self.parse_frame(raw)
-            if parsed["mid"] == 0x03 and parsed["data"] and parsed["data"][0] == 0x00:
-                print(f"✅ Disabled antenna {ant_id} (mask={new_mask:08X}, save={save})")
+            mask = self.query_enabled_ant_mask(use_cache=True)
+            new_mask = mask
+            for ant_id in enable:
+                new_mask |= 1 << (ant_id - 1)
+            for ant_id in disable:
+                new_mask &= ~(1 << (ant_id - 1))
+            if new_mask == mask and self.state.known("antenna_mask"):
+                print(f"✅ Antenna mask already {new_mask:08X}")
+                return True
+            payload = self.build_ant_mask_payload(new_mask, save)
+            parsed = self._command(MID.CONFIG_ANT_MASK, payload)
+            if (parsed["category"], parsed["mid"]) == (0x01, 0x03) and parsed["data"] and parsed["data"][0] == 0x00:
+                self.state.set("antenna_mask", new_mask)
+                print(f"✅ Antenna mask set (enabled={enable}, disabled={disable}, mask={new_mask:08X}, save={save})")
                 return True
             else:
-                print(f"❌ Failed to disable antenna {ant_id}")
+                print(f"❌ Failed to update antenna mask (enable={enable}, disable={disable})")
                 return False
         except Exception as e:
-            print(f"❌ Exception in disable_ant: {e}")
+            print(f"❌ Exception in update_ant_mask: {e}")
             return False
 
+    def get_enabled_ants(self) -> list[int]:
+        """
+        1-based IDs of the enabled antennas (from the cached mask when known).
+        """
+        mask = self.query_enabled_ant_mask(use_cache=True)
+        return [i for i in range(1, 33) if (mask >> (i - 1)) & 1]
+
 
     def build_antenna_mask(self,antenna_ids: list[int]) -> int:
         """
@@ -1761,18 +2367,13 @@ class NationReader:
             return False
 
         try:
-            self.uart.flush_input()
             payload = bytes([profile_id])
-            frame = self.build_frame(mid=0x020A, payload=payload, rs485=self.rs485)
-            self.uart.send(frame)
-
-            time.sleep(0.1)
-            raw = self.uart.receive(64)
-            if not raw:
+            try:
+                parsed = self._command(0x020A, payload)
+            except TimeoutError:
                 print("❌ No response from reader.")
                 return False
 
-            parsed = self.parse_frame(raw)
             if parsed["mid"] != 0x0A:
                 print(f"❌ Unexpected MID in response: 0x{parsed['mid']:02X}")
                 return False
@@ -1783,6 +2384,7 @@ class NationReader:
                 return False
 
             print(f"✅ Profile {profile_id} selected successfully.")
+            self.state.invalidate("baseband")
             return True
 
         except Exception as e:
@@ -1839,28 +2441,17 @@ class NationReader:
 
     
     # Inside your NationReader class
-    def query_rf_band(self):
-        RF_BAND_CODES = {
-            0: "CN 920–925 MHz",
-            1: "CN 840–845 MHz",
-            2: "CN Dual-band 840–845 + 920–925 MHz",
-            3: "FCC 902–928 MHz",
-            4: "ETSI 866–868 MHz",
-            5: "JP 916.8–920.4 MHz",
-            6: "TW 922.25–927.75 MHz",
-            7: "ID 923.125–925.125 MHz",
-            8: "RUS 866.6–867.4 MHz"
-        }
+    def query_rf_band(self, use_cache: bool = False):
+        RF_BAND_CODES = self.RF_BAND_CODES
+        if use_cache:
+            cached = self.state.get("rf_band")
+            if cached is not None:
+                return cached
         CAT_RF_BAND = 0x02
         MID_RF_BAND = 0x04
 
         try:
-            self.uart.flush_input()
-            frame = self.build_frame(mid=(CAT_RF_BAND << 8) | MID_RF_BAND, payload=b'')
-            print(f"📤 Sending frame: {frame.hex().upper()}")
-            self.send(frame)
-            raw = self.receive(64)
-            parsed = self.parse_frame(raw)
+            parsed = self._command((CAT_RF_BAND << 8) | MID_RF_BAND)
             print(f"📥 Parsed frame: CAT=0x{parsed['category']:02X}, MID=0x{parsed['mid']:02X}, Data={parsed['data'].hex().upper()}")
 
             if parsed["category"] != CAT_RF_BAND or parsed["mid"] != MID_RF_BAND:
@@ -1873,10 +2464,12 @@ class NationReader:
             band_code = data[0]
             band_name = RF_BAND_CODES.get(band_code, f"Unknown ({band_code})")
             print(f"📡 Current RF Band: {band_name} [Code={band_code}]")
-            return {
+            band = {
                 "band_code": band_code,
                 "band_name": band_name
             }
+            self.state.set("rf_band", band)
+            return band
         except Exception as e:
             print(f"❌ Error querying RF band: {e}")
             return None
@@ -1888,17 +2481,7 @@ class NationReader:
         - persist: True to save after power-down, False for temporary
         Returns True if successful, False otherwise.
         """
-        RF_BAND_CODES = {
-            0: "CN 920–925 MHz",
-            1: "CN 840–845 MHz",
-            2: "CN Dual-band 840–845 + 920–925 MHz",
-            3: "FCC 902–928 MHz",
-            4: "ETSI 866–868 MHz",
-            5: "JP 916.8–920.4 MHz",
-            6: "TW 922.25–927.75 MHz",
-            7: "ID 923.125–925.125 MHz",
-            8: "RUS 866.6–867.4 MHz"
-        }
+        RF_BAND_CODES = self.RF_BAND_CODES
         CAT_SET_RF_BAND = 0x02
         MID_SET_RF_BAND = 0x03
 
@@ -1906,62 +2489,42 @@ class NationReader:
             if not (0 <= band_code <= 8):
                 raise ValueError("Invalid band_code. Must be between 0–8.")
 
-            self.stop_inventory()
-            self.is_idle()
-            self.uart.flush_input()
-            time.sleep(0.5)
+            if not self.stop_inventory():
+                print("❌ Reader not idle")
+                return False
 
-            # Build payload and frame
             payload = bytes([band_code])
-            frame = self.build_frame(mid=(CAT_SET_RF_BAND << 8) | MID_SET_RF_BAND, payload=payload)
             print(f"📤 Setting RF Band: {RF_BAND_CODES.get(band_code, 'Unknown')} [Persist={'Yes' if persist else 'No'}]")
-            print(f"📤 Sending frame: {frame.hex().upper()}")
-            self.send(frame)
-
-            # Wait and parse response
-            timeout = 1.0
-            start_time = time.time()
-
-            while time.time() - start_time < timeout:
-                raw = self.receive(64)
-                if not raw:
-                    time.sleep(0.01)
-                    continue
-
-                print(f"📥 Received raw data: {raw.hex().upper()}")
 
-                try:
-                    parsed = self.parse_frame(raw)
-                    print(f"📥 Parsed frame: CAT=0x{parsed['category']:02X}, MID=0x{parsed['mid']:02X}, Data={parsed['data'].hex().upper()}")
-                    data = parsed.get("data", b"")
-                except Exception as e:
-                    print(f"⚠️ Frame parse error: {e}")
-                    continue
-
-                # Check both category and mid
-                if parsed["category"] != CAT_SET_RF_BAND or parsed["mid"] != MID_SET_RF_BAND:
-                    print(f"⚠️ Ignored frame with CAT=0x{parsed['category']:02X}, MID=0x{parsed['mid']:02X} (expecting CAT=0x02, MID=0x03)")
-                    continue
-                print(f"📥 RF Band set response: {data.hex().upper()}")
+            # Send and wait for the response
+            try:
+                parsed = self._command((CAT_SET_RF_BAND << 8) | MID_SET_RF_BAND, payload, timeout=1.0)
+            except TimeoutError:
+                print("❌ No valid response for set_rf_band within timeout.")
+                return False
 
-                if len(data) < 1:
-                    raise ValueError("⚠️ Invalid response length for set RF band")
+            data = parsed.get("data", b"")
+            print(f"📥 Parsed frame: CAT=0x{parsed['category']:02X}, MID=0x{parsed['mid']:02X}, Data={data.hex().upper()}")
+            if parsed["category"] != CAT_SET_RF_BAND or parsed["mid"] != MID_SET_RF_BAND:
+                print(f"❌ Unexpected response: CAT=0x{parsed['category']:02X}, MID=0x{parsed['mid']:02X}")
+                return False
 
-                status = data[0]
-                if status == 0x00:
-                    print(f"✅ RF Band set to {RF_BAND_CODES[band_code]} [Persist={'Yes' if persist else 'No'}]")
-                    return True
-                else:
-                    error_map = {
-                        0x01: "Unsupported frequency by hardware",
-                        0x02: "Save failed"
-                    }
-                    reason = error_map.get(status, "Unknown error")
-                    print(f"❌ Failed to set RF band (status=0x{status:02X}): {reason}")
-                    return False
+            if len(data) < 1:
+                raise ValueError("⚠️ Invalid response length for set RF band")
 
-            print("❌ No valid response for set_rf_band within timeout.")
-            return False
+            status = data[0]
+            if status == 0x00:
+                print(f"✅ RF Band set to {RF_BAND_CODES[band_code]} [Persist={'Yes' if persist else 'No'}]")
+                self.state.set("rf_band", {"band_code": band_code, "band_name": RF_BAND_CODES[band_code]})
+                return True
+            else:
+                error_map = {
+                    0x01: "Unsupported frequency by hardware",
+                    0x02: "Save failed"
+                }
+                reason = error_map.get(status, "Unknown error")
+                print(f"❌ Failed to set RF band (status=0x{status:02X}): {reason}")
+                return False
 
         except Exception as e:
             print(f"❌ Error setting RF band: {e}")
@@ -1978,16 +2541,11 @@ class NationReader:
             }
         """
         try:
-            self.uart.flush_input()
-            frame = self.build_frame(mid=0x0206, payload=b'', rs485=self.rs485)
-            self.uart.send(frame)
-
-            time.sleep(0.1)
-            raw = self.uart.receive(64)
-            if not raw:
+            try:
+                parsed = self._command(0x0206)
+            except TimeoutError:
                 raise Exception("No response for working frequency query")
 
-            parsed = self.parse_frame(raw)
             if parsed["mid"] != 0x06:
                 raise Exception("Unexpected MID")
 
@@ -2008,38 +2566,33 @@ class NationReader:
             return {"mode": "error", "channels": []}
 
 
-    def query_filter_settings(self) -> dict:
+    def query_filter_settings(self, use_cache: bool = False) -> dict:
         """
         Queries tag filtering settings:
         - Repeat tag suppression time (in 10ms units)
         - RSSI threshold
         MID = 0x020A
+        :param use_cache: Answer from the cached reader state when known
         """
+        if use_cache:
+            cached = self.state.get("filter")
+            if cached is not None:
+                return cached
         try:
-            self.uart.flush_input()
-            frame = self.build_frame(mid=0x020A, payload=b'', rs485=self.rs485)
-            self.uart.send(frame)
-
-            time.sleep(0.1)
-            raw = self.uart.receive(64)
-            if not raw:
+            try:
+                parsed = self._command(0x020A)
+            except TimeoutError:
                 raise Exception("No response for filter settings query")
 
-            parsed = self.parse_frame(raw)
             if parsed["mid"] != 0x0A:
                 raise Exception("Unexpected MID")
 
-            data = parsed["data"]
-            if len(data) < 2:
+            filtering = self.parse_filter_data(parsed["data"])  # repeat_time in units of 10ms
+            if filtering is None:
                 raise Exception("Insufficient data")
 
-            repeat_time = int.from_bytes(data[0:2], 'big')  # units of 10ms
-            rssi_threshold = data[2] if len(data) >= 3 else None
-
-            return {
-                "repeat_time": repeat_time,
-                "rssi_threshold": rssi_threshold
-            }
+            self.state.set("filter", filtering)
+            return filtering
 
         except Exception as e:
             print(f"❌ Error in query_filter_settings: {e}")
@@ -2084,6 +2637,7 @@ class NationReader:
 
         if success or mode == 2:
             self.beeper_mode = mode  # Only set if command succeeded, or mode is 2 (no hardware call)
+            self.state.set("beeper_mode", mode)
         else:
             print(f"⚠️ Failed to apply buzzer command for mode {mode}")
 
@@ -2102,31 +2656,13 @@ class NationReader:
             raise ValueError("Invalid parameters: ring and duration must be 0 or 1")
 
         try:
-            self.uart.flush_input()  # Clear any previous data in the UART buffer
             # Build the payload for the buzzer control command
             payload = bytes([ring, duration])
             # print(f"📦 Buzzer control payload: {payload.hex()}")
 
-            # Build the communication frame with the correct category and MID
-            mid = (0x01 << 8) | 0x1F  # Category 0x01, MID 0x1F
-            frame = self.build_frame(mid=mid, payload=payload, rs485=self.rs485)
-            # print(f"📤 Sending buzzer control frame: {frame.hex()}")
-
-            # Send the frame
-            self.send(frame)
-
-            # Receive and parse the response
-            raw_response = self.receive(64)
-            # print(f"📥 Received raw response: {raw_response.hex()}")
-
-            # Validate the response frame
-            if len(raw_response) < 9:
-                raise ValueError("Frame too short")
-            if raw_response[0] != FRAME_HEADER:
-                raise ValueError("Invalid frame header")
-
-            # Parse the response
-            response = self.parse_frame(raw_response)
+            # Category 0x01, MID 0x1F; the reader thread routes the reply back
+            mid = (0x01 << 8) | 0x1F
+            response = self._command(mid, payload)
 
             # Check the response MID and result
             if response["mid"] == (mid & 0xFF):  # Compare only the MID part
@@ -2158,22 +2694,12 @@ class NationReader:
 
     def get_session(self) -> Optional[int]:
         try:
-            self.uart.flush_input()
-            frame = self.build_frame(mid=MID.QUERY_BASEBAND, payload=b'', rs485=False)
-            self.uart.send(frame)
-
-            raw = self.uart.receive(64)
-            if not raw:
+            try:
+                response = self._command(MID.QUERY_BASEBAND)
+            except TimeoutError:
                 print("❌ No response for session query.")
                 return None
 
-            # print(f"📥 Raw response: {raw.hex()}")
-            frames = self.extract_valid_frames(raw)
-            frame_data = frames[0]  # first valid frame
-
-            response = self.parse_frame(frame_data)
-
-            
             data = response["data"]
             if len(data) < 4:
                 print("❌ Response too short for session info.")
@@ -2193,28 +2719,25 @@ class NationReader:
 
    
     
-    def is_idle(self, retry: int = 3, delay: float = 0.3, settle_delay: float = 0.5) -> bool:
+    def is_idle(self, retry: int = 3, delay: float = 0.05, settle_delay: float = 0.0) -> bool:
         """
         Checks if the reader is in the Idle state by sending STOP.
-        After confirming idle, waits an additional settle_delay to ensure hardware is ready.
+        The STOP response is the idle confirmation; a timeout already waited a
+        full deadline, so only a 'not idle' reply backs off `delay` before retrying.
+        :param settle_delay: Extra wait after idle is confirmed (only for hardware known to need it)
         """
         for attempt in range(retry):
             try:
-                self.uart.flush_input()
-                stop_frame = self.build_frame(mid=MID.STOP_INVENTORY, payload=b'', rs485=self.rs485)
-                self.uart.send(stop_frame)
-
-                raw_response = self.uart.receive(64)
-                if not raw_response:
+                try:
+                    response = self._command(MID.STOP_INVENTORY)
+                except TimeoutError:
                     print(f"❌ Attempt {attempt+1}/{retry}: No response received for Idle check.")
-                    time.sleep(delay)
                     continue
 
-                response = self.parse_frame(raw_response)
                 if response["mid"] == (MID.STOP_INVENTORY & 0xFF) and response["data"][0] == 0x00:
                     print("✅ Reader responded with STOP success.")
-                    print(f"⏳ Waiting {settle_delay}s for hardware to fully settle...")
-                    time.sleep(settle_delay)
+                    if settle_delay:
+                        time.sleep(settle_delay)
                     return True
                 else:
                     print(f"❌ Attempt {attempt+1}/{retry}: Not idle yet. Response: {response}")
@@ -2234,89 +2757,58 @@ class NationReader:
         Uses MID = 0x0B, Category = 0x01 per protocol spec.
         """
 
-        # --- Step 1: Validate Inputs ---
-        if speed not in (0, 1, 2, 3, 4, 255):
-            print(f"❌ Invalid speed: {speed}")
-            return False
-        if not (0 <= q_value <= 15):
-            print(f"❌ Invalid Q: {q_value}")
-            return False
-        if session not in (0, 1, 2, 3):
-            print(f"❌ Invalid session: {session}")
-            return False
-        if inventory_flag not in (0, 1, 2):
-            print(f"❌ Invalid flag: {inventory_flag}")
+        # --- Step 1: Validate Inputs + Encode TLV Payload ---
+        try:
+            payload = self.build_baseband_payload(speed, q_value, session, inventory_flag)
+        except ValueError as e:
+            print(f"❌ {e}")
             return False
 
         try:
-            # --- Step 2: Ensure Reader Idle ---
-            self.stop_inventory()
-            if not self.is_idle():
+            # --- Step 2: Ensure Reader Idle (the STOP ack is the idle confirmation) ---
+            if not self.stop_inventory():
                 print("❌ Reader not idle")
                 return False
-            time.sleep(0.1)
-            self.uart.flush_input()
-
-            # --- Step 3: Encode TLV Payload ---
-            payload = bytes([
-                0x01, speed,
-                0x02, q_value,
-                0x03, session,
-                0x04, inventory_flag
-            ])
-
-            # --- Step 4: Build Frame with Correct MID Format ---
-            mid_value =  MID.CONFIG_BASEBAND  
-            frame = self.build_frame(
-                mid=mid_value,
-                payload=payload,
-                rs485=False,
-                notify=False
-            )
-            print(f"📤 sent Frame: {frame}")
-
-            # --- Step 5: Send Frame ---
-            self.uart.send(frame)
 
-            # --- Step 6: Wait + Parse Response ---
-            raw = self.uart.receive(64)
-            print(f"📥 Raw: {raw.hex()}")
-            frames = self.extract_valid_frames(raw)
-            if not frames:
+            # --- Step 3: Send Frame + Wait for Response ---
+            print(f"📤 sent Payload: {payload.hex()}")
+            try:
+                resp = self._command(MID.CONFIG_BASEBAND, payload)
+            except TimeoutError:
                 print("❌ No valid response")
                 return False
 
-            for f in frames:
-                resp = self.parse_frame(f)
-                if resp['mid'] == 0x0B and resp['category'] in (0x01, 0x02):
-                    code = resp['data'][0]
-                    if code == 0x00:
-                        print("✅ CONFIG_BASEBAND OK")
-                        return True
-                    else:
-                        errors = {
-                            0x01: "Unsupported baseband",
-                            0x02: "Q param error",
-                            0x03: "Session error",
-                            0x04: "Flag error",
-                            0x05: "Other param error",
-                            0x06: "Save failed"
-                        }
-                        print(f"❌ Error: {errors.get(code, f'Code 0x{code:02X}')}")
-                        return False
-
-                elif resp['mid'] == 0x00:  # Generic error
-                    err = resp['data'][0] if resp['data'] else None
-                    generic = {
-                        0x01: "Unsupported instruction",
-                        0x02: "CRC or mode error",
-                        0x03: "Param error",
-                        0x04: "Busy",
-                        0x05: "Invalid state"
+            if resp['mid'] == 0x0B and resp['category'] in (0x01, 0x02):
+                code = resp['data'][0]
+                if code == 0x00:
+                    print("✅ CONFIG_BASEBAND OK")
+                    self.state.set("baseband", {"speed": speed, "q_value": q_value,
+                                                "session": session, "inventory_flag": inventory_flag})
+                    return True
+                else:
+                    errors = {
+                        0x01: "Unsupported baseband",
+                        0x02: "Q param error",
+                        0x03: "Session error",
+                        0x04: "Flag error",
+                        0x05: "Other param error",
+                        0x06: "Save failed"
                     }
-                    print(f"❌ Generic error: {generic.get(err, f'0x{err:02X}')}")
+                    print(f"❌ Error: {errors.get(code, f'Code 0x{code:02X}')}")
                     return False
 
+            elif resp['mid'] == 0x00:  # Generic error
+                err = resp['data'][0] if resp['data'] else None
+                generic = {
+                    0x01: "Unsupported instruction",
+                    0x02: "CRC or mode error",
+                    0x03: "Param error",
+                    0x04: "Busy",
+                    0x05: "Invalid state"
+                }
+                print(f"❌ Generic error: {generic.get(err, f'0x{err:02X}')}")
+                return False
+
             print("❌ No valid CONFIG_BASEBAND reply")
             return False
 
@@ -2325,50 +2817,259 @@ class NationReader:
             return False
 
 
-    def query_baseband_profile(self) -> dict:
+    def query_baseband_profile(self, use_cache: bool = False) -> dict:
         """
         Query the current EPC baseband parameters.
         Returns a dict: {speed, q_value, session, inventory_flag}
+        :param use_cache: Answer from the cached reader state when known (no STOP, no round-trip)
         """
+        if use_cache:
+            cached = self.state.get("baseband")
+            if cached is not None:
+                return cached
         try:
             self.stop_inventory()  # Ensure reader is idle before querying
-            self.uart.flush_input()
-            # MID = 0x0C in category 0x01 (see MID.QUERY_BASEBAND)
-            frame = self.build_frame(mid=MID.QUERY_BASEBAND, payload=b'', rs485=False)
-            self.uart.send(frame)
-            
-            
-            raw = self.uart.receive(64)
-            if not raw:
+            # MID = 0x0C in category 0x02 (see MID.QUERY_BASEBAND)
+            try:
+                response = self._command(MID.QUERY_BASEBAND)
+            except TimeoutError:
                 print("❌ No response for baseband profile query.")
                 return {}
 
-            frames = self.extract_valid_frames(raw)
-            
-            if not frames:
-                print("❌ No valid frames extracted.")
-                return {}
-
-            
-            frame_data = frames[0]  # first valid frame
-
-            response = self.parse_frame(frame_data)
             # Data: [speed, q_value, session, inventory_flag]
-            data = response['data']
-            
-            if len(data) < 4:
+            baseband = self.parse_baseband_data(response['data'])
+            if baseband is None:
                 print("❌ Invalid baseband profile length.")
                 return {}
 
-            return {
-                "speed": data[0],
-                "q_value": data[1],
-                "session": data[2],
-                "inventory_flag": data[3]
-            }
-            
+            self.state.set("baseband", baseband)
+            return baseband
+
         except Exception as e:
             print(f"❌ Exception in query_baseband_profile: {e}")
             return {}
 
+    ################################################################################
+    #                            PIPELINED CONFIG HEADER                           #
+    ################################################################################
+    def configure_pipelined(
+        self,
+        antenna_powers: Optional[dict[int, int]] = None,
+        antenna_mask: Optional[int] = None,
+        baseband: Optional[dict] = None,
+        filter_settings: Optional[dict] = None,
+        rf_band: Optional[int] = None,
+        persistence: Optional[bool] = None,
+        timeout: float = 1.0,
+        ensure_idle: bool = True,
+    ) -> dict:
+        """
+        Send several configuration commands back-to-back and collect every ack,
+        so shift-start setup costs one round-trip instead of one per command.
+        :param antenna_powers: {antenna_id: dBm}
+        :param antenna_mask: 32-bit enabled-antenna mask
+        :param baseband: {"speed", "q_value", "session", "inventory_flag"}
+        :param filter_settings: {"repeated_time_ms", "rssi_threshold"}
+        :param rf_band: Band code 0–8 (see RF_BAND_CODES)
+        :param persistence: Save power/antenna settings across power-down (None = reader default)
+        :param timeout: Per-command deadline in seconds
+        :param ensure_idle: Send one STOP before the batch
+        :return: {"success": bool, "results": {name: {"success", "result_code", ...}}}
+        """
+        commands = []
+        try:
+            if antenna_powers:
+                commands.append(("antenna_powers", MID.CONFIGURE_READER_POWER,
+                                 self.build_power_payload(antenna_powers, persistence)))
+            if antenna_mask is not None:
+                commands.append(("antenna_mask", MID.CONFIG_ANT_MASK, self.build_ant_mask_payload(antenna_mask, persistence)))
+            if baseband:
+                commands.append(("baseband", MID.CONFIG_BASEBAND, self.build_baseband_payload(**baseband)))
+            if filter_settings:
+                commands.append(("filter", 0x0209, self.build_filter_payload(**filter_settings)))
+            if rf_band is not None:
+                if rf_band not in self.RF_BAND_CODES:
+                    raise ValueError(f"Invalid band_code {rf_band}. Must be between 0–8.")
+                commands.append(("rf_band", MID.CONFIG_RF_BAND, bytes([rf_band])))
+        except (TypeError, ValueError) as e:
+            print(f"❌ Invalid configuration: {e}")
+            return {"success": False, "message": str(e), "results": {}}
+
+        if not commands:
+            return {"success": True, "results": {}}
+        if ensure_idle and not self.stop_inventory():
+            return {"success": False, "message": "Reader not idle", "results": {}}
+
+        start = time.monotonic()
+        futures = [self.submit(mid, payload, timeout=timeout) for _, mid, payload in commands]
+        outcomes = self.wait_all(futures)
+        elapsed_ms = (time.monotonic() - start) * 1000
+
+        applied = {
+            "antenna_powers": antenna_powers,
+            "antenna_mask": antenna_mask,
+            "baseband": baseband,
+            "filter": filter_settings and {"repeat_time": filter_settings.get("repeated_time_ms", 0) // 10,
+                                           "rssi_threshold": filter_settings.get("rssi_threshold", 0)},
+            "rf_band": rf_band is not None and {"band_code": rf_band, "band_name": self.RF_BAND_CODES.get(rf_band)},
+        }
+        results = {}
+        for (name, mid, _), outcome in zip(commands, outcomes):
+            if isinstance(outcome, Exception):
+                results[name] = {"success": False, "result_code": None, "message": str(outcome)}
+                continue
+            code = outcome["data"][0] if outcome["data"] else -1
+            results[name] = {
+                "success": (outcome["category"], outcome["mid"]) == divmod(mid, 0x100) and code == 0x00,
+                "result_code": code,
+            }
+            if results[name]["success"]:
+                if name == "antenna_powers":
+                    self.state.merge(name, applied[name])
+                else:
+                    self.state.set(name, applied[name])
+        success = all(r["success"] for r in results.values())
+        print(f"{'✅' if success else '❌'} Pipelined {len(commands)} config commands in {elapsed_ms:.1f} ms")
+        return {"success": success, "elapsed_ms": round(elapsed_ms, 2), "results": results}
+
+    def apply_config(self, desired: dict, persistence: Optional[bool] = None, timeout: float = 1.0,
+                     dry_run: bool = False) -> dict:
+        """
+        Bring the reader to `desired` by sending only what differs from the cached state.
+        Antenna enables are merged into one mask write and every changed setting goes
+        out in a single pipelined batch behind one STOP; with nothing to change the
+        reader is not touched at all (a running inventory keeps running).
+        :param desired: Any of
+            "antenna_powers": {antenna_id: dBm}
+            "antennas": [1-based IDs to enable, all others disabled] or "antenna_mask": int
+            "baseband": {"speed", "q_value", "session", "inventory_flag"} (missing keys keep the cached value)
+            "filter": {"repeated_time_ms", "rssi_threshold"}
+            "rf_band": band code 0–8
+            "beeper_mode": 0 | 1 | 2
+        Unknown settings (not cached yet) are always sent.
+        :param dry_run: Only compute the diff
+        :return: {"success", "elapsed_ms", "changed": [...], "results": {field: {"success", "changed", ...}}}
+        """
+        start = time.monotonic()
+        unknown_keys = set(desired) - {"antenna_powers", "antennas", "antenna_mask", "baseband",
+                                       "filter", "rf_band", "beeper_mode"}
+        if unknown_keys:
+            return {"success": False, "message": f"Unknown config keys: {sorted(unknown_keys)}", "results": {}}
+
+        results = {}
+        batch = {}
+        state = self.state
+
+        powers = desired.get("antenna_powers")
+        if powers:
+            powers = {int(k): int(v) for k, v in powers.items()}
+            current = state.get("antenna_powers") or {}
+            diff = {ant: dbm for ant, dbm in powers.items() if current.get(ant) != dbm}
+            if diff:
+                batch["antenna_powers"] = diff
+
+        mask = desired.get("antenna_mask")
+        if "antennas" in desired:
+            mask = self.build_antenna_mask(desired["antennas"]) if desired["antennas"] else 0
+        if mask is not None and state.get("antenna_mask") != mask:
+            batch["antenna_mask"] = mask
+
+        baseband = desired.get("baseband")
+        if baseband:
+            current = state.get("baseband")
+            merged = dict(current or {}, **baseband)
+            missing = {"speed", "q_value", "session", "inventory_flag"} - set(merged)
+            if missing:
+                results["baseband"] = {"success": False, "changed": False,
+                                       "message": f"Baseband state unknown, missing {sorted(missing)}"}
+            elif merged != current:
+                batch["baseband"] = merged
+
+        filtering = desired.get("filter")
+        if filtering:
+            wanted = {"repeated_time_ms": int(filtering.get("repeated_time_ms", 0)),
+                      "rssi_threshold": int(filtering.get("rssi_threshold", 0))}
+            current = state.get("filter")
+            if current != {"repeat_time": wanted["repeated_time_ms"] // 10, "rssi_threshold": wanted["rssi_threshold"]}:
+                batch["filter"] = wanted
+
+        band = desired.get("rf_band")
+        if band is not None:
+            current = state.get("rf_band")
+            if not current or current.get("band_code") != int(band):
+                batch["rf_band"] = int(band)
+
+        beeper = desired.get("beeper_mode")
+        beeper_changed = beeper is not None and state.get("beeper_mode") != beeper
+
+        changed = list(batch) + (["beeper_mode"] if beeper_changed else [])
+        for name in ("antenna_powers", "antenna_mask", "baseband", "filter", "rf_band", "beeper_mode"):
+            requested = name in desired or (name == "antenna_mask" and "antennas" in desired)
+            if requested and name not in changed and name not in results:
+                results[name] = {"success": True, "changed": False}
+
+        if dry_run:
+            return {"success": "baseband" not in results or results["baseband"]["success"],
+                    "dry_run": True, "changed": changed, "batch": batch, "results": results}
+
+        if batch:
+            kwargs = {("filter_settings" if name == "filter" else name): value for name, value in batch.items()}
+            outcome = self.configure_pipelined(persistence=persistence, timeout=timeout, **kwargs)
+            if not outcome["results"]:  # rejected before sending (invalid value or reader not idle)
+                for name in batch:
+                    results[name] = {"success": False, "changed": True, "message": outcome.get("message")}
+            for name, result in outcome["results"].items():
+                results[name] = dict(result, changed=True)
+        if beeper_changed:
+            try:
+                ok = self.set_beeper(int(beeper))
+            except ValueError as e:
+                ok = False
+                print(f"❌ {e}")
+            results["beeper_mode"] = {"success": ok, "changed": True}
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        success = all(r["success"] for r in results.values())
+        print(f"{'✅' if success else '❌'} apply_config: {len(changed)} changed "
+              f"({', '.join(changed) or 'none'}) in {elapsed_ms:.1f} ms")
+        return {"success": success, "elapsed_ms": round(elapsed_ms, 2), "changed": changed, "results": results}
+
+    ################################################################################
+    #                            READER STATE HEADER                               #
+    ################################################################################
+    def refresh_state(self, timeout: float = 1.0) -> dict:
+        """
+        Read every cached setting from the hardware in one pipelined batch
+        (one STOP, then power, antenna mask, baseband, RF band and filter queries
+        back-to-back). Called once after connect; afterwards command acks keep
+        the state current.
+        :return: ReaderState snapshot
+        """
+        if not self.stop_inventory():
+            print("❌ Reader not idle, state not refreshed")
+            return self.state.snapshot()
+
+        queries = [
+            ("antenna_powers", MID.QUERY_READER_POWER, self.parse_power_data),
+            ("antenna_mask", MID.QUERY_ANT_MASK, self.parse_ant_mask_data),
+            ("baseband", MID.QUERY_BASEBAND, self.parse_baseband_data),
+            ("rf_band", MID.QUERY_RF_BAND, lambda d: {"band_code": d[0], "band_name": self.RF_BAND_CODES.get(d[0], f"Unknown ({d[0]})")} if d else None),
+            ("filter", 0x020A, self.parse_filter_data),
+        ]
+        futures = [self.submit(mid, timeout=timeout) for _, mid, _ in queries]
+        for (field, mid, parse), outcome in zip(queries, self.wait_all(futures)):
+            value = None
+            if not isinstance(outcome, Exception) and (outcome["category"], outcome["mid"]) == divmod(mid, 0x100):
+                value = parse(outcome["data"])
+            if value is None:
+                print(f"⚠️ Could not read {field} (MID=0x{getattr(mid, 'value', mid):04X})")
+                self.state.invalidate(field)
+            else:
+                self.state.set(field, value)
+        return self.state.snapshot()
 
+    def reader_state(self) -> dict:
+        """
+        Cached configuration (see ReaderState.snapshot); never touches the UART.
+        """
+        return self.state.snapshot()
@@ -0,0 +1,470 @@
+"""
+asyncio transport cho đầu đọc Nation.
+
+AsyncNationReader exposes the NationReader command set as coroutines on top of
+a non-blocking serial fd registered with the event loop, so many readers can
+share one thread with the web server instead of owning one blocking thread each.
+
+    async with AsyncNationReader("/dev/ttyUSB0") as reader:
+        await reader.configure_reader_power({1: 30})
+        await reader.start_inventory_with_mode([1, 2])
+        async for tag in reader.tags():
+            print(tag["epc"])
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+
+import serial
+
+from nation import FrameDecoder, MID, NationReader
+
+
+class AsyncSerialTransport:
+    """
+    Non-blocking serial port driven by loop.add_reader()/add_writer().
+    Incoming bytes are handed to on_data from the event loop thread.
+    """
+
+    def __init__(self, port: str, baudrate: int = 115200):
+        self.port_name = port
+        self.baudrate = baudrate
+        self.ser = None
+        self._loop = None
+        self._fd = None
+        self._on_data = None
+        self._write_buf = bytearray()
+
+    def open(self, on_data: Callable[[bytes], None]):
+        """
+        Open the port in non-blocking mode and start watching its fd.
+        :param on_data: Called with every chunk read from the port
+        """
+        if self.ser and self.ser.is_open:
+            return
+        try:
+            self.ser = serial.Serial(
+                port=self.port_name,
+                baudrate=self.baudrate,
+                bytesize=serial.EIGHTBITS,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE,
+                timeout=0,
+                write_timeout=0,
+                xonxoff=False,
+                rtscts=False,
+                dsrdtr=False
+            )
+        except serial.SerialException as e:
+            raise RuntimeError(f"❌ Failed to open serial port: {e}")
+
+        self._loop = asyncio.get_running_loop()
+        self._fd = self.ser.fileno()
+        os.set_blocking(self._fd, False)
+        self._on_data = on_data
+        self._loop.add_reader(self._fd, self._on_readable)
+        print(f"✅ UART (async) Connected to {self.port_name} @ {self.baudrate}bps")
+
+    def close(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop.remove_writer(self._fd)
+            self._fd = None
+        self._write_buf.clear()
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+            print(f"🔌 UART (async) Disconnected from {self.port_name}")
+
+    def is_open(self) -> bool:
+        return self._fd is not None
+
+    def write(self, data: bytes):
+        """
+        Queue bytes for the port; whatever the driver cannot take now is
+        flushed when the fd becomes writable.
+        """
+        if self._fd is None:
+            raise RuntimeError("❌ UART port is not open")
+        if not self._write_buf:
+            try:
+                sent = os.write(self._fd, data)
+            except BlockingIOError:
+                sent = 0
+            if sent == len(data):
+                return
+            data = data[sent:]
+            self._loop.add_writer(self._fd, self._on_writable)
+        self._write_buf += data
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"⚠️ UART read error: {e}")
+            self.close()
+            return
+        if data:
+            self._on_data(data)
+
+    def _on_writable(self):
+        try:
+            sent = os.write(self._fd, self._write_buf)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"⚠️ UART write error: {e}")
+            self.close()
+            return
+        del self._write_buf[:sent]
+        if not self._write_buf:
+            self._loop.remove_writer(self._fd)
+
+
+class AsyncNationReader:
+    """
+    Coroutine version of NationReader. Frame building/parsing is shared with the
+    threaded driver; only the I/O and the waiting are different.
+    """
+
+    # Frame/payload helpers are pure functions of their arguments, so reuse them as-is
+    build_frame = NationReader.build_frame
+    build_pcw = NationReader.build_pcw
+    parse_frame = NationReader.parse_frame
+    parse_epc = NationReader.parse_epc
+    build_antenna_mask = NationReader.build_antenna_mask
+    build_epc_read_payload = NationReader.build_epc_read_payload
+    all_read_end_mids = staticmethod(NationReader.all_read_end_mids)
+
+    def __init__(self, port: str, baudrate: int = 115200, tag_queue_size: int = 10000):
+        """
+        :param port: Serial port path (e.g. /dev/ttyUSB0)
+        :param baudrate: Baud rate (default: 115200)
+        :param tag_queue_size: Tags buffered for tags() before the oldest are dropped
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.rs485 = False
+        self.antenna_mask = 0x00000001
+        self.transport = AsyncSerialTransport(port, baudrate)
+        self.decoder = FrameDecoder()
+
+        self._inventory_running = False
+        self._on_tag = None
+        self._inventory_ended = asyncio.Event()
+        self._tags: deque = deque(maxlen=tag_queue_size)
+        self._tags_ready = asyncio.Event()
+        self.tags_dropped = 0
+
+        # Response demultiplexer: (category, mid) -> FIFO of waiting futures
+        self._pending: dict[tuple[int, int], deque] = {}
+
+    async def open(self):
+        self.decoder.reset()
+        self.transport.open(self._on_data)
+
+    async def close(self):
+        self._inventory_running = False
+        self._inventory_ended.set()
+        self._tags_ready.set()
+        self.transport.close()
+        self._fail_pending(ConnectionError("UART closed"))
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    ################################################################################
+    #                            FRAME DISPATCH                                    #
+    ################################################################################
+    def _on_data(self, data: bytes):
+        decoder = self.decoder
+        decoder.feed(data)
+        for frame in decoder.frames():
+            try:
+                self._dispatch_frame(self.parse_frame(frame, check_crc=False))
+            except Exception as e:
+                print(f"⚠️ Frame dispatch error: {e}")
+
+    def _dispatch_frame(self, parsed: dict):
+        cat = parsed["category"]
+        mid = parsed["mid"]
+
+        if parsed["notify"]:
+            if mid == 0x00:
+                self._handle_tag_frame(parsed)
+            elif mid in self.all_read_end_mids():
+                self._handle_read_end(parsed)
+            return
+
+        # Frames outlive this callback, so they must not alias the decoder buffer
+        parsed["data"] = bytes(parsed["data"])
+        parsed["raw"] = bytes(parsed["raw"])
+
+        future = self._pop_pending((cat, mid))
+        if future is None and mid == 0x00:
+            if cat == 0x02:
+                self._handle_tag_frame(parsed)
+                return
+            future = self._pop_pending(None)
+        if future is None:
+            print(f"🔍 Unsolicited frame CAT=0x{cat:02X} MID=0x{mid:02X}, Data={parsed['data'].hex()}")
+            return
+        future.set_result(parsed)
+
+    def _handle_tag_frame(self, parsed: dict):
+        if not self._inventory_running:
+            return
+        tag = self.parse_epc(parsed["data"])
+        if "error" in tag:
+            return
+        if self._on_tag:
+            try:
+                self._on_tag(tag)
+            except Exception as e:
+                print(f"⚠️ Tag callback error: {e}")
+        if len(self._tags) == self._tags.maxlen:
+            self.tags_dropped += 1
+        self._tags.append(tag)
+        self._tags_ready.set()
+
+    def _handle_read_end(self, parsed: dict):
+        data = parsed["data"]
+        reason = data[0] if data else None
+        print(f"✅ Inventory ended. Reason: {reason}")
+        self._inventory_running = False
+        self._inventory_ended.set()
+        self._tags_ready.set()
+
+    def _pop_pending(self, key) -> Optional[asyncio.Future]:
+        if key is None:
+            queues = [q for q in self._pending.values() if q]
+            if not queues:
+                return None
+            queue = min(queues, key=lambda q: q[0].created)
+        else:
+            queue = self._pending.get(key)
+        while queue:
+            future = queue.popleft()
+            if not future.done():
+                return future
+        return None
+
+    def _discard_pending(self, future: asyncio.Future):
+        queue = self._pending.get(future.key)
+        if queue and future in queue:
+            queue.remove(future)
+
+    def _fail_pending(self, exc: Exception):
+        pending, self._pending = self._pending, {}
+        for queue in pending.values():
+            for future in queue:
+                if not future.done():
+                    future.set_exception(exc)
+
+    ################################################################################
+    #                            COMMANDS                                          #
+    ################################################################################
+    def submit(self, mid, payload: bytes = b'', timeout: float = 1.0) -> asyncio.Future:
+        """
+        Send a command without waiting; await wait(future) (or gather several) later.
+        """
+        mid_value = getattr(mid, 'value', mid)
+        future = asyncio.get_running_loop().create_future()
+        future.key = ((mid_value >> 8) & 0xFF, mid_value & 0xFF)
+        future.mid = mid_value
+        future.created = time.monotonic()
+        future.deadline = future.created + timeout
+        self._pending.setdefault(future.key, deque()).append(future)
+        try:
+            self.transport.write(self.build_frame(mid_value, payload, rs485=self.rs485))
+        except Exception as e:
+            self._discard_pending(future)
+            future.set_exception(e)
+        return future
+
+    async def wait(self, future: asyncio.Future) -> dict:
+        remaining = max(0.0, future.deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), remaining)
+        except asyncio.TimeoutError:
+            self._discard_pending(future)
+            if future.done():
+                return future.result()
+            future.cancel()
+            raise TimeoutError(f"No response for MID=0x{future.mid:04X} within deadline")
+
+    async def command(self, mid, payload: bytes = b'', timeout: float = 1.0) -> dict:
+        return await self.wait(self.submit(mid, payload, timeout))
+
+    async def Query_Reader_Information(self) -> dict:
+        try:
+            frame = await self.command(MID.QUERY_INFO)
+        except TimeoutError:
+            print("❌ No response received.")
+            return {}
+        if frame['mid'] != 0x00 or frame['category'] != 0x01:
+            print("❌ Unexpected MID or Category.")
+            return {}
+        return NationReader._parse_query_info_data(frame['data']) or {}
+
+    async def stop_inventory(self, timeout: float = 1.0) -> bool:
+        self._inventory_running = False
+        self._inventory_ended.clear()
+        try:
+            resp = await self.command(MID.STOP_INVENTORY, timeout=timeout)
+        except TimeoutError:
+            if self._inventory_ended.is_set():
+                return True
+            print("❌ STOP failed: no valid response or reading end notification.")
+            return False
+        finally:
+            self._tags_ready.set()
+        result = resp["data"][0] if resp["data"] else -1
+        if resp["mid"] == MID.STOP_OPERATION and result == 0x00:
+            return True
+        print(f"⚠️ Reader responded: STOP error MID={resp['mid']:#04x} code={result:#02x}")
+        return False
+
+    async def start_inventory_with_mode(self, antenna_mask, callback=None) -> bool:
+        """
+        Start continuous inventory. Tags go to callback (if given) and to tags().
+        :param antenna_mask: List of 1-based antenna IDs
+        """
+        try:
+            await self.stop_inventory()
+            self._on_tag = callback
+            self._tags.clear()
+            self._tags_ready.clear()
+            self._inventory_ended.clear()
+            payload = self.build_epc_read_payload(self.build_antenna_mask(antenna_mask), continuous=True)
+            self._inventory_running = True
+            try:
+                resp = await self.command(MID.READ_EPC_TAG, payload, timeout=0.5)
+            except TimeoutError:
+                print("⚠️ No ack for inventory start, waiting for tags anyway.")
+                return True
+            code = resp["data"][0] if resp["data"] else -1
+            if resp["mid"] != (MID.READ_EPC_TAG & 0xFF) or code != 0x00:
+                self._inventory_running = False
+                print(f"❌ Inventory start rejected: MID=0x{resp['mid']:02X}, code={code}")
+                return False
+            return True
+        except Exception as e:
+            self._inventory_running = False
+            print(f"❌ Exception in start_inventory_with_mode: {e}")
+            return False
+
+    def is_inventory_running(self) -> bool:
+        return self._inventory_running
+
+    async def tags(self) -> AsyncIterator[dict]:
+        """
+        Yield tags from the current inventory until it is stopped or ends.
+        """
+        while True:
+            while self._tags:
+                yield self._tags.popleft()
+            if not self._inventory_running:
+                return
+            self._tags_ready.clear()
+            await self._tags_ready.wait()
+
+    async def query_reader_power(self) -> dict[int, int]:
+        try:
+            frame = await self.command(MID.QUERY_READER_POWER)
+        except TimeoutError:
+            print("❌ No response received from reader.")
+            return {}
+        if frame["mid"] != (MID.QUERY_READER_POWER & 0xFF):
+            print("❌ Unexpected response MID for power query.")
+            return {}
+        data = frame["data"]
+        return {data[i]: data[i + 1] for i in range(0, len(data) - 1, 2)}
+
+    async def configure_reader_power(self, antenna_powers: dict[int, int], persistence: Optional[bool] = None) -> bool:
+        try:
+            payload = NationReader.build_power_payload(antenna_powers, persistence)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        return await self._simple_command(MID.CONFIGURE_READER_POWER, payload)
+
+    async def query_enabled_ant_mask(self) -> int:
+        try:
+            parsed = await self.command(MID.QUERY_ANT_MASK)
+        except TimeoutError:
+            print("❌ No response for enabled antenna mask query.")
+            return 0
+        mask = NationReader.parse_ant_mask_data(parsed["data"])
+        return mask if mask is not None else 0
+
+    async def set_filter_settings(self, repeated_time_ms: int = 0, rssi_threshold: int = 0) -> bool:
+        try:
+            payload = NationReader.build_filter_payload(repeated_time_ms, rssi_threshold)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        return await self._simple_command(0x0209, payload)
+
+    async def configure_baseband(self, speed: int, q_value: int, session: int, inventory_flag: int) -> bool:
+        try:
+            payload = NationReader.build_baseband_payload(speed, q_value, session, inventory_flag)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        if not await self.stop_inventory():
+            print("❌ Reader not idle")
+            return False
+        return await self._simple_command(MID.CONFIG_BASEBAND, payload)
+
+    async def write_epc_tag_auto(
+        self,
+        new_epc_hex: str,
+        match_epc_hex: Optional[str] = None,
+        antenna_id: int = 1,
+        access_password: Optional[int] = None,
+        timeout: float = 2.0,
+    ) -> dict:
+        try:
+            payload = NationReader.build_write_epc_auto_payload(new_epc_hex, match_epc_hex, antenna_id, access_password)
+            await self.stop_inventory()
+            resp = await self.command(0x0211, payload, timeout=timeout)
+        except TimeoutError:
+            return {
+                "success": False,
+                "result_code": -2,
+                "result_msg": "Timeout waiting for write response",
+                "failed_addr": None,
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "result_code": -99,
+                "result_msg": f"Exception: {e}",
+                "failed_addr": None,
+            }
+        return NationReader.parse_write_epc_response(resp)
+
+    async def _simple_command(self, mid, payload: bytes) -> bool:
+        """
+        Send a configuration command whose reply is a single result code (0x00 = OK).
+        """
+        mid_value = getattr(mid, 'value', mid)
+        try:
+            resp = await self.command(mid_value, payload)
+        except TimeoutError:
+            print(f"❌ No response for MID=0x{mid_value:04X}")
+            return False
+        code = resp["data"][0] if resp["data"] else -1
+        if resp["mid"] == (mid_value & 0xFF) and code == 0x00:
+            return True
+        print(f"❌ MID=0x{mid_value:04X} failed: reply MID=0x{resp['mid']:02X}, code={code}")
+        return False
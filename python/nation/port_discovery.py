@@ -0,0 +1,214 @@
+"""
+Dò tìm cổng serial của reader Nation và theo dõi cắm/rút USB.
+
+PortDiscovery probes candidate ports with the same STOP + QUERY_INFO handshake
+as NationReader.Connect_Reader_And_Initialize / Query_Reader_Information and
+remembers which serial number answered on which port, so a reader that comes
+back as /dev/ttyUSB1 instead of /dev/ttyUSB0 is still found. A watcher thread
+diffs the port list and reports attach/detach events.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from serial.tools import list_ports
+
+from nation import NationReader
+
+
+class PortDiscovery:
+    def __init__(
+        self,
+        baudrates: Iterable[int] = (115200,),
+        cache_file: Optional[str] = None,
+        poll_interval: float = 0.5,
+        probe_timeout: float = 0.3,
+        extra_patterns: Iterable[str] = (),
+        port_filter: Optional[Callable[[object], bool]] = None,
+    ):
+        """
+        :param baudrates: Tried in order when probing a port
+        :param cache_file: JSON file keeping serial-number -> port across restarts
+        :param poll_interval: Seconds between port-list checks in watch()
+        :param probe_timeout: Deadline for each handshake command
+        :param extra_patterns: Globs of extra candidate paths (e.g. /dev/serial/by-id/*)
+        :param port_filter: Keep only comports() entries for which this returns True
+                            (default: USB and ACM adapters)
+        """
+        self.baudrates = tuple(baudrates)
+        self.cache_file = cache_file
+        self.poll_interval = poll_interval
+        self.probe_timeout = probe_timeout
+        self.extra_patterns = tuple(extra_patterns)
+        self.port_filter = port_filter or self._default_filter
+        self._cache: dict[str, dict] = self._load_cache()
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self.probes = 0
+
+    @staticmethod
+    def _default_filter(info) -> bool:
+        device = info.device or ""
+        return bool(info.vid) or "USB" in device or "ACM" in device
+
+    ################################################################################
+    #                            PROBING                                           #
+    ################################################################################
+    def candidates(self) -> list[str]:
+        ports = [info.device for info in list_ports.comports() if self.port_filter(info)]
+        for pattern in self.extra_patterns:
+            ports.extend(sorted(glob.glob(pattern)))
+        return list(dict.fromkeys(ports))
+
+    def probe(self, port: str) -> Optional[dict]:
+        """
+        Handshake with whatever is on `port`.
+        :return: {"port", "baudrate", "serial_number", ...reader info} or None if no reader answered
+        """
+        for baudrate in self.baudrates:
+            self.probes += 1
+            reader = NationReader(port, baudrate, timeout=self.probe_timeout)
+            try:
+                reader.open()
+                if not reader.Connect_Reader_And_Initialize():
+                    continue
+                info = reader.Query_Reader_Information() or {}
+                info.update({"port": port, "baudrate": baudrate})
+                if info.get("serial_number"):
+                    self.remember(info["serial_number"], port, baudrate)
+                return info
+            except Exception as e:
+                print(f"⚠️ Probe {port}@{baudrate} failed: {e}")
+            finally:
+                reader.close()
+        return None
+
+    def scan(self, exclude: Iterable[str] = ()) -> list[dict]:
+        """
+        Probe every candidate port not in `exclude` (ports already in use).
+        """
+        exclude = set(exclude)
+        found = []
+        for port in self.candidates():
+            if port in exclude:
+                continue
+            info = self.probe(port)
+            if info:
+                found.append(info)
+        return found
+
+    def find(self, serial_number: str, exclude: Iterable[str] = ()) -> Optional[dict]:
+        """
+        Locate a reader by serial number: the cached port if it still exists,
+        otherwise a scan of the free candidate ports.
+        :return: {"port", "baudrate"} or None
+        """
+        exclude = set(exclude)
+        with self._lock:
+            cached = self._cache.get(serial_number)
+        if cached and cached["port"] not in exclude and os.path.exists(cached["port"]):
+            return {"port": cached["port"], "baudrate": cached["baudrate"]}
+        for info in self.scan(exclude):
+            if info.get("serial_number") == serial_number:
+                return {"port": info["port"], "baudrate": info["baudrate"]}
+        return None
+
+    ################################################################################
+    #                            SERIAL NUMBER CACHE                               #
+    ################################################################################
+    def remember(self, serial_number: str, port: str, baudrate: int):
+        with self._lock:
+            previous = self._cache.get(serial_number)
+            self._cache[serial_number] = {"port": port, "baudrate": baudrate, "last_seen": time.time()}
+            if previous and previous["port"] == port:
+                return
+        self._save_cache()
+
+    def forget(self, serial_number: str, port: Optional[str] = None):
+        """
+        Drop the cached port of a reader (only if it is still `port`, when given).
+        """
+        with self._lock:
+            cached = self._cache.get(serial_number)
+            if not cached or (port is not None and cached["port"] != port):
+                return
+            del self._cache[serial_number]
+        self._save_cache()
+
+    def known(self) -> dict:
+        with self._lock:
+            return {sn: dict(entry) for sn, entry in self._cache.items()}
+
+    def _load_cache(self) -> dict:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring port cache {self.cache_file}: {e}")
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        with self._lock:
+            data = json.dumps(self._cache, indent=2)
+        tmp = self.cache_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            print(f"⚠️ Could not save port cache: {e}")
+
+    ################################################################################
+    #                            HOT-PLUG WATCHER                                  #
+    ################################################################################
+    def watch(self, on_attached: Callable[[str], None], on_detached: Optional[Callable[[str], None]] = None):
+        """
+        Report ports appearing/disappearing from a background thread.
+        Callbacks get the port path; they must not block for long.
+        """
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch_loop, args=(on_attached, on_detached),
+                                         name="port-discovery", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher and self._watcher is not threading.current_thread():
+            self._watcher.join(timeout=2)
+        self._watcher = None
+
+    def _watch_loop(self, on_attached, on_detached):
+        present = set(self.candidates())
+        while not self._stop.wait(self.poll_interval):
+            try:
+                current = set(self.candidates())
+            except Exception as e:
+                print(f"⚠️ Port listing failed: {e}")
+                continue
+            for port in sorted(current - present):
+                print(f"🔌 Port attached: {port}")
+                self._notify(on_attached, port)
+            for port in sorted(present - current):
+                print(f"🔌 Port detached: {port}")
+                if on_detached:
+                    self._notify(on_detached, port)
+            present = current
+
+    @staticmethod
+    def _notify(callback, port: str):
+        try:
+            callback(port)
+        except Exception as e:
+            print(f"⚠️ Hot-plug callback error: {e}")
@@ -0,0 +1,387 @@
+"""
+Quản lý nhiều reader Nation trong một tiến trình.
+
+One ReaderManager owns N NationReader instances, each addressed by a reader ID
+(its port, or its serial number when key_by="serial"). Every reader keeps its
+own UART thread, tag workers and inventory lifecycle; their tag streams are
+merged into a single sink callback, each tag stamped with "reader_id".
+
+With process_mode=True each reader runs in its own worker process instead
+(reader_process.ProcessReader), so one reader's parsing and callbacks no
+longer compete with the others for the GIL.
+
+A monitor thread reconnects readers whose UART went away (USB unplug) with
+exponential backoff, looking the port up by serial number through an optional
+PortDiscovery, and restores the inventory session that was running.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from nation import NationReader
+from port_discovery import PortDiscovery
+from reader_process import ProcessReader
+
+KEY_BY_PORT = "port"
+KEY_BY_SERIAL = "serial"
+
+
+class ManagedReader:
+    """
+    One reader plus the bookkeeping the manager keeps about it.
+    """
+
+    def __init__(self, reader_id: str, reader: NationReader, info: Optional[dict] = None):
+        self.reader_id = reader_id
+        self.reader = reader
+        self.info = info or {}
+        self.connected_at = time.time()
+        self.inventory_started_at = None
+        self.tag_count = 0
+        self.session = None  # (antennas, dedup) of the running inventory, restored after a reconnect
+        # Reconnect bookkeeping (monitor thread only)
+        self.lost_at = None
+        self.next_attempt = 0.0
+        self.backoff = 0.0
+        self.reconnects = 0
+        self.last_recovery_ms = None
+
+    def status(self) -> dict:
+        process = None
+        if isinstance(self.reader, ProcessReader):
+            process = self.reader.process_stats()
+        connected = self.reader.is_connected()
+        try:
+            running = self.reader.is_inventory_running() if connected else False
+        except (ConnectionError, TimeoutError):
+            running = None  # worker process down or restarting
+        return {
+            "reader_id": self.reader_id,
+            "port": self.reader.port,
+            "baudrate": self.reader.baudrate,
+            "serial_number": self.info.get("serial_number"),
+            "connected_at": self.connected_at,
+            "inventory_running": running,
+            "inventory_started_at": self.inventory_started_at,
+            "tag_count": self.tag_count,
+            "connected": connected,
+            "reconnects": self.reconnects,
+            "last_recovery_ms": self.last_recovery_ms,
+            "process": process,
+        }
+
+
+class ReaderManager:
+    """
+    Thread-safe registry of readers. The sink is called from each reader's tag
+    worker threads, so it must be thread-safe itself.
+    """
+
+    def __init__(
+        self,
+        on_tag: Optional[Callable[[dict], None]] = None,
+        key_by: str = KEY_BY_PORT,
+        reader_factory: Optional[Callable[..., NationReader]] = None,
+        process_mode: bool = False,
+        discovery: Optional[PortDiscovery] = None,
+        reconnect: bool = True,
+        reconnect_backoff: tuple[float, float] = (0.1, 5.0),
+        **reader_kwargs,
+    ):
+        """
+        :param on_tag: Sink for the merged tag stream; each tag carries "reader_id"
+        :param key_by: "port" or "serial" (falls back to the port if the serial cannot be read)
+        :param reader_factory: Builds a reader from (port, baudrate, **reader_kwargs)
+        :param process_mode: Run every reader in its own supervised worker process
+        :param discovery: Finds a reader's port again by serial number after a hot-plug
+        :param reconnect: Reconnect readers whose link was lost
+        :param reconnect_backoff: (first, maximum) delay between reconnect attempts, doubling
+        :param reader_kwargs: Passed to every reader (tag_queue_size, tag_overflow, ...)
+        """
+        if key_by not in (KEY_BY_PORT, KEY_BY_SERIAL):
+            raise ValueError(f"Unknown key_by '{key_by}', expected '{KEY_BY_PORT}' or '{KEY_BY_SERIAL}'")
+        self.on_tag = on_tag
+        self.key_by = key_by
+        self.process_mode = process_mode
+        self.reader_factory = reader_factory or (ProcessReader if process_mode else NationReader)
+        self.reader_kwargs = reader_kwargs
+        self.discovery = discovery
+        self.reconnect = reconnect
+        self.reconnect_backoff = reconnect_backoff
+        self._readers: dict[str, ManagedReader] = {}
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._monitor = None
+        self._monitor_running = False
+
+    def __len__(self) -> int:
+        return len(self._readers)
+
+    def __contains__(self, reader_id: str) -> bool:
+        return reader_id in self._readers
+
+    ################################################################################
+    #                            REGISTRY                                          #
+    ################################################################################
+    def add(self, port: str, baudrate: Optional[int] = None, reader_id: Optional[str] = None,
+            refresh_state: bool = True) -> str:
+        """
+        Open a reader and register it.
+        :param reader_id: Explicit ID; otherwise derived from key_by
+        :param refresh_state: Populate the reader's cached configuration once
+        :return: The reader ID
+        :raises ValueError: If the port or the resulting ID is already registered
+        """
+        with self._lock:
+            if any(m.reader.port == port for m in self._readers.values()):
+                raise ValueError(f"Port {port} is already managed")
+        reader = self.reader_factory(port, baudrate, **self.reader_kwargs)
+        reader.open()
+        try:
+            info = {}
+            if self.key_by == KEY_BY_SERIAL or reader_id is None:
+                info = reader.Query_Reader_Information() or {}
+            if reader_id is None:
+                serial_number = info.get("serial_number") if self.key_by == KEY_BY_SERIAL else None
+                reader_id = serial_number or port
+            if refresh_state:
+                reader.refresh_state()
+            with self._lock:
+                if reader_id in self._readers:
+                    raise ValueError(f"Reader ID '{reader_id}' is already registered")
+                self._readers[reader_id] = ManagedReader(reader_id, reader, info)
+        except Exception:
+            reader.close()
+            raise
+        if self.discovery and info.get("serial_number"):
+            self.discovery.remember(info["serial_number"], port, reader.baudrate)
+        reader.on_link_lost = lambda _reader: self._wake.set()
+        if self.reconnect:
+            self._start_monitor()
+        print(f"✅ [{reader_id}] Reader added on {port}")
+        return reader_id
+
+    def ports_in_use(self) -> set[str]:
+        with self._lock:
+            return {m.reader.port for m in self._readers.values()}
+
+    def discover(self, baudrate: Optional[int] = None) -> list[str]:
+        """
+        Probe the free candidate ports and add every reader that answers.
+        :return: IDs of the readers added
+        """
+        discovery = self.discovery or PortDiscovery(baudrates=(baudrate,) if baudrate else (115200,))
+        added = []
+        for info in discovery.scan(exclude=self.ports_in_use()):
+            try:
+                added.append(self.add(info["port"], info["baudrate"]))
+            except Exception as e:
+                print(f"⚠️ Could not add discovered reader on {info['port']}: {e}")
+        return added
+
+    def remove(self, reader_id: str) -> bool:
+        """
+        Stop inventory, close the port and forget the reader.
+        """
+        with self._lock:
+            managed = self._readers.pop(reader_id, None)
+        if managed is None:
+            return False
+        try:
+            if managed.reader.is_inventory_running():
+                managed.reader.stop_inventory()
+        finally:
+            managed.reader.close()
+        print(f"🔌 [{reader_id}] Reader removed")
+        return True
+
+    def get(self, reader_id: str) -> NationReader:
+        """
+        :raises KeyError: If no reader has this ID
+        """
+        with self._lock:
+            managed = self._readers.get(reader_id)
+        if managed is None:
+            raise KeyError(f"Unknown reader '{reader_id}'")
+        return managed.reader
+
+    def ids(self) -> list[str]:
+        with self._lock:
+            return list(self._readers)
+
+    def status(self, reader_id: Optional[str] = None):
+        """
+        :return: Status dict of one reader, or a list for all of them
+        """
+        with self._lock:
+            if reader_id is not None:
+                if reader_id not in self._readers:
+                    raise KeyError(f"Unknown reader '{reader_id}'")
+                return self._readers[reader_id].status()
+            return [m.status() for m in self._readers.values()]
+
+    ################################################################################
+    #                            INVENTORY LIFECYCLE                               #
+    ################################################################################
+    def start_inventory(self, reader_id: str, antennas, dedup: Optional[dict] = None) -> bool:
+        """
+        Start inventory on one reader; its tags go to the merged sink.
+        """
+        with self._lock:
+            managed = self._readers.get(reader_id)
+        if managed is None:
+            raise KeyError(f"Unknown reader '{reader_id}'")
+        ok = managed.reader.start_inventory_with_mode(antennas, callback=self._tag_sink(managed), dedup=dedup)
+        managed.inventory_started_at = time.time() if ok else None
+        managed.session = (antennas, dedup) if ok else None
+        return ok
+
+    def stop_inventory(self, reader_id: str) -> bool:
+        with self._lock:
+            managed = self._readers.get(reader_id)
+        if managed is None:
+            raise KeyError(f"Unknown reader '{reader_id}'")
+        managed.session = None
+        ok = managed.reader.stop_inventory()
+        managed.inventory_started_at = None
+        return ok
+
+    def start_all(self, antennas, dedup: Optional[dict] = None) -> dict:
+        """
+        :return: {reader_id: started}
+        """
+        return {rid: self._safe(self.start_inventory, rid, antennas, dedup) for rid in self.ids()}
+
+    def stop_all(self) -> dict:
+        """
+        Stop every reader in parallel (each STOP waits on its own UART).
+        :return: {reader_id: stopped}
+        """
+        results = {}
+        threads = []
+        for rid in self.ids():
+            t = threading.Thread(target=lambda r=rid: results.__setitem__(r, self._safe(self.stop_inventory, r)),
+                                 name=f"stop-{rid}", daemon=True)
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join(timeout=5)
+        return results
+
+    def close_all(self):
+        self._stop_monitor()
+        for rid in self.ids():
+            try:
+                self.remove(rid)
+            except Exception as e:
+                print(f"⚠️ [{rid}] Close failed: {e}")
+
+    ################################################################################
+    #                            RECONNECT MONITOR                                 #
+    ################################################################################
+    def _start_monitor(self):
+        if self._monitor and self._monitor.is_alive():
+            return
+        self._monitor_running = True
+        self._monitor = threading.Thread(target=self._monitor_loop, name="reader-monitor", daemon=True)
+        self._monitor.start()
+        if self.discovery:
+            # A port appearing is the best moment to retry
+            self.discovery.watch(on_attached=lambda _port: self._wake.set())
+
+    def _stop_monitor(self):
+        self._monitor_running = False
+        self._wake.set()
+        if self._monitor and self._monitor is not threading.current_thread():
+            self._monitor.join(timeout=2)
+        self._monitor = None
+        if self.discovery:
+            self.discovery.stop()
+
+    def _monitor_loop(self):
+        first, maximum = self.reconnect_backoff
+        while self._monitor_running:
+            self._wake.wait(0.25)
+            self._wake.clear()
+            with self._lock:
+                readers = list(self._readers.values())
+            for managed in readers:
+                if not self._monitor_running or managed.reader.is_connected():
+                    continue
+                now = time.monotonic()
+                if managed.lost_at is None:
+                    print(f"❌ [{managed.reader_id}] Link lost, reconnecting")
+                    managed.lost_at = now
+                    managed.backoff = first
+                    managed.next_attempt = now
+                if now < managed.next_attempt:
+                    continue
+                if self._reconnect(managed):
+                    continue
+                managed.next_attempt = time.monotonic() + managed.backoff
+                managed.backoff = min(managed.backoff * 2, maximum)
+
+    def _reconnect(self, managed: ManagedReader) -> bool:
+        reader = managed.reader
+        port, baudrate = reader.port, reader.baudrate
+        serial_number = managed.info.get("serial_number")
+        wrong_ports = set()  # ports found to hold another reader during this attempt
+        while True:
+            if self.discovery and serial_number:
+                # Ports of readers that are down too may hold this one after a re-enumeration
+                with self._lock:
+                    busy = {m.reader.port for m in self._readers.values()
+                            if m is not managed and m.reader.is_connected()}
+                found = self.discovery.find(serial_number, exclude=busy | wrong_ports)
+                if found:
+                    port, baudrate = found["port"], found["baudrate"]
+            if port in wrong_ports or (port.startswith("/dev/") and not os.path.exists(port)):
+                return False
+            try:
+                reader.reopen(port, baudrate)
+                info = (reader.Query_Reader_Information() or {}) if serial_number else {}
+                if info.get("serial_number") in (None, serial_number):
+                    if managed.session:
+                        antennas, dedup = managed.session
+                        if not reader.start_inventory_with_mode(antennas, callback=self._tag_sink(managed),
+                                                                dedup=dedup):
+                            print(f"⚠️ [{managed.reader_id}] Reconnected but inventory did not restart")
+                    break
+            except Exception as e:
+                print(f"⚠️ [{managed.reader_id}] Reconnect on {port} failed: {e}")
+                return False
+            reader.close()
+            print(f"⚠️ [{managed.reader_id}] {port} now holds reader {info['serial_number']}")
+            if not self.discovery:
+                return False
+            # Re-enumerated ports: cache this one under the reader really found there, then look elsewhere
+            self.discovery.remember(info["serial_number"], port, baudrate)
+            self.discovery.forget(serial_number, port)
+            wrong_ports.add(port)
+        managed.reconnects += 1
+        managed.last_recovery_ms = round((time.monotonic() - managed.lost_at) * 1000, 1)
+        managed.lost_at = None
+        print(f"🔁 [{managed.reader_id}] Reconnected on {port} in {managed.last_recovery_ms} ms")
+        return True
+
+    def _tag_sink(self, managed: ManagedReader) -> Callable[[dict], None]:
+        reader_id = managed.reader_id
+
+        def on_tag(tag: dict):
+            managed.tag_count += 1
+            tag["reader_id"] = reader_id
+            sink = self.on_tag
+            if sink:
+                sink(tag)
+
+        return on_tag
+
+    @staticmethod
+    def _safe(func, *args) -> bool:
+        try:
+            return bool(func(*args))
+        except Exception as e:
+            print(f"⚠️ [{args[0]}] {func.__name__} failed: {e}")
+            return False
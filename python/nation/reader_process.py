@@ -0,0 +1,528 @@
+"""
+Chạy mỗi reader trong một tiến trình riêng, tag chuyển qua shared memory.
+
+With many readers in one interpreter the GIL serialises every reader's frame
+parsing and tag callbacks. ProcessReader moves a NationReader into its own
+worker process:
+
+    worker process  - owns the UART, runs the NationReader and writes every
+                      parsed tag as a fixed-size record into a TagRing
+    web process     - reads the ring (struct unpack, no pickling) on a consumer
+                      thread and calls the tag callback; commands go over a Pipe
+
+The ring lives in multiprocessing.shared_memory created by the web process, so
+it survives a worker crash. A supervisor thread restarts a dead (or hung)
+worker with backoff and restarts its inventory if one was running.
+"""
+
+import math
+import multiprocessing
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+
+RING_MAGIC = 0x4E54524E  # "NTRN"
+RING_VERSION = 1
+LINK_LOST_EXIT = 3  # worker exit code: the UART went away, restarting on the same port is pointless
+
+# magic, version, capacity, record_size, write_seq, heartbeat, dropped
+_HEADER = struct.Struct("<IIIIQdQ")
+_HEADER_SIZE = 64
+_WRITE_SEQ_OFFSET = 16
+_HEARTBEAT_OFFSET = 24
+
+# seq, timestamp, pc, rssi, antenna, epc_len, event, read_count, peak_rssi, mean_rssi, duration, epc
+_RECORD = struct.Struct("<QdHhBBBxIhxxff62s")
+_SEQ = struct.Struct("<Q")
+_NO_RSSI = -32768
+MAX_EPC_BYTES = 62
+
+# Dedup event kinds (see dedup.py); 0 = plain read
+_EVENTS = (None, "first_seen", "refresh", "last_seen")
+_EVENT_CODES = {name: code for code, name in enumerate(_EVENTS)}
+
+
+class TagRing:
+    """
+    Single-producer ring of fixed-size tag records in shared memory.
+    Readers detect overwritten slots with a per-record sequence number
+    (written last, checked before and after the copy), so neither side locks.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        magic, version, capacity, record_size, _, _, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != RING_MAGIC or version != RING_VERSION or record_size != _RECORD.size:
+            raise ValueError(f"Shared memory '{shm.name}' is not a tag ring")
+        self.capacity = capacity
+        self._write_lock = threading.Lock()
+        self._next = self.write_seq + 1  # consumer position
+        self.missed = 0
+
+    @classmethod
+    def create(cls, capacity: int = 65536, name: Optional[str] = None) -> "TagRing":
+        if capacity < 1:
+            raise ValueError("Ring capacity must be >= 1")
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + capacity * _RECORD.size)
+        _HEADER.pack_into(shm.buf, 0, RING_MAGIC, RING_VERSION, capacity, _RECORD.size, 0, time.time(), 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "TagRing":
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_seq(self) -> int:
+        return _SEQ.unpack_from(self.shm.buf, _WRITE_SEQ_OFFSET)[0]
+
+    @property
+    def heartbeat(self) -> float:
+        return struct.unpack_from("<d", self.shm.buf, _HEARTBEAT_OFFSET)[0]
+
+    def beat(self):
+        struct.pack_into("<d", self.shm.buf, _HEARTBEAT_OFFSET, time.time())
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    ################################################################################
+    #                            PRODUCER (worker process)                         #
+    ################################################################################
+    def write(self, tag: dict):
+        """
+        Append one tag (a NationReader tag dict or a dedup event).
+        """
+        epc = bytes.fromhex(tag.get("epc") or "")[:MAX_EPC_BYTES]
+        rssi = tag.get("rssi")
+        peak = tag.get("peak_rssi")
+        mean = tag.get("mean_rssi")
+        buf = self.shm.buf
+        with self._write_lock:
+            seq = self.write_seq + 1
+            offset = _HEADER_SIZE + (seq % self.capacity) * _RECORD.size
+            _SEQ.pack_into(buf, offset, 0)  # slot is being rewritten
+            _RECORD.pack_into(
+                buf, offset, 0, time.time(),
+                int(tag.get("pc") or "0", 16), _NO_RSSI if rssi is None else rssi,
+                tag.get("antenna_id") or 0, len(epc), _EVENT_CODES.get(tag.get("event"), 0),
+                tag.get("read_count") or 0, _NO_RSSI if peak is None else peak,
+                math.nan if mean is None else mean, tag.get("duration") or 0.0, epc,
+            )
+            _SEQ.pack_into(buf, offset, seq)
+            _SEQ.pack_into(buf, _WRITE_SEQ_OFFSET, seq)
+
+    ################################################################################
+    #                            CONSUMER (web process)                            #
+    ################################################################################
+    def read(self, max_items: int = 512) -> list[dict]:
+        """
+        Tags written since the last read, oldest first. Records overwritten
+        before they could be read are counted in `missed`.
+        """
+        buf = self.shm.buf
+        newest = self.write_seq
+        seq = self._next
+        if newest - seq + 1 > self.capacity:
+            self.missed += newest - self.capacity + 1 - seq
+            seq = newest - self.capacity + 1
+        end = min(newest, seq + max_items - 1)
+        tags = []
+        while seq <= end:
+            offset = _HEADER_SIZE + (seq % self.capacity) * _RECORD.size
+            record = _RECORD.unpack_from(buf, offset)
+            if record[0] != seq or _SEQ.unpack_from(buf, offset)[0] != seq:
+                self.missed += 1  # overwritten while we were copying
+            else:
+                tags.append(self._to_tag(record))
+            seq += 1
+        self._next = seq
+        return tags
+
+    @staticmethod
+    def _to_tag(record: tuple) -> dict:
+        _, ts, pc, rssi, antenna, epc_len, event, read_count, peak, mean, duration, epc = record
+        tag = {
+            "epc": epc[:epc_len].hex().upper(),
+            "pc": f"{pc:04X}",
+            "antenna_id": antenna,
+            "rssi": None if rssi == _NO_RSSI else rssi,
+            "read_time": ts,
+        }
+        if event:
+            tag.update({
+                "event": _EVENTS[event],
+                "read_count": read_count,
+                "peak_rssi": None if peak == _NO_RSSI else peak,
+                "mean_rssi": None if math.isnan(mean) else round(mean, 1),
+                "duration": round(duration, 3),
+            })
+        return tag
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "capacity": self.capacity,
+            "write_seq": self.write_seq,
+            "backlog": self.write_seq - self._next + 1,
+            "missed": self.missed,
+            "heartbeat_age": round(time.time() - self.heartbeat, 3),
+        }
+
+
+def _worker_main(port: str, baudrate: int, ring_name: str, conn, reader_kwargs: dict):
+    """
+    Entry point of a reader worker process: open the reader, then serve
+    (call_id, method, args, kwargs) calls from the pipe until "close".
+    Every reply carries the call_id it answers.
+    """
+    from nation import NationReader
+
+    ring = TagRing.attach(ring_name)
+    reader = NationReader(port, baudrate, **reader_kwargs)
+    try:
+        reader.open()
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        ring.close()
+        return
+    conn.send(("ready", None))
+    exit_code = 0
+    try:
+        while True:
+            ring.beat()
+            if reader.link_lost:
+                exit_code = LINK_LOST_EXIT
+                break
+            if not conn.poll(0.5):
+                continue
+            call_id, method, args, kwargs = conn.recv()
+            if method == "close":
+                break
+            if kwargs.pop("callback", None) is True:
+                kwargs["callback"] = ring.write
+            try:
+                result = getattr(reader, method)(*args, **kwargs)
+                conn.send((call_id, "ok", result))
+            except Exception as e:
+                conn.send((call_id, "error", f"{type(e).__name__}: {e}"))
+    except (EOFError, KeyboardInterrupt):
+        pass  # parent went away
+    finally:
+        try:
+            if reader.is_inventory_running():
+                reader.stop_inventory()
+        finally:
+            reader.close()
+            ring.close()
+    if exit_code:
+        sys.exit(exit_code)
+
+
+class ProcessReader:
+    """
+    Stand-in for NationReader whose reader runs in a worker process.
+    Any NationReader method is forwarded over the pipe (arguments and results
+    must be picklable); tags come back through the shared-memory ring.
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: Optional[int] = None,
+        ring_capacity: int = 65536,
+        call_timeout: float = 10.0,
+        max_restarts: int = 5,
+        restart_backoff: float = 1.0,
+        hang_timeout: float = 30.0,
+        poll_interval: float = 0.005,
+        **reader_kwargs,
+    ):
+        """
+        :param ring_capacity: Tag records buffered in shared memory
+        :param call_timeout: Deadline for one forwarded method call
+        :param max_restarts: Give up after this many restarts within 10 minutes
+        :param restart_backoff: Initial delay before a restart (doubles per consecutive crash)
+        :param hang_timeout: Restart a worker whose control loop has not beaten for this long
+        :param poll_interval: Consumer sleep when the ring is empty
+        :param reader_kwargs: Passed to NationReader in the worker
+        """
+        from nation import NationReader
+
+        self.port = port
+        self.baudrate = baudrate or NationReader.DEFAULT_BAUDRATE
+        self.ring_capacity = ring_capacity
+        self.call_timeout = call_timeout
+        self.max_restarts = max_restarts
+        self.restart_backoff = restart_backoff
+        self.hang_timeout = hang_timeout
+        self.poll_interval = poll_interval
+        self.reader_kwargs = reader_kwargs
+
+        self._ctx = multiprocessing.get_context("spawn")  # never fork a threaded web process
+        self._ring: Optional[TagRing] = None
+        self._process = None
+        self._conn = None
+        self._call_lock = threading.Lock()
+        self._call_id = 0
+        self._on_tag: Optional[Callable[[dict], None]] = None
+        self._inventory = None  # (antenna_mask, dedup) to resume after a restart
+        self._running = False
+        self._consumer = None
+        self._supervisor = None
+        self.restarts: list[float] = []
+        self.last_exit_code = None
+        self.failed = False
+        self.link_lost = False
+        self.on_link_lost: Optional[Callable[["ProcessReader"], None]] = None
+        self.handler_errors = 0
+        self.stale_replies = 0
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    ################################################################################
+    #                            LIFECYCLE                                         #
+    ################################################################################
+    def open(self):
+        self.link_lost = self.failed = False
+        self.restarts = []
+        self._ring = TagRing.create(self.ring_capacity)
+        try:
+            self._spawn()
+        except Exception:
+            self._ring.close()
+            self._ring = None
+            raise
+        self._running = True
+        self._consumer = threading.Thread(target=self._consume, name=f"ring-{self.port}", daemon=True)
+        self._consumer.start()
+        self._supervisor = threading.Thread(target=self._supervise, name=f"supervisor-{self.port}", daemon=True)
+        self._supervisor.start()
+
+    def close(self):
+        self._running = False
+        self._inventory = None
+        if self._supervisor and self._supervisor is not threading.current_thread():
+            self._supervisor.join(timeout=2)
+        self._shutdown_worker()
+        if self._consumer:
+            self._consumer.join(timeout=1)
+        if self._ring:
+            self._ring.close()
+            self._ring = None
+
+    def reopen(self, port: Optional[str] = None, baudrate: Optional[int] = None):
+        """
+        Close and start a fresh worker, optionally on another port.
+        """
+        self.close()
+        self.port = port or self.port
+        self.baudrate = baudrate or self.baudrate
+        self.open()
+
+    def is_connected(self) -> bool:
+        """
+        False once the worker lost its UART or the supervisor gave up;
+        a crash being restarted still counts as connected.
+        """
+        return self._running and not self.link_lost and not self.failed
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.port, self.baudrate, self._ring.name, child_conn, self.reader_kwargs),
+            name=f"nation-{self.port}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        if not parent_conn.poll(self.call_timeout):
+            process.terminate()
+            raise TimeoutError(f"Reader worker for {self.port} did not start")
+        status, detail = parent_conn.recv()
+        if status != "ready":
+            process.join(timeout=1)
+            raise ConnectionError(f"Reader worker for {self.port} failed: {detail}")
+        self._process, self._conn = process, parent_conn
+        print(f"✅ [{self.port}] Reader worker pid={process.pid}")
+
+    def _shutdown_worker(self):
+        process, conn = self._process, self._conn
+        if process is None:
+            return
+        try:
+            with self._call_lock:
+                conn.send((0, "close", (), {}))
+        except (OSError, EOFError):
+            pass
+        process.join(timeout=3)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=1)
+        conn.close()
+        self._process = self._conn = None
+
+    ################################################################################
+    #                            FORWARDED CALLS                                   #
+    ################################################################################
+    def call(self, method: str, *args, **kwargs):
+        """
+        Run a NationReader method in the worker.
+        A reply that arrives after its call timed out is discarded by the next call
+        (replies are matched on the call id), so it never answers the wrong call.
+        :raises ConnectionError: If the worker is down
+        :raises TimeoutError: If it did not answer within call_timeout
+        """
+        with self._call_lock:
+            conn = self._conn
+            if conn is None or not self._process.is_alive():
+                raise ConnectionError(f"Reader worker for {self.port} is not running")
+            self._call_id += 1
+            call_id = self._call_id
+            deadline = time.monotonic() + self.call_timeout
+            try:
+                conn.send((call_id, method, args, kwargs))
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not conn.poll(remaining):
+                        raise TimeoutError(f"{method} on {self.port} timed out")
+                    reply_id, status, result = conn.recv()
+                    if reply_id == call_id:
+                        break
+                    self.stale_replies += 1  # late answer to a call that already timed out
+            except TimeoutError:
+                raise
+            except (OSError, EOFError) as e:
+                raise ConnectionError(f"Reader worker for {self.port} died: {e}")
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def start_inventory_with_mode(self, antenna_mask, callback=None, dedup: Optional[dict] = None) -> bool:
+        self._on_tag = callback
+        ok = self.call("start_inventory_with_mode", antenna_mask, callback=callback is not None, dedup=dedup)
+        self._inventory = (antenna_mask, dedup) if ok else None
+        return ok
+
+    def stop_inventory(self, *args, **kwargs) -> bool:
+        self._inventory = None
+        return self.call("stop_inventory", *args, **kwargs)
+
+    def inventory_stats(self) -> dict:
+        try:
+            stats = self.call("inventory_stats")
+        except (ConnectionError, TimeoutError) as e:
+            stats = {"running": False, "error": str(e)}
+        stats["process"] = self.process_stats()
+        return stats
+
+    def process_stats(self) -> dict:
+        process = self._process
+        return {
+            "pid": process.pid if process else None,
+            "alive": bool(process and process.is_alive()),
+            "restarts": len(self.restarts),
+            "stale_replies": self.stale_replies,
+            "last_exit_code": self.last_exit_code,
+            "failed": self.failed,
+            "handler_errors": self.handler_errors,
+            "ring": self._ring.stats() if self._ring else None,
+        }
+
+    ################################################################################
+    #                            CONSUMER + SUPERVISOR THREADS                     #
+    ################################################################################
+    def _consume(self):
+        while self._running:
+            ring = self._ring
+            tags = ring.read() if ring else []
+            if not tags:
+                time.sleep(self.poll_interval)
+                continue
+            callback = self._on_tag
+            if not callback:
+                continue
+            for tag in tags:
+                try:
+                    callback(tag)
+                except Exception as e:
+                    self.handler_errors += 1
+                    print(f"⚠️ Tag handler error: {e}")
+
+    def _supervise(self):
+        consecutive = 0
+        while self._running:
+            time.sleep(0.5)
+            process = self._process
+            if not self._running or process is None:
+                continue
+            hung = self._ring and time.time() - self._ring.heartbeat > self.hang_timeout
+            if process.is_alive() and not hung:
+                consecutive = 0
+                continue
+            if hung and process.is_alive():
+                print(f"⚠️ [{self.port}] Reader worker hung, terminating")
+                process.terminate()
+            process.join(timeout=1)
+            self.last_exit_code = process.exitcode
+            print(f"💥 [{self.port}] Reader worker exited (code={process.exitcode})")
+            with self._call_lock:
+                if self._conn:
+                    self._conn.close()
+                self._process = self._conn = None
+            if process.exitcode == LINK_LOST_EXIT:
+                # The port is gone; whoever owns us reconnects (possibly on another port)
+                self.link_lost = True
+                if self.on_link_lost:
+                    self.on_link_lost(self)
+                return
+
+            now = time.time()
+            self.restarts = [t for t in self.restarts if now - t < 600]
+            if len(self.restarts) >= self.max_restarts:
+                self.failed = True
+                print(f"❌ [{self.port}] Too many restarts, giving up")
+                return
+            time.sleep(min(self.restart_backoff * (2 ** consecutive), 30))
+            consecutive += 1
+            self.restarts.append(time.time())
+            try:
+                self._spawn()
+            except Exception as e:
+                print(f"❌ [{self.port}] Restart failed: {e}")
+                # Leave a dead placeholder so the next pass retries with more backoff
+                self._process = _DeadProcess(getattr(e, "errno", None))
+                continue
+            if self._inventory:
+                antenna_mask, dedup = self._inventory
+                try:
+                    self.start_inventory_with_mode(antenna_mask, self._on_tag, dedup)
+                    print(f"🔁 [{self.port}] Inventory resumed after restart")
+                except Exception as e:
+                    print(f"⚠️ [{self.port}] Could not resume inventory: {e}")
+
+
+class _DeadProcess:
+    pid = None
+
+    def __init__(self, exitcode=None):
+        self.exitcode = exitcode
+
+    def is_alive(self) -> bool:
+        return False
+
+    def join(self, timeout=None):
+        pass
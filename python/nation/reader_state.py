@@ -0,0 +1,92 @@
+"""
+Bản sao trạng thái cấu hình của reader trong bộ nhớ.
+
+Every query against the reader costs a STOP (interrupting a running inventory)
+plus a round-trip. The settings themselves only change when this process sends
+a configuration command, so NationReader keeps the last known value here:
+
+    populated  - once after connect (NationReader.refresh_state)
+    updated    - from the ack of every successful configuration command
+    invalidated - on open()/close(), so a reconnect never serves a stale value
+
+A field that is None is unknown and must be read from the hardware.
+"""
+
+import threading
+import time
+
+STATE_FIELDS = ("antenna_mask", "antenna_powers", "baseband", "rf_band", "filter", "beeper_mode")
+
+
+class ReaderState:
+    """
+    Thread-safe: configuration commands update it from the caller's thread while
+    the web side reads snapshots.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict = {}
+        self._updated: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidate()
+
+    def invalidate(self, *fields: str):
+        """
+        Forget the given fields (all of them when called without arguments).
+        """
+        with self._lock:
+            for field in fields or STATE_FIELDS:
+                self._check(field)
+                self._values[field] = None
+                self._updated[field] = None
+
+    def get(self, field: str):
+        """
+        :return: Cached value (a copy for dict values) or None if unknown
+        """
+        self._check(field)
+        with self._lock:
+            value = self._values[field]
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(value) if isinstance(value, dict) else value
+
+    def set(self, field: str, value):
+        self._check(field)
+        with self._lock:
+            self._values[field] = dict(value) if isinstance(value, dict) else value
+            self._updated[field] = time.time()
+
+    def merge(self, field: str, values: dict):
+        """
+        Update part of a dict field (e.g. the power of some antennas only).
+        An unknown field stays unknown: a partial write says nothing about the rest.
+        """
+        self._check(field)
+        with self._lock:
+            current = self._values[field]
+            if current is None:
+                return
+            current.update(values)
+            self._updated[field] = time.time()
+
+    def known(self, field: str) -> bool:
+        self._check(field)
+        return self._values[field] is not None
+
+    def snapshot(self) -> dict:
+        """
+        :return: {"values": {field: value}, "updated": {field: epoch seconds or None}, "hits", "misses"}
+        """
+        with self._lock:
+            values = {k: dict(v) if isinstance(v, dict) else v for k, v in self._values.items()}
+            return {"values": values, "updated": dict(self._updated), "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _check(field: str):
+        if field not in STATE_FIELDS:
+            raise KeyError(f"Unknown reader state field '{field}'")
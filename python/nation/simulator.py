@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Giả lập đầu đọc Nation trên pseudo-terminal (không cần phần cứng)
+
+Opens a pty pair and speaks the 0x5A/PCW/CRC protocol on the master side, so
+NationReader, app.py and run.py can be pointed at the slave path exactly like
+a real /dev/ttyUSB0:
+
+    python simulator.py --tags 300 --rate 0 --baud 115200 --link /tmp/nation-sim
+    DEFAULT_SERIAL_PORT=/tmp/nation-sim python run.py
+
+From Python (tests, benchmarks):
+
+    with NationSimulator(tag_count=300) as sim:
+        reader = NationReader(sim.port, 115200)
+
+Tag reads are paced to the requested rate, capped at what the configured baud
+rate could carry (10 bits per byte), so throughput numbers stay realistic.
+"""
+
+import argparse
+import os
+import random
+import select
+import threading
+import time
+import tty
+from typing import Optional
+
+from nation import FrameDecoder, MID, NationReader
+
+build_frame = NationReader.build_frame
+
+READ_END_SINGLE = 0x00   # read-end reason: single-shot inventory finished
+READ_END_STOPPED = 0x01  # read-end reason: stopped by STOP command
+
+
+def epc_timestamp_ns(epc_hex: str) -> int:
+    """
+    Send time embedded by a simulator running with timestamp_epcs=True
+    (low 8 bytes of the EPC, time.perf_counter_ns() on the same host).
+    """
+    return int(epc_hex[-16:], 16)
+
+
+class SimTag:
+    __slots__ = ("epc", "pc", "rssi", "antenna")
+
+    def __init__(self, epc: bytes, rssi: float, antenna: int):
+        self.epc = epc
+        self.pc = (len(epc) // 2 << 11).to_bytes(2, 'big')
+        self.rssi = rssi
+        self.antenna = antenna
+
+
+class NationSimulator:
+    def __init__(
+        self,
+        tag_count: int = 100,
+        read_rate: float = 0,
+        baudrate: int = 115200,
+        rssi_mean: float = 180,
+        rssi_stddev: float = 15,
+        rssi_jitter: float = 3,
+        antennas: tuple = (1, 2, 3, 4),
+        cross_read: float = 0.1,
+        epc_bytes: int = 12,
+        response_delay: float = 0.0,
+        timestamp_epcs: bool = False,
+        write_min_power: int = 0,
+        link: Optional[str] = None,
+        seed: Optional[int] = None,
+    ):
+        """
+        :param tag_count: Size of the tag population in the field
+        :param read_rate: Tag reads per second during inventory (0 = as fast as the baud rate allows)
+        :param baudrate: Emulated line rate used to cap read_rate
+        :param rssi_mean: Mean per-tag RSSI (0-255 scale the reader reports)
+        :param rssi_stddev: Spread of per-tag RSSI across the population
+        :param rssi_jitter: Per-read RSSI noise
+        :param antennas: Antenna IDs tags are spread across (each tag has a home antenna)
+        :param cross_read: Probability a read comes from another enabled antenna
+        :param epc_bytes: EPC length in bytes
+        :param response_delay: Seconds to wait before answering a command
+        :param timestamp_epcs: Put time.perf_counter_ns() in the low 8 EPC bytes of each read
+        :param write_min_power: Writes on an antenna set below this power fail with 0x05 (low power)
+        :param link: Optional symlink to create for the slave pty (stable path for apps)
+        :param seed: Random seed for a reproducible population
+        """
+        if timestamp_epcs and epc_bytes < 8:
+            raise ValueError("timestamp_epcs needs epc_bytes >= 8")
+        self.baudrate = baudrate
+        self.read_rate = read_rate
+        self.rssi_jitter = rssi_jitter
+        self.antennas = tuple(antennas)
+        self.cross_read = cross_read
+        self.response_delay = response_delay
+        self.timestamp_epcs = timestamp_epcs
+        self.write_min_power = write_min_power
+        self.write_faults: list[int] = []  # result codes returned by the next writes, in order
+        self.link = link
+        self._rng = random.Random(seed)
+
+        self.tags = [
+            SimTag(
+                self._rng.getrandbits(epc_bytes * 8).to_bytes(epc_bytes, 'big'),
+                min(255.0, max(0.0, self._rng.gauss(rssi_mean, rssi_stddev))),
+                self.antennas[i % len(self.antennas)],
+            )
+            for i in range(tag_count)
+        ]
+
+        # Reader state, as changed by configuration commands
+        self.serial_number = "SIM0001"
+        self.powers = {a: 30 for a in self.antennas}
+        self.enabled_mask = sum(1 << (a - 1) for a in self.antennas)
+        self.baseband = {"speed": 0, "q_value": 4, "session": 0, "inventory_flag": 0}
+        self.rf_band = 0
+        self.filter_ms = 0
+        self.rssi_threshold = 0
+        self.profile = 0
+        self.beeper = 0
+        self.started_at = time.time()
+
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._running = False
+        self._rx_thread = None
+        self._tx_thread = None
+        self._write_lock = threading.Lock()
+        self._inventory = threading.Event()
+        self._inventory_mask = 0
+        self._last_report: dict = {}
+
+        self.commands = 0
+        self.tags_sent = 0
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+        self.command_counts: dict[int, int] = {}
+
+    ################################################################################
+    #                            LIFECYCLE                                         #
+    ################################################################################
+    def start(self) -> str:
+        """
+        Open the pty and start answering. :return: Slave device path
+        """
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        tty.setraw(self._master)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        if self.link:
+            if os.path.islink(self.link):
+                os.unlink(self.link)
+            os.symlink(self.port, self.link)
+        self._running = True
+        self._rx_thread = threading.Thread(target=self._rx_loop, name="nation-sim-rx", daemon=True)
+        self._tx_thread = threading.Thread(target=self._tag_loop, name="nation-sim-tags", daemon=True)
+        self._rx_thread.start()
+        self._tx_thread.start()
+        return self.link or self.port
+
+    def stop(self):
+        self._running = False
+        self._inventory.set()  # wake the tag loop
+        for t in (self._rx_thread, self._tx_thread):
+            if t:
+                t.join(timeout=1)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+        if self.link and os.path.islink(self.link):
+            os.unlink(self.link)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def line_rate(self) -> float:
+        """Tag frames per second the emulated baud rate can carry."""
+        frame_len = 1 + 4 + 2 + (2 + len(self.tags[0].epc) + 2 + 3 if self.tags else 19) + 2
+        return self.baudrate / 10 / frame_len
+
+    def stats(self) -> dict:
+        return {
+            "commands": self.commands,
+            "tags_sent": self.tags_sent,
+            "bytes_sent": self.bytes_sent,
+            "bytes_dropped": self.bytes_dropped,
+            "inventory": self._inventory.is_set(),
+        }
+
+    ################################################################################
+    #                            I/O                                               #
+    ################################################################################
+    def _write(self, data: bytes, wait: float = 0.5) -> int:
+        """
+        Write to the master side; gives up (counting dropped bytes) if the host
+        does not drain its input within `wait`, like a real UART overrun.
+        """
+        view = memoryview(data)
+        deadline = time.monotonic() + wait
+        with self._write_lock:
+            while view:
+                try:
+                    sent = os.write(self._master, view)
+                    self.bytes_sent += sent
+                    view = view[sent:]
+                except BlockingIOError:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._running:
+                        break
+                    select.select([], [self._master], [], min(remaining, 0.05))
+                except OSError:
+                    break
+        self.bytes_dropped += len(view)
+        return len(data) - len(view)
+
+    def _reply(self, mid: int, payload: bytes = b'\x00', notify: bool = False):
+        self._write(build_frame(mid, payload, notify=notify))
+
+    def _rx_loop(self):
+        decoder = FrameDecoder()
+        while self._running:
+            try:
+                ready, _, _ = select.select([self._master], [], [], 0.1)
+                if not ready:
+                    continue
+                data = os.read(self._master, 4096)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            decoder.feed(data)
+            for frame in decoder.frames():
+                parsed = NationReader.parse_frame(bytes(frame), check_crc=False)
+                if self.response_delay:
+                    time.sleep(self.response_delay)
+                try:
+                    self._handle_command(parsed["category"] << 8 | parsed["mid"], bytes(parsed["data"]))
+                except Exception as e:
+                    print(f"⚠️ Simulator command error: {e}")
+
+    ################################################################################
+    #                            COMMANDS                                          #
+    ################################################################################
+    def _handle_command(self, mid: int, data: bytes):
+        self.commands += 1
+        self.command_counts[mid] = self.command_counts.get(mid, 0) + 1
+
+        if mid == MID.STOP_INVENTORY:
+            was_running = self._inventory.is_set()
+            self._inventory.clear()
+            self._reply(mid)
+            if was_running:
+                self._reply(0x0201, bytes([READ_END_STOPPED]), notify=True)
+        elif mid == MID.READ_EPC_TAG:
+            self._inventory_mask = int.from_bytes(data[0:4], 'big') if len(data) >= 4 else 1
+            self._reply(mid)
+            self._last_report.clear()
+            if len(data) >= 5 and data[4] == 0x00:
+                self._single_inventory()
+            else:
+                self._inventory.set()
+        elif mid == 0x1000:  # RFID ability: max power, min power, antennas, frequencies, protocols
+            self._reply(mid, bytes([33, 0, len(self.antennas), 2, 0x00, 0x04, 1, 0x00]))
+        elif mid == MID.QUERY_INFO:
+            self._reply(mid, self._info_payload())
+        elif mid == MID.QUERY_READER_POWER:
+            self._reply(mid, b''.join(bytes([a, p]) for a, p in sorted(self.powers.items())))
+        elif mid == MID.CONFIGURE_READER_POWER:
+            self._reply(mid, self._apply_power(data))
+        elif mid == MID.QUERY_ANT_MASK:
+            self._reply(mid, self.enabled_mask.to_bytes(4, 'big'))
+        elif mid == MID.CONFIG_ANT_MASK:  # antenna enable mask [+ PID 0xFF persist]
+            if len(data) >= 4:
+                self.enabled_mask = int.from_bytes(data[0:4], 'big')
+            self._reply(mid)
+        elif mid == MID.CONFIG_RF_BAND:
+            if not data or data[0] > 8:
+                self._reply(mid, b'\x01')  # unsupported band
+            else:
+                self.rf_band = data[0]
+                self._reply(mid)
+        elif mid == MID.QUERY_RF_BAND:
+            self._reply(mid, bytes([self.rf_band]))
+        elif mid == MID.CONFIG_BASEBAND:
+            self._reply(mid, self._apply_baseband(data))
+        elif mid == MID.QUERY_BASEBAND:
+            b = self.baseband
+            self._reply(mid, bytes([b["speed"], b["q_value"], b["session"], b["inventory_flag"]]))
+        elif mid == 0x0209:  # tag upload filter: PID 0x01 U16 (10 ms), PID 0x02 U8
+            if len(data) >= 3 and data[0] == 0x01:
+                self.filter_ms = int.from_bytes(data[1:3], 'big') * 10
+            if len(data) >= 5 and data[3] == 0x02:
+                self.rssi_threshold = data[4]
+            self._reply(mid)
+        elif mid == 0x020A:  # select profile / query filter share this MID
+            if data:
+                self.profile = data[0]
+                self._reply(mid, bytes([self.profile]))
+            else:
+                self._reply(mid, b'\x01' + (self.filter_ms // 10).to_bytes(2, 'big') + b'\x02' + bytes([self.rssi_threshold]))
+        elif mid == 0x0211:
+            self._reply(mid, self._write_epc(data))
+        elif mid == MID.BUZZER_SWITCH:
+            self.beeper = data[0] if data else 0
+            self._reply(mid)
+        else:
+            self._reply(mid)
+
+    def _info_payload(self) -> bytes:
+        sn = self.serial_number.encode()
+        bb = b"SIM BASEBAND"
+        uptime = int(time.time() - self.started_at)
+        return (b'\x00' + bytes([len(sn)]) + sn + uptime.to_bytes(4, 'big') +
+                b'\x00' + bytes([len(bb)]) + bb + b'\x01\x04' + bytes([1, 0, 0, 0]))
+
+    def _apply_power(self, data: bytes) -> bytes:
+        powers = {}
+        for i in range(0, len(data) - 1, 2):
+            pid, value = data[i], data[i + 1]
+            if pid == 0xFF:
+                continue
+            if pid not in self.antennas:
+                return b'\x01'  # port not supported
+            if value > 33:
+                return b'\x02'  # power not supported
+            powers[pid] = value
+        self.powers.update(powers)
+        return b'\x00'
+
+    def _apply_baseband(self, data: bytes) -> bytes:
+        if self._inventory.is_set():
+            return b'\x05'
+        names = {0x01: "speed", 0x02: "q_value", 0x03: "session", 0x04: "inventory_flag"}
+        for i in range(0, len(data) - 1, 2):
+            name = names.get(data[i])
+            if name:
+                self.baseband[name] = data[i + 1]
+        return b'\x00'
+
+    def _write_epc(self, data: bytes) -> bytes:
+        """
+        Payload: ant mask(4) area(1) start word(2) len(2) data [PID 0x01 match] [PID 0x02 password]
+        """
+        if len(data) < 9 or data[4] != 0x01:
+            return b'\x03'
+        if self.write_faults:
+            return bytes([self.write_faults.pop(0)])
+        antenna = (int.from_bytes(data[0:4], 'big') & -int.from_bytes(data[0:4], 'big')).bit_length()
+        if self.powers.get(antenna, 0) < self.write_min_power:
+            return b'\x05'  # insufficient power
+        start_word = int.from_bytes(data[5:7], 'big')
+        length = int.from_bytes(data[7:9], 'big')
+        content = data[9:9 + length]
+        offset = 9 + length
+        match = None
+        while offset + 3 <= len(data):
+            pid, plen = data[offset], int.from_bytes(data[offset + 1:offset + 3], 'big')
+            value = data[offset + 3:offset + 3 + plen]
+            if pid == 0x01 and len(value) >= 4:
+                match = value[4:4 + value[3] // 8]
+            offset += 3 + plen
+
+        if match is not None:
+            target = next((t for t in self.tags if t.epc == match), None)
+        else:
+            target = self.tags[0] if self.tags else None
+        if target is None:
+            return b'\x0A'  # tag lost
+        if start_word == 1:  # PC word + EPC
+            target.pc, target.epc = content[:2], content[2:]
+        elif start_word == 2:
+            target.epc = content
+        else:
+            return b'\x06'  # overflow (only PC/EPC writes are modelled)
+        return b'\x00'
+
+    ################################################################################
+    #                            TAG STREAM                                        #
+    ################################################################################
+    def _pick_antenna(self, tag: SimTag, mask: int) -> Optional[int]:
+        enabled = [a for a in self.antennas if mask >> (a - 1) & 1]
+        if not enabled:
+            return None
+        if tag.antenna in enabled and self._rng.random() >= self.cross_read:
+            return tag.antenna
+        return self._rng.choice(enabled)
+
+    def _tag_frame(self, now: float, tag: Optional[SimTag] = None) -> Optional[bytes]:
+        tag = tag or self._rng.choice(self.tags)
+        antenna = self._pick_antenna(tag, self._inventory_mask & self.enabled_mask)
+        if antenna is None:
+            return None
+        rssi = int(min(255, max(0, tag.rssi + self._rng.gauss(0, self.rssi_jitter))))
+        if rssi < self.rssi_threshold:
+            return None
+        if self.filter_ms:
+            last = self._last_report.get(tag.epc)
+            if last is not None and (now - last) * 1000 < self.filter_ms:
+                return None
+            self._last_report[tag.epc] = now
+        epc = tag.epc
+        if self.timestamp_epcs:
+            epc = epc[:-8] + time.perf_counter_ns().to_bytes(8, 'big')
+        payload = len(epc).to_bytes(2, 'big') + epc + tag.pc + bytes([antenna, 0x01, rssi])
+        return build_frame(0x0200, payload, notify=True)
+
+    def _single_inventory(self):
+        """
+        One round over the population: each tag reported once, then read-end.
+        """
+        now = time.monotonic()
+        frames = []
+        for tag in self.tags:
+            frame = self._tag_frame(now, tag)
+            if frame:
+                frames.append(frame)
+        if frames:
+            self._write(b''.join(frames), wait=0.05)
+            self.tags_sent += len(frames)
+        self._reply(0x0201, bytes([READ_END_SINGLE]), notify=True)
+
+    def _tag_loop(self):
+        while self._running:
+            if not self._inventory.wait(0.1) or not self._running:
+                continue
+            if not self.tags:
+                time.sleep(0.01)
+                continue
+            rate = min(self.read_rate or self.line_rate, self.line_rate)
+            start = time.monotonic()
+            sent = 0
+            while self._running and self._inventory.is_set():
+                now = time.monotonic()
+                due = int((now - start) * rate) - sent
+                if due <= 0:
+                    time.sleep(min(0.005, 1 / rate))
+                    continue
+                due = min(due, 256)
+                frames = [f for f in (self._tag_frame(now) for _ in range(due)) if f]
+                sent += due
+                if frames:
+                    self._write(b''.join(frames), wait=0.05)
+                    self.tags_sent += len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nation reader simulator on a pseudo-terminal')
+    parser.add_argument('--tags', type=int, default=100, help='Tag population (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=0, help='Reads/s, 0 = line rate (default: %(default)s)')
+    parser.add_argument('--baud', type=int, default=115200, help='Emulated baud rate (default: %(default)s)')
+    parser.add_argument('--rssi-mean', type=float, default=180, help='Mean RSSI (default: %(default)s)')
+    parser.add_argument('--rssi-stddev', type=float, default=15, help='RSSI spread (default: %(default)s)')
+    parser.add_argument('--antennas', default='1,2,3,4', help='Antenna IDs (default: %(default)s)')
+    parser.add_argument('--cross-read', type=float, default=0.1, help='Cross-antenna read probability (default: %(default)s)')
+    parser.add_argument('--delay', type=float, default=0.0, help='Command response delay in seconds (default: %(default)s)')
+    parser.add_argument('--link', default=None, help='Create a symlink to the pty, e.g. /tmp/nation-sim')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    args = parser.parse_args()
+
+    sim = NationSimulator(
+        tag_count=args.tags,
+        read_rate=args.rate,
+        baudrate=args.baud,
+        rssi_mean=args.rssi_mean,
+        rssi_stddev=args.rssi_stddev,
+        antennas=tuple(int(a) for a in args.antennas.split(',')),
+        cross_read=args.cross_read,
+        response_delay=args.delay,
+        link=args.link,
+        seed=args.seed,
+    )
+    port = sim.start()
+    print(f"🛰️  Nation simulator on {port} ({args.tags} tags, {sim.line_rate:.0f} tags/s line rate @ {args.baud}bps)")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📊 {sim.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Gom tag thành lô trước khi đẩy qua SocketIO.
+
+Instead of one socketio.emit('tag_detected') per read from the reader thread,
+tag records are queued here and a dedicated emitter thread flushes them as a
+single 'tag_batch' event every `interval_ms` or every `max_batch` records,
+whichever comes first.
+
+Each client picks its own cadence when it connects (or later with the
+'tag_stream' event); clients with the same settings share one SocketIO room,
+so a batch is serialised once per distinct setting rather than once per client.
+Clients that do not ask for batching keep getting one 'tag_detected' per tag.
+With several readers behind one backend a client may also narrow its stream
+to some reader IDs ("readers": [...]); records without a matching
+"reader_id" are then skipped for that channel.
+"""
+
+import threading
+import time
+from typing import Optional
+
+STREAM_SINGLE = "single"  # legacy: one 'tag_detected' event per tag
+STREAM_BATCH = "batch"    # 'tag_batch' events: {"tags": [...], "count": n, "dropped": d}
+
+
+class _Channel:
+    __slots__ = ("room", "mode", "interval", "max_batch", "readers", "buffer", "due", "members", "dropped")
+
+    def __init__(self, room: str, mode: str, interval: float, max_batch: int, readers: Optional[frozenset] = None):
+        self.room = room
+        self.readers = readers  # None = every reader
+        self.mode = mode
+        self.interval = interval
+        self.max_batch = max_batch
+        self.buffer = []
+        self.due = None  # monotonic deadline set when the first record lands
+        self.members = 0
+        self.dropped = 0
+
+
+class TagBatchEmitter:
+    def __init__(
+        self,
+        socketio,
+        interval_ms: int = 100,
+        max_batch: int = 200,
+        min_interval_ms: int = 20,
+        max_interval_ms: int = 5000,
+        max_pending: int = 10000,
+    ):
+        """
+        :param socketio: flask_socketio.SocketIO instance
+        :param interval_ms: Default flush interval for batch clients
+        :param max_batch: Default records per batch before an early flush
+        :param min_interval_ms: Lower bound a client may negotiate
+        :param max_interval_ms: Upper bound a client may negotiate
+        :param max_pending: Records buffered per channel before the oldest are dropped
+        """
+        self.socketio = socketio
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.max_pending = max_pending
+
+        self._channels: dict[str, _Channel] = {}
+        self._clients: dict[str, str] = {}  # sid -> room
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        self.records_in = 0
+        self.events_out = 0
+
+    ################################################################################
+    #                            CLIENT NEGOTIATION                                #
+    ################################################################################
+    def negotiate(self, options: Optional[dict]) -> dict:
+        """
+        Clamp a client's requested stream settings to what the server allows.
+        :param options: {"mode": "batch"|"single", "interval_ms": int, "max_batch": int,
+                         "readers": [reader_id, ...] (optional)}
+        :return: Effective settings
+        """
+        options = options or {}
+        mode = options.get("mode", STREAM_SINGLE)
+        readers = options.get("readers")
+        if isinstance(readers, str):
+            readers = [readers]
+        settings = {"mode": STREAM_SINGLE}
+        if mode == STREAM_BATCH:
+            interval_ms = int(options.get("interval_ms", self.interval_ms))
+            max_batch = int(options.get("max_batch", self.max_batch))
+            settings = {
+                "mode": STREAM_BATCH,
+                "interval_ms": max(self.min_interval_ms, min(self.max_interval_ms, interval_ms)),
+                "max_batch": max(1, min(self.max_pending, max_batch)),
+            }
+        if readers:
+            settings["readers"] = sorted({str(r) for r in readers})
+        return settings
+
+    def register(self, sid: str, options: Optional[dict] = None) -> tuple[dict, str, Optional[str]]:
+        """
+        Attach a client to the channel matching its settings.
+        :return: (effective settings, room to join, previous room to leave or None)
+        """
+        settings = self.negotiate(options)
+        if settings["mode"] == STREAM_BATCH:
+            room = f"tag_batch:{settings['interval_ms']}:{settings['max_batch']}"
+        else:
+            room = "tag_detected"
+        readers = frozenset(settings["readers"]) if "readers" in settings else None
+        if readers is not None:
+            room += ":" + ",".join(settings["readers"])
+        with self._cond:
+            previous = self._detach(sid)
+            channel = self._channels.get(room)
+            if channel is None:
+                if settings["mode"] == STREAM_BATCH:
+                    channel = _Channel(room, STREAM_BATCH, settings["interval_ms"] / 1000, settings["max_batch"],
+                                       readers)
+                else:
+                    channel = _Channel(room, STREAM_SINGLE, 0.0, 1, readers)
+                self._channels[room] = channel
+            channel.members += 1
+            self._clients[sid] = room
+        return settings, room, previous if previous != room else None
+
+    def unregister(self, sid: str) -> Optional[str]:
+        """
+        :return: Room the client was in, or None
+        """
+        with self._cond:
+            return self._detach(sid)
+
+    def _detach(self, sid: str) -> Optional[str]:
+        room = self._clients.pop(sid, None)
+        channel = self._channels.get(room) if room else None
+        if channel:
+            channel.members -= 1
+            if channel.members <= 0:
+                del self._channels[room]
+        return room
+
+    ################################################################################
+    #                            PRODUCER SIDE                                     #
+    ################################################################################
+    def submit(self, record: dict):
+        """
+        Queue one tag record for every channel. Cheap enough for the reader thread:
+        no JSON, no socket I/O, just a list append per distinct client setting.
+        """
+        with self._cond:
+            self.records_in += 1
+            wake = False
+            now = time.monotonic()
+            for channel in self._channels.values():
+                if channel.readers is not None and record.get("reader_id") not in channel.readers:
+                    continue
+                buffer = channel.buffer
+                if len(buffer) >= self.max_pending:
+                    del buffer[0]
+                    channel.dropped += 1
+                buffer.append(record)
+                if channel.due is None:
+                    # First record of a window: the emitter must learn the new deadline
+                    channel.due = now + channel.interval
+                    wake = True
+                elif len(buffer) >= channel.max_batch:
+                    wake = True
+            if wake:
+                self._cond.notify()
+
+    ################################################################################
+    #                            EMITTER THREAD                                    #
+    ################################################################################
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="tag-batch-emitter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def _take_due(self, now: float) -> list:
+        ready = []
+        for channel in self._channels.values():
+            if channel.buffer and (channel.due <= now or len(channel.buffer) >= channel.max_batch):
+                ready.append((channel.room, channel.mode, channel.max_batch, channel.buffer, channel.dropped))
+                channel.buffer = []
+                channel.due = None
+                channel.dropped = 0
+        return ready
+
+    def _next_timeout(self, now: float) -> Optional[float]:
+        dues = [c.due for c in self._channels.values() if c.due is not None]
+        return max(0.0, min(dues) - now) if dues else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                timeout = self._next_timeout(time.monotonic())
+                if timeout != 0.0:
+                    self._cond.wait(timeout)
+                ready = self._take_due(time.monotonic())
+            for room, mode, max_batch, records, dropped in ready:
+                try:
+                    self._emit(room, mode, max_batch, records, dropped)
+                except Exception as e:
+                    print(f"⚠️ Tag emit failed: {e}")
+
+    def _emit(self, room: str, mode: str, max_batch: int, records: list, dropped: int):
+        if mode == STREAM_SINGLE:
+            for record in records:
+                self.socketio.emit("tag_detected", record, to=room)
+            self.events_out += len(records)
+            return
+        # A batch larger than max_batch only happens after a stall; keep batches bounded
+        for start in range(0, len(records), max_batch):
+            chunk = records[start:start + max_batch]
+            self.socketio.emit("tag_batch", {"tags": chunk, "count": len(chunk), "dropped": dropped}, to=room)
+            dropped = 0
+            self.events_out += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            channels = {
+                room: {"mode": c.mode, "members": c.members, "pending": len(c.buffer),
+                       "readers": sorted(c.readers) if c.readers is not None else None}
+                for room, c in self._channels.items()
+            }
+        return {"records_in": self.records_in, "events_out": self.events_out, "channels": channels}
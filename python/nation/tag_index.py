@@ -0,0 +1,263 @@
+"""
+Chỉ mục tra cứu lịch sử tag trên nhật ký đĩa (tag_log).
+
+Answers "when/where was EPC X seen" and "what did antenna N see between T1 and
+T2" without replaying the whole log. For every segment it keeps:
+
+    epcs    - EPC bytes -> record indices in that segment
+    sparse  - timestamp of every `sparse_every`-th record, to bisect a time
+              range to the right block before touching the segment itself
+    min/max - first/last timestamp, to skip whole segments
+
+Sealed segments (every one but the newest) are indexed once and the result is
+saved next to them as a .idx sidecar; the newest segment is indexed
+incrementally as the writer appends. Loaded indexes are kept in a small LRU.
+"""
+
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+from tag_log import (
+    INDEX_SUFFIX, SEGMENT_SUFFIX, TagLogReader, list_segments, map_segment, read_record, record_dict,
+)
+
+INDEX_MAGIC = b"NTIX"
+INDEX_VERSION = 1
+
+# magic, version, record_count, sparse_every, sparse_count, epc_count, min_ts, max_ts
+_INDEX_HEADER = struct.Struct("<4sHxxIIIIdd")
+_EPC_ENTRY = struct.Struct("<BI")  # epc_len, position count
+
+
+class SegmentIndex:
+    __slots__ = ("base", "count", "sparse_every", "sparse", "epcs", "min_ts", "max_ts")
+
+    def __init__(self, base: int, sparse_every: int):
+        self.base = base
+        self.count = 0
+        self.sparse_every = sparse_every
+        self.sparse = array("d")
+        self.epcs: dict[bytes, array] = {}
+        self.min_ts = None
+        self.max_ts = None
+
+    def extend(self, buf, count: int) -> bool:
+        """
+        Index records [self.count, count) of the mapped segment.
+        :return: False if it stopped at a record with a bad CRC (torn tail)
+        """
+        epcs, sparse, every = self.epcs, self.sparse, self.sparse_every
+        for i in range(self.count, count):
+            record = read_record(buf, i)
+            if record is None:
+                return False
+            timestamp, epc = record[0], record[4]
+            if i % every == 0:
+                sparse.append(timestamp)
+            positions = epcs.get(epc)
+            if positions is None:
+                positions = epcs[epc] = array("I")
+            positions.append(i)
+            if self.min_ts is None:
+                self.min_ts = timestamp
+            self.max_ts = timestamp
+            self.count = i + 1
+        return True
+
+    def overlaps(self, since: Optional[float], until: Optional[float]) -> bool:
+        if self.min_ts is None:
+            return False
+        return (since is None or self.max_ts >= since) and (until is None or self.min_ts <= until)
+
+    def first_at(self, since: Optional[float]) -> int:
+        """
+        Start of the sparse block that may hold the first record >= since.
+        """
+        if since is None:
+            return 0
+        block = bisect_left(self.sparse, since)
+        return max(block - 1, 0) * self.sparse_every
+
+    ################################################################################
+    #                            SIDECAR FILE                                      #
+    ################################################################################
+    def save(self, path: str):
+        parts = [
+            _INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.count, self.sparse_every,
+                               len(self.sparse), len(self.epcs), self.min_ts or 0.0, self.max_ts or 0.0),
+            self.sparse.tobytes(),
+        ]
+        for epc, positions in self.epcs.items():
+            parts.append(_EPC_ENTRY.pack(len(epc), len(positions)))
+            parts.append(epc)
+            parts.append(positions.tobytes())
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, base: int, count: int) -> Optional["SegmentIndex"]:
+        """
+        :return: The saved index, or None if missing, corrupt or not covering `count` records
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, version, saved_count, every, sparse_count, epc_count, min_ts, max_ts = \
+                _INDEX_HEADER.unpack_from(data, 0)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION or saved_count != count:
+                return None
+            index = cls(base, every)
+            index.count = saved_count
+            index.min_ts, index.max_ts = (min_ts, max_ts) if saved_count else (None, None)
+            offset = _INDEX_HEADER.size
+            index.sparse.frombytes(data[offset:offset + sparse_count * 8])
+            offset += sparse_count * 8
+            for _ in range(epc_count):
+                epc_len, n = _EPC_ENTRY.unpack_from(data, offset)
+                offset += _EPC_ENTRY.size
+                epc = data[offset:offset + epc_len]
+                offset += epc_len
+                positions = array("I")
+                positions.frombytes(data[offset:offset + n * 4])
+                offset += n * 4
+                index.epcs[epc] = positions
+            return index
+        except (OSError, struct.error, ValueError):
+            return None
+
+
+class TagLogIndex:
+    """
+    Thread-safe query side over a TagLog directory.
+    """
+
+    def __init__(self, directory: str, sparse_every: int = 1024, max_cached: int = 8):
+        """
+        :param sparse_every: Records per sparse time-index entry
+        :param max_cached: Sealed segment indexes kept in memory
+        """
+        self.directory = directory
+        self.sparse_every = sparse_every
+        self.max_cached = max_cached
+        self._reader = TagLogReader(directory)
+        self._cache: OrderedDict[int, SegmentIndex] = OrderedDict()
+        self._tail: Optional[SegmentIndex] = None
+        self._lock = threading.Lock()
+        self.built = 0
+        self.loaded = 0
+
+    def _segment_index(self, base: int, path: str, buf, count: int, sealed: bool) -> SegmentIndex:
+        with self._lock:
+            if not sealed:
+                if self._tail is None or self._tail.base != base or self._tail.count > count:
+                    self._tail = SegmentIndex(base, self.sparse_every)
+                self._tail.extend(buf, count)
+                return self._tail
+            index = self._cache.get(base)
+            if index is not None and index.count == count:
+                self._cache.move_to_end(base)
+                return index
+            index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+            index = SegmentIndex.load(index_path, base, count)
+            if index is None:
+                if self._tail is not None and self._tail.base == base:
+                    index = self._tail  # the segment we were following just got sealed
+                    self._tail = None
+                else:
+                    index = SegmentIndex(base, self.sparse_every)
+                index.extend(buf, count)
+                try:
+                    index.save(index_path)
+                except OSError as e:
+                    print(f"⚠️ Could not save tag index {index_path}: {e}")
+                self.built += 1
+            else:
+                self.loaded += 1
+            self._cache[base] = index
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+            return index
+
+    def query(self, epc: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              reader_id: Optional[str] = None, antenna: Optional[int] = None,
+              limit: Optional[int] = None, newest_first: bool = False) -> Iterator[dict]:
+        """
+        Yield matching reads one at a time (nothing is collected in memory).
+        :param epc: Hex EPC; uses the per-segment EPC index
+        :param since, until: Epoch seconds, inclusive
+        :param reader_id: Reader ID as stored by TagLog
+        :param antenna: Antenna number
+        :param limit: Stop after this many records
+        :param newest_first: Walk backwards (e.g. limit=1 for "last seen")
+        :return: Iterator of {"seq", "timestamp", "reader_id", "antenna", "rssi", "epc"}
+        """
+        names = self._reader.reader_names()
+        reader_filter = None
+        if reader_id is not None:
+            reader_filter = next((idx for idx, rid in names.items() if rid == reader_id), None)
+            if reader_filter is None:
+                return
+        epc_key = bytes.fromhex(epc) if epc else None
+        remaining = limit
+
+        segments = list_segments(self.directory)
+        order = range(len(segments) - 1, -1, -1) if newest_first else range(len(segments))
+        for n in order:
+            base, path = segments[n]
+            mapped = map_segment(path)
+            if not mapped:
+                continue
+            buf, count = mapped
+            with buf:
+                index = self._segment_index(base, path, buf, count, sealed=n < len(segments) - 1)
+                if not index.overlaps(since, until):
+                    continue
+                if epc_key is not None:
+                    positions = index.epcs.get(epc_key)
+                    if not positions:
+                        continue
+                    candidates = reversed(positions) if newest_first else positions
+                else:
+                    start = index.first_at(since)
+                    candidates = range(index.count - 1, start - 1, -1) if newest_first else range(start, index.count)
+                for i in candidates:
+                    record = read_record(buf, i)
+                    if record is None:
+                        break
+                    timestamp = record[0]
+                    if since is not None and timestamp < since:
+                        if newest_first and epc_key is None:
+                            break
+                        continue
+                    if until is not None and timestamp > until:
+                        if not newest_first and epc_key is None:
+                            break
+                        continue
+                    if reader_filter is not None and record[1] != reader_filter:
+                        continue
+                    if antenna is not None and record[3] != antenna:
+                        continue
+                    yield record_dict(base + i, record, names)
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+
+    def last_seen(self, epc: str) -> Optional[dict]:
+        return next(self.query(epc=epc, limit=1, newest_first=True), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached_segments": len(self._cache),
+                "tail_records": self._tail.count if self._tail else 0,
+                "built": self.built,
+                "loaded": self.loaded,
+            }
@@ -0,0 +1,521 @@
+"""
+Nhật ký tag bền vững: bản ghi nhị phân cố định, chỉ ghi nối tiếp.
+
+TagTable only keeps the last TAG_HISTORY_SIZE reads in memory. TagLog writes
+every read to disk without ever blocking the thread that produced it:
+
+    append()  - caller side, O(1): stamps the read and pushes it on a deque
+    writer    - background thread; every flush_interval it drains the deque,
+                packs the whole group into one buffer and does a single
+                write() (+ fsync) per group ("group commit")
+    segments  - files of fixed-size records, rotated at segment_bytes and
+                deleted oldest-first by retention_segments / retention_seconds
+
+Segment layout (little endian):
+
+    header  32 bytes: magic "NTLG", version, record size, base sequence, created
+    records 80 bytes: timestamp f64, reader u16, rssi i16, antenna u8,
+                      epc_len u8, epc 62 bytes, crc32 of the preceding 76 bytes
+
+Record N of a segment has the global sequence number base + N. A record whose
+CRC does not match is a torn tail from a crash: TagLog truncates it on start
+and TagLogReader stops there. TagLogReader replays segments through mmap.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Iterator, Optional
+
+LOG_MAGIC = b"NTLG"
+LOG_VERSION = 1
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".tlog"
+INDEX_SUFFIX = ".idx"  # sidecar written by tag_index.TagLogIndex
+READERS_FILE = "readers.json"
+
+# magic, version, record_size, base_seq, created
+_HEADER = struct.Struct("<4sHHQd8x")
+# timestamp, reader, rssi, antenna, epc_len, epc
+_BODY = struct.Struct("<dHhBB62s")
+_CRC = struct.Struct("<I")
+_TIMESTAMP = struct.Struct("<d")
+RECORD_SIZE = _BODY.size + _CRC.size
+_NO_RSSI = -32768
+MAX_EPC_BYTES = 62
+
+
+def segment_name(base_seq: int) -> str:
+    return f"{SEGMENT_PREFIX}{base_seq:020d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory: str) -> list[tuple[int, str]]:
+    """
+    :return: [(base_seq, path)] sorted by base sequence number
+    """
+    segments = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            try:
+                base = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            except ValueError:
+                continue
+            segments.append((base, os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def map_segment(path: str):
+    """
+    Map the complete records of a segment read-only.
+    :return: (mmap, record count) or None if the file is gone, empty or not a segment
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None  # removed by retention meanwhile
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        count = max(size - _HEADER.size, 0) // RECORD_SIZE
+        if count == 0:
+            return None
+        buf = mmap.mmap(f.fileno(), _HEADER.size + count * RECORD_SIZE, access=mmap.ACCESS_READ)
+    if buf[:4] != LOG_MAGIC:
+        buf.close()
+        return None
+    return buf, count
+
+
+def read_record(buf, index: int):
+    """
+    :return: (timestamp, reader, rssi, antenna, epc bytes) or None if the CRC does not match
+    """
+    offset = _HEADER.size + index * RECORD_SIZE
+    body_end = offset + _BODY.size
+    (crc,) = _CRC.unpack_from(buf, body_end)
+    if crc != zlib.crc32(buf[offset:body_end]):
+        return None
+    timestamp, reader, rssi, antenna, epc_len, epc = _BODY.unpack_from(buf, offset)
+    return timestamp, reader, rssi, antenna, epc[:epc_len]
+
+
+def record_timestamp(buf, index: int) -> float:
+    return _TIMESTAMP.unpack_from(buf, _HEADER.size + index * RECORD_SIZE)[0]
+
+
+def record_dict(seq: int, record, names: dict) -> dict:
+    timestamp, reader, rssi, antenna, epc = record
+    return {
+        "seq": seq,
+        "timestamp": timestamp,
+        "reader_id": names.get(reader),
+        "antenna": antenna or None,
+        "rssi": None if rssi == _NO_RSSI else rssi,
+        "epc": epc.hex().upper(),
+    }
+
+
+def _valid_records(buf, count: int) -> int:
+    """
+    Number of leading records in `buf` (after the header) whose CRC matches.
+    """
+    for i in range(count):
+        offset = _HEADER.size + i * RECORD_SIZE
+        body_end = offset + _BODY.size
+        (crc,) = _CRC.unpack_from(buf, body_end)
+        if crc != zlib.crc32(buf[offset:body_end]):
+            return i
+    return count
+
+
+class TagLog:
+    """
+    Append side. Thread-safe append(); a single writer thread owns the files.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        retention_segments: int = 32,
+        retention_seconds: Optional[float] = None,
+        flush_interval_ms: int = 50,
+        fsync: bool = True,
+        max_pending: int = 200_000,
+    ):
+        """
+        :param directory: Created if missing
+        :param segment_bytes: Rotate once a segment reaches this size
+        :param retention_segments: Keep at most this many segments (None = unlimited)
+        :param retention_seconds: Delete segments whose newest record is older (None = keep)
+        :param flush_interval_ms: Group commit window
+        :param fsync: fsync after every group (False = leave it to the OS page cache)
+        :param max_pending: Reads buffered in memory before append() starts dropping
+        """
+        self.directory = directory
+        self.segment_bytes = max(segment_bytes, _HEADER.size + RECORD_SIZE)
+        self.retention_segments = retention_segments
+        self.retention_seconds = retention_seconds
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.fsync = fsync
+        self.max_pending = max_pending
+
+        self._pending = deque()
+        self._readers: dict[str, int] = {}
+        self._readers_lock = threading.Lock()
+        self._file = None
+        self._segment_base = 0
+        self._segment_records = 0
+        self._next_seq = 0
+        self._running = False
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.appended = 0
+        self.written = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.commits = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self.truncated = 0
+
+    ################################################################################
+    #                            LIFECYCLE                                         #
+    ################################################################################
+    def start(self):
+        if self._running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_readers()
+        self._open_tail()
+        self._stop.clear()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, name="tag-log", daemon=True)
+        self._thread.start()
+        print(f"📝 Tag log at {self.directory} (next seq {self._next_seq})")
+
+    def close(self):
+        """
+        Flush everything still pending, then close the active segment.
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    ################################################################################
+    #                            APPEND (CALLER SIDE)                              #
+    ################################################################################
+    def append(self, epc: str, rssi: Optional[int] = None, antenna: Optional[int] = None,
+               reader_id: Optional[str] = None, timestamp: Optional[float] = None) -> bool:
+        """
+        Queue one read. Never blocks and never touches the disk.
+        :return: False if the read was dropped (log not running or backlog full)
+        """
+        if not self._running or len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._pending.append((timestamp or time.time(), reader_id, antenna, rssi, epc))
+        self.appended += 1
+        return True
+
+    def sequence(self) -> int:
+        """
+        Sequence number the next written record will get.
+        """
+        return self._next_seq
+
+    def reader_index(self, reader_id: Optional[str]) -> int:
+        """
+        Small integer stored in each record instead of the reader ID (0 = none).
+        The mapping is kept in readers.json next to the segments.
+        """
+        if not reader_id:
+            return 0
+        index = self._readers.get(reader_id)
+        if index is not None:
+            return index
+        with self._readers_lock:
+            index = self._readers.get(reader_id)
+            if index is None:
+                index = len(self._readers) + 1
+                self._readers[reader_id] = index
+                self._save_readers()
+            return index
+
+    ################################################################################
+    #                            WRITER THREAD                                     #
+    ################################################################################
+    def _writer_loop(self):
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            try:
+                self._commit()
+            except Exception as e:
+                print(f"❌ Tag log write error: {e}")
+            if stopping and not self._pending:
+                return
+
+    def _commit(self):
+        count = len(self._pending)
+        if not count:
+            return
+        started = time.perf_counter()
+        while count:
+            room = (self.segment_bytes - _HEADER.size) // RECORD_SIZE - self._segment_records
+            if room <= 0:
+                self._rotate()
+                continue
+            take = min(count, room)
+            buf = bytearray(take * RECORD_SIZE)
+            packed = 0
+            for _ in range(take):
+                packed += self._pack(buf, packed * RECORD_SIZE, self._pending.popleft())
+            count -= take
+            if packed:
+                self._file.write(memoryview(buf)[:packed * RECORD_SIZE])
+                self._segment_records += packed
+                self._next_seq += packed
+                self.written += packed
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        elapsed = (time.perf_counter() - started) * 1000
+        self.commits += 1
+        self.last_commit_ms = elapsed
+        self.max_commit_ms = max(self.max_commit_ms, elapsed)
+
+    def _pack(self, buf: bytearray, offset: int, item) -> int:
+        timestamp, reader_id, antenna, rssi, epc = item
+        try:
+            epc_bytes = bytes.fromhex(epc or "")
+        except ValueError:
+            self.invalid += 1
+            return 0
+        if len(epc_bytes) > MAX_EPC_BYTES:
+            self.invalid += 1
+            return 0
+        _BODY.pack_into(
+            buf, offset, timestamp, self.reader_index(reader_id),
+            _NO_RSSI if rssi is None else rssi, antenna or 0, len(epc_bytes), epc_bytes,
+        )
+        body_end = offset + _BODY.size
+        _CRC.pack_into(buf, body_end, zlib.crc32(memoryview(buf)[offset:body_end]))
+        return 1
+
+    ################################################################################
+    #                            SEGMENTS                                          #
+    ################################################################################
+    def _open_tail(self):
+        """
+        Continue the newest segment after cutting off a torn tail, or start a new one.
+        """
+        segments = list_segments(self.directory)
+        if not segments:
+            self._new_segment(0)
+            return
+        base, path = segments[-1]
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size or header[:4] != LOG_MAGIC:
+                print(f"⚠️ Tag log segment {path} has no valid header, rewriting it")
+                f.close()
+                self._new_segment(base)
+                return
+            size = os.fstat(f.fileno()).st_size
+            valid = (size - _HEADER.size) // RECORD_SIZE
+            # Only the tail can be torn: walk back to the last record with a good CRC
+            while valid:
+                f.seek(_HEADER.size + (valid - 1) * RECORD_SIZE)
+                if _valid_records(header + f.read(RECORD_SIZE), 1):
+                    break
+                valid -= 1
+        end = _HEADER.size + valid * RECORD_SIZE
+        if end != size:
+            self.truncated += size - end
+            print(f"⚠️ Tag log: truncating {size - end} bytes of torn records in {path}")
+            with open(path, "r+b") as f:
+                f.truncate(end)
+        self._file = open(path, "ab")
+        self._segment_base = base
+        self._segment_records = valid
+        self._next_seq = base + valid
+
+    def _new_segment(self, base_seq: int):
+        path = os.path.join(self.directory, segment_name(base_seq))
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(LOG_MAGIC, LOG_VERSION, RECORD_SIZE, base_seq, time.time()))
+        self._file.flush()
+        self._segment_base = base_seq
+        self._segment_records = 0
+        self._next_seq = base_seq
+
+    def _rotate(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._new_segment(self._next_seq)
+        self._apply_retention()
+
+    def _apply_retention(self):
+        segments = list_segments(self.directory)[:-1]  # never the active one
+        if self.retention_segments is not None:
+            excess = len(segments) + 1 - self.retention_segments
+            for _, path in segments[:max(excess, 0)]:
+                self._remove(path)
+            segments = segments[max(excess, 0):]
+        if self.retention_seconds is not None:
+            cutoff = time.time() - self.retention_seconds
+            for _, path in segments:
+                if os.path.getmtime(path) >= cutoff:
+                    break
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+            index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            print(f"🗑️ Tag log segment removed: {os.path.basename(path)}")
+        except OSError as e:
+            print(f"⚠️ Could not remove {path}: {e}")
+
+    ################################################################################
+    #                            READER ID MAP                                     #
+    ################################################################################
+    def _load_readers(self):
+        path = os.path.join(self.directory, READERS_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._readers = {rid: int(idx) for rid, idx in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring {path}: {e}")
+
+    def _save_readers(self):
+        path = os.path.join(self.directory, READERS_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._readers, f, indent=2)
+        os.replace(tmp, path)
+
+    def stats(self) -> dict:
+        segments = list_segments(self.directory)
+        return {
+            "directory": self.directory,
+            "running": self._running,
+            "next_seq": self._next_seq,
+            "pending": len(self._pending),
+            "appended": self.appended,
+            "written": self.written,
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+            "commits": self.commits,
+            "last_commit_ms": round(self.last_commit_ms, 3),
+            "max_commit_ms": round(self.max_commit_ms, 3),
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(path) for _, path in segments),
+            "truncated_bytes": self.truncated,
+        }
+
+
+class TagLogReader:
+    """
+    Read side, usable from another thread or process while TagLog is writing.
+    Each segment is mapped read-only; records past the last valid CRC are ignored.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._readers: dict[int, str] = {}
+
+    def reader_names(self) -> dict[int, str]:
+        path = os.path.join(self.directory, READERS_FILE)
+        try:
+            with open(path) as f:
+                self._readers = {int(idx): rid for rid, idx in json.load(f).items()}
+        except (OSError, ValueError):
+            pass
+        return self._readers
+
+    def replay(self, since: Optional[float] = None, until: Optional[float] = None,
+               start_seq: int = 0, reader_id: Optional[str] = None,
+               epc: Optional[str] = None) -> Iterator[dict]:
+        """
+        Yield records in write order.
+        :param since: Skip records older than this epoch time
+        :param until: Stop at the first record newer than this epoch time
+        :param start_seq: Skip records with a smaller sequence number
+        :param reader_id: Only this reader
+        :param epc: Only this EPC (hex, case-insensitive)
+        :return: Iterator of {"seq", "timestamp", "reader_id", "antenna", "rssi", "epc"}
+        """
+        names = self.reader_names()
+        reader_filter = None
+        if reader_id is not None:
+            reader_filter = next((idx for idx, rid in names.items() if rid == reader_id), -1)
+        epc_filter = bytes.fromhex(epc) if epc else None
+
+        segments = list_segments(self.directory)
+        for i, (base, path) in enumerate(segments):
+            next_base = segments[i + 1][0] if i + 1 < len(segments) else None
+            if next_base is not None and next_base <= start_seq:
+                continue
+            for record in self._scan(path, base, since, until, start_seq, reader_filter, epc_filter, names):
+                if record is None:
+                    return
+                yield record
+
+    def _scan(self, path, base, since, until, start_seq, reader_filter, epc_filter, names):
+        mapped = map_segment(path)
+        if not mapped:
+            return
+        buf, count = mapped
+        with buf:
+            first = max(start_seq - base, 0)
+            if since is not None:
+                first = max(first, self._bisect_time(buf, count, since))
+            for i in range(first, count):
+                record = read_record(buf, i)
+                if record is None:
+                    return
+                if until is not None and record[0] > until:
+                    yield None
+                    return
+                if reader_filter is not None and record[1] != reader_filter:
+                    continue
+                if epc_filter is not None and record[4] != epc_filter:
+                    continue
+                yield record_dict(base + i, record, names)
+
+    @staticmethod
+    def _bisect_time(buf, count: int, since: float) -> int:
+        """
+        First record index with timestamp >= since (records are appended in time order).
+        """
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if record_timestamp(buf, mid) < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
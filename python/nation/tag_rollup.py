@@ -0,0 +1,235 @@
+"""
+Tổng hợp số liệu đọc tag theo khung thời gian (giây / phút / giờ).
+
+Fed with every read from publish_tag() (a host dedup event counts as the
+new_reads it aggregates); each record updates the current bucket of every
+resolution in O(1):
+
+    reads       - read count (-> read rate)
+    unique      - distinct EPCs: an exact set while small, then a HyperLogLog
+    antennas    - reads per antenna
+    rssi        - histogram with fixed-width bins plus mean
+
+Each resolution keeps a fixed number of buckets (deque maxlen), so memory is
+bounded whatever the read rate or tag population: at most one HyperLogLog
+(2**precision bytes) per bucket.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+_MASK64 = (1 << 64) - 1
+_INV_POW2 = [2.0 ** -r for r in range(65)]
+
+RESOLUTIONS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch; standard error about 1.04 / sqrt(2**precision).
+    Uses the interpreter's string hash, so sketches only merge within one process.
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 11):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @staticmethod
+    def position(value: str, precision: int) -> tuple[int, int]:
+        """
+        :return: (register index, rank) of `value`; lets a caller hash once and update several sketches
+        """
+        h = hash(value) & _MASK64
+        rest_bits = 64 - precision
+        rest = h & ((1 << rest_bits) - 1)
+        return h >> rest_bits, rest_bits - rest.bit_length() + 1
+
+    def add_position(self, index: int, rank: int):
+        if self.registers[index] < rank:
+            self.registers[index] = rank
+
+    def add(self, value: str):
+        self.add_position(*self.position(value, self.precision))
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(map(_INV_POW2.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class Bucket:
+    __slots__ = ("start", "width", "reads", "antennas", "rssi_hist", "rssi_sum", "rssi_count", "exact", "hll",
+                 "_unique")
+
+    def __init__(self, start: float, width: int, rssi_bins: int):
+        self.start = start
+        self.width = width
+        self.reads = 0
+        self.antennas: dict[int, int] = {}
+        self.rssi_hist = [0] * rssi_bins
+        self.rssi_sum = 0
+        self.rssi_count = 0
+        self.exact: Optional[set] = set()
+        self.hll: Optional[HyperLogLog] = None
+        self._unique = None  # cached HyperLogLog estimate, cleared when a register changes
+
+    def add_unique(self, epc: str, index: int, rank: int, exact_limit: int, precision: int):
+        if self.exact is not None:
+            self.exact.add(epc)
+            if len(self.exact) > exact_limit:
+                self.hll = HyperLogLog(precision)
+                for value in self.exact:
+                    self.hll.add(value)
+                self.exact = None
+        elif self.hll.registers[index] < rank:
+            self.hll.registers[index] = rank
+            self._unique = None
+
+    def unique(self) -> int:
+        if self.exact is not None:
+            return len(self.exact)
+        if self._unique is None:
+            self._unique = min(self.hll.count(), self.reads)  # the estimate can overshoot small buckets
+        return self._unique
+
+    def to_dict(self, rssi_bin: int, now: float) -> dict:
+        elapsed = min(max(now - self.start, 1e-3), self.width)
+        return {
+            "start": self.start,
+            "reads": self.reads,
+            "rate": round(self.reads / elapsed, 1),
+            "unique": self.unique(),
+            "antennas": dict(sorted(self.antennas.items())),
+            "rssi": {
+                "bin_width": rssi_bin,
+                "histogram": list(self.rssi_hist),
+                "mean": round(self.rssi_sum / self.rssi_count, 1) if self.rssi_count else None,
+            },
+        }
+
+
+class TagRollup:
+    """
+    Thread-safe: record() runs on the tag pipeline threads, snapshot()/summary() on the web side.
+    """
+
+    def __init__(
+        self,
+        retention: Optional[dict] = None,
+        precision: int = 11,
+        exact_limit: int = 256,
+        rssi_bin: int = 16,
+        rssi_max: int = 255,
+    ):
+        """
+        :param retention: Buckets kept per resolution, default {"second": 300, "minute": 180, "hour": 48}
+        :param precision: HyperLogLog precision (2**precision registers per bucket)
+        :param exact_limit: Distinct EPCs counted exactly in a bucket before it switches to HyperLogLog
+        :param rssi_bin: Width of one RSSI histogram bin
+        :param rssi_max: Largest RSSI value (higher values land in the last bin)
+        """
+        self.retention = dict(retention or {"second": 300, "minute": 180, "hour": 48})
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.rssi_bin = rssi_bin
+        self.rssi_bins = rssi_max // rssi_bin + 1
+        self._levels = {name: deque(maxlen=self.retention[name]) for name in RESOLUTIONS}
+        self._lock = threading.Lock()
+        self.total_reads = 0
+        self._total_unique = HyperLogLog(max(precision, 14))
+        self.started = time.time()
+
+    def record(self, epc: Optional[str], rssi: Optional[int] = None, antenna: Optional[int] = None,
+               now: Optional[float] = None, reads: int = 1):
+        """
+        :param reads: Reads this record stands for (a host dedup event aggregates several: its new_reads)
+        """
+        if not epc or reads <= 0:
+            return
+        now = now or time.time()
+        epc = epc.upper()
+        index, rank = HyperLogLog.position(epc, self.precision)
+        rssi_index = None
+        if rssi is not None:
+            rssi_index = min(max(int(rssi), 0) // self.rssi_bin, self.rssi_bins - 1)
+        with self._lock:
+            self.total_reads += reads
+            self._total_unique.add(epc)
+            for name, width in RESOLUTIONS.items():
+                bucket = self._bucket(name, width, now)
+                bucket.reads += reads
+                if antenna:
+                    bucket.antennas[antenna] = bucket.antennas.get(antenna, 0) + reads
+                if rssi_index is not None:
+                    bucket.rssi_hist[rssi_index] += reads
+                    bucket.rssi_sum += rssi * reads
+                    bucket.rssi_count += reads
+                bucket.add_unique(epc, index, rank, self.exact_limit, self.precision)
+
+    def _bucket(self, name: str, width: int, now: float) -> Bucket:
+        level = self._levels[name]
+        start = now - now % width
+        if level and level[-1].start == start:
+            return level[-1]
+        if level and level[-1].start > start:
+            # Late read (clock step or a timestamp from the past): count it in the newest bucket
+            return level[-1]
+        bucket = Bucket(start, width, self.rssi_bins)
+        level.append(bucket)
+        return bucket
+
+    def snapshot(self, resolution: str = "minute", limit: Optional[int] = None) -> list[dict]:
+        """
+        :return: Buckets of `resolution`, oldest first; seconds without reads are not listed
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {list(RESOLUTIONS)}")
+        now = time.time()
+        with self._lock:
+            buckets = list(self._levels[resolution])
+            if limit:
+                buckets = buckets[-limit:]
+            return [bucket.to_dict(self.rssi_bin, now) for bucket in buckets]
+
+    def summary(self) -> dict:
+        """
+        Small payload for the periodic 'stats' event.
+        """
+        now = time.time()
+        with self._lock:
+            seconds = self._levels["second"]
+            # Rate of the last complete second (the current one is still filling)
+            last_second = next((b for b in reversed(seconds) if b.start <= now - 1), None)
+            read_rate = last_second.reads if last_second and last_second.start > now - 2 else 0
+            minute = self._levels["minute"][-1] if self._levels["minute"] else None
+            hour = self._levels["hour"][-1] if self._levels["hour"] else None
+            return {
+                "timestamp": now,
+                "read_rate": read_rate,
+                "total_reads": self.total_reads,
+                "total_unique": self._total_unique.count(),
+                "minute": minute.to_dict(self.rssi_bin, now) if minute and minute.start > now - 60 else None,
+                "hour": hour.to_dict(self.rssi_bin, now) if hour and hour.start > now - 3600 else None,
+            }
+
+    def reset(self):
+        with self._lock:
+            for level in self._levels.values():
+                level.clear()
+            self.total_reads = 0
+            self._total_unique = HyperLogLog(self._total_unique.precision)
+            self.started = time.time()
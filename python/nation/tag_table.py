@@ -0,0 +1,238 @@
+"""
+Bảng tag đã phát hiện: lịch sử dạng ring buffer + chỉ mục theo EPC.
+
+Replaces the old `detected_tags` list (trimmed with pop(0), scanned for every
+lookup) with two structures behind one lock:
+
+    history - fixed-size ring of tag events, each stamped with a sequence number
+              so clients can poll "everything after cursor N"
+    index   - EPC -> TagRecord (first/last seen, read count, antenna bitmask,
+              RSSI min/max/mean), bounded by evicting the least recently seen EPC
+
+Every operation is O(1) per tag except query(), which is O(tags in the index).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TagRecord:
+    __slots__ = ("epc", "pc", "first_seen", "last_seen", "count", "antennas",
+                 "rssi_last", "rssi_min", "rssi_max", "rssi_sum", "rssi_count", "seq")
+
+    def __init__(self, epc: str, now: float):
+        self.epc = epc
+        self.pc = None
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 0
+        self.antennas = 0  # bit (n-1) set = seen on antenna n
+        self.rssi_last = None
+        self.rssi_min = None
+        self.rssi_max = None
+        self.rssi_sum = 0
+        self.rssi_count = 0
+        self.seq = 0  # sequence number of the last event that touched this record
+
+    def update(self, rssi: Optional[int], antenna: Optional[int], now: float, seq: int):
+        self.last_seen = now
+        self.count += 1
+        self.seq = seq
+        if antenna:
+            self.antennas |= 1 << (antenna - 1)
+        if rssi is not None:
+            self.rssi_last = rssi
+            self.rssi_sum += rssi
+            self.rssi_count += 1
+            if self.rssi_min is None or rssi < self.rssi_min:
+                self.rssi_min = rssi
+            if self.rssi_max is None or rssi > self.rssi_max:
+                self.rssi_max = rssi
+
+    def antenna_list(self) -> list[int]:
+        mask, ids = self.antennas, []
+        while mask:
+            low = mask & -mask
+            ids.append(low.bit_length())
+            mask ^= low
+        return ids
+
+    def to_dict(self) -> dict:
+        return {
+            "epc": self.epc,
+            "pc": self.pc,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "count": self.count,
+            "antennas": self.antenna_list(),
+            "rssi": self.rssi_last,
+            "rssi_min": self.rssi_min,
+            "rssi_max": self.rssi_max,
+            "rssi_mean": round(self.rssi_sum / self.rssi_count, 1) if self.rssi_count else None,
+            "seq": self.seq,
+        }
+
+
+class TagTable:
+    """
+    Thread-safe: the reader side calls record(), the web side calls query()/events().
+    """
+
+    def __init__(self, history_size: int = 10000, max_tags: int = 100000):
+        """
+        :param history_size: Tag events kept in the ring buffer
+        :param max_tags: Distinct EPCs kept in the index before the stalest is evicted
+        """
+        if history_size < 1 or max_tags < 1:
+            raise ValueError("history_size and max_tags must be >= 1")
+        self.history_size = history_size
+        self.max_tags = max_tags
+        self._history: list = [None] * history_size
+        self._index: "OrderedDict[str, TagRecord]" = OrderedDict()  # oldest last_seen first
+        self._lock = threading.RLock()
+        self._seq = 0
+        self.total_reads = 0
+        self.evicted = 0
+        self._rate_window_start = time.monotonic()
+        self._rate_window_count = 0
+        self.read_rate = 0.0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, epc: str) -> bool:
+        return epc.upper() in self._index
+
+    @property
+    def cursor(self) -> int:
+        """Sequence number of the newest event (pass back as `since`)."""
+        return self._seq
+
+    def record(self, tag: dict) -> TagRecord:
+        """
+        Add one tag event.
+        :param tag: Dict with "epc" and optionally "rssi", "antenna"/"antenna_id", "pc";
+                    a copy with "seq" added goes into the history, the caller's dict
+                    (also handed to the emitter and the log) is left untouched
+        """
+        epc = tag["epc"].upper()
+        rssi = tag.get("rssi")
+        antenna = tag.get("antenna", tag.get("antenna_id"))
+        now = time.time()
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._history[seq % self.history_size] = dict(tag, seq=seq)
+
+            index = self._index
+            rec = index.get(epc)
+            if rec is None:
+                rec = index[epc] = TagRecord(epc, now)
+                if len(index) > self.max_tags:
+                    index.popitem(last=False)
+                    self.evicted += 1
+            else:
+                index.move_to_end(epc)
+            if tag.get("pc"):
+                rec.pc = tag["pc"]
+            rec.update(rssi, antenna, now, seq)
+
+            self.total_reads += 1
+            self._tick_rate()
+        return rec
+
+    def _tick_rate(self):
+        self._rate_window_count += 1
+        now = time.monotonic()
+        elapsed = now - self._rate_window_start
+        if elapsed >= 1.0:
+            self.read_rate = round(self._rate_window_count / elapsed, 1)
+            self._rate_window_start = now
+            self._rate_window_count = 0
+
+    def get(self, epc: str) -> Optional[dict]:
+        with self._lock:
+            rec = self._index.get(epc.upper())
+            return rec.to_dict() if rec else None
+
+    def clear(self):
+        with self._lock:
+            self._history = [None] * self.history_size
+            self._index.clear()
+            self.total_reads = 0
+            self.evicted = 0
+            self.read_rate = 0.0
+            self._rate_window_start = time.monotonic()
+            self._rate_window_count = 0
+            # _seq keeps counting so cursors held by clients stay meaningful
+
+    def events(self, since: int = 0, limit: int = 100) -> dict:
+        """
+        Tag events newer than cursor `since`, oldest first.
+        :return: {"events": [...], "cursor": last seq returned, "missed": events overwritten before being read}
+        """
+        with self._lock:
+            newest = self._seq
+            oldest = max(1, newest - self.history_size + 1)
+            start = max(since + 1, oldest)
+            missed = max(0, oldest - (since + 1)) if since else 0
+            end = min(newest, start + max(0, limit) - 1)
+            history, size = self._history, self.history_size
+            events = [history[seq % size] for seq in range(start, end + 1)]
+            events = [e for e in events if e is not None]
+        return {"events": events, "cursor": end if events else max(since, 0), "missed": missed}
+
+    def query(
+        self,
+        epc: Optional[str] = None,
+        antenna: Optional[int] = None,
+        min_rssi: Optional[int] = None,
+        seen_within: Optional[float] = None,
+        since: Optional[int] = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> dict:
+        """
+        Filter and page the per-EPC records, most recently seen first.
+        :param epc: EPC prefix (case-insensitive); an exact EPC is an O(1) lookup
+        :param antenna: Only tags seen on this antenna (1-based)
+        :param min_rssi: Only tags whose last RSSI is at least this
+        :param seen_within: Only tags seen in the last N seconds
+        :param since: Only records updated after this cursor
+        :return: {"tags": [...], "total": matches, "cursor": current cursor}
+        """
+        prefix = epc.upper() if epc else None
+        bit = 1 << (antenna - 1) if antenna else 0
+        cutoff = time.time() - seen_within if seen_within else None
+        with self._lock:
+            exact = self._index.get(prefix) if prefix else None
+            candidates = [exact] if exact is not None else reversed(self._index.values())
+            matches = []
+            for rec in candidates:
+                if since is not None and rec.seq <= since:
+                    # index is ordered by last update, so everything further is older
+                    break
+                if cutoff is not None and rec.last_seen < cutoff:
+                    break
+                if prefix and not rec.epc.startswith(prefix):
+                    continue
+                if bit and not rec.antennas & bit:
+                    continue
+                if min_rssi is not None and (rec.rssi_last is None or rec.rssi_last < min_rssi):
+                    continue
+                matches.append(rec)
+            page = [rec.to_dict() for rec in matches[offset:offset + limit]]
+            cursor = self._seq
+        return {"tags": page, "total": len(matches), "cursor": cursor}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "unique_tags": len(self._index),
+                "total_count": self.total_reads,
+                "read_rate": self.read_rate,
+                "evicted": self.evicted,
+                "cursor": self._seq,
+            }
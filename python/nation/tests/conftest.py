@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Modules of this package are imported flat (python app.py / python run.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nation import NationReader  # noqa: E402
+from simulator import NationSimulator  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    simulator = NationSimulator(tag_count=20, seed=7)
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def reader(sim):
+    nation = NationReader(sim.port, sim.baudrate)
+    nation.open()
+    yield nation
+    nation.close()
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import catalog
+from catalog import ProductCatalog
+from gs1 import encode_sgtin96, gtin_check_digit
+
+SGTIN = encode_sgtin96("80614141123458", 7, 6789, filter_value=3)
+
+
+def gtin(i: int) -> str:
+    body = f"{1000000000000 + i:013d}"
+    return body + str(gtin_check_digit(body))
+
+
+def write_csv(path, count: int, extra: str = ""):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("gtin,sku,name,price,epc_prefix\n")
+        for i in reversed(range(count)):
+            f.write(f"{gtin(i)},SKU{i},Product {i},{i}.5,{extra and extra + f'{i:04X}'}\n")
+    return str(path)
+
+
+def test_csv_lookup_by_epc_and_gtin(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text("gtin,sku,name,price,epc_prefix\n"
+                    "80614141123458,SHIRT-1,Shirt,9.99,\n"
+                    "00012345678905,CAP-1,Cap,,E28011\n", encoding="utf-8")
+    products = ProductCatalog(str(path))
+    products.load()
+    assert products.lookup(SGTIN) == {"gtin": "80614141123458", "sku": "SHIRT-1", "name": "Shirt", "price": 9.99}
+    assert products.lookup("E2801100AABBCCDD")["sku"] == "CAP-1"
+    assert products.lookup_gtin("012345678905")["price"] is None
+    assert products.lookup("300000000000000000000000") is None
+
+
+def test_first_row_of_a_duplicate_gtin_wins(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text("gtin,sku\n80614141123458,FIRST\n80614141123458,SECOND\nnot-a-gtin,X\n", encoding="utf-8")
+    products = ProductCatalog(str(path))
+    stats = products.load()
+    assert (stats["products"], stats["skipped_rows"]) == (1, 2)
+    assert products.lookup_gtin("80614141123458")["sku"] == "FIRST"
+
+
+@pytest.mark.parametrize("wrap", [False, True])
+def test_json_is_streamed_across_chunks(tmp_path, monkeypatch, wrap):
+    monkeypatch.setattr(catalog, "_JSON_CHUNK", 16)
+    rows = [{"GTIN": gtin(i), "Name": f"Product {i}", "price": i * 1000 + 0.25} for i in range(50)]
+    path = tmp_path / "products.json"
+    path.write_text(json.dumps({"version": [1, {"x": 2}], "products": rows} if wrap else rows, indent=1))
+    products = ProductCatalog(str(path))
+    assert products.load()["products"] == 50
+    assert products.lookup_gtin(gtin(49)) == {"gtin": gtin(49), "name": "Product 49", "price": 49000.25}
+
+
+@pytest.mark.parametrize("text", ['{"items": []}', '[{"gtin": "1"}', '{"products": [1, 2'])
+def test_malformed_json_is_refused(tmp_path, text):
+    path = tmp_path / "products.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        ProductCatalog(str(path)).load()
+
+
+def test_oversized_catalog_is_refused_and_the_old_one_kept(tmp_path):
+    small, large = write_csv(tmp_path / "small.csv", 10), write_csv(tmp_path / "large.csv", 20000)
+    products = ProductCatalog(small, max_bytes=256 * 1024)
+    products.load()
+    with pytest.raises(ValueError, match="budget"):
+        products.load(large)
+    assert products.stats()["products"] == 10
+    assert products.stats()["path"] == small
+    assert products.lookup_gtin(gtin(3))["sku"] == "SKU3"
+
+
+def test_prefix_map_counts_against_the_budget(tmp_path):
+    plain, prefixed = write_csv(tmp_path / "plain.csv", 2000), write_csv(tmp_path / "prefixed.csv", 2000, "E2")
+    budget = ProductCatalog(plain).load()["bytes"] + 64 * 1024
+    products = ProductCatalog(plain, max_bytes=budget)
+    products.load()
+    with pytest.raises(ValueError, match="budget"):
+        products.load(prefixed)
+    assert products.stats()["bytes"] <= budget
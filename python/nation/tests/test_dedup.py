@@ -0,0 +1,70 @@
+import pytest
+
+from dedup import TagDeduplicator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def feed(dedup, clock, at: float, epc: str = "AA", rssi: int = 100, antenna: int = 1):
+    clock.now = at
+    dedup({"epc": epc, "rssi": rssi, "antenna_id": antenna})
+
+
+def test_first_seen_refresh_last_seen(clock):
+    events = []
+    dedup = TagDeduplicator(events.append, window=1.0, refresh_interval=2.0, clock=clock)
+    for i in range(26):  # every 0.1 s up to 2.5 s
+        feed(dedup, clock, i * 0.1, rssi=100 + i)
+    assert [e["event"] for e in events] == ["first_seen", "refresh"]
+    assert events[0]["read_count"] == 1
+    assert events[1]["read_count"] == 21  # reads at 0.0 .. 2.0 s
+
+    assert dedup.sweep(now=3.4) == 0  # last read at 2.5 s: still inside the window
+    assert dedup.sweep(now=3.5) == 1
+    last = events[-1]
+    assert (last["event"], last["read_count"], last["new_reads"]) == ("last_seen", 26, 5)
+    assert (last["peak_rssi"], last["mean_rssi"], last["duration"]) == (125, 112.5, 2.5)
+
+    feed(dedup, clock, 4.0)  # back in the field: a new first_seen
+    assert events[-1]["event"] == "first_seen"
+    assert dedup.stats() == {"tracked": 1, "reads_in": 27, "events_out": 4}
+
+
+def test_key_by_antenna_tracks_each_pair(clock):
+    events = []
+    dedup = TagDeduplicator(events.append, window=1.0, refresh_interval=0, key_by_antenna=True, clock=clock)
+    feed(dedup, clock, 0.0, antenna=1)
+    feed(dedup, clock, 0.1, antenna=2)
+    feed(dedup, clock, 0.2, antenna=1)
+    assert [(e["event"], e["antenna_id"]) for e in events] == [("first_seen", 1), ("first_seen", 2)]
+    assert dedup.flush() == 2
+    assert sorted(e["read_count"] for e in events[2:]) == [1, 2]
+
+
+def test_close_flushes_tags_still_in_the_field(clock):
+    events = []
+    dedup = TagDeduplicator(events.append, window=60.0, clock=clock)
+    dedup.start()
+    feed(dedup, clock, 0.0, epc="AA")
+    feed(dedup, clock, 0.0, epc="BB")
+    dedup.close()
+    assert sorted((e["event"], e["epc"]) for e in events[2:]) == [("last_seen", "AA"), ("last_seen", "BB")]
+    assert dedup.stats()["tracked"] == 0
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        TagDeduplicator(print, window=0)
+    with pytest.raises(ValueError):
+        TagDeduplicator(print, refresh_interval=-1)
@@ -0,0 +1,47 @@
+import pytest
+
+from epc_allocator import EpcAllocator, PoolExhausted
+
+POOL = {"scheme": "sgtin96", "gtin": "80614141123458", "company_prefix_length": 7, "filter": 3,
+        "serial_start": 6789, "serial_end": 7000}
+
+
+@pytest.fixture
+def allocator(tmp_path):
+    allocator = EpcAllocator(str(tmp_path / "epc_allocator.json"))
+    allocator.define_pool("shirts", POOL)
+    return allocator
+
+
+def test_lease_hands_out_epcs_of_the_pool(allocator):
+    lease = allocator.lease("shirts", 3)
+    assert (lease["start"], lease["end"]) == (6789, 6792)
+    assert allocator.epcs(lease)[0] == "3074257BF7194E4000001A85"
+
+
+def test_release_returns_the_unused_tail(allocator):
+    lease = allocator.lease("shirts", 10)
+    assert allocator.release(lease["id"], used=4) == {"returned": 6, "skipped": 0}
+    assert allocator.lease("shirts", 1)["start"] == 6789 + 4
+
+
+def test_release_after_a_later_lease_skips_the_tail(allocator):
+    first = allocator.lease("shirts", 10)
+    second = allocator.lease("shirts", 10)
+    assert allocator.release(first["id"], used=4) == {"returned": 0, "skipped": 6}
+    assert allocator.lease("shirts", 1)["start"] == second["end"]
+
+
+def test_serials_of_an_open_lease_are_not_reissued_after_a_crash(tmp_path, allocator):
+    lost = allocator.lease("shirts", 10)
+    # A new process on the same state file; the first one never released its lease
+    restarted = EpcAllocator(str(tmp_path / "epc_allocator.json"))
+    lease = restarted.lease("shirts", 10)
+    assert lease["start"] == lost["end"]
+    assert restarted.pool_status("shirts")["next"] == lease["end"]
+
+
+def test_exhausted_pool(allocator):
+    allocator.lease("shirts", 1000)
+    with pytest.raises(PoolExhausted):
+        allocator.lease("shirts", 1)
@@ -0,0 +1,52 @@
+import pytest
+
+from epc_allocator import EpcAllocator
+from epc_encoder import BatchEncoder
+from gs1 import encode_sgtin96
+from nation import NationReader
+from simulator import NationSimulator
+
+POOL = {"scheme": "sgtin96", "gtin": "80614141123458", "company_prefix_length": 7, "filter": 3}
+
+
+@pytest.fixture
+def station():
+    # Encoding station: every tag on the one antenna
+    simulator = NationSimulator(tag_count=4, seed=3, antennas=(1,), cross_read=0)
+    simulator.start()
+    reader = NationReader(simulator.port, simulator.baudrate)
+    reader.open()
+    yield simulator, reader
+    reader.close()
+    simulator.stop()
+
+
+def test_already_encoded_tags_are_left_alone(station, tmp_path):
+    sim, reader = station
+    allocator = EpcAllocator(str(tmp_path / "epc_allocator.json"))
+    allocator.define_pool("shirts", POOL)
+    fmt = allocator.pool_format("shirts")
+    # Written by another station from the same pool, and by an earlier batch of another product
+    sim.tags[0].epc = bytes.fromhex(fmt.epc(500000))
+    sim.tags[1].epc = bytes.fromhex(encode_sgtin96("00614141123452", 7, 1))
+    before = [tag.epc for tag in sim.tags]
+
+    encoder = BatchEncoder(reader, is_encoded=fmt.matches, verify=False, idle_timeout=0.5)
+    summary = encoder.run(allocator.stream("shirts", limit=4))
+
+    assert summary["written"] == 2
+    assert [tag.epc for tag in sim.tags[:2]] == before[:2]
+    assert {tag.epc.hex().upper() for tag in sim.tags[2:]} == {fmt.epc(0), fmt.epc(1)}
+
+
+def test_unencoded_prefix_selects_blank_tags(station):
+    sim, reader = station
+    for i, tag in enumerate(sim.tags):
+        tag.epc = bytes.fromhex(("E28011" if i < 2 else "AB0000") + f"{i:018X}")
+    epcs = [f"{0x3000 + i:024X}" for i in range(4)]
+
+    summary = BatchEncoder(reader, unencoded_prefix="e280", verify=False, idle_timeout=0.5).run(epcs)
+
+    assert summary["written"] == 2
+    assert summary["remaining"] == epcs[2:]
+    assert [tag.epc.hex().upper()[:6] for tag in sim.tags[2:]] == ["AB0000", "AB0000"]
@@ -0,0 +1,31 @@
+from nation import FrameDecoder, MID, NationReader
+
+
+def tag_frames(count: int) -> bytes:
+    return b"".join(NationReader.build_frame(MID.QUERY_INFO, bytes([i])) for i in range(count))
+
+
+def test_frames_split_across_feeds():
+    stream = tag_frames(10)
+    decoder = FrameDecoder()
+    decoded = []
+    for i in range(0, len(stream), 7):
+        decoder.feed(stream[i:i + 7])
+        decoded.extend(bytes(frame) for frame in decoder.frames())
+    assert len(decoded) == 10
+    assert decoder.garbage_bytes == 0
+
+
+def test_stray_header_with_bogus_length_does_not_block_valid_frames():
+    decoder = FrameDecoder()
+    # 0x5A + wrong PCW type/version + a length still under the buffer capacity
+    decoder.feed(bytes([0x5A, 0x12, 0x34, 0x00, 0x01, 0x03, 0x00]) + tag_frames(10))
+    assert sum(1 for _ in decoder.frames()) == 10
+    assert decoder.garbage_bytes == 7
+
+
+def test_header_longer_than_protocol_maximum_is_skipped():
+    decoder = FrameDecoder()
+    # Right PCW type/version, but a length beyond MAX_DATA_LEN
+    decoder.feed(bytes([0x5A, 0x00, 0x01, 0x00, 0x01, 0x0F, 0x00]) + tag_frames(10))
+    assert sum(1 for _ in decoder.frames()) == 10
@@ -0,0 +1,38 @@
+import pytest
+
+from gs1 import EpcDecoder, encode_sgtin96
+
+# Examples from the GS1 EPC Tag Data Standard
+SGTIN96 = "3074257BF7194E4000001A85"   # urn:epc:tag:sgtin-96:3.0614141.812345.6789
+SSCC96 = "3174257BF4499602D2000000"    # urn:epc:tag:sscc-96:3.0614141.1234567890
+GRAI96 = "3374257BF40C0E400000162E"    # urn:epc:tag:grai-96:3.0614141.12345.5678
+
+
+def test_sgtin96_encode():
+    assert encode_sgtin96("80614141123458", 7, 6789, filter_value=3) == SGTIN96
+
+
+def test_sgtin96_decode():
+    fields = EpcDecoder().decode(SGTIN96)
+    assert fields["scheme"] == "sgtin-96"
+    assert fields["gtin"] == "80614141123458"
+    assert fields["filter"] == 3
+    assert fields["serial"] == 6789
+    assert fields["uri"] == "urn:epc:id:sgtin:0614141.812345.6789"
+
+
+def test_sscc96_decode():
+    fields = EpcDecoder().decode(SSCC96)
+    assert fields["sscc"] == "106141412345678908"
+    assert fields["uri"] == "urn:epc:id:sscc:0614141.1234567890"
+
+
+def test_grai96_decode():
+    fields = EpcDecoder().decode(GRAI96)
+    assert fields["grai"] == "006141411234525678"
+    assert fields["uri"] == "urn:epc:id:grai:0614141.12345.5678"
+
+
+@pytest.mark.parametrize("epc", ["", "zz", "E2801160600002", "FF" * 12, None])
+def test_anything_else_decodes_as_raw(epc):
+    assert EpcDecoder().decode(epc) == {"scheme": "raw"}
@@ -0,0 +1,46 @@
+import threading
+
+from handoff import OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, TagHandoffQueue
+
+
+def test_drop_oldest_keeps_the_freshest_items():
+    queue = TagHandoffQueue(capacity=4, overflow=OVERFLOW_DROP_OLDEST)
+    for i in range(10):
+        assert queue.put(i)
+    assert queue.get_batch(10, timeout=0) == [6, 7, 8, 9]
+    assert queue.dropped_oldest == 6
+    queue.task_done(4)
+    assert queue.unfinished() == 0
+
+
+def test_drop_newest_refuses_new_items():
+    queue = TagHandoffQueue(capacity=4, overflow=OVERFLOW_DROP_NEWEST)
+    accepted = [queue.put(i) for i in range(6)]
+    assert accepted == [True] * 4 + [False] * 2
+    assert queue.get_batch(10, timeout=0) == [0, 1, 2, 3]
+    assert queue.dropped_newest == 2
+
+
+def test_unfinished_counts_every_item_still_to_process_under_contention():
+    queue = TagHandoffQueue(capacity=8, overflow=OVERFLOW_DROP_OLDEST)
+    processed = []
+    done = threading.Event()
+
+    def consume():
+        while not done.is_set() or len(queue):
+            batch = queue.get_batch(3, timeout=0.01)
+            processed.extend(batch)
+            queue.task_done(len(batch))
+
+    consumers = [threading.Thread(target=consume) for _ in range(3)]
+    for consumer in consumers:
+        consumer.start()
+    for i in range(50000):
+        queue.put(i)
+        # Never below the items still queued: otherwise wait_empty() returns too early
+        assert queue.unfinished() >= len(queue)
+    done.set()
+    for consumer in consumers:
+        consumer.join()
+    assert queue.enqueued == len(processed) + queue.dropped_oldest
+    assert queue.unfinished() == 0
@@ -0,0 +1,33 @@
+import time
+
+
+def run_inventory(reader, seconds: float, **kwargs) -> list[dict]:
+    tags = []
+    assert reader.start_inventory_with_mode([1, 2, 3, 4], callback=tags.append, **kwargs)
+    time.sleep(seconds)
+    assert reader.stop_inventory()
+    return tags
+
+
+def test_hardware_filter_is_cleared_by_a_later_off_session(sim, reader):
+    sim.rssi_threshold = 0
+    hardware = run_inventory(reader, 0.3, dedup={"mode": "hardware", "window": 5.0})
+    assert sim.filter_ms == 5000
+    assert len(hardware) == len({tag["epc"] for tag in hardware})
+
+    plain = run_inventory(reader, 0.3, dedup={"mode": "off"})
+    assert sim.filter_ms == 0
+    assert len(plain) > len({tag["epc"] for tag in plain})
+
+
+def test_off_session_keeps_the_rssi_threshold(sim, reader):
+    reader.set_filter_settings(2000, 100)
+    run_inventory(reader, 0.1)
+    assert (sim.filter_ms, sim.rssi_threshold) == (0, 100)
+
+
+def test_no_filter_command_when_the_reader_is_known_clear(sim, reader):
+    reader.set_filter_settings(0, 0)
+    writes = sim.command_counts[0x0209]
+    run_inventory(reader, 0.1)
+    assert sim.command_counts[0x0209] == writes
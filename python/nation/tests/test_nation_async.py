@@ -0,0 +1,19 @@
+import asyncio
+
+from nation_async import AsyncNationReader
+
+
+def test_start_tags_stop(sim):
+    async def run():
+        async with AsyncNationReader(sim.port, sim.baudrate) as reader:
+            assert await reader.start_inventory_with_mode([1, 2, 3, 4])
+            epcs = set()
+            async for tag in reader.tags():
+                epcs.add(tag["epc"])
+                if len(epcs) == len(sim.tags):
+                    assert await reader.stop_inventory()
+            assert not reader.is_inventory_running()
+            return epcs
+
+    epcs = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert epcs == {tag.epc.hex().upper() for tag in sim.tags}
@@ -0,0 +1,48 @@
+from nation import MID
+
+
+def current_config(state: dict) -> dict:
+    values = state["values"]
+    return {
+        "antenna_powers": values["antenna_powers"],
+        "antenna_mask": values["antenna_mask"],
+        "baseband": values["baseband"],
+        "filter": {"repeated_time_ms": values["filter"]["repeat_time"] * 10,
+                   "rssi_threshold": values["filter"]["rssi_threshold"]},
+        "rf_band": values["rf_band"]["band_code"],
+    }
+
+
+def test_refresh_state_reads_hardware_values(sim, reader):
+    sim.enabled_mask = 0b0101
+    sim.filter_ms = 300
+    sim.rssi_threshold = 40
+    values = reader.refresh_state()["values"]
+    assert values["antenna_mask"] == 0b0101
+    assert values["filter"] == {"repeat_time": 30, "rssi_threshold": 40}
+    assert values["antenna_powers"] == {1: 30, 2: 30, 3: 30, 4: 30}
+    assert values["rf_band"]["band_code"] == 0
+
+
+def test_apply_current_config_after_refresh_sends_nothing(sim, reader):
+    config = current_config(reader.refresh_state())
+    commands = dict(sim.command_counts)
+
+    result = reader.apply_config(config)
+
+    assert result["success"]
+    assert result["changed"] == []
+    assert sim.command_counts == commands
+
+
+def test_pipelined_mask_and_rf_band_reach_their_own_commands(sim, reader):
+    reader.refresh_state()
+    result = reader.apply_config({"antennas": [1, 2], "rf_band": 3})
+
+    assert result["success"], result
+    assert sorted(result["changed"]) == ["antenna_mask", "rf_band"]
+    assert sim.enabled_mask == 0b0011
+    assert sim.rf_band == 3
+    assert sim.command_counts[MID.CONFIG_ANT_MASK] == 1
+    assert sim.command_counts[MID.CONFIG_RF_BAND] == 1
+    assert reader.apply_config({"antennas": [1, 2], "rf_band": 3})["changed"] == []
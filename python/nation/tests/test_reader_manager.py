@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from port_discovery import PortDiscovery
+from reader_manager import KEY_BY_SERIAL, ReaderManager
+from simulator import NationSimulator
+
+
+@pytest.fixture
+def sims():
+    simulators = [NationSimulator(tag_count=5, seed=seed) for seed in (1, 2)]
+    for simulator, serial_number in zip(simulators, ("SIM-A", "SIM-B")):
+        simulator.serial_number = serial_number
+        simulator.start()
+    yield simulators
+    for simulator in simulators:
+        simulator.stop()
+
+
+def test_readers_recover_after_swapping_ports(sims):
+    ports = [simulator.port for simulator in sims]
+    discovery = PortDiscovery(extra_patterns=ports, port_filter=lambda _info: False, probe_timeout=0.2)
+    manager = ReaderManager(key_by=KEY_BY_SERIAL, discovery=discovery, reconnect_backoff=(0.05, 0.2))
+    try:
+        for simulator in sims:
+            manager.add(simulator.port, simulator.baudrate)
+        # Both readers unplugged and re-enumerated on each other's device path
+        with manager._lock:
+            sims[0].serial_number, sims[1].serial_number = "SIM-B", "SIM-A"
+            for reader_id in manager.ids():
+                manager.get(reader_id).close()
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            if all(status["connected"] for status in manager.status()):
+                break
+            time.sleep(0.05)
+        assert manager.get("SIM-A").port == ports[1]
+        assert manager.get("SIM-B").port == ports[0]
+        assert manager.get("SIM-A").Query_Reader_Information()["serial_number"] == "SIM-A"
+        assert discovery.known()["SIM-A"]["port"] == ports[1]
+        assert discovery.known()["SIM-B"]["port"] == ports[0]
+    finally:
+        manager.close_all()
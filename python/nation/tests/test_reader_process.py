@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from reader_process import ProcessReader
+
+
+@pytest.fixture
+def process_reader(sim):
+    reader = ProcessReader(sim.port, sim.baudrate, call_timeout=0.3)
+    reader.open()
+    yield reader
+    reader.close()
+
+
+def test_forwarded_call(sim, process_reader):
+    info = process_reader.Query_Reader_Information()
+    assert sim.serial_number in str(info)
+
+
+def test_late_reply_is_not_delivered_to_the_next_call(sim, process_reader):
+    sim.response_delay = 0.5
+    with pytest.raises(TimeoutError):
+        process_reader.query_reader_power()
+    sim.response_delay = 0.0
+    time.sleep(0.5)  # the worker answers the timed-out call in the meantime
+
+    info = process_reader.Query_Reader_Information()
+    powers = process_reader.query_reader_power()
+
+    assert sim.serial_number in str(info)
+    assert powers == process_reader.query_reader_power()
+    assert sim.serial_number not in str(powers)
+    assert process_reader.stale_replies == 1
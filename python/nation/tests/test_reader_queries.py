@@ -0,0 +1,13 @@
+def test_query_rfid_ability(sim, reader):
+    ability = reader.query_rfid_ability()
+    assert ability["max_power_dbm"] == 33
+    assert ability["min_power_dbm"] == 0
+    assert ability["antenna_count"] == len(sim.antennas)
+    assert ability["frequencies"] == [0x00, 0x04]
+    assert ability["rfid_protocols"] == [0x00]
+    assert sim.command_counts[0x1000] == 1
+
+
+def test_inventory_once_reads_every_tag_of_the_enabled_antennas(sim, reader):
+    tags = reader.inventory_once(antenna_mask=[1, 2, 3, 4])
+    assert {tag["epc"] for tag in tags} == {tag.epc.hex().upper() for tag in sim.tags}
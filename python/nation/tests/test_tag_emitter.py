@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from tag_emitter import STREAM_BATCH, TagBatchEmitter
+from tag_table import TagTable
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+        self.event = threading.Event()
+
+    def emit(self, name, payload, to=None):
+        self.emitted.append((time.monotonic(), name, payload, to))
+        self.event.set()
+
+    def wait(self, count: int, timeout: float = 2.0) -> list:
+        deadline = time.monotonic() + timeout
+        while len(self.emitted) < count and time.monotonic() < deadline:
+            self.event.wait(0.01)
+            self.event.clear()
+        return self.emitted
+
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+
+@pytest.fixture
+def emitter(socketio):
+    tag_emitter = TagBatchEmitter(socketio)
+    tag_emitter.start()
+    yield tag_emitter
+    tag_emitter.stop()
+
+
+def tags(count: int, reader_id: str = "R1") -> list[dict]:
+    return [{"epc": f"E280{i:04X}", "reader_id": reader_id} for i in range(count)]
+
+
+def test_flush_after_interval(socketio, emitter):
+    emitter.register("a", {"mode": STREAM_BATCH, "interval_ms": 50, "max_batch": 100})
+    started = time.monotonic()
+    for tag in tags(3):
+        emitter.submit(tag)
+    [(at, name, payload, room)] = socketio.wait(1)
+    assert at - started >= 0.045
+    assert (name, room) == ("tag_batch", "tag_batch:50:100")
+    assert payload == {"tags": tags(3), "count": 3, "dropped": 0}
+
+
+def test_flush_as_soon_as_a_batch_is_full(socketio, emitter):
+    emitter.register("a", {"mode": STREAM_BATCH, "interval_ms": 5000, "max_batch": 4})
+    started = time.monotonic()
+    for tag in tags(4):
+        emitter.submit(tag)
+    [(at, _, payload, _)] = socketio.wait(1)
+    assert at - started < 1.0
+    assert payload["count"] == 4
+
+
+def test_single_mode_and_reader_filter(socketio, emitter):
+    emitter.register("a")
+    emitter.register("b", {"readers": "R2"})
+    for tag in tags(2, "R1") + tags(1, "R2"):
+        emitter.submit(tag)
+    emitted = socketio.wait(4)
+    assert sorted((room, payload["reader_id"]) for _, name, payload, room in emitted if name == "tag_detected") == [
+        ("tag_detected", "R1"), ("tag_detected", "R1"), ("tag_detected", "R2"), ("tag_detected:R2", "R2")]
+
+
+def test_negotiate_clamps_to_server_limits(emitter):
+    settings = emitter.negotiate({"mode": STREAM_BATCH, "interval_ms": 1, "max_batch": 10 ** 9})
+    assert settings == {"mode": STREAM_BATCH, "interval_ms": 20, "max_batch": 10000}
+
+
+def test_payloads_do_not_carry_the_table_sequence(socketio, emitter):
+    # publish_tag hands the same dict to the tag table and to the emitter
+    emitter.register("a")
+    table = TagTable()
+    tag = tags(1)[0]
+    table.record(tag)
+    emitter.submit(tag)
+    [(_, _, payload, _)] = socketio.wait(1)
+    assert "seq" not in payload
@@ -0,0 +1,96 @@
+import os
+import time
+
+import pytest
+
+from tag_index import SegmentIndex, TagLogIndex
+from tag_log import INDEX_SUFFIX, RECORD_SIZE, SEGMENT_SUFFIX, TagLog, TagLogReader, list_segments, map_segment
+
+PER_SEGMENT = 10
+SPARSE_EVERY = 4
+
+
+def epc(i: int) -> str:
+    return f"E280{i % 7:020X}"
+
+
+def append(log: TagLog, start: int, count: int):
+    for i in range(start, start + count):
+        log.append(epc(i), rssi=100, antenna=1 + i % 2, reader_id="R1", timestamp=1000.0 + i)
+    deadline = time.monotonic() + 5
+    while log.written < start + count:
+        assert time.monotonic() < deadline, "tag log writer did not catch up"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def log(tmp_path):
+    # Segments of 10 records: 0-9 and 10-19 sealed, 20- live
+    tag_log = TagLog(str(tmp_path / "tag_log"), segment_bytes=32 + PER_SEGMENT * RECORD_SIZE,
+                     flush_interval_ms=5, fsync=False)
+    tag_log.start()
+    append(tag_log, 0, 25)
+    yield tag_log
+    tag_log.close()
+
+
+def seqs(records) -> list[int]:
+    return [r["seq"] for r in records]
+
+
+def test_epc_lookup_across_sealed_and_live_segments(log):
+    index = TagLogIndex(log.directory, sparse_every=SPARSE_EVERY)
+    assert seqs(index.query(epc=epc(3))) == [3, 10, 17, 24]
+    assert index.last_seen(epc(3))["seq"] == 24
+    assert seqs(index.query(epc=epc(3), antenna=2)) == [3, 17]
+
+    append(log, 25, 10)  # the live segment grows and a new one starts
+    assert seqs(index.query(epc=epc(3))) == [3, 10, 17, 24, 31]
+    assert index.last_seen(epc(3))["seq"] == 31
+
+
+@pytest.mark.parametrize("since, until", [
+    (1003.0, 1004.0), (1004.0, 1008.0), (1007.5, 1012.0), (1009.0, 1010.0),
+    (1019.0, 1021.0), (None, 1003.0), (1023.0, None), (990.0, 999.0), (1030.0, None),
+])
+def test_time_range_matches_a_full_replay(log, since, until):
+    expected = [r["seq"] for r in TagLogReader(log.directory).replay()
+                if (since is None or r["timestamp"] >= since) and (until is None or r["timestamp"] <= until)]
+    index = TagLogIndex(log.directory, sparse_every=SPARSE_EVERY)
+    assert seqs(index.query(since=since, until=until)) == expected
+    assert seqs(index.query(since=since, until=until, newest_first=True)) == expected[::-1]
+    assert seqs(index.query(since=since, until=until, newest_first=True, limit=2)) == expected[::-1][:2]
+
+
+def test_sealed_segments_are_indexed_once_and_reloaded_from_the_sidecar(log):
+    first = TagLogIndex(log.directory, sparse_every=SPARSE_EVERY)
+    expected = seqs(first.query(epc=epc(5)))
+    assert first.stats()["built"] == 2
+    sidecars = sorted(name for name in os.listdir(log.directory) if name.endswith(INDEX_SUFFIX))
+    assert sidecars == [f"seg-{base:020d}{INDEX_SUFFIX}" for base in (0, PER_SEGMENT)]
+
+    second = TagLogIndex(log.directory, sparse_every=SPARSE_EVERY)
+    assert seqs(second.query(epc=epc(5))) == expected
+    assert seqs(second.query(since=1005.0, until=1014.0)) == list(range(5, 15))
+    assert (second.stats()["built"], second.stats()["loaded"]) == (0, 2)
+
+
+def test_sidecar_round_trip(log):
+    base, path = list_segments(log.directory)[1]
+    buf, count = map_segment(path)
+    with buf:
+        index = SegmentIndex(base, SPARSE_EVERY)
+        assert index.extend(buf, count)
+    index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+    index.save(index_path)
+
+    loaded = SegmentIndex.load(index_path, base, count)
+    assert (loaded.count, loaded.sparse_every, loaded.min_ts, loaded.max_ts) == (10, SPARSE_EVERY, 1010.0, 1019.0)
+    assert list(loaded.sparse) == [1010.0, 1014.0, 1018.0]
+    assert {key: list(positions) for key, positions in loaded.epcs.items()} == \
+        {key: list(positions) for key, positions in index.epcs.items()}
+    # A sidecar that does not cover the segment any more is rebuilt, not trusted
+    assert SegmentIndex.load(index_path, base, count + 1) is None
+    with open(index_path, "r+b") as f:
+        f.write(b"XXXX")
+    assert SegmentIndex.load(index_path, base, count) is None
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+
+from tag_log import INDEX_SUFFIX, RECORD_SIZE, SEGMENT_SUFFIX, TagLog, TagLogReader, list_segments
+
+SEGMENT_HEADER = 32
+
+
+def epc(i: int) -> str:
+    return f"E280{i:020X}"
+
+
+def wait_written(log: TagLog, count: int):
+    deadline = time.monotonic() + 5
+    while log.written < count:
+        assert time.monotonic() < deadline, "tag log writer did not catch up"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "tag_log")
+
+
+def write(directory, count: int, start: int = 0, **kwargs) -> TagLog:
+    log = TagLog(directory, fsync=False, **kwargs)
+    log.start()
+    for i in range(start, start + count):
+        assert log.append(epc(i), rssi=100 + i % 50, antenna=1 + i % 4, reader_id="R1", timestamp=1000.0 + i)
+    log.close()
+    return log
+
+
+def test_group_commit_writes_a_burst_in_one_write(directory):
+    log = write(directory, 500, flush_interval_ms=10_000)
+    assert (log.written, log.commits) == (500, 1)
+    records = list(TagLogReader(directory).replay())
+    assert [r["seq"] for r in records] == list(range(500))
+    assert records[7] == {"seq": 7, "timestamp": 1007.0, "reader_id": "R1", "antenna": 4, "rssi": 107,
+                          "epc": epc(7)}
+
+
+def test_torn_tail_is_truncated_on_restart(directory):
+    write(directory, 10)
+    [(_, path)] = list_segments(directory)
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size - RECORD_SIZE // 2)  # crash in the middle of the last record
+
+    log = TagLog(directory, fsync=False)
+    log.start()
+    assert log.truncated == RECORD_SIZE - RECORD_SIZE // 2
+    assert log.sequence() == 9
+    log.append(epc(100), timestamp=2000.0)
+    log.close()
+
+    records = list(TagLogReader(directory).replay())
+    assert [r["seq"] for r in records] == list(range(10))
+    assert records[-1]["epc"] == epc(100)
+
+
+def test_record_with_a_bad_crc_is_cut_off(directory):
+    write(directory, 10)
+    [(_, path)] = list_segments(directory)
+    with open(path, "r+b") as f:
+        f.seek(SEGMENT_HEADER + 9 * RECORD_SIZE + 20)
+        f.write(b"\xff")
+
+    assert len(list(TagLogReader(directory).replay())) == 9  # the reader stops at the torn record
+    log = TagLog(directory, fsync=False)
+    log.start()
+    log.close()
+    assert log.truncated == RECORD_SIZE
+    assert log.sequence() == 9
+
+
+def test_rotation_keeps_sequence_numbers_across_segments(directory):
+    write(directory, 35, segment_bytes=SEGMENT_HEADER + 10 * RECORD_SIZE)
+    assert [base for base, _ in list_segments(directory)] == [0, 10, 20, 30]
+    reader = TagLogReader(directory)
+    assert [r["seq"] for r in reader.replay()] == list(range(35))
+    assert [r["seq"] for r in reader.replay(start_seq=18)] == list(range(18, 35))
+    assert [r["seq"] for r in reader.replay(since=1012.0, until=1021.0)] == list(range(12, 22))
+
+
+def test_retention_removes_segments_with_their_index(directory):
+    log = TagLog(directory, segment_bytes=SEGMENT_HEADER + 5 * RECORD_SIZE, retention_segments=2,
+                 flush_interval_ms=10, fsync=False)
+    log.start()
+    try:
+        for block in range(3):
+            for i in range(block * 5, block * 5 + 5):
+                log.append(epc(i), timestamp=1000.0 + i)
+            wait_written(log, block * 5 + 5)
+            # Sidecar as tag_index.TagLogIndex writes it for every segment
+            _, path = list_segments(directory)[-1]
+            with open(path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, "wb") as f:
+                f.write(b"idx")
+        log.append(epc(15), timestamp=1015.0)
+        wait_written(log, 16)
+    finally:
+        log.close()
+
+    names = sorted(os.listdir(directory))
+    assert [base for base, _ in list_segments(directory)] == [10, 15]
+    assert not any(name.startswith("seg-00000000000000000000") for name in names)
+    assert not any(name.startswith("seg-00000000000000000005") for name in names)
+    assert f"seg-{10:020d}{INDEX_SUFFIX}" in names
+    assert [r["seq"] for r in TagLogReader(directory).replay()] == list(range(10, 16))
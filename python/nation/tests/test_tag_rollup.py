@@ -0,0 +1,34 @@
+from dedup import TagDeduplicator
+from tag_rollup import TagRollup
+
+
+def test_counts_reads_per_bucket_and_antenna():
+    rollup = TagRollup()
+    for i in range(10):
+        rollup.record(f"EPC{i % 3}", rssi=100, antenna=1 + i % 2, now=120.5)
+    minute = rollup.snapshot("minute")[-1]
+    assert minute["reads"] == 10
+    assert minute["unique"] == 3
+    assert minute["antennas"] == {1: 5, 2: 5}
+    assert rollup.total_reads == 10
+
+
+def test_host_dedup_events_count_every_read_they_aggregate():
+    now = [0.0]
+    rollup = TagRollup()
+
+    def publish(event):
+        rollup.record(event["epc"], event["rssi"], event["antenna_id"], now=60.0, reads=event["new_reads"])
+
+    dedup = TagDeduplicator(publish, window=1.0, refresh_interval=0.5, clock=lambda: now[0])
+    for i in range(20):
+        now[0] = i * 0.1
+        dedup({"epc": "AA", "rssi": 100, "antenna_id": 1})
+        dedup({"epc": "BB", "rssi": 120, "antenna_id": 2})
+    dedup.flush()
+
+    assert dedup.events_out < 40
+    assert rollup.total_reads == 40
+    minute = rollup.snapshot("minute")[-1]
+    assert minute["antennas"] == {1: 20, 2: 20}
+    assert minute["rssi"]["mean"] == 110.0
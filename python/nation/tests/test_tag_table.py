@@ -0,0 +1,57 @@
+from tag_table import TagTable
+
+
+def read(i: int, antenna: int = 1, rssi: int = 100) -> dict:
+    return {"epc": f"e280{i:04x}", "rssi": rssi, "antenna": antenna}
+
+
+def test_record_leaves_the_callers_dict_alone():
+    table = TagTable()
+    tag = read(1)
+    table.record(tag)
+    assert "seq" not in tag
+    assert table.events()["events"] == [dict(tag, seq=1)]
+
+
+def test_cursor_paging():
+    table = TagTable()
+    for i in range(10):
+        table.record(read(i))
+    pages, since = [], 0
+    while True:
+        page = table.events(since=since, limit=4)
+        if not page["events"]:
+            break
+        pages.append([event["seq"] for event in page["events"]])
+        since = page["cursor"]
+    assert pages == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+    assert table.events(since=10) == {"events": [], "cursor": 10, "missed": 0}
+
+
+def test_events_overwritten_before_being_read_are_reported_missed():
+    table = TagTable(history_size=5)
+    for i in range(12):
+        table.record(read(i))
+    page = table.events(since=3)
+    assert page["missed"] == 4
+    assert [event["seq"] for event in page["events"]] == [8, 9, 10, 11, 12]
+    table.clear()
+    table.record(read(0))
+    assert [event["seq"] for event in table.events(since=12)["events"]] == [13]
+
+
+def test_index_aggregates_per_epc_and_evicts_the_stalest():
+    table = TagTable(max_tags=3)
+    table.record(read(1, antenna=1, rssi=90))
+    table.record(read(1, antenna=3, rssi=110))
+    for i in (2, 3, 1, 4):
+        table.record(read(i))
+    assert "E2800002" not in table
+    assert table.evicted == 1
+    record = table.get("e2800001")
+    assert (record["count"], record["antennas"], record["rssi_min"], record["rssi_max"]) == (3, [1, 3], 90, 110)
+
+    result = table.query()
+    assert [tag["epc"] for tag in result["tags"]] == ["E2800004", "E2800001", "E2800003"]
+    assert [tag["epc"] for tag in table.query(antenna=3)["tags"]] == ["E2800001"]
+    assert [tag["epc"] for tag in table.query(since=4)["tags"]] == ["E2800004", "E2800001"]